@@ -20,12 +20,22 @@ try:
 except ImportError:
     pass
 
+def scrub(seconds): #jump through the video, keeping the audio in step
+    mvf.seek(mvf.curframe + seconds*mvf.framerate)
+    if playaudio: audio.seek(mvf.position())
+
 def callback():
     audio.fillbufs()
-    if thumby.buttonA.justPressed(): mvf.printmem()
+    if thumby.buttonA.justPressed():
+        mvf.printmem()
+        if playaudio: audio.printstats()
     if thumby.buttonB.justPressed():
         audio.stop()
         mvf.stop()
+    if thumby.buttonL.justPressed(): scrub(-5)
+    if thumby.buttonR.justPressed(): scrub(5)
+    if thumby.buttonU.pressed(): mvf.moveto(mvf.xpos - 1, mvf.ypos) #slide the video while held
+    if thumby.buttonD.pressed(): mvf.moveto(mvf.xpos + 1, mvf.ypos)
 
 def transition(colour):
     for frame in range(8):
@@ -38,11 +48,13 @@ transition(0)
 while not exit:
     vf = open("/Games/BadApple/badapple.mvf", "rb")
     mvf.load(vf)
+    if "badapple.mvf.idx" in listdir("/Games/BadApple"): #otherwise built on the first seek
+        with open("/Games/BadApple/badapple.mvf.idx", "rb") as idx: mvf.loadindex(idx)
     if playaudio:
         af = open("/Games/BadApple/badapple.zdp", "rb")
         audio.load(af)
         audio.play()
-    mvf.play(callback=callback)
+    mvf.play(callback=callback, sync=audio.position if playaudio else None)
     
     while audio.playing: #allow audio to finish - the audio is slightly longer than the video
         callback()
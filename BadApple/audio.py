@@ -1,7 +1,4 @@
 #TODO:
-# -safer threading
-# -fix a very rare problem where the audio stops for no obvious reason - only happened twice ever, couldn't trace it.
-#  In both cases the audio stopped (completely silent) and buffers stopped being filled, but there were no error messages and the thread didn't exit.
 # -less hardcoded stuff
 
 import time
@@ -10,15 +7,41 @@ import struct
 import _thread
 import zlib
 
-bufsize = 800 #enough for 6 frames at 30 FPS
-buf1 = bytearray(bufsize)
-buf2 = bytearray(bufsize)
+bufsize = 800 #bytes per slot, enough for 6 frames at 30 FPS
+slots = 4 #slots in the ring buffer
+ring = bytearray(bufsize*slots)
 data = None
+blocks = iter(()) #generator of decompressed audio blocks, empty until audio is loaded
 playing = False
+threadrunning = False
 lengths = [] #compressed size of each audio block, in reverse
+blocklengths = b"" #compressed size of each audio block, little endian uint16s as stored in the file
+datastart = 0 #file offset of the first audio block
+samplerate = 8000
+
+#The ring buffer is shared with the audio thread without locks: every word in bufstate is only ever written by one
+#side, and the slot counters only count up, so each side just reads the other side's counter to see how full it is.
+#Owned by the audio thread:
+READPOS = const(0) #byte position in the slot being played
+SAMPLE = const(1) #current sample
+READSLOTS = const(2) #slots played so far
+UNDERRUNS = const(3) #times the ring ran dry
+STARVED = const(4) #samples spent waiting for data
+ENDED = const(5) #set when the thread is done, for the main loop to stop playback
+#Owned by the main loop:
+WRITESLOTS = const(6) #slots filled so far
+STOPPING = const(7) #set to end playback
+#Constant while playing:
+TOTAL = const(8) #total samples
+SLOTSIZE = const(9)
+SLOTCOUNT = const(10)
+bufstate = bytearray(44)
+
+#Main loop statistics
+lowwater = slots #fewest filled slots seen while playing
+fills = 0
+maxfilltime = 0 #slowest fillbufs call in us
 
-#current buffer, pos in buffer, bufsize, current sample, total samples, buf1NeedsFilling, buf2NeedsFilling
-bufstate = bytearray(struct.pack("<IIIIIII", 0, 0, bufsize, 0, 0, 1, 1))
 
 @micropython.viper
 def audioloop():
@@ -27,37 +50,32 @@ def audioloop():
     setwidth = swBuzzer.duty_u16 #redefining these rather than using thumby.audio reduces clicking
     curtime = time.ticks_us
     state:ptr32 = ptr32(bufstate)
-    b1:ptr8 = ptr8(buf1)
-    b2:ptr8 = ptr8(buf2)
+    buf:ptr8 = ptr8(ring)
+    size:int = state[SLOTSIZE]
+    count:int = state[SLOTCOUNT]
     delay:int = 1000000//8000
     nexttime:int = int(curtime()) + delay
     sample:int = 0
+    starved:int = 0
+    byte:int = 0
     
-    while state[3] < state[4]: #still playing
-        if not state[0]: #first buffer
-            if state[3] & 1: #odd sample
-                sample += (b1[state[1]] & 0b1111)
-                state[3] += 1
-                state[1] += 1
-                if state[1] >= state[2]: #end of buffer
-                    state[5+state[0]] = 1 #set flag
-                    state[0] ^= 1 #swap buffers
-                    state[1] = 0
-            else: #even sample
-                sample += (b1[state[1]] & 0b11110000) >> 4
-                state[3] += 1
+    while state[SAMPLE] < state[TOTAL] and not state[STOPPING]:
+        if state[READSLOTS] == state[WRITESLOTS]: #ring is empty - hold the last sample until the main loop catches up
+            if not starved: state[UNDERRUNS] += 1
+            starved = 1
+            state[STARVED] += 1
         else:
-            if state[3] & 1: #odd sample
-                sample += (b2[state[1]] & 0b1111)
-                state[3] += 1
-                state[1] += 1
-                if state[1] >= state[2]: #end of buffer
-                    state[5+state[0]] = 1 #set flag
-                    state[0] ^= 1 #swap buffers
-                    state[1] = 0
+            starved = 0
+            byte = buf[(state[READSLOTS] % count)*size + state[READPOS]]
+            if state[SAMPLE] & 1: #odd sample
+                sample += byte & 0b1111
+                state[READPOS] += 1
+                if state[READPOS] >= size: #end of slot, hand it back to the main loop
+                    state[READPOS] = 0
+                    state[READSLOTS] += 1
             else: #even sample
-                sample += (b2[state[1]] & 0b11110000) >> 4
-                state[3] += 1
+                sample += byte >> 4
+            state[SAMPLE] += 1
         
         sample &= 0b1111
         while int(curtime()) < nexttime: pass
@@ -65,65 +83,131 @@ def audioloop():
         nexttime += delay
     
     print("Thread ended")
-    stop()
+    state[ENDED] = 1
 
 
 @micropython.viper
-def copyfrom(b1, b2): #copy b1 to b2
-    i:int = 0
-    p1:ptr8 = ptr8(b1)
-    p2:ptr8 = ptr8(b2)
-    for i in range(int(len(b2))):
-        p2[i] = p1[i]
-
-
-def fillbufs():
-    global bufstate
-    if bufstate[20]: #20 and 24 are the buffer empty flags
-        if len(lengths):
-            decompressed = zlib.decompress(data.read(lengths.pop()))
-            copyfrom(decompressed, buf1)
-        bufstate[20] = 0
-        print("buf1 filled")
-    if bufstate[24]:
-        if len(lengths):
-            decompressed = zlib.decompress(data.read(lengths.pop()))
-            copyfrom(decompressed, buf2)
-        bufstate[24] = 0
-        print("buf2 filled")
+def copyinto(src, dest, offset:int, size:int): #copy src to dest[offset:offset+size], padding with silence
+    p1:ptr8 = ptr8(src)
+    p2:ptr8 = ptr8(dest)
+    length:int = int(len(src))
+    for i in range(size):
+        p2[offset+i] = p1[i] if i < length else 0
+
+
+def decompress(): #yields each audio block in turn, reading them from the file as they are needed
+    while len(lengths):
+        yield zlib.decompress(data.read(lengths.pop()))
+
+
+def getstate(field):
+    return struct.unpack_from("<I", bufstate, field*4)[0]
+
+
+def setstate(field, value):
+    struct.pack_into("<I", bufstate, field*4, value)
+
+
+def fillbufs(): #fill one free slot, or all of them if playback is about to run dry
+    global lowwater, fills, maxfilltime
+    start = time.ticks_us()
+    if playing and getstate(ENDED): stop()
+    written = getstate(WRITESLOTS)
+    level = written - getstate(READSLOTS)
+    if playing: lowwater = min(lowwater, level)
+    while level < slots:
+        block = next(blocks, None)
+        if block is None: break
+        copyinto(block, ring, (written % slots)*bufsize, bufsize)
+        written += 1
+        level += 1
+        setstate(WRITESLOTS, written) #publish the slot only once it's full
+        fills += 1
+        if level > 1: break
+    if playing: maxfilltime = max(maxfilltime, time.ticks_diff(time.ticks_us(), start))
+
+
+def reset(sample, size): #point the ring at sample, with the file positioned at the block containing it
+    global bufstate, blocks, lowwater, maxfilltime
+    bufstate = bytearray(44)
+    setstate(READPOS, (sample % (bufsize*2))//2)
+    setstate(SAMPLE, sample)
+    setstate(TOTAL, size)
+    setstate(SLOTSIZE, bufsize)
+    setstate(SLOTCOUNT, slots)
+    blocks = decompress()
+    lowwater = slots
+    maxfilltime = 0
+    while getstate(WRITESLOTS) < slots and len(lengths): fillbufs()
 
 
 def load(f):
-    global data, buf1, buf2, bufstate, lengths
+    global data, lengths, blocklengths, datastart
     data = f
     size, tablesize = struct.unpack("<IH", data.read(6))
     table = data.read(tablesize)
+    blocklengths = table
+    datastart = data.tell()
     lengths = []
     for block in range(0, tablesize, 2):
         lengths.append(table[block] + (table[block+1] << 8))
     lengths.reverse()
-    buf1 = bytearray(bufsize)
-    buf2 = bytearray(bufsize)
-    #current buffer, pos in buffer, bufsize, current sample, total samples, buf1NeedsFilling, buf2NeedsFilling
-    bufstate = bytearray(struct.pack("<IIIIIII", 0, 0, bufsize, 0, size, 1, 1))
-    fillbufs()
+    reset(0, size)
+
+
+def audiothread():
+    global threadrunning
+    threadrunning = True
+    audioloop()
+    threadrunning = False
 
 
 def play():
     global playing
     playing = True
     thumby.audio.set(80000)
-    _thread.start_new_thread(audioloop, ())
+    _thread.start_new_thread(audiothread, ())
+
+
+def position(): #current playback position in ms
+    return getstate(SAMPLE)*1000//samplerate
+
+
+def seek(ms): #continue playback from ms, without going back to the start of the file
+    global lengths
+    wasplaying = playing
+    if threadrunning:
+        stop()
+        while threadrunning: time.sleep_ms(1)
+    
+    size = getstate(TOTAL)
+    sample = min(ms*samplerate//1000, size) & ~1 #whole bytes only
+    block = sample//(bufsize*2)
+    offset = datastart
+    for i in range(0, block*2, 2):
+        offset += blocklengths[i] + (blocklengths[i+1] << 8)
+    data.seek(offset)
+    lengths = []
+    for i in range(block*2, len(blocklengths), 2):
+        lengths.append(blocklengths[i] + (blocklengths[i+1] << 8))
+    lengths.reverse()
+    
+    reset(sample, size)
+    if wasplaying: play()
 
 
 def stop():
     global playing
     playing = False
-    bufstate[12] = bufstate[16] #set current sample to limit
-    bufstate[13] = bufstate[17]
-    bufstate[14] = bufstate[18]
-    bufstate[15] = bufstate[19] #most significant last in case it's clobbered - should really acquire a lock for this
-    #time.sleep_ms(500)
+    setstate(STOPPING, 1)
     thumby.audio.set(1000) #make audible to tell if it fails to stop correctly
     thumby.audio.stop()
 
+
+def printstats(reason=None):
+    print("\n" + "="*79)
+    if reason: print(f"***{reason}***")
+    level = getstate(WRITESLOTS) - getstate(READSLOTS)
+    print(f"Audio ring {level}/{slots} slots full, lowest {lowwater}, {fills} blocks decompressed")
+    print(f"{getstate(UNDERRUNS)} underruns, {getstate(STARVED)*1000//samplerate} ms starved, slowest fill {maxfilltime} us")
+    print("="*79)
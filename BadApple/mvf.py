@@ -1,7 +1,5 @@
 #TODO:
 # -eliminate the excessive amount of global variables
-# -speed up LUT generation (probably viper)
-# -arbitrary positioning of the video (could be movable while playing with fast LUTs)
 # -reduce allocations
 # -general cleanup
 
@@ -9,6 +7,7 @@ import struct
 import time
 import thumby
 import gc
+from array import array
 from micropython import mem_info
 
 
@@ -31,51 +30,113 @@ metadata = "" #embedded text
 framequeue = []
 data = None
 stopped = False
+starttime = 0 #ticks_ms at which frame 0 would have been shown
+indexframes = None #frame numbers of seekable frames, ascending
+indexoffsets = None #file offset of the header byte of the pair holding each of those frames, <<1, +1 for the second frame of a pair
+INDEX_SPACING = 30 #index one seekable frame per this many frames
 
 displaywidth = thumby.display.width
 displayheight = thumby.display.height
 xpos = int(displaywidth/2 - width/2)
 ypos = int(displayheight/2 - height/2)
+lutbase = 0 #display buffer offset of the top left byte of the video, added to every LUT index
 hIndexLUT = bytearray(width*height*2) #gets interpreted as little endian
 hBitLUT = bytearray(width*height)
 vIndexLUT = bytearray(width*height*2) #gets interpreted as little endian
 vBitLUT = bytearray(width*height)
+movebuf = bytearray(0) #scratch space for moving the video while playing
+
+#The LUTs hold positions relative to lutbase, so they only depend on the video size and on ypos & 7 (the bit
+#the top row lands on). Moving the video by whole bytes vertically, or by any amount horizontally, just changes
+#lutbase. Recently used LUT sets are kept around in case the video moves back.
+LUTCACHE_SIZE = 2
+lutcache = [] #(key, (hIndexLUT, hBitLUT, vIndexLUT, vBitLUT)), most recently used last
+
+
+@micropython.viper
+def filllut(indexlut, bitlut, vertical:int, yoffset:int):
+    index = ptr16(indexlut)
+    bit = ptr8(bitlut)
+    w:int = int(width)
+    h:int = int(height)
+    dw:int = int(displaywidth)
+    i:int = 0
+    x:int = 0
+    y:int = 0
+    if vertical:
+        while x < w: #vertical scanning
+            y = 0
+            while y < h:
+                ys:int = h - y - 1 + yoffset if x & 1 else y + yoffset #snake back on odd columns
+                index[i] = (ys >> 3)*dw + x
+                bit[i] = 1 << (ys & 7)
+                i += 1
+                y += 1
+            x += 1
+    else:
+        while y < h: #horizontal scanning
+            ys:int = y + yoffset
+            rowindex:int = (ys >> 3)*dw
+            rowbit:int = 1 << (ys & 7)
+            x = 0
+            while x < w:
+                index[i] = rowindex + (w - x - 1 if y & 1 else x) #snake back on odd rows
+                bit[i] = rowbit
+                i += 1
+                x += 1
+            y += 1
 
 
 def makeluts():
-    global hIndexLUT, hBitLUT, vIndexLUT, vBitLUT
-    hIndexLUT = bytearray(width*height*2) #gets interpreted as little endian
+    global hIndexLUT, hBitLUT, vIndexLUT, vBitLUT, lutbase
+    lutbase = (ypos >> 3)*displaywidth + xpos
+    key = (width, height, ypos & 7)
+    for entry in lutcache:
+        if entry[0] == key:
+            lutcache.remove(entry)
+            lutcache.append(entry)
+            hIndexLUT, hBitLUT, vIndexLUT, vBitLUT = entry[1]
+            return
+    
+    lutstart = time.ticks_ms()
+    if len(lutcache) >= LUTCACHE_SIZE: lutcache.pop(0) #evict the least recently used set before allocating
+    hIndexLUT = bytearray(width*height*2)
     hBitLUT = bytearray(width*height)
-    vIndexLUT = bytearray(width*height*2) #gets interpreted as little endian
+    vIndexLUT = bytearray(width*height*2)
     vBitLUT = bytearray(width*height)
-    
-    print("[MVF] Generating horizontal LUT")
-    i = 0
-    for y in range(height): #horizontal scanning
-        y += ypos
-        for x in range(width):
-            if y & 1: x = width - x - 1 #snake back on odd rows
-            x += xpos
-            index = (y >> 3) * displaywidth + x
-            bit = 1 << (y & 7)
-            hIndexLUT[i*2] = index & 255
-            hIndexLUT[i*2+1] = index >> 8
-            hBitLUT[i] = bit
-            i += 1
-    
-    print("[MVF] Generating vertical LUT")
-    i = 0
-    for x in range(width): #vertical scanning
-        x += xpos
-        for y in range(height):
-            if x & 1: y = height - y - 1 #snake back on odd columns
-            y += ypos
-            index = (y >> 3) * displaywidth + x
-            bit = 1 << (y & 7)
-            vIndexLUT[i*2] = index & 255
-            vIndexLUT[i*2+1] = index >> 8
-            vBitLUT[i] = bit
-            i += 1
+    filllut(hIndexLUT, hBitLUT, 0, ypos & 7)
+    filllut(vIndexLUT, vBitLUT, 1, ypos & 7)
+    lutcache.append((key, (hIndexLUT, hBitLUT, vIndexLUT, vBitLUT)))
+    print(f"[MVF] Generated LUTs in {time.ticks_diff(time.ticks_ms(), lutstart)} ms")
+
+
+@micropython.viper
+def copyvideo(buf, save:int): #copy the video area of the display into buf (1 byte per pixel in scan order), or back
+    display = ptr8(thumby.display.display.buffer)
+    index = ptr16(hIndexLUT)
+    bit = ptr8(hBitLUT)
+    pixels = ptr8(buf)
+    base:int = int(lutbase)
+    i:int = 0
+    limit:int = int(width)*int(height)
+    while i < limit:
+        if save: pixels[i] = display[index[i] + base] & bit[i]
+        elif pixels[i]: display[index[i] + base] |= bit[i]
+        i += 1
+
+
+def moveto(x, y): #move the video to a new position, also while playing. Kept fully on screen.
+    global xpos, ypos, movebuf
+    x = max(0, min(int(x), displaywidth - width))
+    y = max(0, min(int(y), displayheight - height))
+    if x == xpos and y == ypos: return
+    if curframe > 0: #carry the current frame over, since pframes only encode changes
+        if len(movebuf) != width*height: movebuf = bytearray(width*height)
+        copyvideo(movebuf, 1)
+        clearscreen()
+    xpos, ypos = x, y
+    makeluts()
+    if curframe > 0: copyvideo(movebuf, 0)
 
 
 def decodevlq(data): #takes a file-like object, returns an int.
@@ -94,10 +155,11 @@ def clearscreen(): #clear video area without touching any other pixels
     display = ptr8(thumby.display.display.buffer)
     index = ptr16(hIndexLUT)
     bit = ptr8(hBitLUT)
+    base:int = int(lutbase)
     i:int = 0
     limit:int = int(width*height)
     while i < limit:
-        display[index[i]] &= (bit[i] ^ 255)
+        display[index[i] + base] &= (bit[i] ^ 255)
         i += 1
 
 
@@ -111,6 +173,7 @@ def decodeiframe(framedata, scandir:int, runtype:int, bgcolour:int):
         bit = ptr8(hBitLUT)
     display = ptr8(thumby.display.display.buffer)
     data = ptr8(framedata)
+    base:int = int(lutbase)
     datapos = 0
     limit:int = int(width*height)
     colour:int = bgcolour
@@ -129,8 +192,8 @@ def decodeiframe(framedata, scandir:int, runtype:int, bgcolour:int):
         num += nextbyte
         
         while num > 0:
-            if colour: display[index[i]] |= bit[i] #set white
-            else: display[index[i]] &= (bit[i] ^ 255) #set black
+            if colour: display[index[i] + base] |= bit[i] #set white
+            else: display[index[i] + base] &= (bit[i] ^ 255) #set black
             if runtype == 0: colour = bgcolour #reset after 1 pixel for pixel setting mode
             num -= 1
             i += 1
@@ -149,6 +212,7 @@ def decodepframe(framedata, scandir:int, runtype:int):
         bit = ptr8(hBitLUT)
     display = ptr8(thumby.display.display.buffer)
     data = ptr8(framedata)
+    base:int = int(lutbase)
     datapos = 0
     limit:int = int(width*height)
     num:int = 0
@@ -168,7 +232,7 @@ def decodepframe(framedata, scandir:int, runtype:int):
             
             i += num #go to pixel
             if i >= limit: break
-            display[index[i]] ^= bit[i] #flip colour
+            display[index[i] + base] ^= bit[i] #flip colour
     
     else: #run setting mode
         while i < limit:
@@ -196,7 +260,7 @@ def decodepframe(framedata, scandir:int, runtype:int):
             num += nextbyte
             
             while num > 0:
-                display[index[i]] ^= bit[i] #flip colour
+                display[index[i] + base] ^= bit[i] #flip colour
                 num -= 1
                 i += 1
                 if i == limit: break 
@@ -245,8 +309,90 @@ def reset(): #seek to frame 0
     data.seek(framezero)
 
 
+def buildindex(spacing=INDEX_SPACING): #scan the file for iframes, keeping the first one at or after every multiple of spacing
+    global indexframes, indexoffsets
+    print("[MVF] Building seek index")
+    pos = data.tell()
+    data.seek(framezero)
+    indexframes = array("I", [0]) #frame 0 decodes onto a cleared screen, so it's always seekable
+    indexoffsets = array("I", [framezero << 1])
+    frame = 0
+    while frame < framecount:
+        pairoffset = data.tell()
+        header = ord(data.read(1))
+        for half in range(2):
+            if frame >= framecount: break
+            flags = header >> 4 if half == 0 else header & 15
+            if flags & 8 and frame >= indexframes[-1] + spacing:
+                indexframes.append(frame)
+                indexoffsets.append((pairoffset << 1) | half)
+            data.seek(decodevlq(data), 1) #skip frame data
+            frame += 1
+    data.seek(pos)
+    print(f"[MVF] Indexed {len(indexframes)} frames")
+
+
+def datasize(): #length of the video file in bytes
+    pos = data.tell()
+    size = data.seek(0, 2)
+    data.seek(pos)
+    return size
+
+
+def loadindex(f): #takes a file-like object with an index written by saveindex for the loaded video
+    global indexframes, indexoffsets
+    if f.read(4) != b"MVFI":
+        print("[MVF] Not an MVF index")
+        return False
+    frames, size, count = struct.unpack("<III", f.read(12))
+    if frames != framecount or size != datasize(): #stale index from another encode - offsets would be wrong
+        print("[MVF] Index doesn't match the video, ignoring it")
+        return False
+    indexframes = array("I", f.read(count*4))
+    indexoffsets = array("I", f.read(count*4))
+    return True
+
+
+def saveindex(f): #takes a writable file-like object
+    if indexframes is None: buildindex()
+    f.write(b"MVFI")
+    f.write(struct.pack("<III", framecount, datasize(), len(indexframes)))
+    f.write(indexframes)
+    f.write(indexoffsets)
+
+
+def seek(frame): #position playback so that the next frame shown is frame, decoding at most one GOP
+    global curframe, framequeue, starttime
+    if indexframes is None: buildindex()
+    frame = max(0, min(frame, framecount))
+    
+    lo = 0 #find the last indexed frame at or before the target
+    hi = len(indexframes) - 1
+    while lo < hi:
+        mid = (lo + hi + 1) >> 1
+        if indexframes[mid] <= frame: lo = mid
+        else: hi = mid - 1
+    
+    if not (indexframes[lo] <= curframe <= frame): #can't just decode forward from where we are
+        offset = indexoffsets[lo]
+        data.seek(offset >> 1)
+        framequeue = []
+        if offset & 1: #wanted frame is the second of its pair - skip the first
+            header = ord(data.read(1))
+            framequeue.append(((header&8)>>3, (header&4)>>2, (header&2)>>1, header&1))
+            data.seek(decodevlq(data), 1)
+        curframe = indexframes[lo]
+    
+    while curframe < frame: nextframe()
+    starttime = time.ticks_ms() - (1000*curframe)//framerate
+
+
+def position(): #time of the next frame in ms
+    return (1000*curframe)//framerate
+
+
 def load(f=None): #takes a file-like object seeked to the start of an MVF file
-    global width, height, framerate, framecount, metadata, lastframe, curframe, framequeue, data, xpos, ypos, framezero
+    global width, height, framerate, framecount, metadata, lastframe, curframe, framequeue, data, xpos, ypos, framezero, indexframes, indexoffsets
     if f == None: f = data
     else: data = f
     if data.read(4) != b"MVF\x00":
@@ -255,7 +401,6 @@ def load(f=None): #takes a file-like object seeked to the start of an MVF file
     
     metalen = struct.unpack("<H", data.read(2))[0]
     metadata = data.read(metalen)
-    oldwidth, oldheight = width, height
     width, height, framerate, framecount, scheme = struct.unpack("<HHBIB", data.read(10))
     if scheme != 1:
         print("[MVF] Unsupported compression scheme. Remember to encode with scheme 1 and level 0")
@@ -266,18 +411,19 @@ def load(f=None): #takes a file-like object seeked to the start of an MVF file
     xpos = int(displaywidth/2 - width/2)
     ypos = int(displayheight/2 - height/2)
     framezero = data.tell()
+    indexframes = indexoffsets = None #built lazily on the first seek, or use loadindex
     
     print(f"[MVF] Loaded video - {width}x{height}, {framecount} frames at {framerate} FPS")
-    if oldwidth != width or oldheight != height: makeluts()
+    makeluts()
 
 
-def play(callback=None, usegc=True):
-    global stopped
+def play(callback=None, usegc=True, sync=None): #sync optionally returns the playback position in ms of whatever the video should keep up with
+    global stopped, starttime
     stopped = False
     oldframerate = thumby.display.frameRate
     thumby.display.setFPS(0) #use our own frame limiter for this
     #nexttime = time.ticks_ms()
-    starttime = time.ticks_ms()
+    starttime = time.ticks_ms() - (1000*curframe)//framerate
     
     #frames = 0
     #fpstimer = time.ticks_ms()
@@ -286,6 +432,9 @@ def play(callback=None, usegc=True):
         #nexttime += 1000.0/framerate #can't use this with audio - cumulative error causes desync
         nexttime = starttime + (1000*curframe)/framerate #breaks pausing but that won't work with audio anyway
         if usegc: gc.collect()
+        if sync:
+            target = (sync()*framerate)//1000
+            if target > curframe + framerate//2: seek(target) #fallen behind by more than half a second - skip ahead
         nextframe()
         if callback: callback()
         thumby.display.update()
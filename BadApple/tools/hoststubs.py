@@ -0,0 +1,48 @@
+#Stand-ins for the micropython module (viper, native, mem_info), the ptr8, ptr16 and const builtins,
+#time.ticks_ms/ticks_diff and thumby.display, enough for mvf.py to load unchanged.
+
+import builtins
+import sys
+import time
+import types
+
+
+class micropython:
+    @staticmethod
+    def viper(function):
+        return function
+
+    @staticmethod
+    def native(function):
+        return function
+
+    @staticmethod
+    def mem_info():
+        pass
+
+
+def ptr16(buf):
+    return memoryview(buf).cast("H")
+
+
+def ticks_ms():
+    return time.perf_counter_ns() // 1000000
+
+
+def ticks_diff(a, b):
+    return a - b
+
+
+def install(width=72, height=40): #returns the stand-in thumby module
+    builtins.micropython = micropython
+    builtins.ptr8 = memoryview
+    builtins.ptr16 = ptr16
+    builtins.const = lambda value: value
+    sys.modules["micropython"] = micropython
+    time.ticks_ms = ticks_ms
+    time.ticks_diff = ticks_diff
+    display = types.SimpleNamespace(width=width, height=height,
+                                    display=types.SimpleNamespace(buffer=bytearray(width*((height + 7) >> 3))))
+    thumby = types.SimpleNamespace(display=display)
+    sys.modules["thumby"] = thumby
+    return thumby
@@ -0,0 +1,176 @@
+#LUT generation benchmark for mvf.py
+#
+#Loads mvf.py unchanged through the stand-ins in hoststubs.py and times makeluts against the nested loops it
+#replaced (copied below), both when the LUTs have to be generated and when they come from the LUT cache, as on
+#every replay. It also checks that the new LUTs, plus lutbase, point at the same display bytes and bits as the
+#old ones did, and slides a frame around with moveto, checking that it arrives intact with nothing left behind
+#and counting how many LUT sets had to be generated on the way.
+#
+#usage: python3 tools/lutbench.py [--repeat 20]
+#
+#Times are CPython's, where viper code is plain Python, so only the ratios say much about the Thumby. There is
+#no figure from a device yet: on the Thumby, load() and moveto() print "[MVF] Generated LUTs in N ms" whenever
+#they miss the LUT cache.
+
+import argparse
+import io
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import hoststubs
+
+hoststubs.install()
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import mvf
+
+
+def legacymakeluts(width, height, xpos, ypos, displaywidth): #makeluts from before the viper LUT generation
+    hIndexLUT = bytearray(width*height*2) #gets interpreted as little endian
+    hBitLUT = bytearray(width*height)
+    vIndexLUT = bytearray(width*height*2) #gets interpreted as little endian
+    vBitLUT = bytearray(width*height)
+    
+    i = 0
+    for y in range(height): #horizontal scanning
+        y += ypos
+        for x in range(width):
+            if y & 1: x = width - x - 1 #snake back on odd rows
+            x += xpos
+            index = (y >> 3) * displaywidth + x
+            bit = 1 << (y & 7)
+            hIndexLUT[i*2] = index & 255
+            hIndexLUT[i*2+1] = index >> 8
+            hBitLUT[i] = bit
+            i += 1
+    
+    i = 0
+    for x in range(width): #vertical scanning
+        x += xpos
+        for y in range(height):
+            if x & 1: y = height - y - 1 #snake back on odd columns
+            y += ypos
+            index = (y >> 3) * displaywidth + x
+            bit = 1 << (y & 7)
+            vIndexLUT[i*2] = index & 255
+            vIndexLUT[i*2+1] = index >> 8
+            vBitLUT[i] = bit
+            i += 1
+    return hIndexLUT, hBitLUT, vIndexLUT, vBitLUT
+
+
+def setvideo(width, height, xpos, ypos):
+    mvf.width, mvf.height, mvf.xpos, mvf.ypos = width, height, xpos, ypos
+
+
+def quiet(function, *args): #returns what function printed
+    stdout = sys.stdout
+    sys.stdout = io.StringIO()
+    try:
+        function(*args)
+        return sys.stdout.getvalue()
+    finally:
+        sys.stdout = stdout
+
+
+def quietmakeluts():
+    quiet(mvf.makeluts)
+
+
+def timeit(function, repeat): #ms per call
+    start = time.perf_counter()
+    for i in range(repeat):
+        function()
+    return (time.perf_counter() - start)*1000/repeat
+
+
+def same(width, height, xpos, ypos): #do the new LUTs plus lutbase match the old absolute ones?
+    setvideo(width, height, xpos, ypos)
+    del mvf.lutcache[:]
+    quietmakeluts()
+    old = legacymakeluts(width, height, xpos, ypos, mvf.displaywidth)
+    for index, bit, oldindex, oldbit in ((mvf.hIndexLUT, mvf.hBitLUT, old[0], old[1]),
+                                         (mvf.vIndexLUT, mvf.vBitLUT, old[2], old[3])):
+        new = hoststubs.ptr16(index)
+        was = hoststubs.ptr16(oldindex)
+        if bytes(bit) != bytes(oldbit) or any(new[i] + mvf.lutbase != was[i] for i in range(width*height)):
+            return False
+    return True
+
+
+def moves(width, height, path): #slide a frame along path with moveto, returns (arrived intact, LUT sets generated)
+    setvideo(width, height, path[0][0], path[0][1])
+    del mvf.lutcache[:]
+    quietmakeluts()
+    mvf.curframe = 1 #as if playing, so moveto carries the frame over
+    display = mvf.thumby.display.display.buffer
+    display[:] = bytes(len(display))
+    random.seed(width*height)
+    pixels = bytearray(random.getrandbits(1) for i in range(width*height))
+    mvf.copyvideo(pixels, 0)
+    generated = 0
+    for x, y in path[1:]:
+        generated += quiet(mvf.moveto, x, y).count("Generated LUTs")
+    moved = bytearray(width*height)
+    mvf.copyvideo(moved, 1)
+    lit = sum(bin(byte).count("1") for byte in display)
+    mvf.curframe = 0
+    return [bool(p) for p in moved] == [bool(p) for p in pixels] and lit == sum(pixels), generated
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark mvf.py's LUT generation")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    #Bad Apple!! is 52x39, centred on the 72x40 display like load() does
+    width, height = 52, 39
+    xpos = int(mvf.displaywidth/2 - width/2)
+    ypos = int(mvf.displayheight/2 - height/2)
+    setvideo(width, height, xpos, ypos)
+
+    old = timeit(lambda: legacymakeluts(width, height, xpos, ypos, mvf.displaywidth), args.repeat)
+    def miss():
+        del mvf.lutcache[:]
+        quietmakeluts()
+    new = timeit(miss, args.repeat)
+    quietmakeluts()
+    hit = timeit(quietmakeluts, args.repeat)
+    print(f"LUTs for {width}x{height} at {xpos},{ypos}:")
+    print(f"  nested loops     {old:8.3f} ms")
+    print(f"  makeluts, miss   {new:8.3f} ms  ({old/new:.2f}x)")
+    print(f"  makeluts, cached {hit:8.3f} ms  ({old/hit:.0f}x)")
+
+    #the old loops snaked on display parity, the new ones on video parity, so only even positions compare
+    failures = 0
+    for w, h, x, y in ((width, height, xpos, ypos), (width, height, 0, 0), (width, height, 20, 0),
+                       (32, 24, 6, 2), (32, 24, 40, 8), (17, 9, 12, 30)):
+        ok = same(w, h, x, y)
+        failures += not ok
+        print(f"  {w}x{h} at {x},{y}: {'same pixels as the nested loops' if ok else 'DIFFERENT'}")
+
+    #moving during playback: across and back, and a smaller video down and up through every bit row
+    across = [(x, ypos) for x in list(range(xpos, -1, -1)) + list(range(mvf.displaywidth - width + 1))]
+    down = [(20, y) for y in list(range(0, 17)) + list(range(16, -1, -1))]
+    for w, h, path in ((width, height, across), (32, 24, down)):
+        setvideo(w, h, path[0][0], path[0][1])
+        ok, generated = moves(w, h, path)
+        failures += not ok
+        print(f"  {w}x{h} moved {len(path) - 1} times: {'frame carried over' if ok else 'FRAME DAMAGED'}, "
+              f"{generated} LUT sets generated")
+    setvideo(width, height, xpos, ypos)
+    quietmakeluts()
+    step = [0]
+    def move():
+        step[0] ^= 1
+        mvf.moveto(xpos + step[0], ypos)
+    mvf.curframe = 1
+    print(f"  moveto one pixel across, while playing {timeit(move, args.repeat):8.3f} ms")
+    mvf.curframe = 0
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
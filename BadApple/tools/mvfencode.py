@@ -0,0 +1,397 @@
+#MVF encoder
+#
+#Reads a stream of frames, thresholds them to 1 bit and writes an MVF file (scheme 1, level 0) that mvf.py can play.
+#Every frame is encoded in all supported ways - iframe or pframe, horizontal or vertical snake scan, pixel or run
+#mode, and for iframes both background colours - and the smallest one that fits the decode cost budget is kept.
+#Frames are processed one at a time, so memory use doesn't depend on the length of the clip.
+#
+#Input is either a stream of concatenated PGM/PBM images (P2, P4 or P5, as written by
+#"ffmpeg -i clip.mp4 -vf scale=52:39 -f image2pipe -vcodec pgm -"), or raw 8-bit greyscale frames with --raw WxH
+#(as written by "-f rawvideo -pix_fmt gray"). Use - to read from stdin.
+#
+#usage: python3 mvfencode.py input.pgm output.mvf [--fps 30] [--title "Bad Apple!!"] [--report frames.csv]
+#
+#A report with the size, compression ratio and estimated decode cost of every frame can be written with --report.
+#Decode cost is counted in decoder loop iterations (pixels written plus numbers read), which is what the viper
+#decoders in mvf.py spend their time on. --budget caps it per frame, --keyint forces regular iframes so seeking
+#never has to decode a long GOP, and --tolerance allows dropping a few isolated changed pixels per pframe.
+
+import argparse
+import struct
+import sys
+
+
+#### Input
+
+def readtoken(stream):
+    token = b""
+    while True:
+        c = stream.read(1)
+        if not c: return token or None
+        if c == b"#": #comment until end of line
+            while c and c not in b"\r\n": c = stream.read(1)
+            continue
+        if c.isspace():
+            if token: return token
+            continue
+        token += c
+
+
+def readpnm(stream, threshold): #returns (width, height, pixels) or None at the end of the stream
+    magic = readtoken(stream)
+    if magic is None: return None
+    if magic not in (b"P2", b"P4", b"P5"): raise ValueError(f"Unsupported image type {magic}")
+    width = int(readtoken(stream))
+    height = int(readtoken(stream))
+    count = width*height
+    if magic == b"P4": #packed bits, 1 is black
+        rowbytes = (width + 7) >> 3
+        raw = stream.read(rowbytes*height)
+        pixels = bytearray(count)
+        for y in range(height):
+            for x in range(width):
+                pixels[y*width + x] = 0 if raw[y*rowbytes + (x >> 3)] & (128 >> (x & 7)) else 1
+        return width, height, pixels
+    maxval = int(readtoken(stream))
+    cutoff = threshold*maxval//255
+    if magic == b"P5":
+        if maxval > 255: raise ValueError("16-bit PGM is not supported")
+        raw = stream.read(count)
+    else:
+        raw = [int(readtoken(stream)) for i in range(count)]
+    if len(raw) < count: raise ValueError("Truncated image")
+    return width, height, bytearray(1 if v > cutoff else 0 for v in raw)
+
+
+def readframes(stream, raw, threshold): #yields (width, height, pixels)
+    if raw:
+        width, height = raw
+        while True:
+            frame = stream.read(width*height)
+            if len(frame) < width*height: return
+            yield width, height, bytearray(1 if v > threshold else 0 for v in frame)
+    else:
+        while True:
+            frame = readpnm(stream, threshold)
+            if frame is None: return
+            yield frame
+
+
+#### Encoding
+
+def vlq(num):
+    out = bytearray([num & 127])
+    num >>= 7
+    while num:
+        out.insert(0, 128 | (num & 127))
+        num >>= 7
+    return out
+
+
+def scanorders(width, height): #pixel index for each step of the horizontal and vertical snake scans
+    horizontal = []
+    for y in range(height):
+        for x in range(width):
+            horizontal.append(y*width + (width - x - 1 if y & 1 else x))
+    vertical = []
+    for x in range(width):
+        for y in range(height):
+            vertical.append((height - y - 1 if x & 1 else y)*width + x)
+    return horizontal, vertical
+
+
+def runs(bits): #lengths of runs of equal values, starting with a run of 0s (which may be empty)
+    result = []
+    current = 0
+    length = 0
+    for b in bits:
+        if b == current: length += 1
+        else:
+            result.append(length)
+            current = b
+            length = 1
+    result.append(length)
+    return result
+
+
+def positions(bits):
+    return [i for i, b in enumerate(bits) if b]
+
+
+#Each encoder returns (numbers, cost): the VLQ numbers making up the frame data, and the number of decoder loop
+#iterations needed to decode them
+
+def iframe_runs(bits, bg):
+    numbers = runs([b ^ bg for b in bits])
+    return numbers, len(bits) + len(numbers)
+
+
+def iframe_pixels(bits, bg): #first number is background pixels before the first foreground one, then each foreground pixel is followed by gap+1
+    found = positions([b ^ bg for b in bits])
+    if not found: return [len(bits)], len(bits) + 1
+    numbers = [found[0]]
+    for a, b in zip(found, found[1:]): numbers.append(b - a)
+    numbers.append(len(bits) - found[-1])
+    return numbers, len(bits) + len(numbers)
+
+
+def pframe_pixels(diff): #distance to each pixel to flip, then past the end
+    found = positions(diff)
+    numbers = []
+    last = 0
+    for p in found:
+        numbers.append(p - last)
+        last = p
+    numbers.append(len(diff) - last)
+    return numbers, len(numbers) + len(found)
+
+
+def pframe_runs(diff): #(skip, run) pairs, then a final skip past the end if needed
+    lengths = runs(diff)
+    numbers = []
+    flipped = 0
+    end = 0 #just past the last run
+    for i in range(1, len(lengths), 2):
+        numbers.append(lengths[i-1])
+        numbers.append(lengths[i])
+        end += lengths[i-1] + lengths[i]
+        flipped += lengths[i]
+    if end < len(diff): numbers.append(len(diff) - end)
+    return numbers, len(numbers) + flipped
+
+
+def pack(numbers):
+    out = bytearray()
+    for n in numbers: out += vlq(n)
+    return out
+
+
+def dropisolated(diff, width, height, tolerance): #clear up to tolerance changed pixels that have no changed neighbours
+    if tolerance <= 0: return diff
+    diff = bytearray(diff)
+    dropped = 0
+    for i in positions(diff):
+        x, y = i % width, i // width
+        if ((x > 0 and diff[i-1]) or (x < width-1 and diff[i+1]) or
+            (y > 0 and diff[i-width]) or (y < height-1 and diff[i+width])): continue
+        diff[i] = 0
+        dropped += 1
+        if dropped >= tolerance: break
+    return diff
+
+
+class Encoder:
+    def __init__(self, out, width, height, framerate, title, budget=0, keyint=0, tolerance=0, allowp=True):
+        self.out = out
+        self.width = width
+        self.height = height
+        self.budget = budget
+        self.keyint = keyint
+        self.tolerance = tolerance
+        self.allowp = allowp
+        self.orders = scanorders(width, height)
+        self.previous = bytearray(width*height) #what the decoder shows, starts cleared
+        self.sinceiframe = 0
+        self.framecount = 0
+        self.pending = None #(flags, data) of the first frame of a pair
+
+        title = title.encode()
+        out.write(b"MVF\x00")
+        out.write(struct.pack("<H", len(title)))
+        out.write(title)
+        self.countoffset = out.tell() + 5
+        out.write(struct.pack("<HHBIB", width, height, framerate, 0, 1))
+
+    def candidates(self, pixels):
+        diff = dropisolated(bytearray(a ^ b for a, b in zip(pixels, self.previous)), self.width, self.height, self.tolerance)
+        forcei = self.keyint and self.sinceiframe >= self.keyint
+        for scandir, order in enumerate(self.orders):
+            bits = [pixels[i] for i in order]
+            for bg in (0, 1):
+                yield (8 | scandir << 2 | 0 << 1 | bg), iframe_pixels(bits, bg), pixels
+                yield (8 | scandir << 2 | 1 << 1 | bg), iframe_runs(bits, bg), pixels
+            if self.allowp and not forcei:
+                changes = [diff[i] for i in order]
+                result = bytearray(a ^ b for a, b in zip(self.previous, diff))
+                yield (scandir << 2 | 0 << 1), pframe_pixels(changes), result
+                yield (scandir << 2 | 1 << 1), pframe_runs(changes), result
+
+    def add(self, pixels): #encode one frame, returns a report dict
+        best = None
+        for flags, (numbers, cost), result in self.candidates(pixels):
+            data = pack(numbers)
+            over = self.budget and cost > self.budget
+            key = (over, cost if over else len(data), len(data))
+            if best is None or key < best[0]: best = (key, flags, data, cost, result)
+        key, flags, data, cost, result = best
+
+        self.previous = bytearray(result)
+        self.sinceiframe = 0 if flags & 8 else self.sinceiframe + 1
+        if self.pending is None: self.pending = (flags, data)
+        else:
+            self.writepair(self.pending, (flags, data))
+            self.pending = None
+        self.framecount += 1
+
+        raw = (self.width*self.height + 7) >> 3
+        stored = len(data) + len(vlq(len(data))) + 0.5 #half a shared header byte
+        return {
+            "frame": self.framecount - 1,
+            "type": "I" if flags & 8 else "P",
+            "scan": "V" if flags & 4 else "H",
+            "mode": "run" if flags & 2 else "pixel",
+            "bytes": len(data),
+            "ratio": raw/stored,
+            "cost": cost,
+            "overbudget": bool(key[0]),
+            "errors": sum(a != b for a, b in zip(pixels, result)),
+        }
+
+    def writepair(self, first, second):
+        self.out.write(bytes([(first[0] << 4) | (second[0] if second else 0)]))
+        for frame in (first, second):
+            if frame is None: continue
+            self.out.write(vlq(len(frame[1])))
+            self.out.write(frame[1])
+
+    def finish(self):
+        if self.pending is not None: self.writepair(self.pending, None)
+        end = self.out.tell()
+        self.out.seek(self.countoffset)
+        self.out.write(struct.pack("<I", self.framecount))
+        self.out.seek(end)
+
+
+#### Reference decoder, used by --verify
+
+class Decoder:
+    def __init__(self, stream):
+        if stream.read(4) != b"MVF\x00": raise ValueError("Not an MVF file")
+        metalen = struct.unpack("<H", stream.read(2))[0]
+        self.metadata = stream.read(metalen)
+        self.width, self.height, self.framerate, self.framecount, scheme = struct.unpack("<HHBIB", stream.read(10))
+        self.stream = stream
+        self.orders = scanorders(self.width, self.height)
+        self.pixels = bytearray(self.width*self.height)
+
+    def readvlq(self, data, pos):
+        total = 0
+        while data[pos] >= 128:
+            total = (total + (data[pos] & 127)) << 7
+            pos += 1
+        return total + data[pos], pos + 1
+
+    def frames(self):
+        for frame in range(self.framecount):
+            if frame & 1 == 0:
+                header = self.stream.read(1)[0]
+                flags = header >> 4
+            else: flags = header & 15
+            length = 0
+            b = self.stream.read(1)[0]
+            while b >= 128:
+                length = (length + (b & 127)) << 7
+                b = self.stream.read(1)[0]
+            length += b
+            self.decode(flags, self.stream.read(length))
+            yield bytes(self.pixels)
+
+    def decode(self, flags, data):
+        order = self.orders[(flags >> 2) & 1]
+        runtype = (flags >> 1) & 1
+        limit = len(order)
+        pos = 0
+        i = 0
+        if flags & 8:
+            bg = flags & 1
+            colour = bg
+            while i < limit:
+                num, pos = self.readvlq(data, pos)
+                while num > 0 and i < limit:
+                    self.pixels[order[i]] = colour
+                    if runtype == 0: colour = bg
+                    num -= 1
+                    i += 1
+                colour ^= 1
+        elif runtype == 0:
+            while i < limit:
+                num, pos = self.readvlq(data, pos)
+                i += num
+                if i >= limit: break
+                self.pixels[order[i]] ^= 1
+        else:
+            while i < limit:
+                num, pos = self.readvlq(data, pos)
+                i += num
+                if i >= limit: break
+                num, pos = self.readvlq(data, pos)
+                while num > 0 and i < limit:
+                    self.pixels[order[i]] ^= 1
+                    num -= 1
+                    i += 1
+
+
+#### Command line
+
+def main():
+    parser = argparse.ArgumentParser(description="Encode 1-bit video to MVF for the Thumby")
+    parser.add_argument("input", help="PGM/PBM stream or raw greyscale frames, - for stdin")
+    parser.add_argument("output", help="MVF file to write")
+    parser.add_argument("--raw", help="input is raw 8-bit frames of this size, e.g. 52x39")
+    parser.add_argument("--fps", type=int, default=30)
+    parser.add_argument("--title", default="")
+    parser.add_argument("--threshold", type=int, default=127, help="greyscale values above this (0-255) are white")
+    parser.add_argument("--budget", type=int, default=0, help="maximum decode cost per frame, 0 for no limit")
+    parser.add_argument("--keyint", type=int, default=0, help="force an iframe after this many pframes, 0 for never")
+    parser.add_argument("--tolerance", type=int, default=0, help="isolated changed pixels that may be dropped per pframe")
+    parser.add_argument("--ionly", action="store_true", help="only use iframes")
+    parser.add_argument("--report", help="write a CSV report of every frame to this file")
+    parser.add_argument("--verify", action="store_true", help="decode the output again and check it")
+    args = parser.parse_args()
+
+    raw = tuple(int(v) for v in args.raw.lower().split("x")) if args.raw else None
+    if args.verify and (args.input == "-" or args.tolerance): parser.error("--verify needs a file input and no --tolerance")
+    source = sys.stdin.buffer if args.input == "-" else open(args.input, "rb")
+    report = open(args.report, "w") if args.report else None
+    if report: report.write("frame,type,scan,mode,bytes,ratio,cost,overbudget,errors\n")
+
+    encoder = None
+    totalbytes = 0
+    maxcost = 0
+    overbudget = 0
+    errors = 0
+    with open(args.output, "wb") as out:
+        for width, height, pixels in readframes(source, raw, args.threshold):
+            if encoder is None:
+                encoder = Encoder(out, width, height, args.fps, args.title, args.budget, args.keyint, args.tolerance, not args.ionly)
+            elif (width, height) != (encoder.width, encoder.height):
+                raise ValueError("All frames must be the same size")
+            r = encoder.add(pixels)
+            totalbytes += r["bytes"]
+            maxcost = max(maxcost, r["cost"])
+            overbudget += r["overbudget"]
+            errors += r["errors"]
+            if report: report.write("{frame},{type},{scan},{mode},{bytes},{ratio:.2f},{cost},{overbudget:d},{errors}\n".format(**r))
+        if encoder is None: raise ValueError("No frames in input")
+        encoder.finish()
+        size = out.tell()
+
+    rawsize = ((encoder.width*encoder.height + 7) >> 3)*encoder.framecount
+    print(f"{encoder.framecount} frames of {encoder.width}x{encoder.height}, {size} bytes, "
+          f"{rawsize/size:.2f}x smaller than raw 1-bit frames")
+    print(f"Frame data {totalbytes} bytes, worst decode cost {maxcost}, {overbudget} frames over budget, {errors} wrong pixels")
+
+    if args.verify:
+        with open(args.output, "rb") as stream:
+            decoder = Decoder(stream)
+            source.seek(0)
+            for frame, ((w, h, expected), decoded) in enumerate(zip(readframes(source, raw, args.threshold), decoder.frames())):
+                if bytes(expected) != decoded:
+                    print(f"Verification failed at frame {frame}")
+                    return 1
+        print("Verified")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
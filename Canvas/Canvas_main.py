@@ -10,6 +10,7 @@ import thumby
 import time
 
 thumby2=__import__(GAME_DIR+"/lib/thumby2")
+undohistory=__import__(GAME_DIR+"/lib/undohistory")
 
 thumby2.requireMinThumbyVersion("1.6")
 
@@ -323,36 +324,6 @@ class save_files:
         with open(f"{save_files.DIR}/{save_files.PANIC_NAME}.txt","w") as f:
             sys.print_exception(exc,f)
 
-class CircularUndo:
-
-    def __init__(self,size):
-        self.size=size
-        self.history=[None]*size
-        self.clear()
-
-    def clear(self):
-        self.bottom=0
-        self.top=0
-        self.index=0
-
-    def do(self,item):
-        self.history[self.index]=item
-        self.index=(self.index+1)%self.size
-        self.top=self.index
-        if self.top==self.bottom:
-            self.bottom=(self.bottom+1)%self.size
-
-    def undo(self):
-        if self.index!=self.bottom:
-            self.index=(self.index-1)%self.size
-            return self.history[self.index]
-
-    def redo(self):
-        if self.index!=self.top:
-            res=self.history[self.index]
-            self.index=(self.index+1)%self.size
-            return res
-
 def bufLen(size):
     return size[0]*((size[1]+7)//8)
 
@@ -361,6 +332,7 @@ class FBuf:
     def __init__(self,size,buf=None):
         if not buf:
             buf=bytearray(bufLen(size))
+        self.width,self.height=size
         self.raw=buf
         self.fb=framebuf.FrameBuffer(buf,size[0],size[1],framebuf.MONO_VLSB)
 
@@ -387,6 +359,8 @@ class Canvas:
     RECT_SEL_MODE_CORNER=1
     RECT_SEL_MODE_SIZE=2
 
+    UNDO_BUDGET=8192
+
     def __init__(self,size,buf=None,name=None):
         self.name=name
         self.size=size
@@ -401,7 +375,7 @@ class Canvas:
         self.zoomBuf=FBuf((72,40))
         self.zoomBufValid=False
         self.cursorPhase=0
-        self.undoManager=CircularUndo(500)
+        self.undoManager=undohistory.UndoHistory(Canvas.UNDO_BUDGET)
         self.modified=False
         self.statusStr=None
         self.rectSelMode=None
@@ -441,25 +415,48 @@ class Canvas:
 
     def toggle(self):
         self._markModified()
-        self.undoManager.do((self.posX,self.posY))
+        self.undoManager.toggle(self.posX,self.posY)
         self._togglePixel(self.posX,self.posY)
 
     def undo(self):
-        pos=self.undoManager.undo()
-        if pos:
-            self._togglePixel(pos[0],pos[1])
-            self.moveTo(pos)
+        step=self.undoManager.undo()
+        if step:
+            self._applyUndo(step[0],step[1],True)
             return True
         return False
 
     def redo(self):
-        pos=self.undoManager.redo()
-        if pos:
-            self._togglePixel(pos[0],pos[1])
-            self.moveTo(pos)
+        step=self.undoManager.redo()
+        if step:
+            self._applyUndo(step[0],step[1],False)
             return True
         return False
 
+    def _applyUndo(self,entry,step,undo):
+        kind=entry[0]
+        if kind==undohistory.TOGGLES:
+            pos=undohistory.UndoHistory.toggleAt(entry,step)
+            self._markModified()
+            self._togglePixel(pos[0],pos[1])
+            self.moveTo(pos)
+            return
+        done=True
+        if kind==undohistory.REGION:
+            undohistory.applyDiff(self.buf.fb,entry[1],entry[2])
+        elif kind==undohistory.ROTATE:
+            done=self._rotate(entry[1]!=undo)
+        elif kind==undohistory.REFRAME:
+            _,oldSize,newSize,px,py,oldBuf=entry
+            if not undo:
+                done=self._reframe(newSize,px,py,record=False)
+            elif oldBuf:
+                self._setBuf(oldBuf,oldSize,-px,-py)
+            else:
+                done=self._reframe(oldSize,-px,-py,record=False)
+        if not done:
+            self.undoManager.clear()
+        self._markRedraw()
+
     @micropython.native
     def _togglePixel(self,x,y):
         col=not self.buf.fb.pixel(x,y)
@@ -471,20 +468,23 @@ class Canvas:
 
     @micropython.native
     def invertRect(self,rect):
+        snap=self._undoSnapshot(rect)
         rx,ry,rw,rh=rect
         fb=self.buf.fb
         for x in range(rx,rx+rw):
             for y in range(ry,ry+rh):
                 fb.pixel(x,y,not fb.pixel(x,y))
-        self._markBigChange()
+        self._markRegionChange(rect,snap)
 
     def fillRect(self,rect,color):
+        snap=self._undoSnapshot(rect)
         rx,ry,rw,rh=rect
         self.buf.fb.fill_rect(rx,ry,rw,rh,color)
-        self._markBigChange()
+        self._markRegionChange(rect,snap)
 
     @micropython.native
     def flipHRect(self,rect):
+        snap=self._undoSnapshot(rect)
         rx,ry,rw,rh=rect
         fb=self.buf.fb
         for px in range(rw//2):
@@ -492,10 +492,11 @@ class Canvas:
             x2=rx+rw-1-px
             for y in range(ry,ry+rh):
                 self._swap(fb,x,y,x2,y)
-        self._markBigChange()
+        self._markRegionChange(rect,snap)
 
     @micropython.native
     def flipVRect(self,rect):
+        snap=self._undoSnapshot(rect)
         rx,ry,rw,rh=rect
         fb=self.buf.fb
         for py in range(rh//2):
@@ -503,10 +504,11 @@ class Canvas:
             y2=ry+rh-1-py
             for x in range(rx,rx+rw):
                 self._swap(fb,x,y,x,y2)
-        self._markBigChange()
+        self._markRegionChange(rect,snap)
 
     @micropython.native
     def flipHVRect(self,rect):
+        snap=self._undoSnapshot(rect)
         rx,ry,rw,rh=rect
         fb=self.buf.fb
         for px in range(rw//2):
@@ -518,7 +520,7 @@ class Canvas:
             xc=rx+rw//2
             for py in range(rh//2):
                 self._swap(fb,xc,ry+py,xc,ry+rh-1-py)
-        self._markBigChange()
+        self._markRegionChange(rect,snap)
 
     @micropython.native
     def _swap(self,fb,x1,y1,x2,y2):
@@ -536,29 +538,47 @@ class Canvas:
         self.posX=(self.width-1)//2
         self.posY=(self.height-1)//2
 
-    def _reframe(self,newSize,px,py):
+    def _reframe(self,newSize,px,py,record=True):
         oldBuf=self.buf
+        oldSize=self.size
         gc.collect()
         try:
-            self.buf=FBuf(newSize)
+            buf=FBuf(newSize)
         except MemoryError:
-            self.buf=oldBuf
             simpleConfirm(["MemoryError","","Try smaller","canvas."])
             return False
-        self.size=newSize
-        self.width=newSize[0]
-        self.height=newSize[1]
-        self.buf.fb.blit(oldBuf.fb,px,py)
+        buf.fb.blit(oldBuf.fb,px,py)
+        self._setBuf(buf,newSize,px,py)
+        if not record:
+            return True
+        # Undo needs the old buffer only if the new frame cut some of it off
+        if 0<=px and 0<=py and px+oldSize[0]<=newSize[0] and py+oldSize[1]<=newSize[1]:
+            undoBuf,undoSize=None,0
+        else:
+            undoBuf,undoSize=oldBuf,bufLen(oldSize)
         del oldBuf
         gc.collect()
+        self._markBigChange(
+            [undohistory.REFRAME,oldSize,newSize,px,py,undoBuf],undoSize)
+        return True
+
+    def _setBuf(self,buf,size,px,py):
+        self.buf=buf
+        self.size=size
+        self.width=size[0]
+        self.height=size[1]
         self.posX+=px
         self.posY+=py
         self.scrollX+=px
         self.scrollY+=py
-        self._markBigChange()
-        return True
 
     def rotate(self,rotRight):
+        if self._rotate(rotRight):
+            self._markBigChange([undohistory.ROTATE,rotRight])
+            return True
+        return False
+
+    def _rotate(self,rotRight):
         newSize=(self.height,self.width)
         oldBuf=self.buf
         gc.collect()
@@ -577,7 +597,6 @@ class Canvas:
         self._centerPos()
         self.scrollX=0
         self.scrollY=0
-        self._markBigChange()
         return True
 
     @micropython.native
@@ -608,8 +627,14 @@ class Canvas:
         return buf
 
     def paste(self,src,x,y,key=-1):
+        x0,y0=max(x,0),max(y,0)
+        rect=(x0,y0,
+            min(x+src.width,self.width)-x0,min(y+src.height,self.height)-y0)
+        if rect[2]<=0 or rect[3]<=0:
+            return
+        snap=self._undoSnapshot(rect)
         self.buf.fb.blit(src.fb,x,y,key)
-        self._markBigChange()
+        self._markRegionChange(rect,snap)
 
     def changeZoom(self,dir,allowWrap=False):
         zoom=self.zoom+dir
@@ -630,11 +655,38 @@ class Canvas:
             self.zoomBufValid=False
             self.cursorPhase=0
 
-    def _markBigChange(self):
+    def _undoSnapshot(self,rect):
+        # Copies rect before changing it, if its diff could fit in the history
+        if self.undoManager.fits(undohistory.regionLen(rect)):
+            try:
+                return undohistory.snapshot(self.buf.fb,rect)
+            except MemoryError:
+                pass
+        return None
+
+    def _markRegionChange(self,rect,snap):
+        if snap is not None:
+            try:
+                undohistory.diff(self.buf.fb,rect,snap)
+            except MemoryError:
+                snap=None
+        if snap is not None:
+            self._markBigChange([undohistory.REGION,rect,snap],len(snap))
+        else:
+            self._markBigChange()
+
+    def _markBigChange(self,undoEntry=None,undoSize=0):
+        # Records undoEntry, or clears the history if the change can't be undone
+        if undoEntry:
+            self.undoManager.add(undoEntry,undoSize)
+        else:
+            self.undoManager.clear()
+        self._markRedraw()
+
+    def _markRedraw(self):
         self._markModified()
         self.rectSelMode=None
         self.zoomBufValid=False
-        self.undoManager.clear()
         self.posX=min(max(self.posX,0),self.width-1)
         self.posY=min(max(self.posY,0),self.height-1)
 
@@ -938,7 +990,8 @@ Canvas op.:
  operation
  on the who-
  le canvas.
- NO UNDO!
+ Undo if it
+ fits in mem.
 
 Rect op.:
  Perform
@@ -947,20 +1000,23 @@ Rect op.:
  lected
  rectangle
  area.
- NO UNDO!
+ Undo if it
+ fits in mem.
 
 Crop:
  Crop the
  canvas to
  selected
  area.
- NO UNDO!
+ Undo if it
+ fits in mem.
 
 Reframe:
  Change si-
  ze and/or
  pan.
- NO UNDO!
+ Undo if it
+ fits in mem.
 
 Copy:
  Save rect
@@ -1157,8 +1213,11 @@ def showDrawMenu(c):
             free=gc.mem_free()
             total=alloc+free
             usedFrac=alloc/total
+            um=c.undoManager
             simpleConfirm(["RAM usage:","%10d B"%alloc,"of %7d B"%total,
-                f"= {round(100*usedFrac)}%"])
+                f"= {round(100*usedFrac)}%","",
+                "Undo hist.:","%10d B"%um.used,"peak %5d B"%um.peak,
+                "of %7d B"%um.budget])
         elif sel=="Help":
             simpleConfirm(HELP)
         elif sel=="Save":
@@ -0,0 +1,147 @@
+import framebuf
+
+# Undo history for Canvas, kept within a budget of bytes rather than a number
+# of entries. The oldest entries are dropped first when it runs out.
+#
+# Entries are lists, starting with their kind:
+#   [TOGGLES,coords,n,done] - up to RUN consecutive pixel toggles, as 16-bit
+#       x,y pairs in coords. Undo and redo step through them one at a time.
+#   [REGION,rect,diff] - a rectangle XORed with diff, a MONO_VLSB image of
+#       the pixels the operation changed, so undo and redo both apply it.
+#   [ROTATE,rotRight] - a whole canvas rotation, undone by rotating back.
+#   [REFRAME,oldSize,newSize,px,py,oldBuf] - a size change, shifting the
+#       content by px,py. oldBuf keeps the previous buffer if the new frame
+#       cut anything off, otherwise it's None and undo reframes back.
+
+TOGGLES=0
+REGION=1
+ROTATE=2
+REFRAME=3
+
+RUN=64
+# Rough heap cost of an entry besides its data
+OVERHEAD=64
+
+def regionLen(rect):
+    return rect[2]*((rect[3]+7)//8)
+
+@micropython.viper
+def _xor(dst:ptr8,src:ptr8,n:int):
+    for i in range(n):
+        dst[i]^=src[i]
+
+def _regionFb(buf,rect):
+    return framebuf.FrameBuffer(buf,rect[2],rect[3],framebuf.MONO_VLSB)
+
+def snapshot(fb,rect):
+    buf=bytearray(regionLen(rect))
+    _regionFb(buf,rect).blit(fb,-rect[0],-rect[1])
+    return buf
+
+def diff(fb,rect,snap):
+    # Turns a snapshot taken before an operation into the diff it made
+    _xor(snap,snapshot(fb,rect),len(snap))
+    return snap
+
+def applyDiff(fb,rect,diff):
+    buf=snapshot(fb,rect)
+    _xor(buf,diff,len(buf))
+    fb.blit(_regionFb(buf,rect),rect[0],rect[1])
+
+class UndoHistory:
+
+    def __init__(self,budget):
+        self.budget=budget
+        self.peak=0
+        self.clear()
+
+    def clear(self):
+        self.entries=[]
+        self.sizes=[]
+        self.index=0
+        self.used=0
+
+    def fits(self,size):
+        return size+OVERHEAD<=self.budget
+
+    def toggle(self,x,y):
+        self._truncate()
+        last=self.entries[-1] if self.entries else None
+        if last and last[0]==TOGGLES and last[2]<RUN:
+            coords=last[1]
+            i=last[2]*4
+            last[2]+=1
+            last[3]+=1
+        else:
+            coords=bytearray(RUN*4)
+            i=0
+            self._add([TOGGLES,coords,1,1],len(coords))
+        coords[i]=x&0xFF
+        coords[i+1]=x>>8
+        coords[i+2]=y&0xFF
+        coords[i+3]=y>>8
+
+    def add(self,entry,size):
+        # Records an entry holding about size bytes, or clears the history if
+        # it can't fit
+        self._truncate()
+        if not self.fits(size):
+            self.clear()
+            return False
+        self._add(entry,size)
+        return True
+
+    def _add(self,entry,size):
+        self.entries.append(entry)
+        self.sizes.append(size+OVERHEAD)
+        self.used+=size+OVERHEAD
+        while self.used>self.budget:
+            self.used-=self.sizes.pop(0)
+            self.entries.pop(0)
+        self.index=len(self.entries)
+        self.peak=max(self.peak,self.used)
+
+    def _truncate(self):
+        # Drops what was undone, as a new change replaces it
+        index=self.index
+        if index and self.entries[index-1][0]==TOGGLES:
+            last=self.entries[index-1]
+            last[2]=last[3]
+        while len(self.entries)>index:
+            self.entries.pop()
+            self.used-=self.sizes.pop()
+
+    @staticmethod
+    def toggleAt(entry,step):
+        coords=entry[1]
+        i=step*4
+        return (coords[i]|coords[i+1]<<8,coords[i+2]|coords[i+3]<<8)
+
+    def undo(self):
+        # Returns (entry,step) to undo, step being the toggle in TOGGLES
+        if not self.index:
+            return None
+        entry=self.entries[self.index-1]
+        step=0
+        if entry[0]==TOGGLES:
+            entry[3]-=1
+            step=entry[3]
+            if step:
+                return (entry,step)
+        self.index-=1
+        return (entry,step)
+
+    def redo(self):
+        index=self.index
+        if index and self.entries[index-1][0]==TOGGLES:
+            entry=self.entries[index-1]
+            if entry[3]<entry[2]:
+                entry[3]+=1
+                return (entry,entry[3]-1)
+        if index==len(self.entries):
+            return None
+        entry=self.entries[index]
+        self.index+=1
+        if entry[0]==TOGGLES:
+            entry[3]=1
+        return (entry,0)
@@ -0,0 +1,61 @@
+# Canvas host stand-ins
+#
+# The micropython module, the ptr8 builtin, and a framebuf module with a
+# MONO_VLSB FrameBuffer.
+
+import builtins
+import sys
+import types
+
+
+# Only the MONO_VLSB format, as Canvas uses
+class FrameBuffer:
+    def __init__(self, buffer, width, height, format):
+        self.buffer = buffer
+        self.width = width
+        self.height = height
+
+    def pixel(self, x, y, color=None):
+        if not (0 <= x < self.width and 0 <= y < self.height):
+            return 0
+        i = (y >> 3)*self.width + x
+        bit = 1 << (y & 7)
+        if color is None:
+            return 1 if self.buffer[i] & bit else 0
+        if color:
+            self.buffer[i] |= bit
+        else:
+            self.buffer[i] &= ~bit & 0xFF
+
+    def fill_rect(self, x, y, w, h, color):
+        for yy in range(max(y, 0), min(y + h, self.height)):
+            for xx in range(max(x, 0), min(x + w, self.width)):
+                self.pixel(xx, yy, color)
+
+    def fill(self, color):
+        self.buffer[:] = bytes([0xFF if color else 0])*len(self.buffer)
+
+    def blit(self, src, x, y, key=-1):
+        for sy in range(max(0, -y), min(src.height, self.height - y)):
+            for sx in range(max(0, -x), min(src.width, self.width - x)):
+                color = src.pixel(sx, sy)
+                if color != key:
+                    self.pixel(x + sx, y + sy, color)
+
+class MicroPython:
+    @staticmethod
+    def native(function):
+        return function
+
+    @staticmethod
+    def viper(function):
+        return function
+
+def install():
+    # Returns the stand-in framebuf module
+    builtins.micropython = MicroPython
+    builtins.ptr8 = bytearray
+    sys.modules['micropython'] = MicroPython
+    framebuf = types.SimpleNamespace(FrameBuffer=FrameBuffer, MONO_VLSB=0)
+    sys.modules['framebuf'] = framebuf
+    return framebuf
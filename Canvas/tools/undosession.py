@@ -0,0 +1,152 @@
+# Canvas undo session runner
+#
+# Drives the Canvas class through a scripted, seeded editing session - strokes
+# of pixel toggles, rect operations, pastes, rotations, crops and reframes,
+# with bursts of undo and redo in between - and reports the undo history's
+# memory high water mark. It then checks the history by undoing everything,
+# which must give back the blank starting canvas, and redoing everything,
+# which must give back the final one (with anything undone at the end of the
+# session redone).
+#
+# usage: python3 tools/undosession.py [--size 128x64] [--steps 3000]
+#            [--budget 8192] [--seed 1]
+#
+# The Canvas class and lib/undohistory.py are loaded unchanged, through the
+# stand-ins in hoststubs.py. The session is run twice: with --budget, for the
+# memory figures, and with an unlimited budget for the full undo check (with
+# --budget the oldest entries get dropped). Heap figures are CPython's
+# (tracemalloc), so they only compare sessions with each other; the history's
+# own count of its bytes is what Canvas shows in "Mem info" on the Thumby.
+
+import argparse
+import gc
+import importlib.util
+import os
+import random
+import sys
+import tracemalloc
+
+import hoststubs
+
+CANVAS_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+#### Loading
+
+def loadCanvas():
+    framebuf = hoststubs.install()
+    spec = importlib.util.spec_from_file_location('undohistory',
+        os.path.join(CANVAS_PATH, 'lib', 'undohistory.py'))
+    undohistory = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(undohistory)
+    # Just the drawing model, from bufLen to the UI code after Canvas
+    with open(os.path.join(CANVAS_PATH, 'Canvas_main.py')) as f:
+        source = f.read()
+    source = source[source.index('def bufLen'):source.index('def drawTitle')]
+    namespace = {'gc': gc, 'framebuf': framebuf, 'undohistory': undohistory,
+        'simpleConfirm': lambda text: print(' '.join(text))}
+    exec(compile(source, 'Canvas_main.py', 'exec'), namespace)
+    return namespace
+
+
+#### Session
+
+def randomRect(rng, c):
+    x = rng.randrange(c.width)
+    y = rng.randrange(c.height)
+    return (x, y, rng.randint(1, c.width - x), rng.randint(1, c.height - y))
+
+def runSession(canvas, size, budget, steps, seed):
+    Canvas, FBuf = canvas['Canvas'], canvas['FBuf']
+    Canvas.UNDO_BUDGET = budget
+    rng = random.Random(seed)
+    c = Canvas(size)
+    stats = {'toggles': 0, 'ops': 0, 'undos': 0, 'redos': 0}
+    gc.collect()
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    for step in range(steps):
+        r = rng.random()
+        if r < 0.55: # a stroke of toggles
+            for i in range(rng.randint(1, 24)):
+                c.moveBy((rng.choice((-1, 0, 1)), rng.choice((-1, 0, 1))))
+                c.toggle()
+                stats['toggles'] += 1
+        elif r < 0.67: # a rect operation
+            rect = randomRect(rng, c)
+            op = rng.randrange(6)
+            if op == 0: c.flipHRect(rect)
+            elif op == 1: c.flipVRect(rect)
+            elif op == 2: c.flipHVRect(rect)
+            elif op == 3: c.invertRect(rect)
+            else: c.fillRect(rect, op - 4)
+            stats['ops'] += 1
+        elif r < 0.71: # paste a random clip
+            clipSize = (rng.randint(1, 40), rng.randint(1, 40))
+            clip = FBuf(clipSize, bytearray(rng.randbytes(canvas['bufLen'](clipSize))))
+            c.paste(clip, rng.randrange(-8, c.width), rng.randrange(-8, c.height),
+                rng.choice((-1, 0, 1)))
+            stats['ops'] += 1
+        elif r < 0.73:
+            c.rotate(rng.random() < 0.5)
+            stats['ops'] += 1
+        elif r < 0.75: # crop to a rect, or reframe larger around the canvas
+            if rng.random() < 0.5 and c.width > 16 and c.height > 16:
+                x, y = rng.randrange(c.width//2), rng.randrange(c.height//2)
+                c.crop((x, y, rng.randint(8, c.width - x), rng.randint(8, c.height - y)))
+            else:
+                grow = (rng.randint(0, 32), rng.randint(0, 32))
+                c.crop((-rng.randint(0, grow[0]), -rng.randint(0, grow[1]),
+                    min(c.width + grow[0], 256), min(c.height + grow[1], 256)))
+            stats['ops'] += 1
+        elif r < 0.9:
+            for i in range(rng.randint(1, 30)):
+                stats['undos'] += c.undo()
+        else:
+            for i in range(rng.randint(1, 20)):
+                stats['redos'] += c.redo()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    stats['heap'] = current - base
+    stats['heapPeak'] = peak - base
+    return c, stats
+
+def canvasState(c):
+    return (c.size, bytes(c.getBuffer()))
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a scripted Canvas editing session")
+    parser.add_argument("--size", default="128x64", help="starting canvas size, WxH")
+    parser.add_argument("--steps", type=int, default=3000)
+    parser.add_argument("--budget", type=int, default=8192, help="undo history budget in bytes")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    size = tuple(int(v) for v in args.size.split("x"))
+
+    canvas = loadCanvas()
+    c, stats = runSession(canvas, size, args.budget, args.steps, args.seed)
+    um = c.undoManager
+    print(f"session: {stats['toggles']} toggles, {stats['ops']} operations, "
+        f"{stats['undos']} undos, {stats['redos']} redos, ends {c.width}x{c.height}")
+    print(f"undo history: {um.used} B in {len(um.entries)} entries, "
+        f"peak {um.peak} B of {um.budget} B")
+    print(f"heap: {stats['heap']} B held at the end, peak {stats['heapPeak']} B")
+
+    c, stats = runSession(canvas, size, 1 << 30, args.steps, args.seed)
+    # The session can end with some changes undone
+    while c.redo():
+        pass
+    final = canvasState(c)
+    while c.undo():
+        pass
+    blank = canvasState(c) == (size, bytes(canvas['bufLen'](size)))
+    while c.redo():
+        pass
+    redone = canvasState(c) == final
+    print(f"unlimited budget: peak {c.undoManager.peak} B, undo all "
+        f"{'gives the blank canvas' if blank else 'FAILS'}, redo all "
+        f"{'gives the final canvas' if redone else 'FAILS'}")
+    return 0 if blank and redone else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
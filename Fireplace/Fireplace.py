@@ -1,11 +1,10 @@
-FPS = 30 # Video frame rate
-RES = (72,40) # Video resolution
 SCROLL = 6 # Message scroll speed
 
 from sys import path
 loc = __file__[:-12]
 path += [loc]
-from thumbyGrayscale import display, Sprite
+from thumbyGrayscale import display
+from gsv import Video
 display.enableGrayscale()
 
 # Scroll the message
@@ -27,12 +26,12 @@ while h > -len(txt)*10:
     display.update()
     display.fill(0)
 
-# Play the video
-t = 0
-display.setFPS(FPS)
-video = Sprite(RES[0], RES[1], (loc+"vid.BIT.bin", loc+"vid.SHD.bin"), 0, 0)
+# Play the video, decoding each frame straight into the display planes
+video = Video(loc+"vid.gsv")
+display.setFPS(video.fps)
 while True:
-    video.setFrame(t)
-    display.drawSprite(video)
+    video.decode(display.buffer, display.shading)
     display.update()
-    t += 1
\ No newline at end of file
+    if video.frame == video.frames:
+        print("Decode us: last", video.lastUs, "max", video.maxUs,
+            "mean", video.totalUs // video.frames)
\ No newline at end of file
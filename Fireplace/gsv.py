@@ -0,0 +1,84 @@
+# Streaming decoder for GSV grayscale video (see tools/gsvencode.py)
+#
+# Frames are decoded straight into the grayscale driver's buffer and shading
+# planes. Each is an XOR delta against the one before it (or, for keyframes,
+# against a blank screen), run-length coded per plane, so the planes must be
+# left as the last frame drew them between calls.
+
+from utime import ticks_us, ticks_diff
+import struct
+
+_HEADER = "<3sBBBBHH" # "GSV", version, width, height, fps, frames, largest frame
+_KEYFRAME = const(1)
+_PLANE = const(360)
+
+@micropython.viper
+def _clear(dst:ptr32):
+    for i in range(_PLANE >> 2):
+        dst[i] = 0
+
+# XOR one run-length coded plane into dst, returning where its codes end
+@micropython.viper
+def _unpack(src:ptr8, pos:int, dst:ptr8) -> int:
+    i = 0
+    while i < _PLANE:
+        c = src[pos]
+        pos += 1
+        if c < 0x80: # unchanged bytes
+            i += c + 1
+        elif c < 0xC0: # literal bytes
+            n = c - 0x7F
+            while n:
+                dst[i] ^= src[pos]
+                pos += 1
+                i += 1
+                n -= 1
+        else: # one byte, repeated
+            n = c - 0xBF
+            v = src[pos]
+            pos += 1
+            while n:
+                dst[i] ^= v
+                i += 1
+                n -= 1
+    return pos
+
+class Video:
+    def __init__(self, path):
+        self.file = open(path, "rb")
+        magic, version, width, height, self.fps, self.frames, largest = \
+            struct.unpack(_HEADER, self.file.read(struct.calcsize(_HEADER)))
+        if magic != b"GSV" or version != 1 or width != 72 or height != 40:
+            raise ValueError("Not a 72x40 GSV 1 video")
+        self.start = self.file.tell()
+        self.data = bytearray(largest)
+        self.head = bytearray(3)
+        self.frame = 0
+        # Decode time in microseconds: last frame, slowest and total this loop
+        self.lastUs = self.maxUs = self.totalUs = 0
+
+    # Decode the next frame into the planes, looping at the end of the clip.
+    # Returns the decode time in microseconds.
+    @micropython.native
+    def decode(self, buffer, shading):
+        t = ticks_us()
+        if self.frame == self.frames:
+            self.file.seek(self.start)
+            self.frame = 0
+            self.maxUs = self.totalUs = 0
+        head = self.head
+        self.file.readinto(head)
+        size = head[0] | head[1] << 8
+        data = self.data
+        self.file.readinto(memoryview(data)[:size])
+        if head[2] & _KEYFRAME:
+            _clear(buffer)
+            _clear(shading)
+        _unpack(data, _unpack(data, 0, buffer), shading)
+        self.frame += 1
+        t = ticks_diff(ticks_us(), t)
+        self.lastUs = t
+        self.totalUs += t
+        if t > self.maxUs:
+            self.maxUs = t
+        return t
@@ -13,6 +13,12 @@
 #
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# The grayscale games in this repository (Fireplace, RocketCup, MineSweep and
+# Journey3Dg, through its ssd1306grey layer) each ship this same file, as each
+# game folder has to stand alone. Keep the copies identical, and import it by
+# the name "thumbyGrayscale" so a game started from another one reuses the
+# module that is already loaded rather than loading a second copy.
 
 
 from utime import sleep_ms, ticks_diff, ticks_ms, sleep_us
@@ -24,7 +30,7 @@ from array import array
 from thumbyButton import buttonA, buttonB, buttonU, buttonD, buttonL, buttonR
 from sys import modules
 
-__version__ = '3.0.0'
+__version__ = '3.1.0'
 
 
 emulator = None
@@ -709,6 +715,7 @@ class Grayscale:
         if y2 > _HEIGHT:
             y2 = _HEIGHT
             height = _HEIGHT - y
+        if width <= 0 or height <= 0: return
 
         buffer = ptr8(self.buffer)
         shading = ptr8(self.shading)
@@ -1001,6 +1008,57 @@ class Grayscale:
                 dsty = 0
         if dsty+height > _HEIGHT:
             height = _HEIGHT - dsty
+        if width <= 0 or height <= 0:
+            return
+
+        if not mirrorY:
+            # Draw a whole destination byte at a time, shifting it together
+            # from the (at most two) source bytes that overlap it
+            last = srcy + height - 1
+            off = srcy - (dsty & 7)
+            rows = height + (dsty & 7)
+            m = (0xff << (dsty & 7)) & 0xff
+            dsto = (dsty >> 3) * _WIDTH + dstx
+            while rows > 0:
+                if rows < 8:
+                    m &= (1 << rows) - 1
+                sh = off & 7
+                lo = 1 if off >= 0 else 0
+                hi = 1 if sh != 0 and (off & -8) + 8 <= last else 0
+                srco = (off >> 3) * stride + srcx
+                dstco = dsto
+                i = width
+                while i != 0:
+                    v1 = 0 ; v2 = 0
+                    if lo:
+                        v1 = src1[srco] >> sh
+                        if shd:
+                            v2 = src2[srco] >> sh
+                    if hi:
+                        v1 |= src1[srco+stride] << (8-sh)
+                        if shd:
+                            v2 |= src2[srco+stride] << (8-sh)
+                    v1 &= 0xff ; v2 &= 0xff
+                    dm = m
+                    # leave out the pixels matching the key colour
+                    if key == 0:
+                        dm &= v1 | v2
+                    elif key == 1:
+                        dm &= 255 - (v1 & (255 - v2))
+                    elif key == 2:
+                        dm &= 255 - (v2 & (255 - v1))
+                    elif key == 3:
+                        dm &= 255 - (v1 & v2)
+                    buffer[dstco] = (buffer[dstco] & (255 - dm)) | (v1 & dm)
+                    shading[dstco] = (shading[dstco] & (255 - dm)) | (v2 & dm)
+                    srco += sdx
+                    dstco += 1
+                    i -= 1
+                dsto += _WIDTH
+                off += 8
+                rows -= 8
+                m = 0xff
+            return
 
         srco = (srcy >> 3) * stride + srcx
         srcm = 1 << (srcy & 7)
@@ -1038,16 +1096,10 @@ class Grayscale:
                 dstim = 0xfe
             else:
                 dstim = 255 - dstm
-            if mirrorY:
-                srcm >>= 1
-                if srcm == 0:
-                    srco -= stride
-                    srcm = 0x80
-            else:
-                srcm <<= 1
-                if srcm & 0x100:
-                    srco += stride
-                    srcm = 1
+            srcm >>= 1
+            if srcm == 0:
+                srco -= stride
+                srcm = 0x80
             height -= 1
 
     @micropython.native
@@ -1109,6 +1161,48 @@ class Grayscale:
                 dsty = 0
         if dsty+height > _HEIGHT:
             height = _HEIGHT - dsty
+        if width <= 0 or height <= 0:
+            return
+
+        if not mirrorY:
+            # Byte at a time, as in blit(), with the mask shifted the same way
+            last = srcy + height - 1
+            off = srcy - (dsty & 7)
+            rows = height + (dsty & 7)
+            m = (0xff << (dsty & 7)) & 0xff
+            dsto = (dsty >> 3) * _WIDTH + dstx
+            while rows > 0:
+                if rows < 8:
+                    m &= (1 << rows) - 1
+                sh = off & 7
+                lo = 1 if off >= 0 else 0
+                hi = 1 if sh != 0 and (off & -8) + 8 <= last else 0
+                srco = (off >> 3) * stride + srcx
+                dstco = dsto
+                i = width
+                while i != 0:
+                    v1 = 0 ; v2 = 0 ; vm = 0
+                    if lo:
+                        v1 = src1[srco] >> sh
+                        vm = maskp[srco] >> sh
+                        if shd:
+                            v2 = src2[srco] >> sh
+                    if hi:
+                        v1 |= src1[srco+stride] << (8-sh)
+                        vm |= maskp[srco+stride] << (8-sh)
+                        if shd:
+                            v2 |= src2[srco+stride] << (8-sh)
+                    dm = m & (255 - (vm & 0xff))
+                    buffer[dstco] = (buffer[dstco] & (255 - dm)) | (v1 & dm)
+                    shading[dstco] = (shading[dstco] & (255 - dm)) | (v2 & dm)
+                    srco += sdx
+                    dstco += 1
+                    i -= 1
+                dsto += _WIDTH
+                off += 8
+                rows -= 8
+                m = 0xff
+            return
 
         srco = (srcy >> 3) * stride + srcx
         srcm = 1 << (srcy & 7)
@@ -1141,16 +1235,10 @@ class Grayscale:
                 dstim = 0xfe
             else:
                 dstim = 255 - dstm
-            if mirrorY:
-                srcm >>= 1
-                if srcm == 0:
-                    srco -= stride
-                    srcm = 0x80
-            else:
-                srcm <<= 1
-                if srcm & 0x100:
-                    srco += stride
-                    srcm = 1
+            srcm >>= 1
+            if srcm == 0:
+                srco -= stride
+                srcm = 0x80
             height -= 1
 
     @micropython.native
@@ -1158,4 +1246,8 @@ class Grayscale:
         self.blitWithMask(s.bitmap, s.x, s.y, s.width, s.height, s.key, s.mirrorX, s.mirrorY, m.bitmap)
 
 display = Grayscale()
-display.enableGrayscale()
+# A driver layered over this one that has to keep the display to itself a
+# while longer (e.g. Journey3Dg's ssd1306grey) sets "thumbyGrayscale.defer"
+# in sys.modules before importing, and enables grayscale itself later
+if not modules.pop('thumbyGrayscale.defer', None):
+    display.enableGrayscale()
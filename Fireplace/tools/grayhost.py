@@ -0,0 +1,572 @@
+# Grayscale host backend
+#
+# Runs the thumbyGrayscale core, and games drawing with it, under CPython on a
+# build machine. The core is loaded unchanged: its emulator hooks
+# (_initEmuScreen/_clearEmuFunctions) keep the SPI display thread from ever
+# starting, and the frames it would send to the screen are picked up here
+# instead, composited from the buffer/shading bitplanes the same way the
+# display thread splits them into subframes.
+#
+# Every presented frame gets a hash of both bitplanes, so drawing changes can
+# be checked for pixel-exact regressions, and can be written out as a PGM
+# image. There is also a primitive throughput benchmark.
+#
+# Usage (from the repository root):
+#
+#   python3 Fireplace/tools/grayhost.py fireplace --frames 300
+#   python3 Fireplace/tools/grayhost.py fireplace --frames 300 --pgm frames/
+#   python3 Fireplace/tools/grayhost.py fireplace --save baseline.json
+#   python3 Fireplace/tools/grayhost.py fireplace --compare baseline.json
+#   python3 Fireplace/tools/grayhost.py minesweep --keys minesweep-keys.txt
+#   python3 Fireplace/tools/grayhost.py bench --core RocketCup/thumbyGrayscale.py
+#
+# Games run on a virtual clock: sleeps return at once and time moves on by the
+# amount slept, so frame pacing is kept without waiting for it. A key script
+# is a text file with one "milliseconds buttons" pair per line, where buttons
+# is any combination of U, D, L, R, A and B (or "-" for none). The buttons stay
+# pressed until the next line.
+#
+# Device paths are mapped onto the host: /Games/<name> to the repository,
+# /lib and /Saves to a scratch directory. The Thumby fonts are part of the
+# firmware rather than this repository, so pass --fonts with a copy of the
+# firmware's lib directory to render real text. Otherwise placeholder fonts of
+# the right sizes are made up, which still give stable hashes.
+#
+# MineSweep_main.py needs Python 3.12 or later, as it reuses quotes inside
+# f-strings.
+#
+# Timings are for the Python stand-ins of the viper code in hoststubs.py, so
+# they only say how primitives compare to each other, not how fast they are on
+# a Thumby.
+
+import argparse
+import builtins
+import json
+import os
+import random
+import runpy
+import shutil
+import sys
+import tempfile
+import time
+import zlib
+from importlib import util as importUtil
+
+import hoststubs
+from hoststubs import Ptr16, deviceArray, deviceMemoryview, module
+
+REPO_PATH = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+WIDTH = 72
+HEIGHT = 40
+BUFF_SIZE = WIDTH * HEIGHT // 8
+BUTTONS = "UDLRAB"
+FONTS = {"font3x5.bin": 3, "font5x7.bin": 5, "font8x8.bin": 8}
+
+# Frame handshake: the core's show() sets GPIO 2 through the SIO GPIO_OUT_XOR
+# register when running under an emulator
+SIO_GPIO_OUT_XOR = 0xD0000000 + 0x01C
+
+class StopRun(BaseException):
+    pass
+
+
+#### Virtual clock and buttons
+
+class Clock:
+    def __init__(self, limitMs):
+        self.us = 0
+        self.limitUs = limitMs * 1000
+
+    def advance(self, us):
+        self.us += us
+        if self.us > self.limitUs:
+            raise StopRun("time limit")
+
+    # Reading the clock costs a little time, so busy waits still end
+    def ticks_us(self):
+        self.advance(10)
+        return self.us
+
+    def ticks_ms(self):
+        self.advance(10)
+        return self.us // 1000
+
+    def sleep_ms(self, ms):
+        self.advance(max(0, int(ms)) * 1000)
+
+    def sleep_us(self, us):
+        self.advance(max(0, int(us)))
+
+    def ticks_diff(self, a, b):
+        return a - b
+
+    def ticks_add(self, a, b):
+        return a + b
+
+class Keys:
+    def __init__(self, clock, script):
+        self.clock = clock
+        self.script = script
+
+    def down(self):
+        buttons = ""
+        for ms, pressed in self.script:
+            if ms * 1000 > self.clock.us:
+                break
+            buttons = pressed
+        return buttons
+
+def readKeyScript(path):
+    script = []
+    with open(path, 'r') as stream:
+        for line in stream:
+            line = line.split('#')[0].split()
+            if len(line) == 2:
+                script.append((int(line[0]), line[1].upper().replace('-', '')))
+    script.sort()
+    return script
+
+# Thumby buttons are active low
+class KeyPin:
+    def __init__(self, keys, name):
+        self.keys = keys
+        self.name = name
+
+    def value(self, *args):
+        return 0 if self.name in self.keys.down() else 1
+
+    __call__ = value
+
+class Button:
+    def __init__(self, keys, name):
+        self.pin = KeyPin(keys, name)
+        self.last = 1
+
+    def update(self):
+        pass
+
+    def pressed(self):
+        return self.pin.value() == 0
+
+    def justPressed(self):
+        now = self.pin.value()
+        result = self.last == 1 and now == 0
+        self.last = now
+        return result
+
+
+#### Display capture
+
+class Screen:
+    def __init__(self, frames, pgmDir, scale):
+        self.frames = frames
+        self.pgmDir = pgmDir
+        self.scale = scale
+        self.drawBuffer = bytearray(BUFF_SIZE * 2)
+        self.grayscale = False
+        self.brightness = 127
+        self.hashes = []
+
+    # emulator.screen_breakpoint(): the draw buffer to watch, or 1/0 to switch
+    # grayscale on or off
+    def screen_breakpoint(self, value):
+        if isinstance(value, Ptr16):
+            self.drawBuffer = value.buffer
+        else:
+            self.grayscale = bool(value)
+
+    def brightness_breakpoint(self, value):
+        self.brightness = value
+
+    # Subframe contrasts, as the core's brightness() sets them
+    def contrasts(self):
+        cc = int((self.brightness << 17) ** 0.5)
+        return ((cc*30 >> 12) + 6, (cc*72 >> 12) + 14, min((cc*340 >> 12) + 20, 255))
+
+    # Each of the 3 subframes lights a pixel at its own contrast: white in
+    # all of them, light gray in the first two and dark gray in the first
+    def levels(self):
+        if not self.grayscale:
+            return (0, 255, 0, 255)
+        c = self.contrasts()
+        total = sum(c)
+        return (0, 255, 255 * c[0] // total, 255 * (c[0] + c[1]) // total)
+
+    def compose(self, planes):
+        levels = self.levels()
+        pixels = bytearray(WIDTH * HEIGHT)
+        for y in range(HEIGHT):
+            row = (y >> 3) * WIDTH
+            bit = y & 7
+            for x in range(WIDTH):
+                colour = (planes[row + x] >> bit) & 1
+                if self.grayscale:
+                    colour |= ((planes[BUFF_SIZE + row + x] >> bit) & 1) << 1
+                pixels[y * WIDTH + x] = levels[colour]
+        return pixels
+
+    def writePgm(self, path, pixels):
+        scale = self.scale
+        with open(path, 'wb') as stream:
+            stream.write(b"P5\n%d %d\n255\n" % (WIDTH * scale, HEIGHT * scale))
+            for y in range(HEIGHT):
+                row = bytes(p for p in pixels[y*WIDTH:(y+1)*WIDTH] for _ in range(scale))
+                stream.write(row * scale)
+
+    def present(self, planes=None, grayscale=None):
+        if planes is None:
+            planes = self.drawBuffer
+        if grayscale is not None:
+            saved, self.grayscale = self.grayscale, grayscale
+        planes = bytes(planes[:BUFF_SIZE * (2 if self.grayscale else 1)])
+        crc = zlib.crc32(bytes((self.grayscale,)))
+        self.hashes.append("%08x" % zlib.crc32(planes, crc))
+        if self.pgmDir:
+            self.writePgm(os.path.join(self.pgmDir, "frame%05d.pgm" % len(self.hashes)),
+                self.compose(planes))
+        if grayscale is not None:
+            self.grayscale = saved
+        if len(self.hashes) >= self.frames:
+            raise StopRun("frame limit")
+
+class Mem32:
+    def __init__(self, screen):
+        self.screen = screen
+
+    def __setitem__(self, address, value):
+        if address == SIO_GPIO_OUT_XOR and value & (1 << 2):
+            self.screen.present()
+
+    def __getitem__(self, address):
+        return 0
+
+class Pin:
+    IN = 0
+    OUT = 1
+    PULL_UP = 1
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def init(self, *args, **kwargs):
+        pass
+
+    def value(self, *args):
+        return 1
+
+    __call__ = value
+
+class SPI:
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def init(self, *args, **kwargs):
+        pass
+
+    def write(self, data):
+        pass
+
+# Just enough of thumby/thumbyGraphics for games that also use the standard
+# API, like MineSweep through thumby2
+class Graphics:
+    width = WIDTH
+    height = HEIGHT
+
+    def __init__(self, screen, clock):
+        self.screen = screen
+        self.clock = clock
+        self.display = module('ssd1306', buffer=bytearray(BUFF_SIZE),
+            show=lambda: screen.present(self.display.buffer, False))
+        self.frameRate = 0
+        self.lastUpdateEnd = 0
+
+    def setFPS(self, fps):
+        self.frameRate = fps
+
+    def fill(self, colour):
+        self.display.buffer[:] = bytes([0xFF if colour else 0]) * BUFF_SIZE
+
+    def drawText(self, text, x, y, colour):
+        pass
+
+    def update(self):
+        self.display.show()
+
+class Audio:
+    def __init__(self, clock):
+        self.clock = clock
+
+    def playBlocking(self, freq, duration, duty=0):
+        self.clock.sleep_ms(duration)
+
+    def play(self, freq, duration, duty=0):
+        pass
+
+    def set(self, freq, duty=0):
+        pass
+
+    def stop(self):
+        pass
+
+
+#### Device filesystem
+
+class DeviceFiles:
+    def __init__(self, fontDir):
+        self.root = tempfile.mkdtemp(prefix="grayhost")
+        os.mkdir(os.path.join(self.root, "lib"))
+        os.mkdir(os.path.join(self.root, "Saves"))
+        for name, width in FONTS.items():
+            path = os.path.join(self.root, "lib", name)
+            if fontDir and os.path.exists(os.path.join(fontDir, name)):
+                shutil.copy(os.path.join(fontDir, name), path)
+            else:
+                with open(path, 'wb') as stream:
+                    stream.write(placeholderFont(width, 7 if width > 3 else 5))
+
+    def map(self, path):
+        if isinstance(path, str) and path.startswith('/'):
+            top = path[1:].split('/')[0]
+            if top == "Games":
+                return os.path.join(REPO_PATH, path[len("/Games/"):])
+            if top in ("lib", "Saves"):
+                return os.path.join(self.root, path[1:])
+        return path
+
+    def remove(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+# A box for every glyph with its character code inside, so text still changes
+# the picture, and the frame hashes, as the firmware fonts would
+def placeholderFont(width, height):
+    font = bytearray()
+    edge = (1 << height) - 1
+    for glyph in range(96):
+        for x in range(width):
+            if x == 0 or x == width - 1:
+                font.append(edge)
+            else:
+                font.append(edge & ((glyph >> (x - 1)) << 2 | 1 | 1 << (height - 1)))
+    return bytes(font)
+
+
+#### Setup
+
+class Host:
+    def __init__(self, args):
+        self.clock = Clock(args.ms)
+        self.keys = Keys(self.clock, readKeyScript(args.keys) if args.keys else [])
+        self.screen = Screen(args.frames, args.pgm, args.scale)
+        self.files = DeviceFiles(args.fonts)
+        if args.pgm:
+            os.makedirs(args.pgm, exist_ok=True)
+
+    def install(self):
+        clock = self.clock
+        buttons = {'button' + b: Button(self.keys, b) for b in BUTTONS}
+        files = self.files
+        hoststubs.install()
+
+        # MicroPython's time and utime, on the virtual clock
+        for name in ('ticks_ms', 'ticks_us', 'ticks_diff', 'ticks_add', 'sleep_ms', 'sleep_us'):
+            setattr(time, name, getattr(clock, name))
+        sys.modules['utime'] = time
+        sys.modules['machine'] = module('machine', Pin=Pin, SPI=SPI,
+            mem32=Mem32(self.screen), idle=lambda: clock.advance(10),
+            freq=lambda *hz: 125000000)
+        sys.modules['_thread'] = module('_thread', stack_size=lambda size: None,
+            start_new_thread=self.noThreads)
+        sys.modules['emulator'] = module('emulator',
+            screen_breakpoint=self.screen.screen_breakpoint,
+            brightness_breakpoint=self.screen.brightness_breakpoint)
+        sys.modules['thumbyButton'] = module('thumbyButton', **buttons)
+        self.graphics = Graphics(self.screen, clock)
+        sys.modules['thumby'] = module('thumby', display=self.graphics,
+            audio=Audio(clock), reset=self.reset, __version__='1.9', **buttons)
+
+        # Device paths, and MicroPython's "b" (read binary) open mode
+        hostOpen, hostStat = builtins.open, os.stat
+        hostMkdir, hostRemove = os.mkdir, os.remove
+        def deviceOpen(path, mode='r', *args, **kwargs):
+            if mode.strip('b+t') == '':
+                mode = 'r' + mode
+            return hostOpen(files.map(path), mode, *args, **kwargs)
+        builtins.open = deviceOpen
+        os.stat = lambda path: hostStat(files.map(path))
+        os.mkdir = lambda path, *args: hostMkdir(files.map(path), *args)
+        os.remove = lambda path: hostRemove(files.map(path))
+
+        # __import__("/Games/<name>/<module>") loads a file by its device path
+        hostImport = builtins.__import__
+        def deviceImport(name, *args, **kwargs):
+            if not name.startswith('/'):
+                return hostImport(name, *args, **kwargs)
+            if name not in sys.modules:
+                loadModule(name, files.map(name) + '.py')
+            return sys.modules[name]
+        builtins.__import__ = deviceImport
+        os.chdir(files.root)
+
+    def noThreads(self, function, args):
+        raise RuntimeError("the display thread should not start under the emulator hooks")
+
+    def reset(self):
+        raise StopRun("thumby.reset()")
+
+    # Loaded ahead of the game, so its own "import thumbyGrayscale" finds the
+    # copy that has been given the stand-ins
+    def loadCore(self, path):
+        arrayModule = sys.modules['array']
+        sys.modules['array'] = module('array', array=deviceArray)
+        try:
+            core = loadModule('thumbyGrayscale', path)
+        finally:
+            sys.modules['array'] = arrayModule
+        core.memoryview = deviceMemoryview
+        return core
+
+def loadModule(name, path):
+    spec = importUtil.spec_from_file_location(name, path)
+    result = importUtil.module_from_spec(spec)
+    sys.modules[name] = result
+    spec.loader.exec_module(result)
+    return result
+
+
+#### Runners
+
+def runGame(host, game):
+    gameDir = os.path.join(REPO_PATH, game["dir"])
+    if game.get("thumbyGraphics"):
+        sys.modules['thumbyGraphics'] = module('thumbyGraphics', display=host.graphics)
+    host.loadCore(os.path.join(gameDir, game["core"]))
+    sys.path.insert(0, gameDir)
+    start = time.perf_counter()
+    reason = "game ended"
+    try:
+        runpy.run_path(os.path.join(gameDir, game["main"]), run_name='__main__')
+    except StopRun as stop:
+        reason = str(stop)
+    return reason, time.perf_counter() - start
+
+GAMES = {
+    "fireplace": {"dir": "Fireplace", "core": "thumbyGrayscale.py", "main": "Fireplace.py"},
+    "minesweep": {"dir": "MineSweep", "core": "lib/thumbyGrayscale.py", "main": "MineSweep_main.py",
+        "thumbyGraphics": True},
+}
+
+def benchmarks(display, sprite, shaded, mask, seed):
+    r = random.Random(seed)
+    def fill():
+        display.fill(r.randrange(4))
+    def rect():
+        display.drawFilledRectangle(r.randrange(-8, 72), r.randrange(-8, 40),
+            r.randrange(1, 40), r.randrange(1, 30), r.randrange(4))
+    def line():
+        display.drawLine(r.randrange(-8, 80), r.randrange(-8, 48),
+            r.randrange(-8, 80), r.randrange(-8, 48), r.randrange(4))
+    def blit():
+        display.blit(sprite, r.randrange(-16, 72), r.randrange(-16, 40), 16, 16,
+            r.randrange(-1, 2), r.randrange(2), 0)
+    def blitShaded():
+        display.blit(shaded, r.randrange(-16, 72), r.randrange(-16, 40), 16, 16,
+            r.randrange(-1, 4), r.randrange(2), 0)
+    def blitMirrorY():
+        display.blit(shaded, r.randrange(-16, 72), r.randrange(-16, 40), 16, 16,
+            r.randrange(-1, 4), r.randrange(2), 1)
+    def blitWithMask():
+        display.blitWithMask(shaded, r.randrange(-16, 72), r.randrange(-16, 40), 16, 16,
+            -1, r.randrange(2), 0, mask)
+    def text():
+        display.drawText("Grayscale", r.randrange(-8, 72), r.randrange(-8, 40), r.randrange(4))
+    return [("fill", fill), ("rect", rect), ("line", line), ("blit", blit),
+        ("blit shaded", blitShaded), ("blit mirrorY", blitMirrorY),
+        ("blitWithMask", blitWithMask), ("text", text)]
+
+def runBench(host, corePath, seconds):
+    display = host.loadCore(os.path.join(REPO_PATH, corePath)).display
+    r = random.Random(14)
+    sprite = bytearray(r.getrandbits(8) for _ in range(32))
+    shaded = (sprite, bytearray(r.getrandbits(8) for _ in range(32)))
+    mask = bytearray(r.getrandbits(8) for _ in range(32))
+    results = []
+    checks = benchmarks(display, sprite, shaded, mask, 16)
+    for i, (name, draw) in enumerate(benchmarks(display, sprite, shaded, mask, 15)):
+        display.fill(0)
+        count = 0
+        start = time.perf_counter()
+        while time.perf_counter() - start < seconds:
+            for _ in range(20):
+                draw()
+            count += 20
+        elapsed = time.perf_counter() - start
+        # Then a fixed run of calls, so the picture is comparable between
+        # versions of the core
+        display.fill(0)
+        for _ in range(200):
+            checks[i][1]()
+        crc = "%08x" % zlib.crc32(bytes(display.drawBuffer))
+        results.append({"name": name, "rate": count / elapsed, "hash": crc})
+    return results
+
+
+#### Main
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the grayscale core and its games on the host")
+    parser.add_argument('target', choices=sorted(GAMES) + ['bench'], help="game to run, or bench")
+    parser.add_argument('--frames', type=int, default=600, help="stop after this many frames")
+    parser.add_argument('--ms', type=int, default=600000, help="stop after this much virtual time")
+    parser.add_argument('--keys', help="key script for the buttons")
+    parser.add_argument('--pgm', help="write every frame as a PGM image into this directory")
+    parser.add_argument('--scale', type=int, default=1, help="PGM pixel size")
+    parser.add_argument('--fonts', help="directory with the Thumby firmware fonts")
+    parser.add_argument('--core', default="Fireplace/thumbyGrayscale.py", help="core to benchmark")
+    parser.add_argument('--seconds', type=float, default=1.0, help="time per benchmark")
+    parser.add_argument('--save', help="write the frame (or benchmark) hashes to this JSON file")
+    parser.add_argument('--compare', help="compare the hashes against a saved JSON file")
+    args = parser.parse_args()
+
+    host = Host(args)
+    cwd = os.getcwd()
+    save = args.save and os.path.abspath(args.save)
+    compare = args.compare and os.path.abspath(args.compare)
+    if args.pgm:
+        host.screen.pgmDir = os.path.abspath(args.pgm)
+    host.install()
+    try:
+        if args.target == 'bench':
+            results = runBench(host, args.core, args.seconds)
+            hashes = [r["hash"] for r in results]
+            for r in results:
+                print("%-14s %10.0f /s  %s" % (r["name"], r["rate"], r["hash"]))
+        else:
+            reason, elapsed = runGame(host, GAMES[args.target])
+            hashes = host.screen.hashes
+            print("%s: %d frames in %.2fs (%.0f fps), %.1fs virtual, stopped by %s" % (
+                args.target, len(hashes), elapsed, len(hashes) / elapsed if elapsed else 0,
+                host.clock.us / 1000000, reason))
+            if hashes:
+                print("last frame hash %s" % hashes[-1])
+    finally:
+        os.chdir(cwd)
+        host.files.remove()
+
+    failures = 0
+    if compare:
+        with open(compare, 'r') as stream:
+            baseline = json.load(stream)["hashes"]
+        for i in range(max(len(hashes), len(baseline))):
+            if i >= len(hashes) or i >= len(baseline) or hashes[i] != baseline[i]:
+                print("DIFFERS from %s %d" % ("benchmark" if args.target == 'bench' else "frame", i + 1))
+                failures = 1
+                break
+        else:
+            print("same as %s" % args.compare)
+    if save:
+        with open(save, 'w') as stream:
+            json.dump({"target": args.target, "frames": args.frames, "hashes": hashes}, stream, indent=1)
+    return failures
+
+if __name__ == '__main__':
+    sys.exit(main())
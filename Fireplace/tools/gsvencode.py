@@ -0,0 +1,235 @@
+# GSV grayscale video encoder
+#
+# Packs a 72x40 four-shade clip into the GSV format that gsv.py streams
+# straight into the grayscale driver's buffer and shading planes. Run it on a
+# PC when changing the clip, and ship the .gsv file.
+#
+# Input is either the two raw plane files the video used to ship as (as many
+# 360-byte frames of the driver's buffer and shading planes as they hold), or a
+# stream of concatenated 72x40 PGM images (P2 or P5), as written by
+# "ffmpeg -i clip.mp4 -vf scale=72:40 -f image2pipe -vcodec pgm -". PGM input
+# is cut into 4 shades at even steps (black, dark gray, light gray, white).
+#
+# usage: python3 gsvencode.py input.pgm vid.gsv [--fps 30] [--keyint 0]
+#        python3 gsvencode.py --planes vid.BIT.bin vid.SHD.bin vid.gsv [--fps 30]
+#        python3 gsvencode.py --dump vid.gsv vid.BIT.bin vid.SHD.bin
+#
+# --dump decodes a GSV file back into the two plane files, to check a round
+# trip or to re-encode a clip.
+#
+# Format (little endian):
+#   header  "GSV", version:u8 (1), width:u8, height:u8, fps:u8, frames:u16,
+#           largest frame payload:u16
+#   frames  size:u16, flags:u8 (1 = keyframe), then size bytes of payload: the
+#           buffer plane, then the shading plane
+# Each plane is XORed onto the previous frame's (a keyframe clears the planes
+# first), coded as:
+#   0x00-0x7F  skip n+1 unchanged bytes
+#   0x80-0xBF  n-0x7F literal bytes follow
+#   0xC0-0xFF  the next byte, n-0xBF times
+# Every frame is coded both as a delta and as a keyframe, and the smaller one
+# is kept. The first frame is always a keyframe, so the clip can loop.
+# The fireplace clip changes about half of its bytes from one frame to the
+# next, so a delta never comes out smaller there: vid.gsv is all keyframes and
+# only 2.11x smaller than the raw planes. Clips with less motion gain more.
+
+import argparse
+import os
+import struct
+import sys
+
+WIDTH = 72
+HEIGHT = 40
+PLANE = WIDTH * HEIGHT // 8
+HEADER = "<3sBBBBHH"
+KEYFRAME = 1
+
+
+#### Input
+
+def readtoken(stream):
+    token = b""
+    while True:
+        c = stream.read(1)
+        if not c: return token or None
+        if c == b"#": #comment until end of line
+            while c and c not in b"\r\n": c = stream.read(1)
+            continue
+        if c.isspace():
+            if token: return token
+            continue
+        token += c
+
+# 4 shades from dark to light, as (buffer, shading) bits
+SHADES = ((0, 0), (0, 1), (1, 1), (1, 0))
+
+def readpgm(stream): #returns (buffer, shading) planes, or None at the end of the stream
+    magic = readtoken(stream)
+    if magic is None: return None
+    if magic not in (b"P2", b"P5"): raise ValueError(f"Unsupported image type {magic}")
+    width = int(readtoken(stream))
+    height = int(readtoken(stream))
+    maxval = int(readtoken(stream))
+    if (width, height) != (WIDTH, HEIGHT): raise ValueError(f"Frames must be {WIDTH}x{HEIGHT}")
+    count = width*height
+    if magic == b"P5":
+        if maxval > 255: raise ValueError("16-bit PGM is not supported")
+        raw = stream.read(count)
+    else:
+        raw = [int(readtoken(stream)) for i in range(count)]
+    if len(raw) < count: raise ValueError("Truncated image")
+    planes = (bytearray(PLANE), bytearray(PLANE))
+    for y in range(HEIGHT):
+        for x in range(WIDTH):
+            shade = min(3, raw[y*WIDTH + x]*4 // (maxval + 1))
+            for plane, bit in zip(planes, SHADES[shade]):
+                if bit: plane[(y >> 3)*WIDTH + x] |= 1 << (y & 7)
+    return planes
+
+def readframes(args): #yields (buffer, shading) planes
+    if args.planes:
+        with open(args.files[0], "rb") as bit, open(args.files[1], "rb") as shd:
+            while True:
+                planes = bit.read(PLANE), shd.read(PLANE)
+                if len(planes[0]) < PLANE or len(planes[1]) < PLANE: return
+                yield planes
+    else:
+        stream = sys.stdin.buffer if args.files[0] == "-" else open(args.files[0], "rb")
+        while True:
+            planes = readpgm(stream)
+            if planes is None: return
+            yield planes
+
+
+#### Coding
+
+def pack(delta): #run-length code one plane's XOR delta
+    out = bytearray()
+    i = 0
+    n = len(delta)
+    while i < n:
+        j = i
+        if delta[i] == 0:
+            while j < n and delta[j] == 0 and j - i < 128: j += 1
+            out.append(j - i - 1)
+            i = j
+            continue
+        while j < n and delta[j] == delta[i] and j - i < 64: j += 1
+        if j - i >= 3:
+            out += bytes((0xC0 + j - i - 1, delta[i]))
+            i = j
+            continue
+        #literal bytes until a run of zeros or repeats would be cheaper
+        j = i
+        while j < n and j - i < 64:
+            if delta[j] == 0 and (j + 1 >= n or delta[j+1] == 0): break
+            if j + 2 < n and delta[j] == delta[j+1] == delta[j+2]: break
+            j += 1
+        out.append(0x80 + j - i - 1)
+        out += delta[i:j]
+        i = j
+    return out
+
+def unpack(data, pos, plane): #reference decoder, as gsv.py does it
+    i = 0
+    while i < PLANE:
+        c = data[pos]
+        pos += 1
+        if c < 0x80:
+            i += c + 1
+        elif c < 0xC0:
+            for k in range(c - 0x7F):
+                plane[i] ^= data[pos]
+                pos += 1
+                i += 1
+        else:
+            for k in range(c - 0xBF):
+                plane[i] ^= data[pos]
+                i += 1
+            pos += 1
+    return pos
+
+def xor(a, b):
+    return bytes(x ^ y for x, y in zip(a, b))
+
+def encode(frames, fps, keyint, stream): #writes the clip to stream as it goes
+    stream.write(bytes(struct.calcsize(HEADER))) #patched once the counts are known
+    prev = (bytes(PLANE), bytes(PLANE))
+    shown = (bytearray(PLANE), bytearray(PLANE)) #what the decoder will have drawn
+    count = keys = largest = 0
+    for planes in frames:
+        key = pack(planes[0]) + pack(planes[1])
+        payload, flags = key, KEYFRAME
+        if count and not (keyint and count % keyint == 0):
+            delta = pack(xor(planes[0], prev[0])) + pack(xor(planes[1], prev[1]))
+            if len(delta) < len(key):
+                payload, flags = delta, 0
+        #check the round trip as each frame is coded
+        if flags & KEYFRAME:
+            shown = (bytearray(PLANE), bytearray(PLANE))
+        end = unpack(payload, unpack(payload, 0, shown[0]), shown[1])
+        if end != len(payload) or shown[0] != planes[0] or shown[1] != planes[1]:
+            raise AssertionError(f"Frame {count} does not decode back")
+        keys += flags
+        stream.write(struct.pack("<HB", len(payload), flags) + payload)
+        largest = max(largest, len(payload))
+        prev = planes
+        count += 1
+    stream.seek(0)
+    stream.write(struct.pack(HEADER, b"GSV", 1, WIDTH, HEIGHT, fps, count, largest))
+    return count, keys
+
+def decode(data): #yields (buffer, shading) planes
+    magic, version, width, height, fps, count, largest = struct.unpack_from(HEADER, data)
+    if magic != b"GSV" or version != 1: raise ValueError("Not a GSV 1 file")
+    pos = struct.calcsize(HEADER)
+    planes = (bytearray(PLANE), bytearray(PLANE))
+    for f in range(count):
+        size, flags = struct.unpack_from("<HB", data, pos)
+        pos += 3
+        if flags & KEYFRAME:
+            planes = (bytearray(PLANE), bytearray(PLANE))
+        end = unpack(data, unpack(data, pos, planes[0]), planes[1])
+        if end != pos + size: raise ValueError(f"Frame {f} is corrupt")
+        pos = end
+        yield planes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Encode a 72x40 grayscale clip as GSV video")
+    parser.add_argument("files", nargs="+", help="input.pgm (- for stdin) and output.gsv, see the usage above")
+    parser.add_argument("--planes", action="store_true", help="read the buffer and shading plane files instead of PGM")
+    parser.add_argument("--fps", type=int, default=30)
+    parser.add_argument("--keyint", type=int, default=0, help="force a keyframe every this many frames")
+    parser.add_argument("--dump", action="store_true", help="decode the input GSV file into two plane files")
+    args = parser.parse_args()
+    if len(args.files) != (3 if args.planes or args.dump else 2):
+        parser.error("wrong number of files")
+
+    if args.dump:
+        with open(args.files[0], "rb") as stream:
+            data = stream.read()
+        with open(args.files[1], "wb") as bit, open(args.files[2], "wb") as shd:
+            for planes in decode(data):
+                bit.write(planes[0])
+                shd.write(planes[1])
+        return 0
+
+    #write to a temporary file, so a failed round trip leaves the old clip alone
+    temp = args.files[-1] + ".tmp"
+    try:
+        with open(temp, "wb") as stream:
+            count, keys = encode(readframes(args), args.fps, args.keyint, stream)
+            size = stream.seek(0, 2)
+    except BaseException:
+        os.remove(temp)
+        raise
+    os.replace(temp, args.files[-1])
+    raw = count*PLANE*2
+    print(f"{args.files[-1]}: {count} frames ({keys} keyframes), {size} bytes, "
+        f"{raw/size:.2f}x smaller than raw planes ({raw} bytes), "
+        f"{(size - struct.calcsize(HEADER))/max(count, 1):.0f} bytes per frame")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
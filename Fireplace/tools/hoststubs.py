@@ -0,0 +1,98 @@
+# Fireplace host stand-ins
+#
+# The micropython module and const builtin, ptr8/ptr16/ptr32 pointers that
+# refuse to stray outside their buffer, and MicroPython's array('O') and str
+# memoryview, as thumbyGrayscale uses them.
+
+import builtins
+import sys
+from array import array as _array
+
+
+# Viper pointers truncate on store. Unlike them, these refuse to read or write
+# outside the buffer, so drawing code that strays is caught here.
+class Ptr8:
+    def __init__(self, buffer):
+        self.buffer = buffer
+
+    def __getitem__(self, index):
+        if index < 0:
+            raise IndexError("ptr8 index %d" % index)
+        return self.buffer[index]
+
+    def __setitem__(self, index, value):
+        if index < 0:
+            raise IndexError("ptr8 index %d" % index)
+        self.buffer[index] = value & 0xFF
+
+class Ptr16:
+    def __init__(self, buffer):
+        self.buffer = buffer
+
+class Ptr32:
+    def __init__(self, buffer):
+        self.words = memoryview(buffer).cast('B').cast('I')
+
+    def __getitem__(self, index):
+        if index < 0:
+            raise IndexError("ptr32 index %d" % index)
+        return self.words[index]
+
+    def __setitem__(self, index, value):
+        if index < 0:
+            raise IndexError("ptr32 index %d" % index)
+        self.words[index] = value & 0xFFFFFFFF
+
+# ptr8(0) is a null pointer, used for absent shading planes
+def pointer(kind):
+    def make(buffer):
+        return None if isinstance(buffer, int) else kind(buffer)
+    return make
+
+class MicroPython:
+    @staticmethod
+    def native(function):
+        return function
+
+    # Viper takes buffers passed as ptr8/ptr16/ptr32 arguments as pointers
+    @staticmethod
+    def viper(function):
+        kinds = (builtins.ptr8, builtins.ptr16, builtins.ptr32)
+        names = function.__code__.co_varnames[:function.__code__.co_argcount]
+        makers = [function.__annotations__.get(name) for name in names]
+        makers = [maker if any(maker is kind for kind in kinds) else None for maker in makers]
+        if not any(makers):
+            return function
+        def call(*args):
+            return function(*(maker(arg) if maker and not isinstance(arg, int) else arg
+                for maker, arg in zip(makers, args)))
+        return call
+
+    @staticmethod
+    def const(value):
+        return value
+
+# MicroPython iterates a str through memoryview as its utf-8 bytes
+def deviceMemoryview(obj):
+    if isinstance(obj, str):
+        obj = obj.encode()
+    return memoryview(obj)
+
+# array('O') holds objects on MicroPython
+def deviceArray(typecode, items=()):
+    if typecode == 'O':
+        return list(items)
+    return _array(typecode, items)
+
+def module(name, **members):
+    result = type(sys)(name)
+    result.__dict__.update(members)
+    return result
+
+def install():
+    builtins.const = MicroPython.const
+    builtins.micropython = MicroPython
+    builtins.ptr8 = pointer(Ptr8)
+    builtins.ptr16 = pointer(Ptr16)
+    builtins.ptr32 = pointer(Ptr32)
+    sys.modules['micropython'] = MicroPython
@@ -0,0 +1,301 @@
+# Flucht headless replay harness
+#
+# Runs common_code.game_loop under CPython at a fixed timestep, feeding it a
+# recorded key trace, with a game_interface that draws into an in-memory 1-bit
+# screen instead of the Thumby's. Reports game_loop frame time percentiles,
+# the time spent in create_level_elements when it generates, the memory
+# allocated per frame, and a hash of the screen for every frame, so changes to
+# level generation, particles or hazards can be profiled and regression tested
+# without a device.
+#
+# Usage (from the repository root):
+#
+#   python3 Flucht/tools/headless.py --frames 3600
+#   python3 Flucht/tools/headless.py --frames 3600 --record trace.txt
+#   python3 Flucht/tools/headless.py --keys trace.txt --save baseline.json
+#   python3 Flucht/tools/headless.py --keys trace.txt --compare baseline.json
+#   python3 Flucht/tools/headless.py --god --frames 20000 --profile 15
+#
+# A key trace is a text file with one "frame pressed" pair per line, pressed
+# being 1 or 0. The key stays that way until the next line. Without a trace,
+# a seeded pseudo-random one is made, which --record writes out.
+#
+# The game_interface class is loaded unchanged from Flucht.py, over the
+# stand-ins in hoststubs.py for the thumby display and sprites; only the clock
+# and the high score file are replaced, with a virtual clock and an in-memory
+# save. common_code is loaded fresh for each run, since it keeps its state in
+# module globals, and the random module is seeded, so the same trace gives the
+# same frames. The trace is played twice: once timed, and once with
+# tracemalloc for the memory figures, which must give the same frames. CPython
+# timings and allocations only compare runs with each other; on the Thumby,
+# gc.mem_alloc() tells.
+
+import argparse
+import contextlib
+import cProfile
+import importlib.util
+import io
+import json
+import os
+import pstats
+import random
+import sys
+import time
+import tracemalloc
+import zlib
+
+from hoststubs import Display, Sprite, module
+
+FLUCHT_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+#### Loading the game
+
+# The game_interface class from Flucht.py, drawing into display
+def loadInterface(display):
+    with open(os.path.join(FLUCHT_PATH, 'Flucht.py'), 'r') as stream:
+        source = stream.read()
+    source = source[source.index('class game_interface'):source.index('_game_interface =')]
+    namespace = {
+        'thumby': module('thumby', display=display, Sprite=Sprite),
+        'time': module('time', ticks_ms=lambda: 0),
+        'SCREEN_WIDTH': 40,
+        'SCREEN_HEIGHT': 72,
+        'CONFIG_FILE_PATH': None,
+    }
+    exec(compile(source, 'Flucht.py', 'exec'), namespace)
+    return namespace['game_interface']
+
+def makeInterface(display, clock, saved):
+    class HeadlessInterface(loadInterface(display)):
+        def get_current_time(self):
+            return clock[0]
+
+        # The high score file, as load_data would read it back
+        def save_data(self, data_dict):
+            saved.clear()
+            saved.update((str(key), str(value)) for key, value in data_dict.items())
+
+        def load_data(self):
+            return dict(saved)
+    return HeadlessInterface()
+
+# common_code keeps the whole game's state in its globals, so every run gets a
+# fresh copy of the module
+def loadGame():
+    spec = importlib.util.spec_from_file_location('common_code', os.path.join(FLUCHT_PATH, 'common_code.py'))
+    game = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(game)
+    return game
+
+
+#### Key traces
+
+def readKeyTrace(path):
+    trace = []
+    with open(path, 'r') as stream:
+        for line in stream:
+            line = line.split('#')[0].split()
+            if len(line) == 2:
+                trace.append((int(line[0]), line[1] != '0'))
+    trace.sort()
+    return trace
+
+def writeKeyTrace(path, trace):
+    with open(path, 'w') as stream:
+        stream.write("# frame pressed\n")
+        for frame, pressed in trace:
+            stream.write("%d %d\n" % (frame, pressed))
+
+# Taps and holds of different lengths, with pauses in between
+def randomKeyTrace(frames, seed):
+    generator = random.Random(seed)
+    trace = []
+    frame = generator.randrange(30, 90)
+    while frame < frames:
+        trace.append((frame, True))
+        frame += generator.randrange(2, 20)
+        trace.append((frame, False))
+        frame += generator.randrange(3, 45)
+    return trace
+
+def keyStates(trace, frames):
+    states = []
+    pressed = False
+    index = 0
+    for frame in range(frames):
+        while index < len(trace) and trace[index][0] <= frame:
+            pressed = trace[index][1]
+            index += 1
+        states.append(pressed)
+    return states
+
+
+#### Runner
+
+def percentile(values, fraction):
+    if not values:
+        return 0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+def runTrace(states, fps, seed, god, measureMemory=False, profiler=None):
+    random.seed(seed)
+    game = loadGame()
+    game.GOD_MODE = god
+    display = Display()
+    clock = [0.0]
+    saved = {}
+    interface = makeInterface(display, clock, saved)
+
+    # Times create_level_elements, keeping the calls that generated something
+    levelGen = []
+    createLevelElements = game.create_level_elements
+    def timedCreateLevelElements(current_y_pos):
+        last = game.last_generation_height
+        start = time.perf_counter_ns()
+        createLevelElements(current_y_pos)
+        if game.last_generation_height != last:
+            levelGen.append(time.perf_counter_ns() - start)
+    game.create_level_elements = timedCreateLevelElements
+
+    deltaTime = 1.0 / fps
+    frameTimes = []
+    logicTimes = []
+    peakBytes = []
+    netBlocks = []
+    hashes = []
+    climb = 0.0
+    if measureMemory:
+        tracemalloc.start()
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        if profiler:
+            profiler.enable()
+        for frame, pressed in enumerate(states):
+            if measureMemory:
+                tracemalloc.reset_peak()
+                before = tracemalloc.get_traced_memory()[0]
+                blocks = sys.getallocatedblocks()
+            display.drawTime = 0
+            start = time.perf_counter_ns()
+            game.game_loop(pressed, deltaTime if frame else 0.0, interface)
+            elapsed = time.perf_counter_ns() - start
+            if measureMemory:
+                blocks = sys.getallocatedblocks() - blocks
+                current, peak = tracemalloc.get_traced_memory()
+                peakBytes.append(peak - before)
+                netBlocks.append(blocks)
+            frameTimes.append(elapsed)
+            logicTimes.append(elapsed - display.drawTime)
+            climb = max(climb, game.f_camera_bottom_y)
+            clock[0] += deltaTime
+            hashes.append("%08x" % zlib.crc32(display.buffer))
+        if profiler:
+            profiler.disable()
+    if measureMemory:
+        tracemalloc.stop()
+
+    log = output.getvalue()
+    return {
+        "frameTimes": frameTimes,
+        "logicTimes": logicTimes,
+        "levelGen": levelGen,
+        "peakBytes": peakBytes,
+        "netBlocks": netBlocks,
+        "hashes": hashes,
+        "gameOvers": log.count("Game over!"),
+        "bestScore": int(saved.get('highscore', 0)),
+        "climb": round(float(climb + game.SCROLL_MIN_HEIGHT) / game.PLAYER_HEIGHT),
+        "log": log,
+    }
+
+def firstDivergence(hashes, baseline):
+    for frame in range(min(len(hashes), len(baseline))):
+        if hashes[frame] != baseline[frame]:
+            return frame
+    if len(hashes) != len(baseline):
+        return min(len(hashes), len(baseline))
+    return None
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay key traces through Flucht's game loop headlessly")
+    parser.add_argument('--frames', type=int, default=3600, help="frames to run")
+    parser.add_argument('--fps', type=int, default=60, help="fixed timestep, in frames per second")
+    parser.add_argument('--keys', help="key trace to replay instead of random input")
+    parser.add_argument('--record', help="write the key trace used to this file")
+    parser.add_argument('--seed', type=int, default=1, help="seed for the random module and random input")
+    parser.add_argument('--god', action='store_true', help="set GOD_MODE, so runs climb without dying")
+    parser.add_argument('--profile', type=int, metavar='N', help="show the N functions with the most time in the timed run")
+    parser.add_argument('--save', help="write per-frame hashes and timings to this JSON file")
+    parser.add_argument('--compare', help="compare per-frame hashes against a saved JSON file")
+    parser.add_argument('--verbose', action='store_true', help="show the game's output")
+    args = parser.parse_args()
+
+    trace = readKeyTrace(args.keys) if args.keys else randomKeyTrace(args.frames, args.seed)
+    if args.record:
+        writeKeyTrace(args.record, trace)
+    states = keyStates(trace, args.frames)
+
+    profiler = cProfile.Profile() if args.profile else None
+    timed = runTrace(states, args.fps, args.seed, args.god, profiler=profiler)
+    traced = runTrace(states, args.fps, args.seed, args.god, measureMemory=True)
+    if args.verbose:
+        sys.stdout.write(timed["log"])
+
+    frameTimes = [t / 1000 for t in timed["frameTimes"]]
+    logicTimes = [t / 1000 for t in timed["logicTimes"]]
+    levelGen = [t / 1000 for t in timed["levelGen"]]
+    print("%d frames at %d fps, %d presses, %d game overs, best score %dm, highest climb %dm, last hash %s" % (
+        args.frames, args.fps, sum(1 for frame, pressed in trace if pressed and frame < args.frames),
+        timed["gameOvers"], timed["bestScore"], timed["climb"], timed["hashes"][-1]))
+    print("%-30s %6s %8s %8s %8s %8s" % ("us", "calls", "p50", "p90", "p99", "max"))
+    for name, values in (("game_loop", frameTimes), ("game_loop without drawing", logicTimes),
+            ("create_level_elements", levelGen)):
+        print("%-30s %6d %8.0f %8.0f %8.0f %8.0f" % (name, len(values), percentile(values, 0.5),
+            percentile(values, 0.9), percentile(values, 0.99), max(values or [0])))
+    peakBytes, netBlocks = traced["peakBytes"], traced["netBlocks"]
+    print("allocated per frame: p50 %d B, p99 %d B, max %d B; blocks still held after %d frames: %d" % (
+        percentile(peakBytes, 0.5), percentile(peakBytes, 0.99), max(peakBytes), args.frames, sum(netBlocks)))
+
+    failures = 0
+    frame = firstDivergence(traced["hashes"], timed["hashes"])
+    if frame is not None:
+        print("NOT DETERMINISTIC: the two runs differ from frame %d" % frame)
+        failures += 1
+    if args.compare:
+        with open(args.compare, 'r') as stream:
+            baseline = json.load(stream)
+        frame = firstDivergence(timed["hashes"], baseline["hashes"])
+        if frame is None:
+            print("same frames as %s" % args.compare)
+        else:
+            print("DIFFERS from %s from frame %d" % (args.compare, frame))
+            failures += 1
+        if baseline.get("frameTimes"):
+            old = [t / 1000 for t in baseline.get("logicTimes", baseline["frameTimes"])]
+            print("game_loop without drawing: p50 %.0f us, was %.0f us; p99 %.0f us, was %.0f us" % (
+                percentile(logicTimes, 0.5), percentile(old, 0.5),
+                percentile(logicTimes, 0.99), percentile(old, 0.99)))
+
+    if args.save:
+        with open(args.save, 'w') as stream:
+            json.dump({
+                "frames": args.frames,
+                "fps": args.fps,
+                "seed": args.seed,
+                "god": args.god,
+                "trace": trace,
+                "frameTimes": timed["frameTimes"],
+                "logicTimes": timed["logicTimes"],
+                "peakBytes": peakBytes,
+                "hashes": timed["hashes"],
+            }, stream, indent=1)
+
+    if profiler:
+        pstats.Stats(profiler).sort_stats('tottime').print_stats(args.profile)
+
+    return 1 if failures else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
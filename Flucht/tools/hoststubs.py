@@ -0,0 +1,100 @@
+# Flucht host stand-ins
+#
+# thumby.Sprite, and a thumby.display that draws into a 72x40 MONO_VLSB buffer
+# and keeps count of its own drawing time.
+
+import sys
+import time
+
+SCREEN_WIDTH = 72 # the Thumby's screen, Flucht plays it on its side
+SCREEN_HEIGHT = 40
+
+
+class Sprite:
+    def __init__(self, width, height, bitmapData, x=0, y=0, key=-1, mirrorX=0, mirrorY=0):
+        self.width = width
+        self.height = height
+        self.bitmap = bitmapData
+        self.x = x
+        self.y = y
+        self.key = key
+
+# Draws into a MONO_VLSB buffer like the Thumby's, clipped to the screen.
+# Drawing here is Python, where the Thumby's is native code, so it keeps count
+# of its own time for the runner to take out of game_loop's.
+class Display:
+    width = SCREEN_WIDTH
+    height = SCREEN_HEIGHT
+
+    def __init__(self):
+        self.buffer = bytearray(SCREEN_WIDTH * SCREEN_HEIGHT // 8)
+        self.drawTime = 0
+
+    def plot(self, x, y, colour):
+        if 0 <= x < SCREEN_WIDTH and 0 <= y < SCREEN_HEIGHT:
+            bit = 1 << (y & 7)
+            if colour:
+                self.buffer[(y >> 3) * SCREEN_WIDTH + x] |= bit
+            else:
+                self.buffer[(y >> 3) * SCREEN_WIDTH + x] &= ~bit & 0xFF
+
+    def line(self, x1, y1, x2, y2, colour):
+        dx, dy = abs(x2 - x1), -abs(y2 - y1)
+        sx, sy = (1 if x1 < x2 else -1), (1 if y1 < y2 else -1)
+        error = dx + dy
+        while True:
+            self.plot(x1, y1, colour)
+            if x1 == x2 and y1 == y2:
+                break
+            if 2 * error >= dy:
+                error += dy
+                x1 += sx
+            if 2 * error <= dx:
+                error += dx
+                y1 += sy
+
+    def setPixel(self, x, y, colour):
+        start = time.perf_counter_ns()
+        self.plot(x, y, colour)
+        self.drawTime += time.perf_counter_ns() - start
+
+    def fill(self, colour):
+        start = time.perf_counter_ns()
+        self.buffer[:] = bytes([0xFF if colour else 0]) * len(self.buffer)
+        self.drawTime += time.perf_counter_ns() - start
+
+    def drawLine(self, x1, y1, x2, y2, colour):
+        start = time.perf_counter_ns()
+        self.line(x1, y1, x2, y2, colour)
+        self.drawTime += time.perf_counter_ns() - start
+
+    def drawFilledRectangle(self, x, y, width, height, colour):
+        start = time.perf_counter_ns()
+        for yy in range(max(y, 0), min(y + height, SCREEN_HEIGHT)):
+            for xx in range(max(x, 0), min(x + width, SCREEN_WIDTH)):
+                self.plot(xx, yy, colour)
+        self.drawTime += time.perf_counter_ns() - start
+
+    def drawRectangle(self, x, y, width, height, colour):
+        start = time.perf_counter_ns()
+        self.line(x, y, x + width - 1, y, colour)
+        self.line(x, y + height - 1, x + width - 1, y + height - 1, colour)
+        self.line(x, y, x, y + height - 1, colour)
+        self.line(x + width - 1, y, x + width - 1, y + height - 1, colour)
+        self.drawTime += time.perf_counter_ns() - start
+
+    def drawSprite(self, sprite):
+        start = time.perf_counter_ns()
+        x, y = int(sprite.x), int(sprite.y)
+        if x < SCREEN_WIDTH and y < SCREEN_HEIGHT and x + sprite.width > 0 and y + sprite.height > 0:
+            for sy in range(sprite.height):
+                for sx in range(sprite.width):
+                    colour = (sprite.bitmap[(sy >> 3) * sprite.width + sx] >> (sy & 7)) & 1
+                    if colour != sprite.key:
+                        self.plot(x + sx, y + sy, colour)
+        self.drawTime += time.perf_counter_ns() - start
+
+def module(name, **members):
+    result = type(sys)(name)
+    result.__dict__.update(members)
+    return result
@@ -1,14 +1,21 @@
 import thumby
-from framebuf import FrameBuffer, MONO_HMSB, MONO_VLSB, MONO_HLSB
 import random
 import time
+import sys
+sys.path.append("/Games/GameOfLife")
+import life
 
 # Thomas Duffin, May 2022
 # Conway's Game of Life, written in MicroPython for the Thumby console. 
 # Free to modify and share, though credit is always appreciated!
 # Github: tduffinntu@github.com
 
-cursor = thumby.Sprite(2, 2, bytearray([3,3,0,0]), 72//2, 40//2, -1) # blinking square
+BOARD_WIDTH = 36 # board size in cells, it wraps around at the edges. Can be bigger than the screen,
+BOARD_HEIGHT = 20 # e.g. 256x256 with CELL_SIZE = 1, and the screen scrolls around it
+CELL_SIZE = 2 # pixels per cell: 1, 2, 4 or 8
+SKIPS = [1, 2, 4, 8, 16] # generations per frame, A cycles through these while simulating
+
+cursor = thumby.Sprite(CELL_SIZE, CELL_SIZE, bytearray([(1<<CELL_SIZE)-1]*CELL_SIZE + [0]*CELL_SIZE), 0, 0, -1) # blinking square
 
 # BITMAP: width: 72, height: 40
 cover1 = bytearray([0,0,0,0,0,0,0,0,0,248,248,248,248,248,0,0,0,0,0,0,0,0,112,136,136,80,0,0,112,136,136,112,0,0,248,16,32,64,248,0,0,120,128,112,128,120,0,0,240,40,40,248,0,0,8,16,224,16,8,0,0,24,0,0,144,168,168,72,0,0,0,0,
@@ -37,55 +44,55 @@ cover_screen = thumby.Sprite(72, 40, cover1+cover2, 0, 0, -1) # combining bitmap
 controls_screen = thumby.Sprite(72, 40, controls, 0, 0, -1)
 
 simulate = False # are we simulating?
+skip = 0 # index into SKIPS
 
-buf = bytearray() # our pixel data; like a texture!
-cells = [] # the board we run our simulation on
-
-wb = 72//8 # 9 -> pixel width in bytes
-hb = 360//wb # 40 -> pixel width in bytes
-
-wc = 72//2 # 36 -> width in cells
-hc = 40//2 # 20 -> height in cells
-
-def BuildBuffer(): # converts game screen (cells) into a screen buffer
-    global buf
-    buf = bytearray() # will store our pixel data
-    gi=0 # index into cells array
-    for row in range(hb):
-        if row%2 == 0:
-            for col in range(wb):
-                nb = 0b0
-                for i in range(4):
-                    nb |= (0b11*cells[gi]) << (i*2)
-                    gi+=1
-                buf.append(nb)
-        else:
-            buf.extend(buf[-wb:])
-            
+board = life.Board(BOARD_WIDTH, BOARD_HEIGHT) # the board we run our simulation on, see life.py
+
+wc = min(72//CELL_SIZE, BOARD_WIDTH) # width of the view in cells
+hc = min(40//CELL_SIZE, BOARD_HEIGHT) # height of the view in cells
+vx = 0 # board cell at the top-left of the view
+vy = 0
+cx = wc//2 # cursor cell within the view
+cy = hc//2
 
 def RandomizeGrid():
-    global cells
-    cells = [0]*(720)
-    for i in range(len(cells)//6): # 720//6 =~ 120 'living' cells
-        cells[random.randint(0,len(cells)-1)] = 1
-    
-    BuildBuffer()
-    
-    
+    board.clear()
+    for i in range(BOARD_WIDTH*BOARD_HEIGHT//6): # 720//6 =~ 120 'living' cells on a 36x20 board
+        board.set(random.randint(0,BOARD_WIDTH-1), random.randint(0,BOARD_HEIGHT-1))
+
+
+def MoveCursor(dx, dy): # moves the cursor, scrolling the view at its edges when the board is bigger than the screen
+    global cx, cy
+    if 0 <= cx+dx < wc:
+        cx += dx
+    elif wc < BOARD_WIDTH: # at the edge of the view, move the view instead
+        Scroll(dx, 0)
+    else:
+        cx = (cx+dx) % wc
+    if 0 <= cy+dy < hc:
+        cy += dy
+    elif hc < BOARD_HEIGHT:
+        Scroll(0, dy)
+    else:
+        cy = (cy+dy) % hc
+
+
+def Scroll(dx, dy): # moves the view around the board, wrapping at its edges
+    global vx, vy
+    vx = (vx+dx) % BOARD_WIDTH
+    vy = (vy+dy) % BOARD_HEIGHT
+
+
 def handleInput(): # called every frame
-    global cursor
     global simulate
-    global cells
+    global skip
     
-    if thumby.buttonA.justPressed(): # toggle cell at cursor's position
+    if thumby.buttonA.justPressed():
         Beep()
-        #print(f'x: {cursor.x}, y: {cursor.y}') # debugging cursor pos
-        i = (cursor.x//2) + ((cursor.y//2) * 36)
-        if cells[i] == 1:
-            cells[i] = 0
-        else:
-            cells[i] = 1
-        BuildBuffer()
+        if simulate: # change how many generations go by each frame
+            skip = (skip+1) % len(SKIPS)
+        else: # toggle cell at cursor's position
+            board.toggle((vx+cx) % BOARD_WIDTH, (vy+cy) % BOARD_HEIGHT)
         
     if thumby.buttonB.justPressed(): # toggles the simulate flag
         Beep()
@@ -94,59 +101,28 @@ def handleInput(): # called every frame
         else:
             simulate = True
     
-    if not simulate:
-        if thumby.buttonL.justPressed(): # cursor control and screen wrapping
-            Beep()
-            cursor.x -= 2
-            if cursor.x < 0:
-                cursor.x = 2*wc-2
-        if thumby.buttonR.justPressed():
-            Beep()
-            cursor.x += 2
-            if cursor.x > 2*wc-2:
-                cursor.x = 0
-        if thumby.buttonU.justPressed():
-            Beep()
-            cursor.y -= 2
-            if cursor.y < 0:
-                cursor.y = 2*hc-2
-        if thumby.buttonD.justPressed():
-            Beep()
-            cursor.y += 2
-            if cursor.y > 2*hc-2:
-                cursor.y = 0
-    
-            
-def Simulate(): # inefficient, feel free to send suggestions!
-    global cells
-    
-    old_cells = cells.copy() # previous state of board used to generate next board
+    if not simulate: # cursor control and screen wrapping
+        move = MoveCursor
+    elif wc < BOARD_WIDTH or hc < BOARD_HEIGHT: # look around a big board while it runs
+        move = Scroll
+    else:
+        return
+    if thumby.buttonL.justPressed():
+        Beep()
+        move(-1, 0)
+    if thumby.buttonR.justPressed():
+        Beep()
+        move(1, 0)
+    if thumby.buttonU.justPressed():
+        Beep()
+        move(0, -1)
+    if thumby.buttonD.justPressed():
+        Beep()
+        move(0, 1)
     
-    for row in range(hc): # remember rows go down, cols go across!
-        for col in range(wc):
-            c = col+(row*wc)
-            neighbors = [c-wc, c-wc-1, c-wc+1, c-1, c+1, c+wc, c+wc-1, c+wc+1] # all 8 neighbors
-            
-            count = 0 # number of living neighbors
-            for n in neighbors: # we wrap around top-left/bottom-right, and left/right for funsies
-                if n >= len(cells):
-                    count += old_cells[n%len(cells)]
-                else:
-                    count += old_cells[n]
-            
-            status = old_cells[c] # whether cell is alive or not
             
-            if status == 1: # game of life rules
-                if count < 2:
-                    cells[c] = 0
-                if count == 2 or count == 3:
-                    cells[c] = 1
-                if count > 3:
-                    cells[c] = 0
-            elif count == 3:
-                cells[c] = 1
-    
-    BuildBuffer()
+def Simulate(): # a whole row of cells at a time, see life.py
+    board.step(SKIPS[skip])
     
     
 def Beep(): # audio feedback for inputs!
@@ -154,8 +130,6 @@ def Beep(): # audio feedback for inputs!
     
 
 ### BOARD/STATE SETUP ###    
-fbuffer = FrameBuffer(thumby.display.display.buffer, 72, 40, MONO_VLSB) # create thumby buffer
-
 old_ticks=0 # timer count on last frame
 blink_interval=600 # ~ms per blink
 next_blink = blink_interval # time until next blink in ms
@@ -205,14 +179,15 @@ while 1: # controls screen
 while 1: # simulation screen
     Timing()
     
-    thumby.display.fill(0)
-    fbuffer.blit(FrameBuffer(buf, 72, 40, MONO_HMSB), 0, 0, 72,40) # drawing game board
+    board.render(thumby.display.display.buffer, vx, vy, CELL_SIZE) # drawing game board straight into the screen buffer
     
     handleInput()
         
     if simulate: # hide cursor if simulating
         Simulate()
     else:
+        cursor.x = cx*CELL_SIZE
+        cursor.y = cy*CELL_SIZE
         cursor.setFrame(blinks)
         thumby.display.drawSprite(cursor)
     
@@ -0,0 +1,109 @@
+import micropython
+from micropython import const
+
+# Bit-sliced Game of Life engine for GameOfLife.py
+# Each row of the board is one packed integer, bit x being the cell in column x,
+# so a whole row of cells is worked out at once with bitwise adder logic instead
+# of counting neighbors cell by cell. The board wraps around at every edge (a torus)
+# and can be any size; render() draws the part of it that fits on the screen.
+
+SCREEN_W = const(72)
+SCREEN_H = const(40)
+
+class Board:
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.mask = (1 << width) - 1 # all the cells of one row
+        self.generation = 0
+        self.rows = [0]*height
+        self._sides = [0]*height # ones of each row's left+right neighbor counts
+        self._sideCarries = [0]*height # twos of each row's left+right neighbor counts
+        self._sums = [0]*height # ones of each row's left+self+right counts
+        self._carries = [0]*height # twos of each row's left+self+right counts
+        self._view = bytearray(SCREEN_H*(SCREEN_W//8)) # visible rows, packed like rows, for render
+
+    def clear(self):
+        for y in range(self.height):
+            self.rows[y] = 0
+        self.generation = 0
+
+    def get(self, x, y):
+        return (self.rows[y] >> x) & 1
+
+    def set(self, x, y, alive=1):
+        if alive:
+            self.rows[y] |= 1 << x
+        else:
+            self.rows[y] &= ~(1 << x)
+
+    def toggle(self, x, y):
+        self.rows[y] ^= 1 << x
+
+    @micropython.native
+    def step(self, generations=1): # advances the board by a number of generations
+        rows = self.rows
+        sides = self._sides
+        sideCarries = self._sideCarries
+        sums = self._sums
+        carries = self._carries
+        mask = self.mask
+        top = self.width - 1
+        last = self.height - 1
+        for g in range(generations):
+            # first pass: each row's left+right neighbor counts, and its left+self+right counts,
+            # both as two bit planes (ones and twos), wrapping around the sides
+            for y in range(self.height):
+                b = rows[y]
+                l = ((b << 1) | (b >> top)) & mask # each cell's left neighbor
+                r = (b >> 1) | ((b & 1) << top) # each cell's right neighbor
+                s = l ^ r
+                c = l & r
+                sides[y] = s
+                sideCarries[y] = c
+                sums[y] = s ^ b
+                carries[y] = c | (s & b)
+            # second pass: add up the rows above and below, and the sides of this row
+            for y in range(self.height):
+                sa = sums[y-1] # y-1 wraps to the last row on its own
+                ca = carries[y-1]
+                d = y+1 if y < last else 0
+                sd = sums[d]
+                cd = carries[d]
+                sb = sides[y]
+                cb = sideCarries[y]
+                t = sa ^ sb
+                ones = t ^ sd # ones bit of the neighbor count
+                k = (sa & sb) | (t & sd) # carry from adding up the ones
+                x = ca ^ cb
+                z = cd ^ k
+                # there are 2 or 3 neighbors when exactly one of the four twos is set,
+                # then the cell lives if it has 3 or was already alive
+                rows[y] = (ones | rows[y]) & (x ^ z) & ~((ca & cb) | (cd & k))
+        self.generation += generations
+
+    def render(self, buffer, vx, vy, scale=1): # draws the board from cell vx,vy onwards into a 72x40 screen buffer, scale pixels per cell
+        cols = min(SCREEN_W//scale, self.width)
+        count = min(SCREEN_H//scale, self.height)
+        stride = (cols+7) >> 3
+        view = self._view
+        vmask = (1 << cols) - 1
+        w = self.width
+        for i in range(count):
+            row = self.rows[(vy+i) % self.height]
+            view[i*stride:(i+1)*stride] = (((row >> vx) | (row << (w-vx))) & vmask).to_bytes(stride, 'little')
+        _blit(buffer, view, stride, cols, count, (1, 2, 4, 8).index(scale))
+
+
+@micropython.viper
+def _blit(dst:ptr8, src:ptr8, stride:int, cols:int, count:int, shift:int): # packed rows to MONO_VLSB, each cell 1<<shift pixels square
+    for i in range(SCREEN_H*SCREEN_W//8):
+        dst[i] = 0
+    for y in range(count << shift):
+        line = (y >> shift)*stride
+        page = (y >> 3)*SCREEN_W
+        bit = 1 << (y & 7)
+        for x in range(cols << shift):
+            c = x >> shift
+            if src[line + (c >> 3)] & (1 << (c & 7)):
+                dst[page + x] |= bit
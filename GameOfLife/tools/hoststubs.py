@@ -0,0 +1,29 @@
+# GameOfLife host stand-ins
+#
+# The micropython module and the ptr8 builtin life.py uses.
+
+import builtins
+import os
+import sys
+
+GAME_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class MicroPython:
+    @staticmethod
+    def native(function):
+        return function
+
+    @staticmethod
+    def viper(function):
+        return function
+
+    @staticmethod
+    def const(value):
+        return value
+
+def install():
+    builtins.micropython = MicroPython
+    builtins.ptr8 = bytearray
+    sys.modules['micropython'] = MicroPython
+    sys.path.insert(0, GAME_PATH)
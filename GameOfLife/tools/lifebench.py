@@ -0,0 +1,175 @@
+# GameOfLife generation benchmark
+#
+# Times the bit-sliced engine in life.py against the cell-by-cell Simulate and
+# BuildBuffer it replaced, in generations per second, on the 36x20 board the
+# game starts with and on a 256x256 board. It also checks the engine against a
+# straightforward toroidal reference, generation by generation.
+#
+# Runs under CPython from the repository root, through the stand-ins in
+# hoststubs.py:
+#
+#   python3 GameOfLife/tools/lifebench.py [--gens 50] [--seed 1]
+#
+# or on a Thumby, after copying it to /Games/GameOfLife/tools:
+#
+#   import sys; sys.path.append('/Games/GameOfLife/tools'); import lifebench
+#
+# The old code wrapped the board as one long list (off the right edge onto the
+# next row, off the bottom onto the top row), not as a torus, so only its speed
+# is compared. Its BuildBuffer only drew a 72x40 screen of 2x2 cells, so at
+# 256x256 it is timed without drawing, while the engine still renders the
+# 72x40 view. Under CPython the viper blit is plain Python, so only the numbers
+# measured on the device say anything about real frame rates.
+
+import random
+import sys
+import time
+
+if sys.implementation.name == 'micropython':
+    sys.path.insert(0, '/Games/GameOfLife')
+    ticks_us = time.ticks_us
+    ticks_diff = time.ticks_diff
+else:
+    import hoststubs
+    hoststubs.install()
+    ticks_us = lambda: int(time.perf_counter() * 1000000)
+    ticks_diff = lambda a, b: a - b
+
+import life
+
+SIZES = ((36, 20, 2), (256, 256, 1)) # width, height, pixels per cell
+CHECK_GENS = 20
+
+
+#### The list-based code from before life.py, for comparison
+
+def legacySimulate(cells, wc, hc):
+    old_cells = cells.copy() # previous state of board used to generate next board
+
+    for row in range(hc): # remember rows go down, cols go across!
+        for col in range(wc):
+            c = col+(row*wc)
+            neighbors = [c-wc, c-wc-1, c-wc+1, c-1, c+1, c+wc, c+wc-1, c+wc+1] # all 8 neighbors
+
+            count = 0 # number of living neighbors
+            for n in neighbors: # we wrap around top-left/bottom-right, and left/right for funsies
+                if n >= len(cells):
+                    count += old_cells[n%len(cells)]
+                else:
+                    count += old_cells[n]
+
+            status = old_cells[c] # whether cell is alive or not
+
+            if status == 1: # game of life rules
+                if count < 2:
+                    cells[c] = 0
+                if count == 2 or count == 3:
+                    cells[c] = 1
+                if count > 3:
+                    cells[c] = 0
+            elif count == 3:
+                cells[c] = 1
+
+def legacyBuildBuffer(cells):
+    wb = 72//8
+    buf = bytearray() # will store our pixel data
+    gi=0 # index into cells array
+    for row in range(40):
+        if row%2 == 0:
+            for col in range(wb):
+                nb = 0b0
+                for i in range(4):
+                    nb |= (0b11*cells[gi]) << (i*2)
+                    gi+=1
+                buf.append(nb)
+        else:
+            buf.extend(buf[-wb:])
+    return buf
+
+
+#### Reference results, one cell at a time on a torus
+
+def referenceStep(cells, width, height):
+    result = []
+    for y in range(height):
+        for x in range(width):
+            count = 0
+            for dy in (-1, 0, 1):
+                for dx in (-1, 0, 1):
+                    if dx or dy:
+                        count += cells[(y+dy) % height * width + (x+dx) % width]
+            result.append(1 if count == 3 or (count == 2 and cells[y*width + x]) else 0)
+    return result
+
+def boardCells(board):
+    return [board.get(x, y) for y in range(board.height) for x in range(board.width)]
+
+
+def randomCells(rng, width, height):
+    cells = [0]*(width*height)
+    for i in range(len(cells)//6):
+        cells[rng.randint(0, len(cells)-1)] = 1
+    return cells
+
+def makeBoard(cells, width, height):
+    board = life.Board(width, height)
+    for i in range(len(cells)):
+        if cells[i]:
+            board.set(i % width, i // width)
+    return board
+
+def gensPerSecond(run, gens):
+    start = ticks_us()
+    run(gens)
+    return gens * 1000000 / max(ticks_diff(ticks_us(), start), 1)
+
+def main(gens=50, seed=1):
+    rng = random.Random(seed) if hasattr(random, 'Random') else random
+    screen = bytearray(72*40//8)
+    print("%-8s %-14s %12s %12s %8s  %s" % ("board", "engine", "old gen/s", "new gen/s", "speedup", "check"))
+    for width, height, scale in SIZES:
+        cells = randomCells(rng, width, height)
+
+        board = makeBoard(cells, width, height)
+        expected = list(cells)
+        check = "ok"
+        for g in range(CHECK_GENS):
+            board.step()
+            expected = referenceStep(expected, width, height)
+            if boardCells(board) != expected:
+                check = "MISMATCH at generation %d" % (g+1)
+                break
+
+        old = list(cells)
+        if width*height == 720:
+            def legacy(n):
+                for i in range(n):
+                    legacySimulate(old, width, height)
+                    legacyBuildBuffer(old)
+        else:
+            def legacy(n):
+                for i in range(n):
+                    legacySimulate(old, width, height)
+        # the old code takes a while on a big board, a few generations will do
+        oldRate = gensPerSecond(legacy, max(1, gens * 720 // (width*height)))
+
+        for skip in (1, 16):
+            board = makeBoard(cells, width, height)
+            def engine(n):
+                for i in range(n // skip):
+                    board.step(skip)
+                    board.render(screen, 0, 0, scale)
+            newRate = gensPerSecond(engine, gens * skip)
+            print("%-8s %-14s %12.1f %12.1f %7.1fx  %s" % (
+                "%dx%d" % (width, height), "step(%d)+render" % skip,
+                oldRate, newRate, newRate / oldRate, check))
+
+if sys.implementation.name == 'micropython':
+    main()
+else:
+    import argparse
+    parser = argparse.ArgumentParser(description="Benchmark the GameOfLife engine")
+    parser.add_argument("--gens", type=int, default=50, help="generations to time for each board")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    main(args.gens, args.seed)
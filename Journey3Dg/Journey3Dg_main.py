@@ -32,7 +32,7 @@ from math import sin, pi, sqrt
 from array import array
 from sys import path
 
-path.append("/Games/Journey3Dg")
+path.insert(0, "/Games/Journey3Dg")
 
 from ssd1306grey import SSD1306_SPI_Grey
 
@@ -17,14 +17,36 @@
 """
 
 import thumby
+import time
+from array import array
+
+W=const(72)
+H=const(40)
+UNKNOWN=const(0xFFFF) # escape count of a pixel that hasn't been worked out yet
+TILE=8 # size of the tiles of the first pass, a power of two
+BUDGET=25 # ms of rendering each frame, so the buttons keep working
 
 
 @micropython.viper
-def mandel(afix:int, bfix:int, niter:int) -> bool:
+def mandel(afix:int, bfix:int, niter:int) -> int:
+    # Returns the number of iterations before escaping, niter if it never does
+    # Inside the main cardioid or the period 2 bulb, with a margin as the
+    # fixed point iteration can escape right at their edges and the cusp
+    b2=(bfix*bfix)>>13
+    q=afix-2048
+    q2=((q*q)>>13)+b2
+    if q2>=64 and q2<=8192 and (q2*(q2+q))>>13<=(b2>>2)-16:
+        return niter
+    p=afix+8192
+    if ((p*p)>>13)+b2<=480:
+        return niter
     i=0
     x0=0
     y0=0
     term=4*8192
+    px=0 # point saved to look for a cycle, which never escapes
+    py=0
+    save=8
     while i<niter:
         x0_2=(x0*x0)>>13
         y0_2=(y0*y0)>>13
@@ -34,72 +56,200 @@ def mandel(afix:int, bfix:int, niter:int) -> bool:
         x0=x0_2-y0_2+afix
         y0=x0y0+x0y0+bfix
         i+=1
-    if i==niter:
-        return True
-    else:
-        return False
-        
-        
-w=thumby.display.width
-h=thumby.display.height
+        if x0==px and y0==py:
+            return niter
+        if i==save:
+            px=x0
+            py=y0
+            save+=save
+    return i
+
+
+@micropython.viper
+def _unknown(counts:ptr16, x:int, y:int, s:int) -> int:
+    n=0
+    for j in range(y, y+s):
+        for i in range(j*W+x, j*W+x+s):
+            if counts[i]==UNKNOWN:
+                n+=1
+    return n
+
+
+@micropython.viper
+def _fill(counts:ptr16, x:int, y:int, s:int, count:int):
+    for j in range(y, y+s):
+        for i in range(j*W+x, j*W+x+s):
+            if counts[i]==UNKNOWN:
+                counts[i]=count
+
+
+@micropython.viper
+def _draw(buf:ptr8, counts:ptr16, x:int, y:int, w:int, h:int, niter:int, guess:int):
+    # Draws escaped pixels white, using guess for the unknown ones
+    for j in range(y, y+h):
+        page=(j>>3)*W
+        bit=1<<(j&7)
+        for i in range(x, x+w):
+            c=counts[j*W+i]
+            if c==UNKNOWN:
+                c=guess
+            if c<niter:
+                buf[page+i]|=bit
+            else:
+                buf[page+i]&=0xFF^bit
+
+
+@micropython.viper
+def _shift(dst:ptr16, src:ptr16, dx:int, dy:int):
+    # Moves the counts in src by dx,dy pixels into dst, the uncovered ones unknown
+    for y in range(H):
+        sy=y-dy
+        for x in range(W):
+            sx=x-dx
+            if sx>=0 and sx<W and sy>=0 and sy<H:
+                dst[y*W+x]=src[sy*W+sx]
+            else:
+                dst[y*W+x]=UNKNOWN
+
 
-thumby.display.setFPS(60)
+class Renderer:
+    # Renders a frame a bit at a time. The first pass samples the corners of
+    # TILE sized tiles; tiles whose corners (and the middles of their edges)
+    # agree are filled in, the others are split in four and refined in later
+    # passes. Escape counts are kept per pixel, so a pan only has to work out
+    # the newly uncovered pixels.
+
+    def __init__(self, buf, niter):
+        self.buf=buf
+        self.niter=niter
+        self.counts=array('H', [UNKNOWN]*(W*H))
+        self.spare=array('H', self.counts)
+        self.ax=array('i', [0]*W) # fixed point coordinates of each column and row
+        self.by=array('i', [0]*H)
+        self.tiles=[]
+        self.next=0
+        self.samples=0
+
+    def reset(self, zoom, ox, oy):
+        # Views zoom wide around ox,oy, in pixels, forgetting all counts
+        for i in range(W*H):
+            self.counts[i]=UNKNOWN
+        self._start(zoom, ox, oy)
+
+    def pan(self, dx, dy):
+        # Moves the view by whole pixels, keeping the counts still on screen
+        _shift(self.spare, self.counts, -dx, -dy)
+        self.counts, self.spare = self.spare, self.counts
+        self._start(self.zoom, self.ox+dx, self.oy+dy)
+
+    def _start(self, zoom, ox, oy):
+        self.zoom=zoom
+        self.ox=ox
+        self.oy=oy
+        dx=zoom/W
+        dy=zoom/H
+        for x in range(W):
+            self.ax[x]=int((ox+x-W//2)*dx*8192.)
+        for y in range(H):
+            self.by[y]=int((oy+y-H//2)*dy*8192.)
+        _draw(self.buf, self.counts, 0, 0, W, H, self.niter, self.niter)
+        self.tiles=[(x, y, TILE) for y in range(0, H, TILE) for x in range(0, W, TILE)]
+        self.next=0
+        self.firstPass=len(self.tiles) # tiles to go through before the whole frame has been seen
+        self.samples=0
+        self.busy=0
+        self.firstBusy=0
+
+    def work(self, ms):
+        # Refines the frame for up to about ms milliseconds, returns True when it's finished
+        start=time.ticks_ms()
+        tiles=self.tiles
+        while self.next<len(tiles):
+            x, y, s = tiles[self.next]
+            self.next+=1
+            self._tile(x, y, s)
+            if self.next==self.firstPass:
+                self.firstBusy=self.busy+time.ticks_diff(time.ticks_ms(), start)
+            if time.ticks_diff(time.ticks_ms(), start)>=ms:
+                break
+        self.busy+=time.ticks_diff(time.ticks_ms(), start)
+        return self.next==len(tiles)
+
+    def _sample(self, x, y):
+        i=y*W+x
+        c=self.counts[i]
+        if c==UNKNOWN:
+            c=mandel(self.ax[x], self.by[y], self.niter)
+            self.counts[i]=c
+            self.samples+=1
+        return c
+
+    def _tile(self, x, y, s):
+        counts=self.counts
+        if not _unknown(counts, x, y, s):
+            return
+        e=s-1
+        c=self._sample(x, y)
+        c1=self._sample(x+e, y)
+        c2=self._sample(x, y+e)
+        c3=self._sample(x+e, y+e)
+        h=s>>1
+        if c==c1 and c==c2 and c==c3 and (s<=2 or
+                # the middles of the edges too, or thin filaments between corners get lost
+                c==self._sample(x+h, y)==self._sample(x, y+h)==self._sample(x+e, y+h)==self._sample(x+h, y+e)):
+            _fill(counts, x, y, s, c)
+        if s<=2 or not _unknown(counts, x, y, s):
+            _draw(self.buf, counts, x, y, s, s, self.niter, c)
+            return
+        for sy in (y, y+h):
+            for sx in (x, x+h):
+                # show the quarter in the colour of its corner until it's refined
+                _draw(self.buf, counts, sx, sy, h, h, self.niter, self._sample(sx, sy))
+                self.tiles.append((sx, sy, h))
+
+
+# Main loop
+thumby.display.setFPS(30)
 
 thumby.display.fill(0)
 thumby.display.update()
 
 
 zoom=4.
-a=0
-b=0
 niter=500
 
-changed=True
+renderer=Renderer(thumby.display.display.buffer, niter)
+renderer.reset(zoom, 0., 0.)
+rendering=True
 
 while True:
-    if changed:
-        thumby.display.fill(0)
-        thumby.display.update()
-
-        dx=zoom/w
-        dy=zoom/h
-    
-        for y in range(h):
-            for x in range(w):
-                a0=-0.5*zoom+a+x*dx
-                b0=-0.5*zoom+b+y*dy
-                if mandel(int(a0*8192.),int(b0*8192.),int(niter)):
-                    thumby.display.setPixel(x,y,0)
-                else:
-                    thumby.display.setPixel(x,y,1)
-            thumby.display.update()
-        changed=False
-        
-        
     if thumby.buttonA.justPressed():
         zoom*=0.25
-        changed=True
+        renderer.reset(zoom, renderer.ox*4., renderer.oy*4.)
+        rendering=True
     
     if thumby.buttonB.justPressed():
         zoom*=4.
-        changed=True
+        renderer.reset(zoom, renderer.ox*0.25, renderer.oy*0.25)
+        rendering=True
         
-    if thumby.buttonL.justPressed():
-        a-=0.25*zoom
-        changed=True
+    if thumby.buttonL.justPressed(): # pans are a quarter of the screen
+        renderer.pan(-W//4, 0)
+        rendering=True
     
     if thumby.buttonR.justPressed():
-        a+=0.25*zoom
-        changed=True
+        renderer.pan(W//4, 0)
+        rendering=True
     
     if thumby.buttonU.justPressed():
-        b-=0.25*zoom
-        changed=True
+        renderer.pan(0, -H//4)
+        rendering=True
     
     if thumby.buttonD.justPressed():
-        b+=0.25*zoom
-        changed=True
+        renderer.pan(0, H//4)
+        rendering=True
     
-
-        
-
+    if rendering and renderer.work(BUDGET):
+        rendering=False
+        print("[Mandelbrot] First pass", renderer.firstBusy, "ms, done in", renderer.busy, "ms,", renderer.samples, "pixels iterated")
+    thumby.display.update()
@@ -0,0 +1,31 @@
+# Mandelbrot host stand-ins
+#
+# The micropython decorators, the const, ptr8 and ptr16 builtins, an empty
+# thumby module, and time.ticks_ms/ticks_diff with fractions of a ms.
+
+import builtins
+import sys
+import time
+import types
+
+
+class MicroPython:
+    @staticmethod
+    def native(function):
+        return function
+
+    @staticmethod
+    def viper(function):
+        return function
+
+# Fractions of a ms, so the renderer's own timings are fine enough here
+def ticks_ms():
+    return time.perf_counter() * 1000
+
+def install():
+    builtins.micropython = MicroPython
+    builtins.const = lambda value: value
+    builtins.ptr8 = builtins.ptr16 = memoryview
+    sys.modules['thumby'] = types.SimpleNamespace()
+    time.ticks_ms = ticks_ms
+    time.ticks_diff = lambda a, b: a - b
@@ -0,0 +1,135 @@
+# Mandelbrot render benchmark
+#
+# Renders a few views with the progressive Renderer in Mandelbrot.py and with
+# the per-pixel loop it replaced, and reports the time to the end of the first
+# pass (the first frame with the whole view on screen), the time to the
+# finished frame, and how many pixels were iterated. It also pans each view a
+# quarter screen right and down, to show what the escape count cache saves,
+# and checks the finished frames against the old loop's. The speedup is the
+# old loop's time over the first pass's.
+#
+# usage: python3 tools/mandelbench.py [--niter 500] [--budget 25]
+#
+# The renderer is loaded unchanged from Mandelbrot.py (everything above its
+# main loop), through the stand-ins in hoststubs.py, which also give
+# time.ticks_ms fractions of a ms. --budget is the ms of rendering per frame,
+# as in the game, which only matters for how finely the first pass is timed.
+# Under CPython viper code is plain Python, so only the ratios say much about
+# the Thumby, where the game prints its own timings after each frame.
+
+import argparse
+import os
+import sys
+import time
+
+import hoststubs
+
+MANDELBROT_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# zoom, centre in pixels: the whole set, then views three zooms in (the
+# deepest the 13 bit fixed point allows) around the edge of the set, where
+# much of the view is inside it and the old loop ran all 500 iterations
+VIEWS = (
+    ("whole set", 4., 0., 0.),
+    ("seahorse", 4./64, -864., 64.),
+    ("cusp", 4./64, 288., 0.),
+    ("spiral", 4./64, -115., 544.),
+    ("bulbs", 4./64, -1440., 0.),
+)
+
+
+#### Loading
+
+def loadRenderer():
+    hoststubs.install()
+    with open(os.path.join(MANDELBROT_PATH, 'Mandelbrot.py'), encoding='utf-8') as f:
+        source = f.read()
+    source = source[:source.index('# Main loop')]
+    namespace = {'__name__': 'Mandelbrot'}
+    exec(compile(source, 'Mandelbrot.py', 'exec'), namespace)
+    return namespace
+
+
+#### The per-pixel loop from before the Renderer, for comparison
+
+def legacyMandel(afix, bfix, niter):
+    i=0
+    x0=0
+    y0=0
+    term=4*8192
+    while i<niter:
+        x0_2=(x0*x0)>>13
+        y0_2=(y0*y0)>>13
+        x0y0=(x0*y0)>>13
+        if x0_2+y0_2>term:
+            break
+        x0=x0_2-y0_2+afix
+        y0=x0y0+x0y0+bfix
+        i+=1
+    if i==niter:
+        return True
+    else:
+        return False
+
+def legacyRender(zoom, a, b, niter, w=72, h=40):
+    pixels = bytearray(w*h)
+    dx=zoom/w
+    dy=zoom/h
+    for y in range(h):
+        for x in range(w):
+            a0=-0.5*zoom+a+x*dx
+            b0=-0.5*zoom+b+y*dy
+            pixels[y*w+x] = 0 if legacyMandel(int(a0*8192.),int(b0*8192.),int(niter)) else 1
+    return pixels
+
+
+def screenPixels(buf, w=72, h=40):
+    return bytearray((buf[(y >> 3)*w + x] >> (y & 7)) & 1 for y in range(h) for x in range(w))
+
+def render(renderer, budget):
+    while not renderer.work(budget):
+        pass
+    return renderer.firstBusy/1000, renderer.busy/1000
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the Mandelbrot renderer")
+    parser.add_argument("--niter", type=int, default=500)
+    parser.add_argument("--budget", type=int, default=25, help="ms of rendering per frame")
+    args = parser.parse_args()
+
+    m = loadRenderer()
+    W, H = m['W'], m['H']
+    buf = bytearray(W*H//8)
+    renderer = m['Renderer'](buf, args.niter)
+    print("%-10s %-6s %10s %10s %10s %8s %8s  %s" % ("view", "", "old ms", "first ms",
+        "done ms", "speedup", "pixels", "check"))
+    for name, zoom, ox, oy in VIEWS:
+        start = time.perf_counter()
+        expected = legacyRender(zoom, ox*zoom/W, oy*zoom/H, args.niter)
+        old = time.perf_counter() - start
+
+        renderer.reset(zoom, ox, oy)
+        first, total = render(renderer, args.budget)
+        got = screenPixels(buf)
+        wrong = sum(1 for a, b in zip(got, expected) if a != b)
+        check = "ok" if not wrong else "%d pixels differ" % wrong
+        print("%-10s %-6s %10.0f %10.0f %10.0f %7.1fx %8d  %s" % (name, "reset", old*1000,
+            first*1000, total*1000, old/first, renderer.samples, check))
+
+        for dx, dy in ((W//4, 0), (0, H//4)):
+            ox += dx
+            oy += dy
+            start = time.perf_counter()
+            expected = legacyRender(zoom, ox*zoom/W, oy*zoom/H, args.niter)
+            old = time.perf_counter() - start
+            renderer.pan(dx, dy)
+            first, total = render(renderer, args.budget)
+            got = screenPixels(buf)
+            wrong = sum(1 for a, b in zip(got, expected) if a != b)
+            check = "ok" if not wrong else "%d pixels differ" % wrong
+            print("%-10s %-6s %10.0f %10.0f %10.0f %7.1fx %8d  %s" % ("", "pan", old*1000,
+                first*1000, total*1000, old/first, renderer.samples, check))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
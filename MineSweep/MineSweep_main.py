@@ -1,12 +1,14 @@
 GAME_NAME="MineSweep"
 GAME_DIR=f"/Games/{GAME_NAME}"
 
+import errno
 import io
 import os
 import random
 import thumby
-# import thumbyGrayscale
-thumbyGrayscale=__import__(GAME_DIR+"/lib/thumbyGrayscale")
+from sys import path
+path.insert(0,GAME_DIR+"/lib")
+import thumbyGrayscale
 import time
 
 thumby2=__import__(GAME_DIR+"/lib/thumby2")
@@ -360,6 +362,7 @@ class Game:
             else:
                 self.numFlags+=1
 
+    # Version 1 saves, still loaded: the board as one big base 5 number.
     B_SERIALISATION=[
         0,
         F_MINE,
@@ -369,6 +372,11 @@ class Game:
     ]
     BITS_PER_POS=2.3219281 # math.log(len(B_SERIALISATION))/math.log(2)
 
+    # Version 2 saves: width, height, mines (2 bytes), inited, pos, then the
+    # mine, flag and open bitmaps, one bit per field in board order, low bit
+    # first.
+    B_BITMAPS=[F_MINE,F_FLAG,F_OPEN]
+
     @staticmethod
     def deserialise(bytes):
         inp=io.BytesIO(bytes)
@@ -393,25 +401,70 @@ class Game:
                     y,x=divmod(i,g.size[0])
                     g.__placeMine((x,y))
             return g
+        elif ver==2:
+            head=inp.read(7)
+            g=Game({"size":(head[0],head[1]),"mines":head[2]<<8|head[3]})
+            g.bInited=head[4]
+            g.pos=(head[5],head[6])
+            b=g.b
+            mapLen=(len(b)+7)//8
+            for flag in Game.B_BITMAPS:
+                bits=inp.read(mapLen)
+                if len(bits)<mapLen:
+                    raise ValueError("Truncated board")
+                for i in range(len(b)):
+                    if bits[i>>3]&(1<<(i&7)):
+                        b[i]|=flag
+            for f in b:
+                if f&(F_OPEN|F_MINE)==F_OPEN:
+                    g.safeLeft-=1
+                if f&F_FLAG!=0:
+                    g.numFlags+=1
+            g.__countMines()
+            return g
         else:
             return None
 
+    def __countMines(self):
+        # Sets every field's number from the mines around it, summing the mines
+        # in each row's 3-wide windows, then three rows of those.
+        w,h=self.size
+        b=self.b
+        rowSums=bytearray(len(b))
+        for y in range(h):
+            row=y*w
+            left=0
+            mid=b[row]&F_MINE!=0
+            for x in range(w):
+                right=x+1<w and b[row+x+1]&F_MINE!=0
+                rowSums[row+x]=left+mid+right
+                left,mid=mid,right
+        for i in range(len(b)):
+            num=rowSums[i]-(b[i]&F_MINE!=0)
+            if i>=w:
+                num+=rowSums[i-w]
+            if i+w<len(b):
+                num+=rowSums[i+w]
+            b[i]=b[i]&~F_NUM_MASK|num
+
     def serialise(self):
         out=bytearray()
-        out.append(1)
+        out.append(2)
         out.append(self.size[0])
         out.append(self.size[1])
-        out.append(self.mines)
+        out.append(self.mines>>8)
+        out.append(self.mines&0xFF)
         out.append(self.bInited)
         out.append(self.pos[0])
         out.append(self.pos[1])
-        boardVal=0
-        mask=F_MINE|F_FLAG|F_OPEN
-        for b in self.b:
-            boardVal*=len(Game.B_SERIALISATION)
-            boardVal+=Game.B_SERIALISATION.index(b&mask)
-        numBits=int(len(self.b)*Game.BITS_PER_POS+1)
-        out.extend(boardVal.to_bytes((numBits+7)//8,"big"))
+        b=self.b
+        mapLen=(len(b)+7)//8
+        for flag in Game.B_BITMAPS:
+            bits=bytearray(mapLen)
+            for i in range(len(b)):
+                if b[i]&flag!=0:
+                    bits[i>>3]|=1<<(i&7)
+            out.extend(bits)
         return out
 
 def drawLogo():
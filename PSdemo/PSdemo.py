@@ -22,45 +22,19 @@ except ImportError:
 from time import sleep_ms, sleep_us
 from _thread import start_new_thread #only for oscilloscope
 import polysynth
-import midi
+import songs
 import logo
 
 
 logo.start() #hide the loading time with the logo
 machine.freq(220000000) #overclock while loading
 
+#both songs are compiled to event files (see tools/midicompile.py), so the sequencer streams them without parsing MIDI or allocating channels as it plays.
 print("\n*** Song 1 ***")
-#there isn't enough memory to preload the entire song anymore, so it must be opened as a stream.
-song1 = midi.loadstream(open("/Games/PSdemo/moontheme.mid", "rb"), reserve={0:[0,1,8], 1:[2], 2:[3], 3:[4,5,6]}, callbacks={7:polysynth.enabled})
-
-instruments1 = {
-#0:polysynth.instrument(), #square 1
-1:polysynth.instrument(vibspeed=7.5, vibamount=0.4), #square 1 vibrato
-#2:polysynth.instrument(), #square 2
-#3:polysynth.instrument(), #triangle
-4:polysynth.instrument(detune=57), #drum low
-5:polysynth.instrument(detune=95), #drum mid
-6:polysynth.instrument(detune=150), #drum high
-#7:polysynth.instrument(), #set channel count callback
-8:polysynth.instrument(rise=11.25), #square 1 pitch bend - rises by 15 notes over 1.33 seconds. Using rise for now in lieu of proper MIDI pitch bend.
-}
+song1 = polysynth.EventFile("/Games/PSdemo/moontheme.pse", callbacks=songs.moontheme["callbacks"])
 
 print("\n*** Song 2 ***")
-#this song can be entirely loaded - this will reduce the risk of stuttering.
-song2 = midi.load(open("/Games/PSdemo/evergreen.mid", "rb"))
-
-instruments2 = {
-0:polysynth.instrument(phaselock=True), #main lead
-1:polysynth.instrument(vibspeed=6, vibamount=0.25), #main lead vibrato
-2:polysynth.instrument(phaselock=True), #main lead double
-3:polysynth.instrument(vibspeed=6, vibamount=0.25), #main lead vibrato double
-4:polysynth.instrument(phaselock=True), #bass
-5:polysynth.instrument(phaselock=True), #bass double
-6:polysynth.instrument(detune=0.02), #channel 2 backing
-7:polysynth.instrument(detune=-0.06), #channel 4 backing
-8:polysynth.instrument(detune=0.1), #main lead echo
-9:polysynth.instrument(detune=0.1, vibspeed=6, vibamount=0.25), #main lead echo vibrato
-}
+song2 = polysynth.EventFile("/Games/PSdemo/evergreen.pse")
 
 machine.freq(125000000) #back to normal speed
 
@@ -232,15 +206,15 @@ for i in range(60):
     thumby.display.update()
 
 #set up for first song
-polysynth.configure([polysynth.SQUARE, polysynth.SQUARE, polysynth.SQUARE, polysynth.NOISE])
-polysynth.enabled(4) #this has to be specified since streams can't know how many channels will be needed
-polysynth.playstream(song1, instruments1) #play the first song
+polysynth.configure(songs.moontheme["types"])
+polysynth.playstream(song1, songs.moontheme["instruments"]) #play the first song
 
 while polysynth.playing:
     wavescreen()
     thumby.display.update()
     if thumby.buttonA.justPressed(): break
 polysynth.stop()
+print(f"[polysynth] Slowest sequencer tick: {polysynth.maxticktime} us")
 
 for i in range(8):
     wavescreen()
@@ -249,14 +223,15 @@ sleep_ms(2000)
 
 
 #set up for second song
-polysynth.configure()
-polysynth.play(song2, instruments2) #play the second song
+polysynth.configure(songs.evergreen["types"])
+polysynth.playstream(song2, songs.evergreen["instruments"]) #play the second song
 
 while polysynth.playing:
     wavescreen()
     thumby.display.update()
     if thumby.buttonA.justPressed(): break
 polysynth.stop()
+print(f"[polysynth] Slowest sequencer tick: {polysynth.maxticktime} us")
 
 for i in range(8):
     wavescreen()
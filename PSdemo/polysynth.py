@@ -2,6 +2,8 @@ import machine
 import rp2
 import time
 import math
+import struct
+from array import array
 
 unusedpins = [7, 8, 9, 10, 11, 21, 22] #do not change or reorder these - their relative positions are hardcoded in pio_mixer.
 commpins = [machine.Pin(i, machine.Pin.OUT) for i in unusedpins] #these pins are for communication between PIO cores. Each one will have one audio channel on it for the main core to mix together.
@@ -177,6 +179,8 @@ def setnote(chan, pitch): #set a channel's pitch to a specific note, according t
 
 
 timer = machine.Timer()
+ticktime = 0 #how long the last sequencer tick took in microseconds
+maxticktime = 0 #the longest tick since the song started. Tick jitter shows up as this
 stream = None
 eventstart = 0
 playing = False
@@ -214,8 +218,8 @@ def makepersist(chan, pitch, ins, starttime):
 #@micropython.native
 def audiotick(dummy):
     global playing, eventstart, notes, stream
+    starttick = time.ticks_us()
     stop = True
-    lockedwrites = [] #phase-locked changes - each is (channel, value). This should probably be changed to have one queue per channel to avoid multiple notes per tick messing up timing.
     
     if stream != None and stream.nextevent != None: #if a song needs playing
         stop = False
@@ -237,13 +241,13 @@ def audiotick(dummy):
                         instruments[event[2]] = makepersist(event[2], event[3], ins, event[0]+eventstart)
                     
                     elif ins[1] != None: #has specified phase offset
-                        lockedwrites.append((event[2], 0)) #clear current phase
-                        lockedwrites.append((event[2], int(halfcycle*(1.0+ins[1])) - 1)) #delay to get intended phase amount
-                        lockedwrites.append((event[2], halfcycle - 1)) #set intended pitch
+                        lockwrite(event[2], 0) #clear current phase
+                        lockwrite(event[2], int(halfcycle*(1.0+ins[1])) - 1) #delay to get intended phase amount
+                        lockwrite(event[2], halfcycle - 1) #set intended pitch
                         
                     elif ins[0]: #phase locked
-                        lockedwrites.append((event[2], 0)) #clear current phase
-                        lockedwrites.append((event[2], halfcycle - 1)) #set intended pitch
+                        lockwrite(event[2], 0) #clear current phase
+                        lockwrite(event[2], halfcycle - 1) #set intended pitch
                     
                     elif channels[event[2]].tx_fifo() < 4: #not phase locked
                         channels[event[2]].put(halfcycle-1)
@@ -266,6 +270,69 @@ def audiotick(dummy):
             if stream.reset():
                 eventstart = time.ticks_ms()
     
+    endtick(stop, starttick)
+
+
+#compiled event records (see EventFile) are 4 words:
+#timestamp_ms, kind<<24 | channel<<16 | midiPitch<<8 | instrumentNum, value, phaseValue
+#kinds 0, 2 and 3 are as above (the channel count is in midiPitch, callbacks get midiPitch), note ons are split by how they start:
+#1 - write value, the channel's half cycle count - 1
+#4 - phase locked, clear the phase and write value
+#5 - phase offset, clear the phase, write phaseValue, then value
+#6 - persistent (vibrato, rise or duration), look the instrument up to start it
+#@micropython.native
+def eventtick(dummy): #audiotick for EventFile streams, which only has to copy precomputed values to the channels
+    global eventstart
+    starttick = time.ticks_us()
+    stop = True
+    
+    if stream != None and stream.nextevent != None:
+        stop = False
+        block = stream.block
+        now = time.ticks_ms()-eventstart
+        pos = stream.nextevent
+        while pos != None and block[pos] < now:
+            word = block[pos+1]
+            kind = word >> 24
+            chan = (word >> 16) & 255
+            if kind == 0: #note off
+                notes[chan] = None
+                instruments[chan] = None
+                if chan < len(channels) and channels[chan].tx_fifo() < 4:
+                    channels[chan].put(0)
+            
+            elif kind == 2: #set channel count
+                if setenabled:
+                    enabled((word >> 8) & 255)
+            
+            elif kind == 3: #run callback
+                stream.callbacks[word & 255]((word >> 8) & 255)
+            
+            else: #note on
+                notes[chan] = (word >> 8) & 255
+                instruments[chan] = None
+                if kind == 1:
+                    if chan < len(channels) and channels[chan].tx_fifo() < 4:
+                        channels[chan].put(block[pos+2])
+                elif kind == 6:
+                    instruments[chan] = makepersist(chan, (word >> 8) & 255, ilist[word & 255], block[pos]+eventstart)
+                else:
+                    lockwrite(chan, 0)
+                    if kind == 5:
+                        lockwrite(chan, block[pos+3])
+                    lockwrite(chan, block[pos+2])
+            
+            pos = stream.readevent()
+        
+        if pos == None and autoreset:
+            if stream.reset():
+                eventstart = time.ticks_ms()
+    
+    endtick(stop, starttick)
+
+
+def endtick(stop, starttick): #the rest of a tick: update persistent instruments, make phase-locked writes, stop when done and time the tick
+    global notes, stream, playing, ticktime, maxticktime
     for i in range(7):
         if instruments[i] != None: #if an instrument needs updating
             stop = False
@@ -284,12 +351,12 @@ def audiotick(dummy):
             if ins[6]: pitch += (time.ticks_ms()-ins[4])/1000 * ins[6]
             halfcycle = int(tickfreq // (2*czero*twelveroottwo**(pitch)))
             if ins[0]: #phase locked
-                lockedwrites.append((ins[5], halfcycle-1))
+                lockwrite(ins[5], halfcycle-1)
             elif channels[ins[5]].tx_fifo() < 4: #not phase locked
                 channels[ins[5]].put(halfcycle - 1)
     
-    if len(lockedwrites):
-        fastwrite([(channels[i[0]].tx_fifo, channels[i[0]].put, i[1]) for i in lockedwrites])
+    if lockcount:
+        fastwrite()
     
     if stop:
         timer.deinit()
@@ -297,19 +364,40 @@ def audiotick(dummy):
         stream = None
         playing = False
         #print("Timer stopped")
+    
+    ticktime = time.ticks_diff(time.ticks_us(), starttick)
+    if ticktime > maxticktime: maxticktime = ticktime
+
+
+#phase-locked changes, queued in preallocated buffers so ticks don't allocate. This should probably be changed to have one queue per channel to avoid multiple notes per tick messing up timing.
+lockchannels = bytearray(64)
+lockvalues = array('I', [0 for i in range(64)])
+lockcount = 0
+
+def lockwrite(chan, value):
+    global lockcount
+    if lockcount < len(lockchannels):
+        lockchannels[lockcount] = chan
+        lockvalues[lockcount] = value
+        lockcount += 1
+    else:
+        print("[polysynth] Warning: too many phase-locked events in one tick")
 
 
 @micropython.native
-def fastwrite(events):
+def fastwrite():
+    global lockcount
     mixwrite = synthcore.put #cache these in local variables for slightly better speed
     cc = channelcount
     mixwrite(0) #disable wavegens
-    for i in events: #each is (core.tx_fifo, core.put, num)
-        if i[0]() < 4:
-            i[1](i[2])
+    for i in range(lockcount):
+        chan = channels[lockchannels[i]]
+        if chan.tx_fifo() < 4:
+            chan.put(lockvalues[i])
         else:
             print("[polysynth] Warning: could not write all phase-locked events")
     mixwrite(cc) #enable wavegens
+    lockcount = 0
 
 
 class StreamWrapper: #turn a list of events into a stream
@@ -334,8 +422,43 @@ class StreamWrapper: #turn a list of events into a stream
         return self.nextevent
 
 
+blockevents = 32 #how many events an EventFile reads from flash at a time
+class EventFile: #stream a song compiled by tools/midicompile.py, with channels and pitches already worked out
+    def __init__(self, path, callbacks={}): #callbacks is a dict of {instrumentNum:func}, as given to the compiler
+        self.file = open(path, "rb")
+        head = self.file.read(12)
+        if not head[:4] == b"PSE\x01":
+            print("[polysynth] Error loading song: not a version 1 event file.")
+        self.clock, self.count = struct.unpack("<II", head[4:])
+        self.callbacks = callbacks
+        self.block = array('I', bytes(blockevents*16))
+        self.reset()
+    
+    def reset(self):
+        self.file.seek(12)
+        self.left = self.count
+        self.end = 0
+        self.nextevent = -4
+        self.readevent()
+        return True
+    
+    def readevent(self): #nextevent is the position of the next event in block, or None at the end
+        pos = self.nextevent + 4
+        if pos >= self.end:
+            if not self.left:
+                self.nextevent = None
+                return None
+            self.file.readinto(self.block)
+            n = min(self.left, blockevents)
+            self.left -= n
+            self.end = n*4
+            pos = 0
+        self.nextevent = pos
+        return pos
+
+
 def play(song, ins={}, autoenable=True, loop=False): #song events, instruments, whether or not to automatically set/change the channel count
-    global stream, eventstart, playing, instruments, ilist, setenabled, autoreset
+    global stream, eventstart, playing, instruments, ilist, setenabled, autoreset, maxticktime
     stream = StreamWrapper(song)
     playing = True
     autoreset = loop
@@ -343,11 +466,12 @@ def play(song, ins={}, autoenable=True, loop=False): #song events, instruments,
     ilist = ins
     setenabled = autoenable
     eventstart = time.ticks_ms()
+    maxticktime = 0
     timer.init(freq=50, mode=machine.Timer.PERIODIC, callback=audiotick)
 
 
-def playstream(song, ins={}, autoenable=True, loop=False): #song events, instruments, whether or not to automatically set/change the channel count
-    global stream, eventstart, playing, instruments, ilist, setenabled, autoreset
+def playstream(song, ins={}, autoenable=True, loop=False): #song stream (a MappedStream or an EventFile), instruments, whether or not to automatically set/change the channel count
+    global stream, eventstart, playing, instruments, ilist, setenabled, autoreset, maxticktime
     stream = song
     playing = True
     autoreset = loop
@@ -355,7 +479,13 @@ def playstream(song, ins={}, autoenable=True, loop=False): #song events, instrum
     ilist = ins
     setenabled = autoenable
     eventstart = time.ticks_ms()
-    timer.init(freq=50, mode=machine.Timer.PERIODIC, callback=audiotick)
+    maxticktime = 0
+    if isinstance(song, EventFile):
+        if song.clock != tickfreq:
+            print(f"[polysynth] Warning: song was compiled for a {song.clock*8} Hz clock, pitches will be off")
+        timer.init(freq=50, mode=machine.Timer.PERIODIC, callback=eventtick)
+    else:
+        timer.init(freq=50, mode=machine.Timer.PERIODIC, callback=audiotick)
 
 
 def playnote(chan, pitch, ins=None):
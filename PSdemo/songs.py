@@ -0,0 +1,38 @@
+#Settings for each song, shared by PSdemo.py and tools/midicompile.py, which bakes the channel mapping and pitches into the song's event file.
+#Each has midi.loadstream's keyword arguments (reserve, callbacks, mute, solo, automap) plus the channel types and instruments it's played with.
+#Recompile the song after changing anything here: python3 tools/midicompile.py moontheme
+import polysynth
+
+
+moontheme = {
+"types": [polysynth.SQUARE, polysynth.SQUARE, polysynth.SQUARE, polysynth.NOISE],
+"reserve": {0:[0,1,8], 1:[2], 2:[3], 3:[4,5,6]},
+"callbacks": {7:polysynth.enabled},
+"instruments": {
+#0:polysynth.instrument(), #square 1
+1:polysynth.instrument(vibspeed=7.5, vibamount=0.4), #square 1 vibrato
+#2:polysynth.instrument(), #square 2
+#3:polysynth.instrument(), #triangle
+4:polysynth.instrument(detune=57), #drum low
+5:polysynth.instrument(detune=95), #drum mid
+6:polysynth.instrument(detune=150), #drum high
+#7:polysynth.instrument(), #set channel count callback
+8:polysynth.instrument(rise=11.25), #square 1 pitch bend - rises by 15 notes over 1.33 seconds. Using rise for now in lieu of proper MIDI pitch bend.
+},
+}
+
+evergreen = {
+"types": None,
+"instruments": {
+0:polysynth.instrument(phaselock=True), #main lead
+1:polysynth.instrument(vibspeed=6, vibamount=0.25), #main lead vibrato
+2:polysynth.instrument(phaselock=True), #main lead double
+3:polysynth.instrument(vibspeed=6, vibamount=0.25), #main lead vibrato double
+4:polysynth.instrument(phaselock=True), #bass
+5:polysynth.instrument(phaselock=True), #bass double
+6:polysynth.instrument(detune=0.02), #channel 2 backing
+7:polysynth.instrument(detune=-0.06), #channel 4 backing
+8:polysynth.instrument(detune=0.1), #main lead echo
+9:polysynth.instrument(detune=0.1, vibspeed=6, vibamount=0.25), #main lead echo vibrato
+},
+}
@@ -0,0 +1,79 @@
+# PSdemo host stand-ins
+#
+# A virtual clock, machine.Pin and machine.Timer on it, rp2.StateMachine that
+# logs what is written to it, and the micropython module and const builtin,
+# as polysynth uses them.
+
+import builtins
+import os
+import sys
+import time
+import types
+
+PSDEMO_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class Clock:
+    def __init__(self):
+        self.ms = 0
+
+    def ticks_ms(self):
+        return self.ms
+
+    def ticks_us(self):
+        return self.ms * 1000
+
+    def ticks_diff(self, a, b):
+        return a - b
+
+class Timer:
+    PERIODIC = 1
+
+    def __init__(self, *args):
+        self.callback = None
+
+    def init(self, freq=None, mode=None, callback=None):
+        self.callback = callback
+
+    def deinit(self):
+        self.callback = None
+
+# Records every write to a channel or the mixer, with the tick it was made on
+class StateMachine:
+    log = []
+    tick = 0
+
+    def __init__(self, number, program, **kwargs):
+        self.number = number
+
+    def put(self, value):
+        StateMachine.log.append((StateMachine.tick, self.number, value & 0xFFFFFFFF))
+
+    def tx_fifo(self):
+        return 0
+
+    def active(self, value):
+        pass
+
+class Pin:
+    OUT = IN = 0
+
+    def __init__(self, *args):
+        pass
+
+class MicroPython:
+    @staticmethod
+    def native(function):
+        return function
+
+def install(clock, cpu):
+    builtins.micropython = MicroPython
+    builtins.const = lambda value: value
+    for name in ('ticks_ms', 'ticks_us', 'ticks_diff'):
+        setattr(time, name, getattr(clock, name))
+    sys.modules['micropython'] = MicroPython
+    sys.modules['machine'] = types.SimpleNamespace(Pin=Pin, Timer=Timer, freq=lambda *args: cpu)
+    sys.modules['rp2'] = types.SimpleNamespace(StateMachine=StateMachine,
+        asm_pio=lambda **kwargs: lambda program: program,
+        PIO=types.SimpleNamespace(OUT_LOW=0, SHIFT_LEFT=0, SHIFT_RIGHT=1))
+    sys.path.insert(0, PSDEMO_PATH)
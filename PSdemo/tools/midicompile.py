@@ -0,0 +1,161 @@
+# PSdemo MIDI event compiler
+#
+# Turns a song's .mid file into the event file polysynth.EventFile streams.
+# The song is read with midi.MappedStream, with the settings for it in
+# songs.py, so tracks are merged, channels are allocated and pitches are
+# worked out here once instead of in the sequencer's timer callback. On the
+# Thumby each event is then one 16 byte record to copy to the channels.
+#
+# usage: python3 tools/midicompile.py moontheme evergreen [--clock 125000000]
+#        python3 tools/midicompile.py moontheme --bench
+#
+# Songs are named by their settings in songs.py, and are read from NAME.mid
+# and written to NAME.pse in the PSdemo folder. --clock is the CPU clock the
+# song is played at (half cycle counts depend on it), PSdemo plays at 125MHz.
+#
+# --bench plays each song through the sequencer twice, once streamed from the
+# .mid file and once from the compiled file, on the virtual clock and PIO
+# state machines in hoststubs.py. It checks that both make the same channel
+# writes on the same ticks and reports the slowest and mean timer callback
+# for each (the fastest of --repeat plays for each tick, to leave out host
+# noise). These are CPython timings, so only the ratio between the two says
+# much about the Thumby, where polysynth.maxticktime has the real one.
+#
+# Format (little endian):
+#   header  "PSE", version:u8 (1), tick frequency (CPU clock / 8):u32,
+#           events:u32
+#   events  timestamp_ms:u32, kind<<24 | channel<<16 | midiPitch<<8 |
+#           instrumentNum:u32, value:u32, phaseValue:u32
+# The kinds are listed above polysynth.eventtick.
+
+import argparse
+import os
+import struct
+import sys
+import time
+
+from hoststubs import PSDEMO_PATH, Clock, StateMachine, install
+
+HEADER = "<4sII"
+RECORD = "<IIII"
+
+
+#### Compiling
+
+def readsong(midi, name, settings): #returns the song's events as the sequencer would get them from midi.MappedStream
+    settings = dict(settings)
+    settings.pop("instruments", None)
+    settings.pop("types", None)
+    #callback events carry the instrument number instead of the function
+    settings["callbacks"] = {i: i for i in settings.get("callbacks", {})}
+    with open(os.path.join(PSDEMO_PATH, name + ".mid"), "rb") as data:
+        stream = midi.MappedStream(data, **settings)
+        events = []
+        while stream.nextevent != None:
+            events.append(stream.nextevent)
+            stream.readevent()
+    #start with a channel count event, like midi.load
+    return [(0, 2, stream.maxchannels+1)] + events
+
+def halfcycle(polysynth, pitch):
+    return int(polysynth.tickfreq // (2*polysynth.czero*polysynth.twelveroottwo**pitch))
+
+def record(polysynth, event, instruments):
+    t, kind = event[0], event[1]
+    if kind == 0:
+        return (t, event[2] << 16, 0, 0)
+    if kind == 2:
+        return (t, 2 << 24 | event[2] << 8, 0, 0)
+    if kind == 3:
+        return (t, 3 << 24 | event[3] << 8 | event[2], 0, 0)
+    chan, pitch, num = event[2], event[3], event[4]
+    word = chan << 16 | pitch << 8 | num
+    if num not in instruments:
+        return (t, 1 << 24 | word, (halfcycle(polysynth, pitch) - 1) & 0xFFFFFFFF, 0)
+    ins = instruments[num]
+    cycle = halfcycle(polysynth, pitch + ins[2])
+    if ins[4] or ins[5] or ins[6]: #vibrato, rise or duration, started by the sequencer
+        return (t, 6 << 24 | word, 0, 0)
+    if ins[1] != None: #phase offset
+        return (t, 5 << 24 | word, (cycle - 1) & 0xFFFFFFFF, (int(cycle*(1.0+ins[1])) - 1) & 0xFFFFFFFF)
+    return (t, (4 if ins[0] else 1) << 24 | word, (cycle - 1) & 0xFFFFFFFF, 0)
+
+def compile(polysynth, midi, name, settings):
+    events = readsong(midi, name, settings)
+    instruments = settings.get("instruments", {})
+    data = bytearray(struct.pack(HEADER, b"PSE\x01", polysynth.tickfreq, len(events)))
+    for event in events:
+        data += struct.pack(RECORD, *record(polysynth, event, instruments))
+    path = os.path.join(PSDEMO_PATH, name + ".pse")
+    with open(path, "wb") as out:
+        out.write(data)
+    print(f"{name}.pse: {len(events)} events, {len(data)} bytes")
+
+
+#### Benchmark
+
+def play(polysynth, clock, settings, song):
+    polysynth.configure(settings.get("types"))
+    StateMachine.log = []
+    StateMachine.tick = 0
+    #the .mid stream has no channel count event to start with, so neither gets to set it
+    polysynth.playstream(song, settings.get("instruments", {}), autoenable=False)
+    times = []
+    while polysynth.playing:
+        clock.ms += 20 #the sequencer runs at 50Hz
+        StateMachine.tick += 1
+        start = time.perf_counter()
+        polysynth.timer.callback(None)
+        times.append(time.perf_counter() - start)
+    log = StateMachine.log
+    StateMachine.log = []
+    return log, times
+
+def playbest(polysynth, clock, settings, load, repeat): #plays the song repeat times, keeping the fastest time for each tick
+    log, best = play(polysynth, clock, settings, load())
+    for i in range(repeat - 1):
+        best = list(map(min, best, play(polysynth, clock, settings, load())[1]))
+    return log, best
+
+def bench(polysynth, midi, clock, name, settings, repeat):
+    mid = os.path.join(PSDEMO_PATH, name + ".mid")
+    streamsettings = {key: value for key, value in settings.items() if key not in ("instruments", "types")}
+    results = (
+        playbest(polysynth, clock, settings, lambda: midi.loadstream(open(mid, "rb"), **streamsettings), repeat),
+        playbest(polysynth, clock, settings, lambda: polysynth.EventFile(
+            os.path.join(PSDEMO_PATH, name + ".pse"), settings.get("callbacks", {})), repeat))
+    for label, (log, times) in zip(("midi stream", "event file"), results):
+        print(f"{name} {label:12} {len(times)} ticks, slowest {max(times)*1e6:7.0f} us, "
+            f"mean {sum(times)/len(times)*1e6:5.1f} us, {len(log)} channel writes")
+    midilog, filelog = results[0][0], results[1][0]
+    if midilog != filelog:
+        first = next(i for i, (a, b) in enumerate(zip(midilog + [None], filelog + [None])) if a != b)
+        print(f"{name}: channel writes differ from write {first}")
+        return 1
+    print(f"{name}: channel writes match")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compile PSdemo songs to polysynth event files")
+    parser.add_argument("songs", nargs="+", help="song names from songs.py")
+    parser.add_argument("--clock", type=int, default=125000000, help="CPU clock the song is played at")
+    parser.add_argument("--bench", action="store_true", help="compare the compiled songs with the .mid files in the sequencer")
+    parser.add_argument("--repeat", type=int, default=5, help="plays per song for --bench, keeping each tick's fastest time")
+    args = parser.parse_args()
+
+    clock = Clock()
+    install(clock, args.clock)
+    import polysynth, midi, songs
+    polysynth.configure()
+    failed = 0
+    for name in args.songs:
+        settings = getattr(songs, name)
+        if args.bench:
+            failed += bench(polysynth, midi, clock, name, settings, args.repeat)
+        else:
+            compile(polysynth, midi, name, settings)
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -71,6 +71,7 @@ def runSilicon8():
     thumby.display.fill(0)
     thumby.display.update()
     instance.run(roms.load(program))
+    print("Instructions per second:", instance.cyclesPerSecond)
     return True
 
 while runSilicon8():
@@ -2,6 +2,7 @@ import random
 import thumbyinterface
 import types
 import time
+import savestate
 from display import AccurateDisplay
 
 @micropython.viper
@@ -22,6 +23,10 @@ class CPU:
     XOCHIP_RAM_SIZE    = const(65023 + 512)
     DEFAULT_STACK_SIZE = const(12)
     SCHIP_STACK_SIZE   = const(16)  # According to http://devernay.free.fr/hacks/chip8/schip.txt: "Subroutine nesting is limited to 16 levels"
+    MAX_BLOCKS         = const(128) # Decoded blocks to keep before flushing the cache
+    MAX_BLOCK_LENGTH   = const(32)  # Maximum number of instructions in one block
+    REWIND_BUDGET      = const(8192) # Bytes of memory to use for rewind snapshots
+    REWIND_INTERVAL    = const(30)  # Frames between rewind snapshots
 
     # Font definitions for the interpreter built in fonts
 
@@ -93,12 +98,20 @@ class CPU:
         self.userFlags = bytearray(16)
         self.display = AccurateDisplay(self)
         self.rendering = False
+        self.useBlockCache = True
+        self.cycles = 0
+        self.cyclesPerSecond = 0
+        self.ticks = 0
+        self.rewind = savestate.Rewind(CPU.REWIND_BUDGET)
+        self.snapshotDue = False
+        self.frames = 0
+        self.reference = b''
 
     def start(self):
-    	self.running = True
+        self.running = True
 
     def stop(self):
-    	self.running = False
+        self.running = False
 
     @micropython.native
     def clockTick(self, t):
@@ -107,43 +120,76 @@ class CPU:
 
         # Tick timers
         if self.dt > 0:
-        	self.dt -= 1
+            self.dt -= 1
 
         if self.st > 0:
-        	if not self.playing:
-        		self.playing = True
-        		thumbyinterface.playSound(self.playingPattern, self.pattern, self.pitch)
-        		self.audioDirty = False
-        	self.st -= 1
+            if not self.playing:
+                self.playing = True
+                thumbyinterface.playSound(self.playingPattern, self.pattern, self.pitch)
+                self.audioDirty = False
+            self.st -= 1
         else:
-        	if self.playing:
-        		self.playing = False
-        		self.audioDirty = False
-        		thumbyinterface.stopSound()
+            if self.playing:
+                self.playing = False
+                self.audioDirty = False
+                thumbyinterface.stopSound()
 
         # Trigger audio updates if dirty
         if self.audioDirty:
-        	thumbyinterface.playSound(self.playingPattern, self.pattern, self.pitch)
-        	self.audioDirty = False
+            thumbyinterface.playSound(self.playingPattern, self.pattern, self.pitch)
+            self.audioDirty = False
 
         # Render display if dirty (only render half of the interrupts to save a
         # few CPU cycles)
         self.rendering = not self.rendering
         if self.display.dirty and self.rendering:
-            thumbyinterface.render(self.display.width, self.display.height, self.display.frameBuffers)
-            self.display.dirty = False
+            thumbyinterface.render(self.display)
+            self.display.markClean()
 
         # Register display redraw interrupt for dispQuirk
         self.display.interrupt()
 
+        # Keep track of executed instructions per second
+        self.ticks += 1
+        if self.ticks >= 60:
+            self.cyclesPerSecond = self.cycles
+            self.cycles = 0
+            self.ticks = 0
+
+        # Ask the main loop for a rewind snapshot every so often
+        self.frames += 1
+        if self.frames >= CPU.REWIND_INTERVAL:
+            self.snapshotDue = True
+            self.frames = 0
+
     @micropython.viper
     def run(self, program):
         ram = ptr8(self.ram)
         prog = ptr8(program)
         for i in range(int(len(program))):
             ram[i + 0x200] = prog[i]
+        self.loaded(int(len(program)))
+        step = self.runBlock if self.useBlockCache else self.cycle
         while self.running and not thumbyinterface.breakCombo():
-            self.cycle()
+            step()
+            if self.snapshotDue:
+                self.snapshot()
+
+    # Program has been copied into RAM: remember what RAM looked like as the
+    # reference image for save states, and start with an empty cache
+    def loaded(self, size):
+        self.reference = bytes(self.ram[0:0x200 + size])
+        self.rewind.clear()
+        self.flushBlocks()
+
+    # Take a rewind snapshot, or go back to the last one while the rewind key
+    # combination is held
+    def snapshot(self):
+        self.snapshotDue = False
+        if thumbyinterface.rewindCombo():
+            self.rewind.pop(self)
+        else:
+            self.rewind.push(self)
 
     def reset(self, interpreter):
         self.stop()
@@ -156,17 +202,17 @@ class CPU:
             self.typeFixed = False
 
         if interpreter == types.VIP:
-        	self.RAMSize = CPU.VIP_SCHIP_RAM_SIZE
-    		self.stackSize = CPU.DEFAULT_STACK_SIZE
-    	elif interpreter == types.SCHIP:
-    		self.RAMSize = CPU.VIP_SCHIP_RAM_SIZE
-    		self.stackSize = CPU.SCHIP_STACK_SIZE
-    	elif interpreter == types.XOCHIP:
-    		self.RAMSize = CPU.XOCHIP_RAM_SIZE
-    		self.stackSize = CPU.DEFAULT_STACK_SIZE
-    	elif interpreter == types.AUTO: # Takes maximum sizes, determines limits at runtime
-    		self.RAMSize = CPU.XOCHIP_RAM_SIZE
-    		self.stackSize = CPU.SCHIP_STACK_SIZE
+            self.RAMSize = CPU.VIP_SCHIP_RAM_SIZE
+            self.stackSize = CPU.DEFAULT_STACK_SIZE
+        elif interpreter == types.SCHIP:
+            self.RAMSize = CPU.VIP_SCHIP_RAM_SIZE
+            self.stackSize = CPU.SCHIP_STACK_SIZE
+        elif interpreter == types.XOCHIP:
+            self.RAMSize = CPU.XOCHIP_RAM_SIZE
+            self.stackSize = CPU.DEFAULT_STACK_SIZE
+        elif interpreter == types.AUTO: # Takes maximum sizes, determines limits at runtime
+            self.RAMSize = CPU.XOCHIP_RAM_SIZE
+            self.stackSize = CPU.SCHIP_STACK_SIZE
 
         # Initialize registers
         self.pc = 0x200
@@ -184,6 +230,7 @@ class CPU:
         self.display.reset()
         self.stack = [0] * self.stackSize
         self.ram = bytearray(self.RAMSize)
+        self.flushBlocks()
 
         # Initialize internal variables
         self.waitForKey = False
@@ -226,14 +273,139 @@ class CPU:
         if not self.running:
             return
 
-        op  = self.ram[self.a(self.pc)]<<8 | self.ram[self.a(self.pc+1)]
-        x   = self.ram[self.a(self.pc)] & 0x0F
-        y   = (self.ram[self.a(self.pc+1)] & 0xF0) >> 4
-        n   = self.ram[self.a(self.pc+1)] & 0x0F
-        nn  = self.ram[self.a(self.pc+1)] & 0xFF
-        nnn = x<<8 | nn
-
+        op = self.ram[self.a(self.pc)]<<8 | self.ram[self.a(self.pc+1)]
         self.pc += 2
+        self.cycles += 1
+        self.execute(op, 0, 0)
+
+    # Run one basic block from the decoded instruction cache and return control.
+    # Blocks are straight-line runs of instructions that end at the first jump,
+    # call, return, skip or write to RAM.
+    @micropython.native
+    def runBlock(self):
+        if not self.running:
+            return
+
+        block = self.blocks.get(self.pc)
+        if block is None:
+            block = self.decodeBlock(self.pc)
+
+        # Every instruction in a block that looks at the program counter is the
+        # last one in the block, so we can move to the end of it right away
+        self.pc = block[0]
+        ops = block[1]
+        for k in range(0, len(ops), 4):
+            ops[k](ops[k+1], ops[k+2], ops[k+3])
+        self.cycles += len(ops) >> 2
+
+    # Decode a basic block starting at the given address into a flat tuple of
+    # (handler, arg, arg, arg) entries and store it in the cache
+    @micropython.native
+    def decodeBlock(self, start:int):
+        ram = self.ram
+        pc = start
+        ops = []
+        while True:
+            high = ram[self.a(pc)]
+            low = ram[self.a(pc+1)]
+            pc += 2
+            check = high & 0xF0
+            x = high & 0x0F
+            end = False
+
+            if check == 0x60:
+                ops.extend((self.opSetRegister, x, low, 0))
+            elif check == 0x70:
+                ops.extend((self.opAddRegister, x, low, 0))
+            elif check == 0x80:
+                ops.extend((self.maths, x, low >> 4, low & 0x0F))
+            elif check == 0xA0:
+                ops.extend((self.opSetI, x<<8 | low, 0, 0))
+            elif check == 0xC0:
+                ops.extend((self.opRandom, x, low, 0))
+            elif check == 0xD0:
+                ops.extend((self.display.draw, x, low >> 4, low & 0x0F))
+            elif check == 0x10:
+                ops.extend((self.opJump, x<<8 | low, 0, 0))
+                end = True
+            elif check == 0x30:
+                ops.extend((self.opSkipEqual, x, low, 0))
+                end = True
+            elif check == 0x40:
+                ops.extend((self.opSkipNotEqual, x, low, 0))
+                end = True
+            elif check == 0xF0 and low == 0x00:
+                ops.extend((self.opSetILong, ram[self.a(pc)]<<8 | ram[self.a(pc+1)], 0, 0))
+                pc += 2
+            else:
+                op = high<<8 | low
+                ops.extend((self.execute, op, 0, 0))
+                end = self.endsBlock(op)
+
+            if end or len(ops) >= CPU.MAX_BLOCK_LENGTH * 4:
+                break
+
+        if len(self.blocks) >= CPU.MAX_BLOCKS:
+            self.flushBlocks()
+        block = (pc, tuple(ops))
+        self.blocks[start] = block
+        for page in range(start >> 4, ((pc - 1) >> 4) + 1):
+            if page < len(self.codePages):
+                self.codePages[page] = 1
+        return block
+
+    # Does this instruction need to be the last one in its block? Anything that
+    # changes the flow of the program or writes to RAM does.
+    @micropython.native
+    def endsBlock(self, op:int) -> bool:
+        check = op & 0xF000
+        if check == 0x0000:
+            return not (op == 0x00E0 or op & 0xFFF0 == 0x00C0 or op & 0xFFF0 == 0x00D0 or
+                        op == 0x00FB or op == 0x00FC or op == 0x00FE or op == 0x00FF)
+        if check == 0x2000 or check == 0x5000 or check == 0x9000 or check == 0xB000 or check == 0xE000:
+            return True
+        if check == 0xF000:
+            return op & 0xFF == 0x33 or op & 0xFF == 0x55
+        return False
+
+    # Throw away all decoded blocks
+    def flushBlocks(self):
+        self.blocks = {}
+        self.codePages = bytearray((self.RAMSize >> 4) + 1)
+
+    # Throw away all decoded blocks that overlap the given range of RAM, because
+    # the program has just written to it
+    @micropython.native
+    def invalidateBlocks(self, address:int, length:int):
+        first = address >> 4
+        last = min((address + length - 1) >> 4, len(self.codePages) - 1)
+        hit = False
+        for page in range(first, last + 1):
+            if self.codePages[page]:
+                hit = True
+                self.codePages[page] = 0
+        if not hit:
+            return
+
+        end = address + length
+        for start in list(self.blocks):
+            blockEnd = self.blocks[start][0]
+            if start < end and blockEnd > address:
+                del self.blocks[start]
+            elif (start >> 4) <= last and ((blockEnd - 1) >> 4) >= first:
+                # Block survives but shares a page with the write, so keep
+                # that page marked as holding code
+                for page in range(max(first, start >> 4), min(last, (blockEnd - 1) >> 4) + 1):
+                    self.codePages[page] = 1
+
+    # Decode and execute a single instruction
+    @micropython.native
+    def execute(self, op:int, unused1:int, unused2:int):
+        x   = (op & 0x0F00) >> 8
+        y   = (op & 0x00F0) >> 4
+        n   = op & 0x000F
+        nn  = op & 0x00FF
+        nnn = op & 0x0FFF
 
         check = op & 0xF000
         if check < 0x8000:
@@ -270,6 +442,44 @@ class CPU:
             else:
                 self.opcodesFX29andUp(nn, x)
 
+    # Pre-decoded handlers for the most common instructions, called from the
+    # block cache with three arguments each
+
+    @micropython.native
+    def opSetRegister(self, x:int, nn:int, unused:int):
+        self.v[x] = nn
+
+    @micropython.native
+    def opAddRegister(self, x:int, nn:int, unused:int):
+        self.v[x] = (self.v[x] + nn) & 0xFF
+
+    @micropython.native
+    def opSetI(self, nnn:int, unused1:int, unused2:int):
+        self.i = nnn
+
+    @micropython.native
+    def opSetILong(self, nnnn:int, unused1:int, unused2:int):
+        self.i = nnnn
+        self.bumpSpecType(types.XOCHIP)
+
+    @micropython.native
+    def opRandom(self, x:int, nn:int, unused:int):
+        self.v[x] = random.randint(0, 255) & nn
+
+    @micropython.native
+    def opJump(self, nnn:int, unused1:int, unused2:int):
+        self.pc = nnn
+
+    @micropython.native
+    def opSkipEqual(self, x:int, nn:int, unused:int):
+        if self.v[x] == nn:
+            self.skipNextInstruction()
+
+    @micropython.native
+    def opSkipNotEqual(self, x:int, nn:int, unused:int):
+        if self.v[x] != nn:
+            self.skipNextInstruction()
+
     # @micropython.native
     def opcodes0to7(self, check:int, op:int, x:int, y:int, n:int, nn:int, nnn:int):
         if check == 0x0000:
@@ -298,6 +508,7 @@ class CPU:
                 # Store range of registers to memory
                 for i in range(x, y + 1):
                     self.ram[self.a(self.i+(i-x))] = self.v[i]
+                self.invalidateBlocks(self.i, y - x + 1)
                 self.bumpSpecType(types.XOCHIP)
             elif n == 3:
                 # Load range of registers from memory
@@ -312,7 +523,7 @@ class CPU:
             self.v[x] = nn
         elif check == 0x7000:
             # Add to register
-            self.v[x] += nn
+            self.v[x] = (self.v[x] + nn) & 0xFF
 
     @micropython.native
     def opcodesFX1EandBelow(self, nn:int, x:int):
@@ -377,6 +588,7 @@ class CPU:
             self.ram[self.a(self.i+0)] = int(self.v[x] / 100)
             self.ram[self.a(self.i+1)] = int(self.v[x] % 100 / 10)
             self.ram[self.a(self.i+2)] = self.v[x] % 10
+            self.invalidateBlocks(self.i, 3)
         elif nn == 0x3A:
             # XO-Chip: Change pitch of audio pattern
             self.pitch = 4000 * pow(2, (self.v[x]-64)/48)
@@ -387,6 +599,7 @@ class CPU:
             # Store registers to memory (regular VIP/SCHIP)
             for i in range(0, x + 1):
                 self.ram[self.a(self.i + i)] = self.v[i]
+            self.invalidateBlocks(self.i, x + 1)
             if self.memQuirk:
                 self.i = (self.i + x + 1) & 0xFFFF
         elif nn == 0x65:
@@ -409,14 +622,14 @@ class CPU:
     @micropython.native
     def machineCall(self, op:int, n:int):
         check = op & 0xFFF0
-    	if check == 0x00C0:
-    		self.display.scrollDown(n)
-    		self.bumpSpecType(types.SCHIP)
-    		return
-    	elif check == 0x00D0:
-    		self.display.scrollUp(n)
-    		self.bumpSpecType(types.XOCHIP)
-    		return
+        if check == 0x00C0:
+            self.display.scrollDown(n)
+            self.bumpSpecType(types.SCHIP)
+            return
+        elif check == 0x00D0:
+            self.display.scrollUp(n)
+            self.bumpSpecType(types.XOCHIP)
+            return
 
         if op == 0x00E0:
             # Clear screen
@@ -426,86 +639,86 @@ class CPU:
             self.sp += 1
             self.pc = self.stack[self.s(self.sp)]
         elif op == 0x00FB:
-    		self.display.scrollRight()
-    		self.bumpSpecType(types.SCHIP)
-    	elif op == 0x00FC:
-    		self.display.scrollLeft()
-    		self.bumpSpecType(types.SCHIP)
-    	elif op == 0x00FD:
-    		# Exit interpreter
-    		self.running = False
-    		self.bumpSpecType(types.SCHIP)
-    	elif op == 0x00FE:
-    		# Set normal screen resolution
-    		self.display.setResolution(64, 32)
-    		self.bumpSpecType(types.SCHIP)
-    	elif op == 0x00FF:
-    		# Set extended screen resolution
-    		self.display.setResolution(128, 64)
-    		self.bumpSpecType(types.SCHIP)
-    	else:
+            self.display.scrollRight()
+            self.bumpSpecType(types.SCHIP)
+        elif op == 0x00FC:
+            self.display.scrollLeft()
+            self.bumpSpecType(types.SCHIP)
+        elif op == 0x00FD:
+            # Exit interpreter
+            self.running = False
+            self.bumpSpecType(types.SCHIP)
+        elif op == 0x00FE:
+            # Set normal screen resolution
+            self.display.setResolution(64, 32)
+            self.bumpSpecType(types.SCHIP)
+        elif op == 0x00FF:
+            # Set extended screen resolution
+            self.display.setResolution(128, 64)
+            self.bumpSpecType(types.SCHIP)
+        else:
             print("RCA 1802 assembly calls not supported at address", self.pc-2, "opcode", op)
             self.running = False
 
     @micropython.viper
     def maths(self, x:int, y:int, n:int):
         regs = ptr8(self.v)
-    	if n == 0x0:
-    		regs[x] = regs[y]
-    	elif n == 0x1:
-    		regs[x] |= regs[y]
-    		if self.vfQuirk:
-    			regs[0xF] = 0
-    	elif n == 0x2:
-    		regs[x] &= regs[y]
-    		if self.vfQuirk:
-    			regs[0xF] = 0
-    	elif n == 0x3:
-    		regs[x] ^= regs[y]
-    		if self.vfQuirk:
-    			regs[0xF] = 0
-    	elif n == 0x4:
-    		# Add register vY to vX
-    		# Set VF to 01 if a carry occurs
-    		# Set VF to 00 if a carry does not occur
-    		flag:bool = (0xFF - regs[x]) < regs[y]
-    		regs[x] += regs[y]
-    		self.setFlag(flag)
-    	elif n == 0x5:
-    		# Subtract register vY from vX and store in vX
-    		# Set VF to 00 if a borrow occurs
-    		# Set VF to 01 if a borrow does not occur
-    		flag:bool = regs[x] >= regs[y]
-    		regs[x] -= regs[y]
-    		self.setFlag(flag)
-    	elif n == 0x6:
-    		# Shift right
-    		if self.shiftQuirk:
-    			y = x
-    		# Set register VF to the least significant bit prior to the shift
-    		flag:bool = regs[y] & 0b00000001 > 0
-    		regs[x] = regs[y] >> 1
-    		self.setFlag(flag)
-    	elif n == 0x7:
-    		# Subtract register vX from vY and store in vX
-    		# Set VF to 00 if a borrow occurs
-    		# Set VF to 01 if a borrow does not occur
-    		flag:bool = regs[y] >= regs[x]
-    		regs[x] = regs[y] - regs[x]
-    		self.setFlag(flag)
-    	elif n == 0xE:
-    		# Shift left
-    		if self.shiftQuirk:
-    			y = x
-    		# Set register VF to the most significant bit prior to the shift
-    		flag:bool = regs[y] & 0b10000000 > 0
-    		regs[x] = regs[y] << 1
-    		self.setFlag(flag)
+        if n == 0x0:
+            regs[x] = regs[y]
+        elif n == 0x1:
+            regs[x] |= regs[y]
+            if self.vfQuirk:
+                regs[0xF] = 0
+        elif n == 0x2:
+            regs[x] &= regs[y]
+            if self.vfQuirk:
+                regs[0xF] = 0
+        elif n == 0x3:
+            regs[x] ^= regs[y]
+            if self.vfQuirk:
+                regs[0xF] = 0
+        elif n == 0x4:
+            # Add register vY to vX
+            # Set VF to 01 if a carry occurs
+            # Set VF to 00 if a carry does not occur
+            flag:bool = (0xFF - regs[x]) < regs[y]
+            regs[x] += regs[y]
+            self.setFlag(flag)
+        elif n == 0x5:
+            # Subtract register vY from vX and store in vX
+            # Set VF to 00 if a borrow occurs
+            # Set VF to 01 if a borrow does not occur
+            flag:bool = regs[x] >= regs[y]
+            regs[x] -= regs[y]
+            self.setFlag(flag)
+        elif n == 0x6:
+            # Shift right
+            if self.shiftQuirk:
+                y = x
+            # Set register VF to the least significant bit prior to the shift
+            flag:bool = regs[y] & 0b00000001 > 0
+            regs[x] = regs[y] >> 1
+            self.setFlag(flag)
+        elif n == 0x7:
+            # Subtract register vX from vY and store in vX
+            # Set VF to 00 if a borrow occurs
+            # Set VF to 01 if a borrow does not occur
+            flag:bool = regs[y] >= regs[x]
+            regs[x] = regs[y] - regs[x]
+            self.setFlag(flag)
+        elif n == 0xE:
+            # Shift left
+            if self.shiftQuirk:
+                y = x
+            # Set register VF to the most significant bit prior to the shift
+            flag:bool = regs[y] & 0b10000000 > 0
+            regs[x] = regs[y] << 1
+            self.setFlag(flag)
 
     @micropython.native
     def skipNextInstruction(self):
         nextInstruction = self.ram[self.a(self.pc)]<<8 | self.ram[self.a(self.pc+1)]
-    	if nextInstruction == 0xF000:
+        if nextInstruction == 0xF000:
             self.pc += 4
         else:
             self.pc += 2
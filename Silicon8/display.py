@@ -14,7 +14,6 @@ class AccurateDisplay:
         self.height = 32
         self.numPlanes = 1
         self.selectedPlane = 1
-        self.dirty = True
         self.waitForInt = 0
         self.initBuffers()
 
@@ -28,6 +27,35 @@ class AccurateDisplay:
             FrameBuffer(self.buffers[0], self.width, self.height, MONO_HLSB),
             FrameBuffer(self.buffers[1], self.width, self.height, MONO_HLSB)
         ]
+        self.markAllDirty()
+
+    # Keep track of the area of the screen that has changed since the last
+    # render, so we only have to copy that part to the Thumby display
+    @micropython.native
+    def markDirty(self, left:int, top:int, right:int, bottom:int):
+        if self.dirty:
+            self.dirtyLeft = min(self.dirtyLeft, left)
+            self.dirtyTop = min(self.dirtyTop, top)
+            self.dirtyRight = max(self.dirtyRight, right)
+            self.dirtyBottom = max(self.dirtyBottom, bottom)
+        else:
+            self.dirtyLeft = left
+            self.dirtyTop = top
+            self.dirtyRight = right
+            self.dirtyBottom = bottom
+            self.dirty = True
+
+    @micropython.native
+    def markAllDirty(self):
+        self.dirtyLeft = 0
+        self.dirtyTop = 0
+        self.dirtyRight = self.width
+        self.dirtyBottom = self.height
+        self.dirty = True
+
+    @micropython.native
+    def markClean(self):
+        self.dirty = False
 
     # Called by 60Hz interrupt timer for dispQuirk
     @micropython.native
@@ -46,63 +74,117 @@ class AccurateDisplay:
             if (i+1) & planes > 0:
                 for j in range(len(self.buffers[i])):
                     self.buffers[i][j] = 0
-        self.dirty = True
+        self.markAllDirty()
 
-    @micropython.native
-    def scrollDown(self, n):
-        offset = int(self.width * n / 8)
-        for plane in range(1, 3):
-            if (plane & self.selectedPlane) == 0:
+    # Scrolling moves whole 32-bit words for vertical scrolls (rows are always
+    # a multiple of 8 bytes), and shifts each row by a nibble with a carry from
+    # the next byte for horizontal scrolls. The vertical moves copy in the safe
+    # direction, so the source and destination can overlap.
+
+    @micropython.viper
+    def scrollDown(self, n:int):
+        offset:int = (int(self.width) * n) >> 5
+        words:int = (int(self.width) * int(self.height)) >> 5
+        selected:int = int(self.selectedPlane)
+        for plane in range(2):
+            if (plane + 1) & selected == 0:
                 continue
-            for i in range(len(self.buffers[plane-1]) - 1, -1, -1):
-                self.buffers[plane-1][i] = self.buffers[plane-1][i - offset] if i > offset else 0
-            self.dirty = True
+            buf = ptr32(self.buffers[plane])
+            i:int = words - 1
+            while i >= offset:
+                buf[i] = buf[i - offset]
+                i -= 1
+            while i >= 0:
+                buf[i] = 0
+                i -= 1
+        self.markAllDirty()
 
-    @micropython.native
-    def scrollUp(self, n):
-        offset = int(self.width * n / 8)
-        for plane in range(1, 3):
-            if (plane & self.selectedPlane) == 0:
+    @micropython.viper
+    def scrollUp(self, n:int):
+        offset:int = (int(self.width) * n) >> 5
+        words:int = (int(self.width) * int(self.height)) >> 5
+        selected:int = int(self.selectedPlane)
+        for plane in range(2):
+            if (plane + 1) & selected == 0:
                 continue
-            maxIndex = len(self.buffers[plane-1])
-            for i in range(maxIndex):
-                self.buffers[plane-1][i] = self.buffers[plane-1][i + offset] if i + offset < maxIndex else 0
-            self.dirty = True
+            buf = ptr32(self.buffers[plane])
+            i:int = 0
+            while i < words - offset:
+                buf[i] = buf[i + offset]
+                i += 1
+            while i < words:
+                buf[i] = 0
+                i += 1
+        self.markAllDirty()
 
-    @micropython.native
+    @micropython.viper
     def scrollLeft(self):
-        for plane in range(1, 3):
-            if (plane & self.selectedPlane) == 0:
+        rowBytes:int = int(self.width) >> 3
+        size:int = rowBytes * int(self.height)
+        selected:int = int(self.selectedPlane)
+        for plane in range(2):
+            if (plane + 1) & selected == 0:
                 continue
-            for i in range(len(self.buffers[plane-1])):
-                right = self.buffers[plane-1][i+1] >> 4 if (i+1) % self.width / 8 != 0 else 0
-                left = self.buffers[plane-1][i] << 4
-                self.buffers[plane-1][i] = left | right
-            self.dirty = True
+            buf = ptr8(self.buffers[plane])
+            row:int = 0
+            while row < size:
+                last:int = row + rowBytes - 1
+                i:int = row
+                while i < last:
+                    buf[i] = (buf[i] << 4) | (buf[i+1] >> 4)
+                    i += 1
+                buf[last] = buf[last] << 4
+                row += rowBytes
+        self.markAllDirty()
 
-    @micropython.native
+    @micropython.viper
     def scrollRight(self):
-        for plane in range(1, 3):
-            if (plane & self.selectedPlane) == 0:
+        rowBytes:int = int(self.width) >> 3
+        size:int = rowBytes * int(self.height)
+        selected:int = int(self.selectedPlane)
+        for plane in range(2):
+            if (plane + 1) & selected == 0:
                 continue
-            for i in range(len(self.buffers[plane-1]) - 1, -1, -1):
-                left = self.buffers[plane-1][i-1] << 4 if i % self.width / 8 != 0 else 0
-                right = self.buffers[plane-1][i] >> 4
-                self.buffers[plane-1][i] = left | right
-            self.dirty = True
+            buf = ptr8(self.buffers[plane])
+            row:int = 0
+            while row < size:
+                i:int = row + rowBytes - 1
+                while i > row:
+                    buf[i] = (buf[i-1] << 4) | (buf[i] >> 4)
+                    i -= 1
+                buf[row] = buf[row] >> 4
+                row += rowBytes
+        self.markAllDirty()
 
     @micropython.native
     def draw(self, x:int, y:int, n:int):
         if self.cpu.dispQuirk:
             self.waitForInterrupt()
+
+        # Work out the affected area before drawSprite changes vF
+        left = self.cpu.v[x] % self.width
+        top = self.cpu.v[y] % self.height
+        size = 16 if n == 0 else 8
+        right = left + size
+        bottom = top + (16 if n == 0 else n)
+        if right > self.width:
+            # Sprite rows that run off the right edge end up on the next line
+            left = 0
+            right = self.width
+            bottom += 1
+        if bottom > self.height:
+            # Clipped or wrapped around to the top
+            top = 0
+            bottom = self.height
+
         self.drawSprite(x, y, n)
-        self.dirty = True
+        self.markDirty(left, top, right, bottom)
 
     @micropython.viper
     def drawSprite(self, x:int, y:int, n:int):
-    	# Get real sprite position & height
-    	xPos:int = int(self.cpu.v[x]) % int(self.width)
-    	yPos:int = int(self.cpu.v[y]) % int(self.height)
+        # Get real sprite position & height
+        xPos:int = int(self.cpu.v[x]) % int(self.width)
+        yPos:int = int(self.cpu.v[y]) % int(self.height)
         height:int = n
         if height == 0:
             self.cpu.bumpSpecType(types.SCHIP)
@@ -242,8 +324,8 @@ class FastDisplay:
     @micropython.native
     def drawSprite(self, x:int, y:int, n:int):
         # Get real sprite position & height
-    	xPos:int = self.cpu.v[x] % self.width
-    	yPos:int = self.cpu.v[y] % self.height
+        xPos:int = self.cpu.v[x] % self.width
+        yPos:int = self.cpu.v[y] % self.height
         height:int = n
         if height == 0:
             self.cpu.bumpSpecType(types.SCHIP)
@@ -0,0 +1,298 @@
+import struct
+
+# Save states for the Silicon8 CPU
+#
+# A save state is a small binary blob holding everything needed to resume a
+# program: registers, timers, stack, quirk flags, audio pattern, both display
+# planes and RAM. RAM is stored as a list of spans that differ from the
+# reference image (font and ROM as they were loaded), so a state of a
+# typical program is only a few hundred bytes on top of the display planes.
+#
+# Layout, little endian:
+#
+#   header    see HEADER below
+#   v         16 bytes
+#   userFlags 16 bytes
+#   pattern   16 bytes
+#   stack     stackSize 32-bit words
+#   planes    2 * width * height / 8 bytes
+#   RAM delta (offset:uint16, length:uint16, bytes) spans, up to the end
+
+MAGIC   = b'S8ST'
+VERSION = const(1)
+
+HEADER = '<4sBBHIBhIIBBBBBBfIH'
+HEADER_SIZE = struct.calcsize(HEADER)
+
+# Bits in the flags field of the header
+TYPE_FIXED      = const(1)
+SHIFT_QUIRK     = const(2)
+JUMP_QUIRK      = const(4)
+MEM_QUIRK       = const(8)
+VF_QUIRK        = const(16)
+CLIP_QUIRK      = const(32)
+DISP_QUIRK      = const(64)
+PLAYING_PATTERN = const(128)
+
+# Equal bytes allowed inside a RAM span before starting a new one; a span
+# header costs four bytes so shorter gaps are cheaper to include
+SPAN_GAP = const(4)
+
+# Encode the spans where ram differs from reference (implicitly zero past its
+# end) into out and return the encoded length, or -1 if out is too short for
+# it. With an empty out, just return the length it would need.
+@micropython.viper
+def encodeDelta(ram, reference, out) -> int:
+    r = ptr8(ram)
+    ref = ptr8(reference)
+    o = ptr8(out)
+    size:int = int(len(ram))
+    refSize:int = int(len(reference))
+    limit:int = int(len(out))
+    write:bool = limit > 0
+    pos:int = 0
+    i:int = 0
+    while i < size:
+        expected:int = ref[i] if i < refSize else 0
+        if r[i] == expected:
+            i += 1
+            continue
+
+        # Found a changed byte, extend the span until we see enough equal ones
+        start:int = i
+        end:int = i + 1
+        i += 1
+        while i < size and i - end < SPAN_GAP:
+            expected = ref[i] if i < refSize else 0
+            if r[i] != expected:
+                end = i + 1
+            i += 1
+
+        length:int = end - start
+        if write:
+            if pos + 4 + length > limit:
+                return -1
+            o[pos] = start
+            o[pos+1] = start >> 8
+            o[pos+2] = length
+            o[pos+3] = length >> 8
+            j:int = 0
+            while j < length:
+                o[pos+4+j] = r[start+j]
+                j += 1
+        pos += 4 + length
+    return pos
+
+# Rebuild RAM from the reference image and the spans in data, starting at
+# offset
+@micropython.viper
+def decodeDelta(ram, reference, data, offset:int):
+    r = ptr8(ram)
+    ref = ptr8(reference)
+    d = ptr8(data)
+    size:int = int(len(ram))
+    refSize:int = int(len(reference))
+    i:int = 0
+    while i < size:
+        r[i] = ref[i] if i < refSize else 0
+        i += 1
+
+    end:int = int(len(data))
+    pos:int = offset
+    while pos + 4 <= end:
+        start:int = d[pos] | (d[pos+1] << 8)
+        length:int = d[pos+2] | (d[pos+3] << 8)
+        pos += 4
+        j:int = 0
+        while j < length:
+            r[start+j] = d[pos+j]
+            j += 1
+        pos += length
+
+# Fletcher-16 over the reference image, so we don't restore a state on top
+# of a different ROM
+@micropython.viper
+def checksum(data) -> int:
+    d = ptr8(data)
+    a:int = 0
+    b:int = 0
+    for i in range(int(len(data))):
+        a = (a + d[i]) % 255
+        b = (b + a) % 255
+    return (b << 8) | a
+
+# Bytes of a state before the RAM delta
+def fixedSize(cpu):
+    planeSize = cpu.display.width * cpu.display.height >> 3
+    return HEADER_SIZE + 48 + cpu.stackSize * 4 + 2 * planeSize
+
+def size(cpu):
+    return fixedSize(cpu) + encodeDelta(cpu.ram, cpu.reference, b'')
+
+def flags(cpu):
+    return ((TYPE_FIXED if cpu.typeFixed else 0) |
+            (SHIFT_QUIRK if cpu.shiftQuirk else 0) |
+            (JUMP_QUIRK if cpu.jumpQuirk else 0) |
+            (MEM_QUIRK if cpu.memQuirk else 0) |
+            (VF_QUIRK if cpu.vfQuirk else 0) |
+            (CLIP_QUIRK if cpu.clipQuirk else 0) |
+            (DISP_QUIRK if cpu.dispQuirk else 0) |
+            (PLAYING_PATTERN if cpu.playingPattern else 0))
+
+# Write the state of cpu into out (a bytearray or memoryview) and return the
+# number of bytes written, or -1 if out is too short for it. size(cpu) bytes
+# are always enough.
+def write(cpu, out):
+    if len(out) < fixedSize(cpu):
+        return -1
+    display = cpu.display
+    struct.pack_into(HEADER, out, 0,
+        MAGIC, VERSION, cpu.specType, flags(cpu), cpu.RAMSize,
+        cpu.stackSize, cpu.sp, cpu.pc, cpu.i, cpu.dt, cpu.st,
+        display.width, display.height, display.numPlanes, display.selectedPlane,
+        cpu.pitch, len(cpu.reference), checksum(cpu.reference))
+    pos = HEADER_SIZE
+    out[pos:pos+16] = cpu.v
+    out[pos+16:pos+32] = cpu.userFlags
+    for i in range(16):
+        out[pos+32+i] = cpu.pattern[i]
+    pos += 48
+    for value in cpu.stack:
+        struct.pack_into('<I', out, pos, value)
+        pos += 4
+    for plane in display.buffers:
+        out[pos:pos+len(plane)] = plane
+        pos += len(plane)
+    length = encodeDelta(cpu.ram, cpu.reference, memoryview(out)[pos:])
+    return pos + length if length >= 0 else -1
+
+# Take a save state of cpu as a new bytearray
+def save(cpu):
+    out = bytearray(size(cpu))
+    write(cpu, out)
+    return out
+
+# Restore cpu from a save state. Raises ValueError if the state is not valid
+# for the program that is currently loaded.
+def load(cpu, data):
+    (magic, version, specType, bits, ramSize, stackSize, sp, pc, i, dt, st,
+     width, height, numPlanes, selectedPlane, pitch,
+     refLength, refChecksum) = struct.unpack_from(HEADER, data, 0)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("Not a Silicon8 save state")
+    if refLength != len(cpu.reference) or refChecksum != checksum(cpu.reference):
+        raise ValueError("Save state belongs to a different program")
+
+    cpu.specType = specType
+    cpu.typeFixed = bool(bits & TYPE_FIXED)
+    cpu.shiftQuirk = bool(bits & SHIFT_QUIRK)
+    cpu.jumpQuirk = bool(bits & JUMP_QUIRK)
+    cpu.memQuirk = bool(bits & MEM_QUIRK)
+    cpu.vfQuirk = bool(bits & VF_QUIRK)
+    cpu.clipQuirk = bool(bits & CLIP_QUIRK)
+    cpu.dispQuirk = bool(bits & DISP_QUIRK)
+    cpu.playingPattern = bool(bits & PLAYING_PATTERN)
+    cpu.RAMSize = ramSize
+    cpu.stackSize = stackSize
+    cpu.sp = sp
+    cpu.pc = pc
+    cpu.i = i
+    cpu.dt = dt
+    cpu.st = st
+    cpu.pitch = pitch
+    cpu.audioDirty = True
+
+    pos = HEADER_SIZE
+    cpu.v[:] = data[pos:pos+16]
+    cpu.userFlags[:] = data[pos+16:pos+32]
+    cpu.pattern = list(data[pos+32:pos+48])
+    pos += 48
+    cpu.stack = [0] * stackSize
+    for j in range(stackSize):
+        cpu.stack[j] = struct.unpack_from('<I', data, pos)[0]
+        pos += 4
+
+    display = cpu.display
+    if display.width != width or display.height != height:
+        display.setResolution(width, height)
+    display.numPlanes = numPlanes
+    display.selectedPlane = selectedPlane
+    for plane in display.buffers:
+        plane[:] = data[pos:pos+len(plane)]
+        pos += len(plane)
+    display.markAllDirty()
+
+    if len(cpu.ram) != ramSize:
+        cpu.ram = bytearray(ramSize)
+    decodeDelta(cpu.ram, cpu.reference, data, pos)
+    cpu.flushBlocks()
+
+def saveFile(cpu, path):
+    with open(path, 'wb') as stream:
+        stream.write(save(cpu))
+
+def loadFile(cpu, path):
+    with open(path, 'rb') as stream:
+        load(cpu, stream.read())
+
+
+# Ring of recent save states for rewinding, kept in one preallocated buffer of
+# a fixed number of bytes. Taking a snapshot doesn't allocate the state itself,
+# and the oldest states are dropped to make room for new ones.
+class Rewind:
+    def __init__(self, budget):
+        self.buffer = bytearray(budget)
+        self.view = memoryview(self.buffer)
+        self.entries = []   # (offset, length), oldest first
+        self.head = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def clear(self):
+        self.entries = []
+        self.head = 0
+
+    # Take a snapshot of cpu. Returns False if it doesn't fit the budget.
+    # The state is encoded straight into the buffer after the newest one, or
+    # from the start if it runs out of room there, so the RAM delta only gets
+    # encoded more than once when the ring wraps. Whatever that overwrote is
+    # dropped, so a state too big for the whole buffer leaves it empty.
+    def push(self, cpu):
+        offset = self.head
+        length = write(cpu, self.view[offset:])
+        if length < 0:
+            self.drop(offset, len(self.buffer))
+            if offset > 0:
+                offset = 0
+                length = write(cpu, self.view)
+            if length < 0:
+                self.clear()
+                return False
+
+        end = offset + length
+        self.drop(offset, end)
+        self.entries.append((offset, length))
+        self.head = end
+        return True
+
+    # Drop the oldest states until none of them overlaps start to end
+    def drop(self, start, end):
+        while self.overlaps(start, end):
+            self.entries.pop(0)
+
+    def overlaps(self, start, end):
+        for offset, length in self.entries:
+            if offset < end and offset + length > start:
+                return True
+        return False
+
+    # Restore the most recent snapshot and drop it. Returns False if there is
+    # nothing left to rewind to.
+    def pop(self, cpu):
+        if not self.entries:
+            return False
+        offset, length = self.entries.pop()
+        load(cpu, self.view[offset:offset+length])
+        self.head = offset
+        return True
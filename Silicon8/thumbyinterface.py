@@ -21,15 +21,51 @@ dispBuffer = FrameBuffer(
     MONO_VLSB
 )
 
+# Copy the first plane of the CHIP-8 display to the Thumby display. If only a
+# small part of it changed since the last render, only that part is converted.
 @micropython.viper
-def render(dispWidth:int, dispHeight:int, planeBuffer):
-    dispBuffer.blit(
-        planeBuffer[0],
-        (int(thumby.display.width) - dispWidth) >> 1,
-        (int(thumby.display.height) - dispHeight) >> 1,
-        min(dispWidth, thumby.display.width),
-        min(dispHeight, thumby.display.height)
-    )
+def render(display):
+    dispWidth:int = int(display.width)
+    dispHeight:int = int(display.height)
+    screenWidth:int = int(thumby.display.width)
+    screenHeight:int = int(thumby.display.height)
+    offsetX:int = (screenWidth - dispWidth) >> 1
+    offsetY:int = (screenHeight - dispHeight) >> 1
+
+    # Only look at the visible part of the dirty area
+    left:int = int(max(int(display.dirtyLeft), 0 - offsetX))
+    top:int = int(max(int(display.dirtyTop), 0 - offsetY))
+    right:int = int(min(int(display.dirtyRight), screenWidth - offsetX))
+    bottom:int = int(min(int(display.dirtyBottom), screenHeight - offsetY))
+
+    if (right - left) * (bottom - top) * 2 > screenWidth * screenHeight:
+        # Most of the screen changed, let framebuf do the whole thing
+        dispBuffer.blit(
+            display.frameBuffers[0],
+            offsetX,
+            offsetY,
+            min(dispWidth, screenWidth),
+            min(dispHeight, screenHeight)
+        )
+    else:
+        # Convert the dirty rectangle from horizontal to vertical bytes
+        src = ptr8(display.buffers[0])
+        dst = ptr8(thumby.display.display.buffer)
+        rowBytes:int = dispWidth >> 3
+        y:int = top
+        while y < bottom:
+            srcRow:int = y * rowBytes
+            dstRow:int = ((y + offsetY) >> 3) * screenWidth + offsetX
+            bit:int = 1 << ((y + offsetY) & 7)
+            x:int = left
+            while x < right:
+                if src[srcRow + (x >> 3)] & (0x80 >> (x & 7)):
+                    dst[dstRow + x] = dst[dstRow + x] | bit
+                else:
+                    dst[dstRow + x] = dst[dstRow + x] & (0xFF ^ bit)
+                x += 1
+            y += 1
+
     thumby.display.update()
 
 
@@ -59,6 +95,11 @@ def getKeys():
         keyboard[keymap["b"]]     |= thumby.buttonB.pressed()
     return keyboard
 
+# Key combination to rewind the running program
+@micropython.viper
+def rewindCombo():
+    return thumby.buttonR.pressed() and thumby.buttonA.pressed() and thumby.buttonB.pressed()
+
 # Key combination to quit the running program
 @micropython.viper
 def breakCombo():
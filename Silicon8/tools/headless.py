@@ -0,0 +1,268 @@
+# Silicon8 headless batch runner
+#
+# Runs every ROM in the Silicon8 catalog under CPython for a fixed number of
+# frames, with scripted key input, and reports instructions per second, frames
+# per second and, for every frame, a hash of the CHIP-8 display planes and one
+# of the Thumby screen the interface rendered them to. This gives a
+# reproducible performance and regression baseline for interpreter and
+# rendering changes without needing a Thumby.
+#
+# The interpreter modules are loaded unchanged, through the stand-ins in
+# hoststubs.py. Viper code runs as plain Python there, so the instruction and
+# frame rates only compare versions of the interpreter with each other.
+#
+# Usage (from the repository root):
+#
+#   python3 Silicon8/tools/headless.py --frames 600
+#   python3 Silicon8/tools/headless.py --frames 600 --save baseline.json
+#   python3 Silicon8/tools/headless.py --frames 600 --compare baseline.json
+#   python3 Silicon8/tools/headless.py --rom pong --keys pong-keys.txt
+#
+# A key script is a text file with one "frame buttons" pair per line, where
+# buttons is any combination of U, D, L, R, A and B (or "-" for none). The
+# buttons stay pressed until the next line. Without a key script, every ROM
+# gets a seeded pseudo-random sequence of presses.
+#
+# Frames end after --ipf instructions, but the block cache only returns control
+# at the end of a block, so hashes are only comparable between runs that use
+# the same execution mode (with or without --no-block-cache). Baselines saved
+# before screen hashes were recorded only compare the display planes.
+#
+# A ROM that is still running after --timeout seconds of host time is stopped
+# and reported as a failure, so one stuck ROM can't hold up the catalog.
+
+import argparse
+import contextlib
+import io
+import json
+import random
+import sys
+import time
+import zlib
+
+import hoststubs
+
+BUTTONS = "UDLRAB"
+MAPPING = {'U': "up", 'D': "down", 'L': "left", 'R': "right", 'A': "a", 'B': "b"}
+
+
+#### Virtual machine: drives the 60Hz clock and the scripted buttons
+
+# Raised out of the interpreter when the run is over, wherever it is, since
+# a key wait (FX0A) ends frames from inside an instruction and never returns
+# until a key is pressed
+class StopRun(Exception):
+    pass
+
+class Machine:
+    def __init__(self):
+        self.buttons = ""
+        self.screen = None
+
+    def start(self, instance, keyScript, instructionsPerFrame, limit, timeout):
+        self.instance = instance
+        self.keyScript = keyScript
+        self.instructionsPerFrame = instructionsPerFrame
+        self.limit = limit
+        self.deadline = time.perf_counter() + timeout
+        self.timedOut = False
+        self.frame = 0
+        self.executed = 0
+        self.hashes = []
+        self.screenHashes = []
+        # Start every ROM on a blank Thumby screen, whatever ran before it
+        self.screen[:] = bytes(len(self.screen))
+        self.setButtons()
+
+    def setButtons(self):
+        for frame, buttons in self.keyScript:
+            if frame > self.frame:
+                break
+            self.buttons = buttons
+
+    # One 60Hz interrupt: let the interface draw, record the frame, then move
+    # on to the next one
+    def endFrame(self):
+        self.executed += self.instance.cycles
+        self.instance.cycles = 0
+        self.instance.clockTick(None)
+        self.instance.cycles = 0
+        display = self.instance.display
+        crc = zlib.crc32(bytes((display.width >> 3, display.height >> 3)))
+        for buffer in display.buffers:
+            crc = zlib.crc32(buffer, crc)
+        self.hashes.append("%08x" % crc)
+        self.screenHashes.append("%08x" % zlib.crc32(self.screen))
+        self.frame += 1
+        if self.frame >= self.limit:
+            raise StopRun()
+        if time.perf_counter() > self.deadline:
+            self.timedOut = True
+            raise StopRun()
+        self.setButtons()
+
+    # Busy waits in the interpreter (key waits, display wait quirk) give up the
+    # rest of the current frame
+    def wait(self, ms):
+        self.endFrame()
+
+machine = Machine()
+
+
+#### Key scripts
+
+def readKeyScript(path):
+    script = []
+    with open(path, 'r') as stream:
+        for line in stream:
+            line = line.split('#')[0].split()
+            if len(line) == 2:
+                script.append((int(line[0]), line[1].upper().replace('-', '')))
+    script.sort()
+    return script
+
+def randomKeyScript(program, frames, seed):
+    generator = random.Random(seed)
+    mapped = [b for b in BUTTONS if program["keys"].get(MAPPING[b]) is not None]
+    script = []
+    for frame in range(0, frames, 8):
+        if mapped and generator.random() < 0.5:
+            script.append((frame, generator.choice(mapped)))
+        else:
+            script.append((frame, ""))
+    return script
+
+
+#### Runner
+
+def runProgram(cpu, roms, program, frames, keyScript, instructionsPerFrame, blockCache, seed, timeout):
+    random.seed(seed)
+    instance = cpu.CPU()
+    instance.useBlockCache = blockCache
+    instance.reset(program["type"])
+
+    rom = roms.load(program)
+    instance.ram[0x200:0x200 + len(rom)] = rom
+    instance.loaded(len(rom))
+
+    machine.start(instance, keyScript, instructionsPerFrame, frames, timeout)
+    step = instance.runBlock if blockCache else instance.cycle
+    start = time.perf_counter()
+    try:
+        while machine.frame < frames and instance.running:
+            frame = machine.frame
+            while instance.running and machine.frame == frame and instance.cycles < instructionsPerFrame:
+                step()
+                if instance.snapshotDue:
+                    instance.snapshot()
+            if machine.frame == frame:
+                machine.endFrame()
+    except StopRun:
+        pass
+    elapsed = time.perf_counter() - start
+
+    return {
+        "name": program["name"],
+        "file": program["file"],
+        "frames": machine.frame,
+        "instructions": machine.executed,
+        "seconds": elapsed,
+        "ips": machine.executed / elapsed if elapsed else 0,
+        "fps": machine.frame / elapsed if elapsed else 0,
+        "halted": not instance.running,
+        "timedOut": machine.timedOut,
+        "hashes": machine.hashes,
+        "screenHashes": machine.screenHashes,
+    }
+
+def firstDivergence(hashes, baseline):
+    for frame in range(min(len(hashes), len(baseline))):
+        if hashes[frame] != baseline[frame]:
+            return frame
+    if len(hashes) != len(baseline):
+        return min(len(hashes), len(baseline))
+    return None
+
+def main():
+    parser = argparse.ArgumentParser(description="Run Silicon8 ROMs headlessly and benchmark the interpreter")
+    parser.add_argument('--frames', type=int, default=600, help="60Hz frames to run per ROM")
+    parser.add_argument('--ipf', type=int, default=1000, help="instructions per frame")
+    parser.add_argument('--rom', action='append', help="only run ROMs whose file name contains this (repeatable)")
+    parser.add_argument('--keys', help="key script to use instead of random input")
+    parser.add_argument('--seed', type=int, default=8, help="seed for random input and CXNN")
+    parser.add_argument('--timeout', type=float, default=120, help="seconds of host time a ROM may run for")
+    parser.add_argument('--no-block-cache', dest='blockCache', action='store_false', help="use CPU.cycle instead of the block cache")
+    parser.add_argument('--save', help="write results, including per-frame hashes, to this JSON file")
+    parser.add_argument('--compare', help="compare per-frame hashes against a saved JSON file")
+    parser.add_argument('--verbose', action='store_true', help="show interpreter output")
+    args = parser.parse_args()
+
+    cpu, roms, thumbyinterface = hoststubs.loadInterpreter(
+        lambda name: name in machine.buttons, machine.wait)
+    machine.screen = thumbyinterface.thumby.display.display.buffer
+    catalog = [p for p in roms.catalog() if p.get("file")]
+    if args.rom:
+        catalog = [p for p in catalog if any(r.lower() in p["file"].lower() for r in args.rom)]
+    baseline = {}
+    if args.compare:
+        with open(args.compare, 'r') as stream:
+            baseline = {r["file"]: r for r in json.load(stream)["results"]}
+
+    results = []
+    failures = 0
+    print("%-28s %7s %10s %10s %8s  %s" % ("ROM", "frames", "instr", "instr/s", "fps", "last hash"))
+    for program in catalog:
+        thumbyinterface.setKeys(program["keys"])
+        if args.keys:
+            keyScript = readKeyScript(args.keys)
+        else:
+            keyScript = randomKeyScript(program, args.frames, args.seed)
+        output = io.StringIO()
+        with contextlib.redirect_stdout(sys.stdout if args.verbose else output):
+            result = runProgram(cpu, roms, program, args.frames, keyScript, args.ipf, args.blockCache, args.seed,
+                args.timeout)
+        results.append(result)
+
+        status = result["hashes"][-1] if result["hashes"] else "-"
+        if program["file"] in baseline:
+            saved = baseline[program["file"]]
+            frame = firstDivergence(result["hashes"], saved["hashes"])
+            screenFrame = None
+            if "screenHashes" in saved:
+                screenFrame = firstDivergence(result["screenHashes"], saved["screenHashes"])
+            if frame is not None:
+                status += "  DIFFERS from frame %d" % frame
+                failures += 1
+            elif screenFrame is not None:
+                status += "  SCREEN DIFFERS from frame %d" % screenFrame
+                failures += 1
+            else:
+                status += "  same"
+        if result["halted"]:
+            status += "  (halted)"
+        if result["timedOut"]:
+            status += "  TIMED OUT"
+            failures += 1
+        print("%-28s %7d %10d %10.0f %8.1f  %s" % (
+            program["name"][:28], result["frames"], result["instructions"],
+            result["ips"], result["fps"], status))
+
+    instructions = sum(r["instructions"] for r in results)
+    seconds = sum(r["seconds"] for r in results)
+    print("Total: %d instructions in %.2fs, %.0f instructions/s" % (
+        instructions, seconds, instructions / seconds if seconds else 0))
+
+    if args.save:
+        with open(args.save, 'w') as stream:
+            json.dump({
+                "frames": args.frames,
+                "ipf": args.ipf,
+                "seed": args.seed,
+                "blockCache": args.blockCache,
+                "results": results
+            }, stream, indent=1)
+
+    return 1 if failures else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
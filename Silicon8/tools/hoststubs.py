@@ -0,0 +1,163 @@
+# Silicon8 host stand-ins
+#
+# The `thumby` (buttons, display, audio), `framebuf`, `micropython` and `ujson`
+# modules and the `const`, `ptr8` and `ptr32` builtins the interpreter uses,
+# and loadInterpreter, which loads the interpreter modules over them.
+
+import builtins
+import json
+import os
+import sys
+import time
+
+SILICON8_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ROM_PATH = os.path.join(SILICON8_PATH, 'chip8')
+
+
+# Viper pointers truncate on store, CPython bytearrays raise instead. Both
+# assume a little-endian machine, like the RP2040.
+class Ptr8:
+    def __init__(self, buffer):
+        self.buffer = buffer
+
+    def __getitem__(self, index):
+        return self.buffer[index]
+
+    def __setitem__(self, index, value):
+        self.buffer[index] = value & 0xFF
+
+class Ptr32:
+    def __init__(self, buffer):
+        self.words = memoryview(buffer).cast('I')
+
+    def __getitem__(self, index):
+        return self.words[index]
+
+    def __setitem__(self, index, value):
+        self.words[index] = value & 0xFFFFFFFF
+
+class MicroPython:
+    @staticmethod
+    def native(function):
+        return function
+
+    @staticmethod
+    def viper(function):
+        return function
+
+    @staticmethod
+    def const(value):
+        return value
+
+MONO_VLSB = 0
+MONO_HLSB = 3
+
+# Just enough of framebuf.FrameBuffer for thumbyinterface
+class FrameBuffer:
+    def __init__(self, buffer, width, height, format):
+        self.buffer = buffer
+        self.width = width
+        self.height = height
+        self.format = format
+
+    def pixel(self, x, y, colour=None):
+        if self.format == MONO_HLSB:
+            index = (y * self.width + x) >> 3
+            bit = 7 - (x & 7)
+        else:
+            index = (y >> 3) * self.width + x
+            bit = y & 7
+        if colour is None:
+            return (self.buffer[index] >> bit) & 1
+        if colour:
+            self.buffer[index] |= 1 << bit
+        else:
+            self.buffer[index] &= ~(1 << bit) & 0xFF
+
+    def fill(self, colour):
+        for i in range(len(self.buffer)):
+            self.buffer[i] = 0xFF if colour else 0
+
+    def blit(self, source, x, y, key=-1, palette=None):
+        for sy in range(source.height):
+            if not 0 <= y + sy < self.height:
+                continue
+            for sx in range(source.width):
+                if not 0 <= x + sx < self.width:
+                    continue
+                colour = source.pixel(sx, sy)
+                if colour != key:
+                    self.pixel(x + sx, y + sy, colour)
+
+# pressed(name) says whether a button is held, by its letter in UDLRAB
+class Button:
+    def __init__(self, name, pressed):
+        self.name = name
+        self.isPressed = pressed
+
+    def pressed(self):
+        return self.isPressed(self.name)
+
+    def justPressed(self):
+        return self.pressed()
+
+class Display:
+    width = 72
+    height = 40
+
+    def __init__(self):
+        self.display = FrameBuffer(bytearray(72 * 40 // 8), 72, 40, MONO_VLSB)
+
+    def update(self):
+        pass
+
+    def setFPS(self, fps):
+        pass
+
+class Audio:
+    def play(self, freq, duration):
+        pass
+
+    def stop(self):
+        pass
+
+def module(name, **members):
+    result = type(sys)(name)
+    result.__dict__.update(members)
+    return result
+
+# wait(ms) is what time.sleep_ms does, which the interpreter busy waits with
+def installStandIns(pressed=lambda name: False, wait=lambda ms: None):
+    builtins.const = MicroPython.const
+    builtins.micropython = MicroPython
+    builtins.ptr8 = Ptr8
+    builtins.ptr32 = Ptr32
+    time.sleep_ms = wait
+    time.ticks_ms = lambda: int(time.perf_counter() * 1000)
+    time.ticks_diff = lambda a, b: a - b
+    sys.modules['micropython'] = MicroPython
+    sys.modules['framebuf'] = module('framebuf',
+        FrameBuffer=FrameBuffer, MONO_HLSB=MONO_HLSB, MONO_VLSB=MONO_VLSB)
+    sys.modules['thumby'] = module('thumby',
+        display=Display(), audio=Audio(),
+        buttonU=Button('U', pressed), buttonD=Button('D', pressed),
+        buttonL=Button('L', pressed), buttonR=Button('R', pressed),
+        buttonA=Button('A', pressed), buttonB=Button('B', pressed))
+    sys.modules['ujson'] = json
+
+# Silicon8 has its own `types` module that shadows the standard library one,
+# so load the interpreter with the standard module temporarily out of the way
+def loadInterpreter(pressed=lambda name: False, wait=lambda ms: None):
+    installStandIns(pressed, wait)
+    standardTypes = sys.modules.pop('types')
+    sys.path.insert(0, SILICON8_PATH)
+    try:
+        import cpu
+        import roms
+        import thumbyinterface
+    finally:
+        sys.path.remove(SILICON8_PATH)
+        sys.modules['s8types'] = sys.modules['types']
+        sys.modules['types'] = standardTypes
+    roms.ROM_PATH = ROM_PATH
+    return cpu, roms, thumbyinterface
@@ -0,0 +1,139 @@
+# Silicon8 scroll microbenchmark
+#
+# Times the AccurateDisplay scroll operations against the per-byte loops they
+# replaced, at 64x32 and 128x64, with both planes selected. Also checks the
+# results against a straightforward row-by-row reference.
+#
+# Runs under CPython from the repository root, using the stand-ins from
+# hoststubs.py:
+#
+#   python3 Silicon8/tools/scrollbench.py
+#
+# or on a Thumby, after copying it to /Games/Silicon8/tools:
+#
+#   import sys; sys.path.append('/Games/Silicon8/tools'); import scrollbench
+#
+# Under CPython the viper pointers are emulated, so only the numbers measured
+# on the device say anything about real scroll cost.
+
+import sys
+import time
+
+if sys.implementation.name == 'micropython':
+    sys.path.insert(0, '/Games/Silicon8')
+    import cpu
+    ticks_us = time.ticks_us
+    ticks_diff = time.ticks_diff
+else:
+    import os
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import hoststubs
+    cpu, roms, thumbyinterface = hoststubs.loadInterpreter()
+    ticks_us = lambda: int(time.perf_counter() * 1000000)
+    ticks_diff = lambda a, b: a - b
+
+REPEATS = 20
+
+
+#### The per-byte loops from before the scroll engine, for comparison
+
+@micropython.native
+def legacyScrollDown(self, n):
+    offset = int(self.width * n / 8)
+    for plane in range(1, 3):
+        if (plane & self.selectedPlane) == 0:
+            continue
+        for i in range(len(self.buffers[plane-1]) - 1, -1, -1):
+            self.buffers[plane-1][i] = self.buffers[plane-1][i - offset] if i > offset else 0
+
+@micropython.native
+def legacyScrollUp(self, n):
+    offset = int(self.width * n / 8)
+    for plane in range(1, 3):
+        if (plane & self.selectedPlane) == 0:
+            continue
+        maxIndex = len(self.buffers[plane-1])
+        for i in range(maxIndex):
+            self.buffers[plane-1][i] = self.buffers[plane-1][i + offset] if i + offset < maxIndex else 0
+
+@micropython.native
+def legacyScrollLeft(self):
+    for plane in range(1, 3):
+        if (plane & self.selectedPlane) == 0:
+            continue
+        for i in range(len(self.buffers[plane-1])):
+            right = self.buffers[plane-1][i+1] >> 4 if (i+1) % self.width / 8 != 0 else 0
+            left = self.buffers[plane-1][i] << 4
+            self.buffers[plane-1][i] = (left | right) & 0xFF
+
+@micropython.native
+def legacyScrollRight(self):
+    for plane in range(1, 3):
+        if (plane & self.selectedPlane) == 0:
+            continue
+        for i in range(len(self.buffers[plane-1]) - 1, -1, -1):
+            left = self.buffers[plane-1][i-1] << 4 if i % self.width / 8 != 0 else 0
+            right = self.buffers[plane-1][i] >> 4
+            self.buffers[plane-1][i] = (left | right) & 0xFF
+
+
+#### Reference results, one row at a time
+
+def referenceScroll(buffer, width, height, direction, n):
+    rowBytes = width >> 3
+    rows = [int.from_bytes(buffer[r*rowBytes:(r+1)*rowBytes], 'big') for r in range(height)]
+    mask = (1 << width) - 1
+    if direction == 'down':
+        rows = [0] * n + rows[:height-n]
+    elif direction == 'up':
+        rows = rows[n:] + [0] * n
+    elif direction == 'left':
+        rows = [(r << 4) & mask for r in rows]
+    else:
+        rows = [r >> 4 for r in rows]
+    result = bytearray()
+    for r in rows:
+        result.extend(r.to_bytes(rowBytes, 'big'))
+    return result
+
+
+def makeDisplay(width, height):
+    instance = cpu.CPU()
+    instance.reset(0)
+    display = instance.display
+    display.selectedPlane = 3
+    display.setResolution(width, height)
+    for plane in display.buffers:
+        for i in range(len(plane)):
+            plane[i] = (i * 73 + 41) & 0xFF
+    return display
+
+def timeIt(function, display, args):
+    start = ticks_us()
+    for _ in range(REPEATS):
+        function(display, *args)
+    return ticks_diff(ticks_us(), start) / REPEATS
+
+def main():
+    cases = (
+        ('down',  legacyScrollDown,  'scrollDown',  (4,)),
+        ('up',    legacyScrollUp,    'scrollUp',    (4,)),
+        ('left',  legacyScrollLeft,  'scrollLeft',  ()),
+        ('right', legacyScrollRight, 'scrollRight', ()),
+    )
+    print("%-6s %-8s %12s %12s %8s  %s" % ("dir", "size", "loops us", "engine us", "speedup", "check"))
+    for width, height in ((64, 32), (128, 64)):
+        for direction, legacy, method, args in cases:
+            display = makeDisplay(width, height)
+            before = bytearray(display.buffers[0])
+            getattr(display, method)(*args)
+            n = args[0] if args else 0
+            check = "ok" if display.buffers[0] == referenceScroll(before, width, height, direction, n) else "MISMATCH"
+
+            old = timeIt(legacy, makeDisplay(width, height), args)
+            display = makeDisplay(width, height)
+            new = timeIt(lambda d, *a: getattr(d, method)(*a), display, args)
+            print("%-6s %-8s %12.1f %12.1f %7.1fx  %s" % (
+                direction, "%dx%d" % (width, height), old, new, old / new if new else 0, check))
+
+main()
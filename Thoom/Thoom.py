@@ -15,12 +15,14 @@ import time
 import thumby
 import math
 import random
+from array import array
 customrender = __import__("/Games/Thoom/customrender")
 gamesprite = __import__("/Games/Thoom/gamesprite")
 _drawMeltScreen = customrender.drawMeltScreen
 _drawBg = customrender.drawBg
 _drawWall = customrender.drawWall
 _drawWall2 = customrender.drawWall2
+_castWalls = customrender.castWalls
 _drawMeltScreen = customrender.drawMeltScreen
 _drawScaled = customrender.drawScaled
 _drawPixel = customrender.drawPixel
@@ -490,6 +492,10 @@ T_Map =  [
            bytearray( [4, 0, 0, 0, 6, 0, 0, 6, 4, 0, 0, 0, 0, 1, 1, 1, 1, 1, 1]),
            bytearray( [4, 0, 0, 0, 6, 0, 0, 6, 4, 0, 0, 0, 0, 1, 1, 1, 1, 1, 1]),
            bytearray( [4, 4, 4, 4, 6, 6, 6, 6, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1])]
+#rows are views into one flat copy so the viper raycaster sees door changes
+MAPW = len(T_Map[0])
+T_MapData = bytearray(b"".join(T_Map))
+T_Map = [memoryview(T_MapData)[y*MAPW:(y+1)*MAPW] for y in range(len(T_Map))]
             
 doors = [[4,6],[9,6],[13,6]]
 entitesLv1 = [Demon(6,6.5),Demon(8,5),Demon(6.5,11.5),Demon(2.5,11),ItemKey(1.5,11.5)]
@@ -524,6 +530,14 @@ yOffset = 4
 music = 0
 frame = -60
 depthMap= [0]*72
+FASTRAYCAST = True #fixed-point raycaster in customrender, False for the original float one
+PROFILE = False #print where the frame time goes every 30 frames
+rayTables = array('i', [0]*72*6) #per column ray direction, delta distance and texture direction
+rayHits = array('i', [0]*72*3) #per column distance, wall and texture u
+rayParams = array('i', [0]*7)
+rayTableKey = None #direction the tables were built for
+profileTimes = [0]*4 #background, walls, entities, hud in us
+profileLast = 0
 entites = []
 boss = Boss()
 
@@ -624,6 +638,79 @@ def raycastWall(x:int, rayPositionX:float, rayPositionY:float):
         return perpWallDistance
         
         
+@micropython.native
+def buildRayTables(step:int):
+    count = SW//step
+    for c in range(count):
+        cameraX = 2.0 * c*step / SW - 1.0
+        rayDirectionX = directionX + planeX * cameraX
+        rayDirectionY = directionY + planeY * cameraX + .000000000000001 # avoiding ZDE 
+        rayLength = math.sqrt(rayDirectionX * rayDirectionX + rayDirectionY * rayDirectionY)
+        t = c*6
+        rayTables[t] = int(rayDirectionX*4096)
+        rayTables[t+1] = int(rayDirectionY*4096)
+        rayTables[t+2] = int(min(256/max(abs(rayDirectionX),.000001), 262144))
+        rayTables[t+3] = int(min(256/max(abs(rayDirectionY),.000001), 262144))
+        rayTables[t+4] = int(rayDirectionX/rayLength*4096)
+        rayTables[t+5] = int(rayDirectionY/rayLength*4096)
+    rayParams[2] = count
+    rayParams[3] = MAPW
+    rayParams[4] = int(planeX*2*step/SW*65536)
+    rayParams[5] = int(planeY*2*step/SW*65536)
+    rayParams[6] = 8
+
+@micropython.native
+def raycastColumns():
+    global rayTableKey
+    step = 2 if emulated else 1
+    key = (directionX, directionY, step)
+    if key != rayTableKey:
+        buildRayTables(step)
+        rayTableKey = key
+    rayParams[0] = int(positionX*4096)
+    rayParams[1] = int(positionY*4096)
+    _castWalls(rayTables, T_MapData, rayHits, rayParams)
+    
+    _draw = _drawWall
+    if emulated:
+         _draw = _drawWall2
+    for c in range(SW//step):
+        x = c*step
+        perp = rayHits[c*3]
+        if perp < 0:
+            d = 99
+        else:
+            d = perp/4096
+            lineHEIGHT = (SH<<12)//perp
+            drawStart = -(lineHEIGHT >>1) + (SH >>1) -yOffset
+            if (drawStart < 0): drawStart = 0
+            drawEnd = (lineHEIGHT >>1)+ (SH >>1)-yOffset
+            if (drawEnd >= SH): drawEnd = SH
+            w = rayHits[c*3+1]
+            if(w == 3):
+                if(boss.minX>x):boss.minX = x;
+                if(boss.maxX<x):boss.maxX = x;
+                boss.depth = d
+            if(lineHEIGHT>SH):
+                _draw( T_Walls[w], x, drawStart, drawEnd-drawStart, (lineHEIGHT-SH)*1536//lineHEIGHT, 3072//lineHEIGHT, rayHits[c*3+2])
+            elif(lineHEIGHT>0):
+                _draw( T_Walls[w], x, drawStart, drawEnd-drawStart, 0, 3072//lineHEIGHT, rayHits[c*3+2])
+        depthMap[x] = d
+        if step == 2:
+            depthMap[x+1] = d
+
+def profileMark(phase):
+    global profileLast
+    now = time.ticks_us()
+    if phase >= 0:
+        profileTimes[phase] += time.ticks_diff(now, profileLast)
+    profileLast = now
+    
+def profileReport():
+    print("bg %.1f walls %.1f entities %.1f hud %.1f ms" % tuple(t/30000 for t in profileTimes))
+    for i in range(4):
+        profileTimes[i] = 0
+        
 @micropython.native
 def dot(x1:float,y1:float,x2:float,y2:float):
     return x1*x2+y1*y2
@@ -784,10 +871,14 @@ def process():
     boss.minX = SW+1
     boss.maxX = -1
     boss.depth = -1
+    if PROFILE: profileMark(-1)
     _drawBg(T_BG,SW,PA)
+    if PROFILE: profileMark(0)
     if(boss.active):
         boss.update()
-    if emulated:
+    if FASTRAYCAST:
+        raycastColumns()
+    elif emulated:
         for x in range(0, (SW>>1) ):
             d = raycastWall(x<<1,positionX,positionY)
             depthMap[x<<1] = d
@@ -796,6 +887,7 @@ def process():
         for x in range(0, (SW) ):
             d = raycastWall(x-1,positionX,positionY)
             depthMap[x] = d
+    if PROFILE: profileMark(1)
     
     renderList= []
     for e in entites:
@@ -823,6 +915,7 @@ def process():
             shooting = 1
     else:
         aiming =0
+    if PROFILE: profileMark(2)
     if(hp<=0):
         0
     elif(shooting>0):
@@ -862,6 +955,9 @@ def process():
         hpStr = " "+hpStr
     thumby.display.drawText(hpStr, 56, 1, 1)
     frame += 1
+    if PROFILE:
+        profileMark(3)
+        if frame%30 == 0: profileReport()
     
     
 @micropython.native
@@ -57,6 +57,125 @@ def drawWall2( sprtptr:ptr8, x:int, drawStart:int, height:int, vs:int, m:int, u:
             ptr[i]  &= v
             ptr[i+1]  &= v
 
+# Fixed-point DDA for every column at once. Positions and distances are 20.12,
+# delta distances 8.8, ray directions 4.12 and the per-column ray step 0.16.
+# tables holds 6 ints per column: ray direction x/y, delta distance x/y and the
+# ray direction divided by its length x/y (for texture u). params: position
+# x/y, columns, map width, ray step x/y, max columns to reuse a hit for. out
+# gets 3 ints per column: distance (-1 for no hit), wall type and texture u.
+# After a full DDA, the next columns reuse its hit cell and side for as long as
+# no grid corner on the path lies between their ray and this one, since then
+# their rays cross exactly the same cells.
+@micropython.viper
+def castWalls(tables:ptr32, level:ptr8, out:ptr32, params:ptr32):
+    posX = params[0]
+    posY = params[1]
+    count = params[2]
+    mapW = params[3]
+    dX = params[4]
+    dY = params[5]
+    cap = params[6]
+    dN = (dX if dX > 0 else 0-dX) + (dY if dY > 0 else 0-dY)
+    cellX = posX >> 12
+    cellY = posY >> 12
+    reach = 0
+    wall = 0
+    hitX = 0
+    hitY = 0
+    side = 0
+    for c in range(count):
+        t = c*6
+        rdx = tables[t]
+        rdy = tables[t+1]
+        if reach > 0:
+            reach -= 1
+        else:
+            deltaX = tables[t+2]
+            deltaY = tables[t+3]
+            stepX = 1 if rdx >= 0 else -1
+            stepY = 1 if rdy >= 0 else -1
+            sideX = (((4096-(posX & 4095)) if rdx >= 0 else (posX & 4095))*deltaX) >> 12
+            sideY = (((4096-(posY & 4095)) if rdy >= 0 else (posY & 4095))*deltaY) >> 12
+            mapX = cellX
+            mapY = cellY
+            reach = cap
+            # corners to check: all 4 of the starting cell, then the ends of
+            # each crossed edge
+            gx = cellX
+            gy = cellY
+            pStep = 1
+            pEnd = 4
+            hit = 0
+            while hit < 10:
+                p = 0
+                while p < pEnd:
+                    px = ((gx + (p & 1)) << 12) - posX
+                    py = ((gy + (p >> 1)) << 12) - posY
+                    p += pStep
+                    if px*rdx + py*rdy <= 0: # behind the player
+                        continue
+                    # the corner is between this ray and the one k columns on
+                    # where the cross products change sign. Corners within a
+                    # column of this ray stop reuse either way, as rounding
+                    # may have put them on the wrong side.
+                    cA = rdx*py - rdy*px
+                    cD = (dX*py - dY*px) >> 4
+                    aA = cA if cA > 0 else 0-cA
+                    aD = cD if cD > 0 else 0-cD
+                    if aA <= aD:
+                        reach = 0
+                    elif (cA > 0 and cD < 0) or (cA < 0 and cD > 0):
+                        k = aA//aD - 1
+                        if k < reach:
+                            reach = k
+                if hit > 0 and level[mapY*mapW + mapX] > 0:
+                    break
+                hit += 1
+                if sideX < sideY:
+                    gx = mapX + (1 if stepX > 0 else 0)
+                    gy = mapY
+                    pStep = 2
+                    sideX += deltaX
+                    mapX += stepX
+                    side = 0
+                else:
+                    gx = mapX
+                    gy = mapY + (1 if stepY > 0 else 0)
+                    pStep = 1
+                    sideY += deltaY
+                    mapY += stepY
+                    side = 1
+                pEnd = 4 if pStep == 2 else 2
+            if hit == 10:
+                out[c*3] = -1
+                reach = 0
+                continue
+            wall = level[mapY*mapW + mapX]
+            hitX = mapX + (1 if side == 0 and stepX < 0 else 0)
+            hitY = mapY + (1 if side == 1 and stepY < 0 else 0)
+        # distance along the ray to the face of the hit cell
+        if side == 0:
+            num = (hitX << 12) - posX
+            den = rdx
+        else:
+            num = (hitY << 12) - posY
+            den = rdy
+        num = num if num > 0 else 0-num
+        den = den if den > 0 else 0-den
+        perp = (num << 12)//den if den > 0 else 1
+        if perp < 1:
+            perp = 1
+        if side == 0:
+            u = posY + ((perp*tables[t+5]) >> 12)
+        else:
+            u = posX + ((perp*tables[t+4]) >> 12)
+        limit = 11744051//(dN*(perp >> 4) + 1) # keeps reused rays within 0.7 cells of each other
+        if limit < reach:
+            reach = limit
+        out[c*3] = perp
+        out[c*3+1] = wall
+        out[c*3+2] = ((u & 4095)*24) >> 12
+
 @micropython.viper
 def capture():
     ptr = ptr8(thumby.display.display.buffer)
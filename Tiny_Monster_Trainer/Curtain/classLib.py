@@ -5,6 +5,9 @@ import thumby
 import math
 import random
 import ujson
+import sys
+sys.path.append("/Games/Tiny_Monster_Trainer/Curtain/")
+from partsLib import openParts, readPart, HEADS, BODIES, LEGS, SPECIAL, BIRB_HEAD, BIRB_BODY, BIRB_LEGS
 
 
 def thingAquired(word1, word2, itemName, word4 ="", setSleep=1, skipUpdate=0, skipFill=0):
@@ -286,22 +289,19 @@ class Monster:
     
     def makeMonBody(self):
         gc.collect()
-        f = open('/Games/Tiny_Monster_Trainer/Curtain/MonsterParts.ujson')
-        monsterParts = ujson.load(f)
-
+        f = openParts()
         if random.randint(0,120) != 1:
             randoNum = random.randint(0,17)
-            self.bodyBlock['head'] = monsterParts["heads"][str(randoNum)]
+            self.bodyBlock['head'] = list(readPart(f, HEADS, randoNum))
             randoNum = random.randint(1,17)
-            self.bodyBlock['body'] = monsterParts["bodies"][str(randoNum)]
+            self.bodyBlock['body'] = list(readPart(f, BODIES, randoNum))
             randoNum = random.randint(1,17)
-            self.bodyBlock['legs'] = monsterParts["legs"][str(randoNum)]
+            self.bodyBlock['legs'] = list(readPart(f, LEGS, randoNum))
         else:
-            self.bodyBlock['head'] = monsterParts["special"]["birbHead"]
-            self.bodyBlock['body'] = monsterParts["special"]["birbBody"]
-            self.bodyBlock['legs'] = monsterParts["special"]["birbLegs"]
+            self.bodyBlock['head'] = list(readPart(f, SPECIAL, BIRB_HEAD))
+            self.bodyBlock['body'] = list(readPart(f, SPECIAL, BIRB_BODY))
+            self.bodyBlock['legs'] = list(readPart(f, SPECIAL, BIRB_LEGS))
         f.close()
-        del monsterParts
 
     
     
@@ -9,6 +9,7 @@ import sys
 sys.path.append("/Games/Tiny_Monster_Trainer/Curtain/")
 from classLib import Player, Monster, Item, AttackMove
 from funcLib import thingAquired, buttonInput, noDupAtk, giveName, tameMon, save, showMonInfo
+from saveLib import saveExists, SAVE_PATH
 
     
 def makeMonsterList(mSeed):
@@ -41,8 +42,8 @@ def makeMonsterList(mSeed):
     del MonsterDict
     gc.collect()
     try:
-        p = open("/Games/Tiny_Monster_Trainer/Curtain/tmt.ujson", "r")
-        p.close()
+        if not saveExists(SAVE_PATH + "tmt"):
+            raise OSError
     except OSError:
         randomNum1 = 0
         randomNum2 = 0
@@ -102,8 +103,8 @@ def makePlayer(monster1, monster2, monster3, seed):
 
     
 try:
-    p = open("/Games/Tiny_Monster_Trainer/Curtain/tmt.ujson", "r")
-    p.close()
+    if not saveExists(SAVE_PATH + "tmt"):
+        raise OSError
     p = open("/Games/Tiny_Monster_Trainer/Curtain/here_be_monsters.ujson", "r")
     p.close()
 except OSError:
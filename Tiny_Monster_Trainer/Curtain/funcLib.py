@@ -4,10 +4,11 @@ from time import sleep as sleepy
 import thumby
 import math
 import sys
-import ujson
 import micropython
 sys.path.append("/Games/Tiny_Monster_Trainer/Curtain/")
 from classLib import Monster, TextForScroller
+from saveLib import savePlayer, SAVE_PATH
+from partsLib import monSprite, MON_WIDTH, MON_HEIGHT
 
 
 def makeTheList(theObj):
@@ -220,9 +221,7 @@ def switchActiveMon(playerInfo, oldActiveMon, newActiveMon, newActiveMonOldPos):
     
 
 def printMon(monsterBody, x, y, playerOrNPC):
-    thumby.display.blit(bytearray(monsterBody['head']), x, y, 20, 9, 0, playerOrNPC, 0)
-    thumby.display.blit(bytearray(monsterBody['body']), x, y+9, 20, 9, 0, playerOrNPC, 0)
-    thumby.display.blit(bytearray(monsterBody['legs']), x, y+18, 20, 9, 0, playerOrNPC, 0)
+    thumby.display.blit(monSprite(monsterBody), x, y, MON_WIDTH, MON_HEIGHT, 0, playerOrNPC, 0)
 
 
 def drawArrows(l, r, d, u=1): # x, y):
@@ -348,32 +347,7 @@ def showMonInfo(playerInfo, startOfgameCheck=0, combatCheck=0, campfire=0):
             right = -1
 
     
-def obj_to_dict(obj):
-    return obj.__dict__
-
-        
 def save(playerInfo, name):
     gc.collect()
-    statDict = {}
-    bodyDict = {}
-    attackDict = {}
-    mutateDict = {}
-    itemDict = {}
-    bonusDict = {}
-    for x in range(0, len(playerInfo.friends)):
-        tempAttackDict = {}
-        for y in range (0, len(playerInfo.friends[x].attackList)):
-            tempAttackDict["attack" + str(y)] = obj_to_dict(playerInfo.friends[x].attackList[y])
-            attackDict["mon" + str(x) + "atk"] = tempAttackDict
-        statDict["mon" + str(x) + "stat"] = playerInfo.friends[x].statBlock
-        bodyDict["mon" + str(x) + "body"] = playerInfo.friends[x].bodyBlock
-        mutateDict["mon" + str(x) + "mutate"] = playerInfo.friends[x].mutateSeed
-        bonusDict["mon" + str(x) + "bonus"] = playerInfo.friends[x].bonusStats
-    for x in range(0, len(playerInfo.inventory)):
-        itemDict["item" + str(x)] = obj_to_dict(playerInfo.inventory[x])
-    playerDict = [{"player" : playerInfo.playerBlock, "items" : [itemDict], "monsterInfo": [statDict, bodyDict, attackDict, mutateDict, bonusDict]}]
-    with open('/Games/Tiny_Monster_Trainer/Curtain/'+name+'.ujson', 'w') as f:
-        ujson.dump(playerDict, f)
-        f.close()
-    del playerDict
+    savePlayer(playerInfo, SAVE_PATH + name)
     gc.collect()    
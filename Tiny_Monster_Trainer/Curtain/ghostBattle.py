@@ -4,70 +4,23 @@ import time
 import thumby
 import math
 import random
-import ujson
 import sys 
 import machine
 sys.path.append("/Games/Tiny_Monster_Trainer/Curtain/")
 from classLib import Player, Monster, TextForScroller, Item, AttackMove
 from funcLib import thingAquired, battleStartAnimation, drawArrows, showOptions, buttonInput, switchActiveMon
 from battle import Battle
+from saveLib import loadPlayer, listSaves, SAVE_PATH, GHOST_PATH
 
 def loadGame():
     gc.collect()
-    tempPlayer = Player()
-    f = open('/Games/Tiny_Monster_Trainer/Curtain/tmt.ujson')
-    bigJson = ujson.load(f)
-    tempPlayer.playerBlock = bigJson[0]['player'].copy()
-    if bigJson[0]['items'] != [{}]:
-        for x in range(0, len(bigJson[0]['items'][0])):
-            tempPlayer.inventory.append(Item(bigJson[0]['items'][0]['item' + str(x)]['name'],
-                                            bigJson[0]['items'][0]['item' + str(x)]['key'],
-                                            bigJson[0]['items'][0]['item' + str(x)]['bonus']))
-    for x in range(0, len(bigJson[0]['monsterInfo'][0])):
-        tempMon = Monster()
-        tempMon.statBlock = bigJson[0]['monsterInfo'][0]['mon' + str(x) + 'stat'].copy()
-        tempMon.bodyBlock = bigJson[0]['monsterInfo'][1]['mon' + str(x) + 'body'].copy()
-        tempMon.mutateSeed = bigJson[0]['monsterInfo'][3]['mon' + str(x) + 'mutate'].copy()
-        for y in range(0, len(bigJson[0]['monsterInfo'][2]['mon' + str(x) + 'atk'])): 
-            tempAttackMove = AttackMove(bigJson[0]['monsterInfo'][2]['mon' + str(x) + 'atk']['attack' + str(y)]['name'], 
-                                        bigJson[0]['monsterInfo'][2]['mon' + str(x) + 'atk']['attack' + str(y)]['numUses'],
-                                        bigJson[0]['monsterInfo'][2]['mon' + str(x) + 'atk']['attack' + str(y)]['baseDamage'],
-                                        bigJson[0]['monsterInfo'][2]['mon' + str(x) + 'atk']['attack' + str(y)]['magic'],
-                                        bigJson[0]['monsterInfo'][2]['mon' + str(x) + 'atk']['attack' + str(y)]['moveElementType'])
-            tempAttackMove.currentUses = bigJson[0]['monsterInfo'][2]['mon' + str(x) + 'atk']['attack' + str(y)]['currentUses']
-            tempMon.attackList.append(tempAttackMove) 
-        tempMon.attackList = tempMon.attackList.copy()
-        tempPlayer.friends.append(tempMon)
-        tempPlayer.friends = tempPlayer.friends.copy()
-    f.close()
-    del bigJson
-    return tempPlayer
+    return loadPlayer(SAVE_PATH + "tmt")
 
 
 def loadGhost(ghostFile):
     gc.collect()
-    tempPlayer = Player()
-    f = open('/Games/Tiny_Monster_Trainer/Ghosts/'+ghostFile+'.ujson')
-    bigGhostJson = ujson.load(f)
-    tempPlayer.playerBlock = bigGhostJson[0]['player'].copy()
-    for x in range(0, len(bigGhostJson[0]['monsterInfo'][0])):
-        tempMon = Monster()
-        tempMon.statBlock = bigGhostJson[0]['monsterInfo'][0]['mon' + str(x) + 'stat'].copy()
-        tempMon.bodyBlock = bigGhostJson[0]['monsterInfo'][1]['mon' + str(x) + 'body'].copy()
-        for y in range(0, len(bigGhostJson[0]['monsterInfo'][2]['mon' + str(x) + 'atk'])): 
-            tempAttackMove = AttackMove(bigGhostJson[0]['monsterInfo'][2]['mon' + str(x) + 'atk']['attack' + str(y)]['name'], 
-                                        bigGhostJson[0]['monsterInfo'][2]['mon' + str(x) + 'atk']['attack' + str(y)]['numUses'],
-                                        bigGhostJson[0]['monsterInfo'][2]['mon' + str(x) + 'atk']['attack' + str(y)]['baseDamage'],
-                                        bigGhostJson[0]['monsterInfo'][2]['mon' + str(x) + 'atk']['attack' + str(y)]['magic'],
-                                        bigGhostJson[0]['monsterInfo'][2]['mon' + str(x) + 'atk']['attack' + str(y)]['moveElementType'])
-            tempAttackMove.currentUses = bigGhostJson[0]['monsterInfo'][2]['mon' + str(x) + 'atk']['attack' + str(y)]['currentUses']
-            tempMon.attackList.append(tempAttackMove) 
-        tempMon.attackList = tempMon.attackList.copy()
-        tempPlayer.friends.append(tempMon)
-        tempPlayer.friends = tempPlayer.friends.copy()
+    tempPlayer = loadPlayer(GHOST_PATH + ghostFile)
     tempPlayer.lOrR = 0
-    f.close()
-    del bigGhostJson
     return tempPlayer
 
 
@@ -98,14 +51,11 @@ def drawArrowsGhost(d, u): # x, y):
 
 
 def pickGhost():
-    import os
     curSelect = 0
     cancelCheck = 0
     tempSelect = curSelect
     bottomText = "Pick a Ghost"
-    files = os.listdir("/Games/Tiny_Monster_Trainer/Ghosts/")
-    for x in range(len(files)):
-        files[x] = files[x].replace('.ujson', '')
+    files = listSaves(GHOST_PATH)
     while cancelCheck != 1:
         curSelect = showOptions(files, curSelect, bottomText)
         drawArrowsGhost(0, 0)
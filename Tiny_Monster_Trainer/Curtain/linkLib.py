@@ -0,0 +1,212 @@
+import gc
+gc.enable()
+import time
+import thumby
+import random
+import struct
+import micropython
+import sys
+sys.path.append("/Games/Tiny_Monster_Trainer/Curtain/")
+from classLib import Player, Monster, AttackMove
+
+# Link battle wire format: a player and their monsters are packed into one
+# binary payload, which LinkExchange trades with the other thumby in a few
+# big packets instead of one ujson packet per field.
+
+WIRE_VERSION = 1
+CHUNK = 64          # payload bytes per chunk
+WINDOW = 4          # chunks per packet, 11 + 4*(1+64) + 2 = 273 bytes, thumby.link takes up to 512
+MAX_CHUNKS = 32     # one bit each in the ack field
+MAGIC = 0xB7        # first byte of every exchange packet, never '[' like the battle's ujson packets
+RESEND_MS = 60      # resend when nothing comes back for this long (plus some jitter)
+LINGER_MS = 300     # once done, keep acking the other thumby until it has been quiet this long
+QUIET_MS = 1000     # with all of theirs but no ack for mine, this long without a word means they're done and gone
+
+HEADER = "<BBHHIB"  # magic, my chunk count, my payload length, my payload checksum, chunks I have of theirs, chunks in this packet
+HEADER_SIZE = 11
+# then each chunk's index and bytes, and a checksum of the whole packet
+PLAYER = "<HHBI"    # trainerLevel, experience, friendMax, worldSeed
+STATS = "<HHHHHH"   # Health, Agility, Strength, Endurance, Mysticism, Tinfoil
+ATTACK = "<HhB"     # numUses, baseDamage, magic
+STAT_KEYS = ('Health', 'Agility', 'Strength', 'Endurance', 'Mysticism', 'Tinfoil')
+BODY_KEYS = ('head', 'body', 'legs')
+BODY_SIZE = 40
+
+
+@micropython.native
+def checksum(buf, start, end): # Fletcher-16
+    a = 0
+    b = 0
+    for i in range(start, end):
+        a += buf[i]
+        if a >= 255:
+            a -= 255
+        b += a
+        if b >= 255:
+            b -= 255
+    return (b << 8) | a
+
+
+#### Serializer
+
+def _putStr(out, text):
+    data = text.encode()
+    out.append(len(data))
+    out.extend(data)
+
+
+def _getStr(data, pos):
+    end = pos + 1 + data[pos]
+    return str(data[pos+1:end], 'utf-8'), end
+
+
+def packPlayer(player):
+    out = bytearray([WIRE_VERSION])
+    block = player.playerBlock
+    _putStr(out, block['name'])
+    out.extend(struct.pack(PLAYER, block['trainerLevel'], block['experience'], block['friendMax'], block['worldSeed']))
+    out.append(len(player.friends))
+    for mon in player.friends:
+        stats = mon.statBlock
+        _putStr(out, stats['name'])
+        _putStr(out, stats['given_name'])
+        for key in ('Type1', 'Type2', 'Type3'):
+            _putStr(out, stats[key])
+        out.extend(struct.pack(STATS, stats['Health'], stats['Agility'], stats['Strength'],
+                               stats['Endurance'], stats['Mysticism'], stats['Tinfoil']))
+        for key in BODY_KEYS:
+            out.extend(bytes(mon.bodyBlock[key]))
+        out.append(len(mon.attackList))
+        for atk in mon.attackList:
+            _putStr(out, atk.name)
+            _putStr(out, atk.moveElementType)
+            out.extend(struct.pack(ATTACK, atk.numUses, atk.baseDamage, atk.magic))
+    return out
+
+
+def unpackPlayer(data):
+    if data[0] != WIRE_VERSION:
+        raise ValueError("link data version " + str(data[0]))
+    player = Player()
+    block = player.playerBlock
+    block['name'], pos = _getStr(data, 1)
+    block['trainerLevel'], block['experience'], block['friendMax'], block['worldSeed'] = struct.unpack_from(PLAYER, data, pos)
+    pos += struct.calcsize(PLAYER)
+    count = data[pos]
+    pos += 1
+    for x in range(0, count):
+        mon = Monster()
+        stats = mon.statBlock
+        stats['name'], pos = _getStr(data, pos)
+        stats['given_name'], pos = _getStr(data, pos)
+        for key in ('Type1', 'Type2', 'Type3'):
+            stats[key], pos = _getStr(data, pos)
+        values = struct.unpack_from(STATS, data, pos)
+        pos += struct.calcsize(STATS)
+        for i in range(0, len(STAT_KEYS)):
+            stats[STAT_KEYS[i]] = values[i]
+        stats['currentHealth'] = stats['Health']
+        for key in BODY_KEYS:
+            mon.bodyBlock[key] = list(data[pos:pos+BODY_SIZE])
+            pos += BODY_SIZE
+        atkCount = data[pos]
+        pos += 1
+        for y in range(0, atkCount):
+            name, pos = _getStr(data, pos)
+            elementType, pos = _getStr(data, pos)
+            numUses, baseDamage, magic = struct.unpack_from(ATTACK, data, pos)
+            pos += struct.calcsize(ATTACK)
+            mon.attackList.append(AttackMove(name, numUses, baseDamage, magic, elementType))
+        player.friends.append(mon)
+    return player
+
+
+#### Exchange
+
+class LinkExchange:
+    # Trades payloads with the other thumby, both ways at once. Each payload is
+    # cut into chunks, and every packet carries the first few chunks the other
+    # thumby hasn't got yet, along with a bitmap of the chunks received from it,
+    # so a lost or damaged packet only has its own chunks sent again. Call poll()
+    # until it returns True, then the other thumby's payload is in received.
+    def __init__(self, payload):
+        self.payload = payload
+        self.count = (len(payload) + CHUNK - 1) // CHUNK
+        if self.count > MAX_CHUNKS:
+            raise ValueError("link payload too big")
+        self.total = checksum(payload, 0, len(payload))
+        self.allMine = (1 << self.count) - 1
+        self.acked = 0          # my chunks the other thumby has
+        self.got = 0            # their chunks I have
+        self.allTheirs = -1     # all of their chunks, from their first packet
+        self.theirTotal = 0
+        self.received = None
+        self.complete = False   # got all of their payload, and it checks out
+        self.done = False       # and they have all of mine
+        self.packet = bytearray(HEADER_SIZE + WINDOW*(1+CHUNK) + 2)
+        self.sent = time.ticks_ms()
+        self.heard = self.sent
+        self.wait = 0           # send as soon as polled
+        self.sentBefore = 0
+        self.packets = 0
+        self.resent = 0
+
+    def _take(self, data): # returns whether the other thumby still needs an answer
+        magic, count, length, total, acked, inPacket = struct.unpack_from(HEADER, data, 0)
+        if self.received == None:
+            self.received = bytearray(length)
+            self.allTheirs = (1 << count) - 1
+            self.theirTotal = total
+        self.acked = acked & self.allMine
+        pos = HEADER_SIZE
+        for c in range(0, inPacket):
+            index = data[pos]
+            start = index*CHUNK
+            size = min(start + CHUNK, length) - start
+            self.received[start:start+size] = data[pos+1:pos+1+size]
+            self.got |= 1 << index
+            pos += 1 + size
+        if self.got == self.allTheirs and not self.complete:
+            if checksum(self.received, 0, length) == self.theirTotal:
+                self.complete = True
+            else:
+                self.got = 0 # damage got past the packet checksums, have them send it all again
+        self.done = self.complete and self.acked == self.allMine
+        return inPacket > 0 or self.acked != self.allMine
+
+    def _send(self):
+        packet = self.packet
+        pos = HEADER_SIZE
+        inPacket = 0
+        window = WINDOW if self.received != None else 0 # short hellos until they answer, they collide less
+        for index in range(0, self.count):
+            if inPacket == window:
+                break
+            if not self.acked & (1 << index):
+                start = index*CHUNK
+                end = min(start + CHUNK, len(self.payload))
+                packet[pos] = index
+                packet[pos+1:pos+1+end-start] = self.payload[start:end]
+                pos += 1 + end - start
+                inPacket += 1
+                if self.sentBefore & (1 << index):
+                    self.resent += 1
+                self.sentBefore |= 1 << index
+        struct.pack_into(HEADER, packet, 0, MAGIC, self.count, len(self.payload), self.total, self.got, inPacket)
+        struct.pack_into("<H", packet, pos, checksum(packet, 0, pos))
+        if thumby.link.send(packet[0:pos+2]) != False:
+            self.packets += 1
+            self.sent = time.ticks_ms()
+            self.wait = RESEND_MS + random.randint(0, RESEND_MS) # the jitter stops both thumbies colliding again and again
+
+    def poll(self):
+        received = thumby.link.receive()
+        if received != None and len(received) >= HEADER_SIZE + 2 and received[0] == MAGIC \
+                and checksum(received, 0, len(received) - 2) == struct.unpack_from("<H", received, len(received) - 2)[0]:
+            self.heard = time.ticks_ms()
+            if self._take(received) or not self.done:
+                self._send()
+        elif not self.done and time.ticks_diff(time.ticks_ms(), self.sent) >= self.wait:
+            self._send()
+        quiet = time.ticks_diff(time.ticks_ms(), self.heard)
+        return (self.done and quiet >= LINGER_MS) or (self.complete and quiet >= QUIET_MS)
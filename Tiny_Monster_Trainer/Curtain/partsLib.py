@@ -0,0 +1,104 @@
+import gc
+gc.enable()
+import struct
+import micropython
+
+# Monster parts atlas: every head, body and legs from MonsterParts.ujson,
+# 40 bytes each, in one binary file with an index of where each part is, so a
+# part is read straight into a buffer instead of parsing the whole ujson file.
+# tools/buildparts.py makes it from MonsterParts.ujson.
+#
+#   header | index | parts
+#
+# The header has the magic, version, part size and the number of groups, then
+# for each group the number of keys it has. The index has a 16 bit offset for
+# each key of each group, 0xFFFF where a group has no part for that key.
+
+PARTS_PATH = "/Games/Tiny_Monster_Trainer/Curtain/MonsterParts.bin"
+PARTS_VERSION = 1
+HEADER = "<4sBBB"           # "TMTP", version, part size, group count
+HEADS = 0
+BODIES = 1
+LEGS = 2
+SPECIAL = 3
+BIRB_HEAD = 0               # keys in SPECIAL
+BIRB_BODY = 1
+BIRB_LEGS = 2
+PART_SIZE = 40              # 20 wide, 9 high
+MON_WIDTH = 20
+MON_HEIGHT = 27
+SPRITE_SIZE = 80            # head, body and legs one above the other, 20 wide and 4 pages high
+CACHE_SIZE = 6              # a battle shows two monsters, menus one at a time
+
+_index = None               # offset of each key in each group, from the atlas
+_groups = None              # where each group's offsets start in _index, and how many keys it has
+_spriteCache = []           # [head, body, legs, sprite], most recently used first
+_part = bytearray(PART_SIZE)
+
+
+def _loadIndex(f):
+    global _index, _groups
+    header = bytearray(struct.calcsize(HEADER))
+    f.readinto(header)
+    magic, version, partSize, groupCount = struct.unpack_from(HEADER, header, 0)
+    if magic != b"TMTP" or version != PARTS_VERSION or partSize != PART_SIZE:
+        raise ValueError("not a parts atlas this version can read")
+    counts = bytearray(groupCount)
+    f.readinto(counts)
+    _groups = []
+    start = 0
+    for count in counts:
+        _groups.append((start, count))
+        start += count
+    _index = bytearray(2*start)
+    f.readinto(_index)
+
+
+def openParts(): # for readPart, close it when done
+    f = open(PARTS_PATH, 'rb')
+    if _index == None:
+        _loadIndex(f)
+    return f
+
+
+def readPart(f, group, key, buf=_part): # reads the part into buf, which holds PART_SIZE bytes
+    start, count = _groups[group]
+    offset = struct.unpack_from("<H", _index, 2*(start + key))[0] if key < count else 0xFFFF
+    if offset == 0xFFFF:
+        raise ValueError("no part " + str(key) + " in group " + str(group))
+    f.seek(offset)
+    f.readinto(buf)
+    return buf
+
+
+@micropython.native
+def _compose(sprite, head, body, legs):
+    # the parts are 9 high, so each has 8 rows in its first page and 1 in its second
+    for x in range(0, MON_WIDTH):
+        column = head[x] | (head[x+20] & 1) << 8 | body[x] << 9 | (body[x+20] & 1) << 17 | legs[x] << 18 | (legs[x+20] & 1) << 26
+        sprite[x] = column & 0xFF
+        sprite[x+20] = (column >> 8) & 0xFF
+        sprite[x+40] = (column >> 16) & 0xFF
+        sprite[x+60] = column >> 24
+
+
+def monSprite(monsterBody): # the monster's head, body and legs as one MON_WIDTH x MON_HEIGHT sprite
+    head = monsterBody['head']
+    body = monsterBody['body']
+    legs = monsterBody['legs']
+    # parts are only ever replaced, never changed in place, so the lists themselves are the key,
+    # and holding them here keeps them from being freed and another list taking their place
+    for i in range(0, len(_spriteCache)):
+        entry = _spriteCache[i]
+        if entry[0] is head and entry[1] is body and entry[2] is legs:
+            if i > 0:
+                _spriteCache.insert(0, _spriteCache.pop(i))
+            return entry[3]
+    if len(_spriteCache) == CACHE_SIZE:
+        entry = _spriteCache.pop()
+        sprite = entry[3]
+    else:
+        sprite = bytearray(SPRITE_SIZE)
+    _compose(sprite, head, body, legs)
+    _spriteCache.insert(0, [head, body, legs, sprite])
+    return sprite
@@ -0,0 +1,265 @@
+import gc
+gc.enable()
+import os
+import struct
+import ujson
+import micropython
+import sys
+sys.path.append("/Games/Tiny_Monster_Trainer/Curtain/")
+from classLib import Player, Monster, AttackMove, Item
+
+# Save files: fixed size binary records, so a save only rewrites the records
+# that changed, in place, and a load reads them one at a time into one buffer
+# instead of parsing a whole ujson file.
+#
+#   header | player | monster * monsterCount | item * itemCount
+#
+# Saves from before these (name.ujson) are read once, written out as name.sav
+# and removed. The header's version says how to read the rest; a new layout
+# gets a new version, and loadPlayer upgrades older ones as it reads them.
+
+SAVE_PATH = "/Games/Tiny_Monster_Trainer/Curtain/"
+GHOST_PATH = "/Games/Tiny_Monster_Trainer/Ghosts/"
+SAVE_EXT = ".sav"
+OLD_EXT = ".ujson"
+SAVE_VERSION = 1
+
+HEADER = "<4sBBBx"          # "TMTS", version, monster count, item count
+PLAYER = "<16sHIBIhi"       # name, trainerLevel, experience, friendMax, worldSeed, inspire, money
+MONSTER = "<16s16s8s8s8sh13h120sBBBBBBB" # name, given_name, Type1-3, trainingPoints, stats, body,
+                            # mutateSeed length and values, has bonusStats, item, trained, attack count
+ATTACK = "<16sBbbB8s"       # name, numUses, currentUses, baseDamage, magic, moveElementType
+ITEM = "<12sBb"             # name, key, bonus
+MAX_ATTACKS = 8
+HEADER_SIZE = struct.calcsize(HEADER)
+PLAYER_SIZE = struct.calcsize(PLAYER)
+ATTACK_SIZE = struct.calcsize(ATTACK)
+MONSTER_SIZE = struct.calcsize(MONSTER) + MAX_ATTACKS*ATTACK_SIZE
+ITEM_SIZE = struct.calcsize(ITEM)
+STAT_KEYS = ('Health', 'currentHealth', 'maxHealth', 'Strength', 'maxStrength', 'Agility', 'maxAgility',
+             'Endurance', 'maxEndurance', 'Mysticism', 'maxMysticism', 'Tinfoil', 'maxTinfoil')
+BODY_KEYS = ('head', 'body', 'legs')
+
+_record = bytearray(MONSTER_SIZE)  # the record being saved or loaded
+_onFile = bytearray(MONSTER_SIZE)  # what the save file has there now
+
+
+def _text(value, size):
+    data = value.encode()
+    if len(data) > size:
+        raise ValueError("too long to save: " + value)
+    return data
+
+
+def _untext(data):
+    end = data.find(b'\x00')
+    return str(data if end < 0 else data[:end], 'utf-8')
+
+
+@micropython.native
+def _differs(a, b, size):
+    for i in range(0, size):
+        if a[i] != b[i]:
+            return True
+    return False
+
+
+#### Records
+
+def _packPlayer(block):
+    struct.pack_into(PLAYER, _record, 0, _text(block['name'], 16), block['trainerLevel'], block['experience'],
+                     block['friendMax'], block['worldSeed'], block.get('inspire', 0), block.get('money', 0))
+    return PLAYER_SIZE
+
+
+def _unpackPlayer(player):
+    values = struct.unpack_from(PLAYER, _record, 0)
+    block = player.playerBlock
+    block['name'] = _untext(values[0])
+    block['trainerLevel'], block['experience'], block['friendMax'], block['worldSeed'], block['inspire'], block['money'] = values[1:]
+
+
+def _packMonster(mon):
+    stats = mon.statBlock
+    if len(mon.attackList) > MAX_ATTACKS:
+        raise ValueError("too many attacks to save")
+    body = bytearray(120)
+    for i in range(0, 3):
+        body[i*40:i*40+40] = bytes(mon.bodyBlock[BODY_KEYS[i]])
+    seed = mon.mutateSeed + [0, 0]
+    bonus = getattr(mon, 'bonusStats', None)
+    struct.pack_into(MONSTER, _record, 0, _text(stats['name'], 16), _text(stats['given_name'], 16),
+                     _text(stats['Type1'], 8), _text(stats['Type2'], 8), _text(stats['Type3'], 8), stats['trainingPoints'],
+                     *([stats[key] for key in STAT_KEYS] + [body, len(mon.mutateSeed), seed[0], seed[1],
+                     bonus != None, bonus.get('item', 0) if bonus else 0, bonus.get('trained', 0) if bonus else 0,
+                     len(mon.attackList)]))
+    pos = MONSTER_SIZE - MAX_ATTACKS*ATTACK_SIZE
+    for atk in mon.attackList:
+        struct.pack_into(ATTACK, _record, pos, _text(atk.name, 16), atk.numUses, atk.currentUses,
+                         atk.baseDamage, atk.magic, _text(atk.moveElementType, 8))
+        pos += ATTACK_SIZE
+    for i in range(pos, MONSTER_SIZE): # unused attack slots, so they compare the same every save
+        _record[i] = 0
+    return MONSTER_SIZE
+
+
+def _unpackMonster():
+    values = struct.unpack_from(MONSTER, _record, 0)
+    mon = Monster()
+    stats = mon.statBlock
+    stats['name'] = _untext(values[0])
+    stats['given_name'] = _untext(values[1])
+    stats['Type1'] = _untext(values[2])
+    stats['Type2'] = _untext(values[3])
+    stats['Type3'] = _untext(values[4])
+    stats['trainingPoints'] = values[5]
+    for i in range(0, len(STAT_KEYS)):
+        stats[STAT_KEYS[i]] = values[6+i]
+    body = values[19]
+    for i in range(0, 3):
+        mon.bodyBlock[BODY_KEYS[i]] = list(body[i*40:i*40+40])
+    mon.mutateSeed = [values[21], values[22]][0:values[20]]
+    if values[23]:
+        mon.bonusStats = {'item' : values[24], 'trained' : values[25]}
+    pos = MONSTER_SIZE - MAX_ATTACKS*ATTACK_SIZE
+    for y in range(0, values[26]):
+        name, numUses, currentUses, baseDamage, magic, moveElementType = struct.unpack_from(ATTACK, _record, pos)
+        atk = AttackMove(_untext(name), numUses, baseDamage, magic, _untext(moveElementType))
+        atk.currentUses = currentUses
+        mon.attackList.append(atk)
+        pos += ATTACK_SIZE
+    return mon
+
+
+def _packItem(item):
+    struct.pack_into(ITEM, _record, 0, _text(item.name, 12), item.key, item.bonus)
+    return ITEM_SIZE
+
+
+#### Saving and loading
+
+def _write(f, fresh, offset, size): # writes _record at offset, unless the file has it already
+    f.seek(offset)
+    if not fresh:
+        view = memoryview(_onFile)
+        if f.readinto(view[0:size]) == size and not _differs(_record, _onFile, size):
+            return 0
+        f.seek(offset)
+    f.write(memoryview(_record)[0:size])
+    return 1
+
+
+def savePlayer(player, path): # path without the extension, returns how many records were written
+    fresh = False
+    try:
+        f = open(path + SAVE_EXT, 'r+b')
+    except OSError:
+        f = open(path + SAVE_EXT, 'wb')
+        f.write(bytes(HEADER_SIZE)) # no magic yet, so a save cut short here won't load
+        fresh = True
+    written = _write(f, fresh, HEADER_SIZE, _packPlayer(player.playerBlock))
+    offset = HEADER_SIZE + PLAYER_SIZE
+    for mon in player.friends:
+        written += _write(f, fresh, offset, _packMonster(mon))
+        offset += MONSTER_SIZE
+    for item in player.inventory:
+        written += _write(f, fresh, offset, _packItem(item))
+        offset += ITEM_SIZE
+    # the header goes last, so the counts never cover records that aren't there yet
+    struct.pack_into(HEADER, _record, 0, b"TMTS", SAVE_VERSION, len(player.friends), len(player.inventory))
+    written += _write(f, fresh, 0, HEADER_SIZE)
+    f.close()
+    if fresh:
+        try:
+            os.remove(path + OLD_EXT) # loadPlayer would never read it again
+        except OSError:
+            pass
+    return written
+
+
+def _read(f, size):
+    if f.readinto(memoryview(_record)[0:size]) != size:
+        raise ValueError("save file is cut short")
+
+
+def loadPlayer(path): # path without the extension
+    try:
+        f = open(path + SAVE_EXT, 'rb')
+    except OSError:
+        return _migrate(path)
+    player = Player()
+    _read(f, HEADER_SIZE)
+    magic, version, monsterCount, itemCount = struct.unpack_from(HEADER, _record, 0)
+    if magic != b"TMTS" or version != SAVE_VERSION:
+        f.close()
+        raise ValueError("not a save this version can read: " + path)
+    _read(f, PLAYER_SIZE)
+    _unpackPlayer(player)
+    for x in range(0, monsterCount):
+        _read(f, MONSTER_SIZE)
+        player.friends.append(_unpackMonster())
+    for x in range(0, itemCount):
+        _read(f, ITEM_SIZE)
+        name, key, bonus = struct.unpack_from(ITEM, _record, 0)
+        player.inventory.append(Item(_untext(name), key, bonus))
+    f.close()
+    return player
+
+
+def saveExists(path):
+    for ext in (SAVE_EXT, OLD_EXT):
+        try:
+            os.stat(path + ext)
+            return True
+        except OSError:
+            pass
+    return False
+
+
+def listSaves(path): # names of the saves in a directory, like the ghosts
+    names = []
+    for fileName in os.listdir(path):
+        for ext in (SAVE_EXT, OLD_EXT):
+            if fileName.endswith(ext) and fileName[:-len(ext)] not in names:
+                names.append(fileName[:-len(ext)])
+    return names
+
+
+#### Saves from before the binary format
+
+def _migrate(path):
+    gc.collect()
+    player = _loadOld(path)
+    gc.collect()
+    savePlayer(player, path)
+    return player
+
+
+def _loadOld(path):
+    f = open(path + OLD_EXT)
+    bigJson = ujson.load(f)[0]
+    f.close()
+    player = Player()
+    player.playerBlock = bigJson['player'].copy()
+    items = bigJson.get('items', [{}])[0]
+    for x in range(0, len(items)):
+        item = items['item' + str(x)]
+        player.inventory.append(Item(item['name'], item['key'], item['bonus']))
+    monsterInfo = bigJson['monsterInfo']
+    for x in range(0, len(monsterInfo[0])):
+        mon = Monster()
+        mon.statBlock = monsterInfo[0]['mon' + str(x) + 'stat'].copy()
+        mon.bodyBlock = monsterInfo[1]['mon' + str(x) + 'body'].copy()
+        if len(monsterInfo) > 3: # ghosts don't keep these
+            mon.mutateSeed = monsterInfo[3]['mon' + str(x) + 'mutate'].copy()
+        if len(monsterInfo) > 4 and 'mon' + str(x) + 'bonus' in monsterInfo[4]:
+            mon.bonusStats = monsterInfo[4]['mon' + str(x) + 'bonus'].copy()
+        attacks = monsterInfo[2]['mon' + str(x) + 'atk']
+        for y in range(0, len(attacks)):
+            atk = attacks['attack' + str(y)]
+            attack = AttackMove(atk['name'], atk['numUses'], atk['baseDamage'], atk['magic'], atk['moveElementType'])
+            attack.currentUses = atk['currentUses']
+            mon.attackList.append(attack)
+        player.friends.append(mon)
+    del bigJson
+    return player
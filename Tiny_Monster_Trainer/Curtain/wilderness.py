@@ -9,6 +9,7 @@ import sys
 sys.path.append("/Games/Tiny_Monster_Trainer/Curtain/")
 from classLib import Player, Map, Monster, Tile, RoamingMonster, TextForScroller, Item, AttackMove, NPC
 from funcLib import thingAquired, battleStartAnimation, printMon, drawArrows, showOptions, popItOff, buttonInput, noDupAtk, giveName, tameMon, switchActiveMon, save, showMonInfo
+from saveLib import loadPlayer, SAVE_PATH
 from battle import Battle
 import characters
 #import micropython
@@ -595,38 +596,7 @@ def trainCandles(monsterBody):
 
 def loadGame(name="tmt"):
     gc.collect()
-    tempPlayer = Player()
-    f = open('/Games/Tiny_Monster_Trainer/Curtain/'+name+'.ujson')
-    bigJson = ujson.load(f)
-    tempPlayer.playerBlock = bigJson[0]['player'].copy()
-    if bigJson[0]['items'] != [{}]:
-        for x in range(0, len(bigJson[0]['items'][0])):
-            tempPlayer.inventory.append(Item(bigJson[0]['items'][0]['item' + str(x)]['name'],
-                                            bigJson[0]['items'][0]['item' + str(x)]['key'],
-                                            bigJson[0]['items'][0]['item' + str(x)]['bonus']))
-    for x in range(0, len(bigJson[0]['monsterInfo'][0])):
-        tempMon = Monster()
-        tempMon.statBlock = bigJson[0]['monsterInfo'][0]['mon' + str(x) + 'stat'].copy()
-        tempMon.bodyBlock = bigJson[0]['monsterInfo'][1]['mon' + str(x) + 'body'].copy()
-        tempMon.mutateSeed = bigJson[0]['monsterInfo'][3]['mon' + str(x) + 'mutate'].copy()
-        try:
-            tempMon.bonusStats = bigJson[0]['monsterInfo'][4]['mon' + str(x) + 'bonus'].copy() 
-        except:
-            pass
-        for y in range(0, len(bigJson[0]['monsterInfo'][2]['mon' + str(x) + 'atk'])): 
-            tempAttackMove = AttackMove(bigJson[0]['monsterInfo'][2]['mon' + str(x) + 'atk']['attack' + str(y)]['name'], 
-                                        bigJson[0]['monsterInfo'][2]['mon' + str(x) + 'atk']['attack' + str(y)]['numUses'],
-                                        bigJson[0]['monsterInfo'][2]['mon' + str(x) + 'atk']['attack' + str(y)]['baseDamage'],
-                                        bigJson[0]['monsterInfo'][2]['mon' + str(x) + 'atk']['attack' + str(y)]['magic'],
-                                        bigJson[0]['monsterInfo'][2]['mon' + str(x) + 'atk']['attack' + str(y)]['moveElementType'])
-            tempAttackMove.currentUses = bigJson[0]['monsterInfo'][2]['mon' + str(x) + 'atk']['attack' + str(y)]['currentUses']
-            tempMon.attackList.append(tempAttackMove) 
-        tempMon.attackList = tempMon.attackList.copy()
-        tempPlayer.friends.append(tempMon)
-        tempPlayer.friends = tempPlayer.friends.copy()
-    f.close()
-    del bigJson
-    return tempPlayer
+    return loadPlayer(SAVE_PATH + name)
 
 
 def makeRandomStats(monToStat, trainerLevel):
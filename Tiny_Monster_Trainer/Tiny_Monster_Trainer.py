@@ -6,6 +6,7 @@ import ujson
 sys.path.append("/Games/Tiny_Monster_Trainer/Curtain/")
 from classLib import TextForScroller
 from funcLib import thingAquired, battleStartAnimation, buttonInput, showOptions
+from saveLib import saveExists, SAVE_PATH
 #import micropython
 
 
@@ -31,8 +32,8 @@ def openScreen():
             battleStartAnimation(0)
             f.close()
             try:
-                p = open("/Games/Tiny_Monster_Trainer/Curtain/tmt.ujson", "r")
-                p.close()
+                if not saveExists(SAVE_PATH + "tmt"):
+                    raise OSError
                 p = open("/Games/Tiny_Monster_Trainer/Curtain/here_be_monsters.ujson", "r")
                 p.close()
                 break
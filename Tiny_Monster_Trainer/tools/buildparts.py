@@ -0,0 +1,237 @@
+# Tiny Monster Trainer parts atlas builder
+#
+# Turns Curtain/MonsterParts.ujson into Curtain/MonsterParts.bin, the atlas
+# Curtain/partsLib.py reads monster parts from. Run it after changing the
+# parts, and ship both files.
+#
+# usage: python3 tools/buildparts.py [--bench] [--repeat 200]
+#
+# It checks every part read back through partsLib.readPart against the ujson
+# file. With --bench it also loads classLib.py and funcLib.py unchanged
+# through hoststubs.py, and compares making a monster's body and drawing a
+# monster with the old ujson parts and three blits against the atlas and the
+# sprite cache, checking that both draw the same pixels. Times and heap
+# figures (tracemalloc) are CPython's, so only the ratios say much about the
+# Thumby.
+
+import argparse
+import gc
+import json
+import os
+import random
+import re
+import struct
+import sys
+import time
+import tracemalloc
+
+import hoststubs
+
+TMT_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CURTAIN_PATH = os.path.join(TMT_PATH, 'Curtain')
+SOURCE = os.path.join(CURTAIN_PATH, 'MonsterParts.ujson')
+ATLAS = os.path.join(CURTAIN_PATH, 'MonsterParts.bin')
+# groups in partsLib's order, and the keys of the special group
+GROUPS = ("heads", "bodies", "legs", "special")
+SPECIAL_KEYS = ("birbHead", "birbBody", "birbLegs")
+PART_SIZE = 40
+VERSION = 1
+
+
+#### Building
+
+def loadSource():
+    # MicroPython's ujson doesn't mind a missing comma or a trailing one, and
+    # MonsterParts.ujson has both
+    with open(SOURCE, encoding='utf-8') as f:
+        text = f.read()
+    text = re.sub(r'\]\s*\n(\s*")', r'],\n\1', text)
+    text = re.sub(r',\s*([}\]])', r'\1', text)
+    return json.loads(text)
+
+def groupKeys(parts, group):
+    if group == "special":
+        return list(SPECIAL_KEYS)
+    return [str(key) for key in range(max(int(key) for key in parts[group]) + 1)]
+
+def build(parts):
+    counts = [len(groupKeys(parts, group)) for group in GROUPS]
+    offset = struct.calcsize("<4sBBB") + len(GROUPS) + 2*sum(counts)
+    index = bytearray()
+    data = bytearray()
+    for group in GROUPS:
+        for key in groupKeys(parts, group):
+            part = parts[group].get(key)
+            if part is None:
+                index += struct.pack("<H", 0xFFFF)
+                continue
+            if len(part) != PART_SIZE or not all(0 <= value < 256 for value in part):
+                raise ValueError("%s %s is not %d bytes" % (group, key, PART_SIZE))
+            index += struct.pack("<H", offset + len(data))
+            data += bytes(part)
+    atlas = struct.pack("<4sBBB", b"TMTP", VERSION, PART_SIZE, len(GROUPS)) + bytes(counts) + index + data
+    if len(atlas) >= 0xFFFF:
+        raise ValueError("too many parts for 16 bit offsets")
+    return atlas
+
+
+#### A stand-in display
+
+class Display:
+    # Just enough of thumby.display to draw sprites into a 72x40 framebuffer
+    def __init__(self):
+        self.buffer = bytearray(72*40)
+        self.blits = 0
+        self.drawing = True
+
+    def blit(self, buf, x, y, w, h, key, mirrorX, mirrorY):
+        self.blits += 1
+        if not self.drawing:
+            return
+        for row in range(h):
+            for col in range(w):
+                pixel = (buf[(row >> 3)*w + col] >> (row & 7)) & 1
+                if pixel == key:
+                    continue
+                sx = x + (w - 1 - col if mirrorX else col)
+                sy = y + (h - 1 - row if mirrorY else row)
+                if 0 <= sx < 72 and 0 <= sy < 40:
+                    self.buffer[sy*72 + sx] = pixel
+
+def loadGame(display):
+    hoststubs.install(display=display)
+    import partsLib
+    partsLib.PARTS_PATH = ATLAS
+    import classLib
+    import funcLib
+    return partsLib, classLib, funcLib
+
+
+#### The ujson parts and three blits from before the atlas, for comparison
+
+def legacyMakeMonBody(bodyBlock):
+    gc.collect()
+    parts = loadSource() # the game parsed the whole file for every monster
+    if random.randint(0,120) != 1:
+        randoNum = random.randint(0,17)
+        bodyBlock['head'] = parts["heads"][str(randoNum)]
+        randoNum = random.randint(1,17)
+        bodyBlock['body'] = parts["bodies"][str(randoNum)]
+        randoNum = random.randint(1,17)
+        bodyBlock['legs'] = parts["legs"][str(randoNum)]
+    else:
+        bodyBlock['head'] = parts["special"]["birbHead"]
+        bodyBlock['body'] = parts["special"]["birbBody"]
+        bodyBlock['legs'] = parts["special"]["birbLegs"]
+    del parts
+
+def legacyPrintMon(display, monsterBody, x, y, playerOrNPC):
+    display.blit(bytearray(monsterBody['head']), x, y, 20, 9, 0, playerOrNPC, 0)
+    display.blit(bytearray(monsterBody['body']), x, y+9, 20, 9, 0, playerOrNPC, 0)
+    display.blit(bytearray(monsterBody['legs']), x, y+18, 20, 9, 0, playerOrNPC, 0)
+
+
+#### Measuring
+
+def measure(function, repeat):
+    start = time.perf_counter()
+    for i in range(repeat):
+        function()
+    ms = (time.perf_counter() - start) * 1000 / repeat
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    function()
+    peak = tracemalloc.get_traced_memory()[1] - base
+    tracemalloc.stop()
+    return ms, peak
+
+def bench(parts, display, repeat):
+    failures = 0
+    partsLib, classLib, funcLib = loadGame(display)
+    print()
+    print("%-22s %9s %9s %9s %9s" % ("", "old ms", "new ms", "old heap", "new heap"))
+    mon = classLib.Monster()
+    old = measure(lambda: legacyMakeMonBody({}), repeat)
+    new = measure(mon.makeMonBody, repeat)
+    print("%-22s %9.3f %9.3f %9d %9d" % ("make a monster's body", old[0], new[0], old[1], new[1]))
+
+    # a battle screen: both monsters drawn every frame, one of them mirrored. Blitting is
+    # C on the Thumby and draws as many pixels either way, so only printMon itself is timed
+    monsters = []
+    for seed in range(8):
+        random.seed(seed)
+        mon = classLib.Monster()
+        mon.makeMonBody()
+        monsters.append(mon.bodyBlock)
+    frame = lambda draw: (draw(monsters[0], 2, 4, 0), draw(monsters[1], 50, 4, 1))
+    display.drawing = False
+    old = measure(lambda: frame(lambda body, x, y, m: legacyPrintMon(display, body, x, y, m)), repeat)
+    new = measure(lambda: frame(funcLib.printMon), repeat)
+    print("%-22s %9.3f %9.3f %9d %9d" % ("draw a battle frame", old[0], new[0], old[1], new[1]))
+    display.blits = 0
+    frame(funcLib.printMon)
+    display.drawing = True
+    print("%-22s %9d %9d" % ("blits a frame", 6, display.blits))
+
+    print()
+    print("checks:")
+    wrong = 0
+    for body in monsters + [{'head': parts["special"]["birbHead"], 'body': parts["special"]["birbBody"],
+                             'legs': parts["special"]["birbLegs"]}]:
+        for x, y, mirror in ((0, 0, 0), (50, 13, 1), (-5, 20, 0), (60, -3, 1)):
+            display.buffer = bytearray(b'\x01' * (72*40)) # key 0 must leave the background alone
+            legacyPrintMon(display, body, x, y, mirror)
+            expected = bytes(display.buffer)
+            display.buffer = bytearray(b'\x01' * (72*40))
+            funcLib.printMon(body, x, y, mirror)
+            wrong += bytes(display.buffer) != expected
+            display.buffer = bytearray(72*40)
+            legacyPrintMon(display, body, x, y, mirror)
+            expected = bytes(display.buffer)
+            display.buffer = bytearray(72*40)
+            funcLib.printMon(body, x, y, mirror)
+            wrong += bytes(display.buffer) != expected
+    failures += wrong > 0
+    print("  %-52s %s" % ("printMon draws the same pixels as the three blits", "ok" if not wrong else
+        "FAILED: %d draws differ" % wrong))
+
+    # more monsters than the cache holds, drawn again in a different order
+    partsLib._spriteCache.clear()
+    sprites = [bytes(partsLib.monSprite(body)) for body in monsters]
+    ok = len(partsLib._spriteCache) == partsLib.CACHE_SIZE and \
+        all(bytes(partsLib.monSprite(monsters[i])) == sprites[i] for i in (7, 0, 3, 7, 1, 6, 2, 5, 4))
+    failures += not ok
+    print("  %-52s %s" % ("sprite cache keeps %d and evicts the oldest" % partsLib.CACHE_SIZE, "ok" if ok else "FAILED"))
+    return failures
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the monster parts atlas")
+    parser.add_argument("--bench", action="store_true", help="compare with the ujson parts")
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    parts = loadSource()
+    atlas = build(parts)
+    with open(ATLAS, 'wb') as f:
+        f.write(atlas)
+    print("wrote %s: %d parts, %d bytes (%s is %d bytes)" % (os.path.relpath(ATLAS, TMT_PATH),
+        sum(len(group) for group in parts.values()), len(atlas), os.path.basename(SOURCE),
+        os.path.getsize(SOURCE)))
+
+    display = Display()
+    partsLib = loadGame(display)[0]
+    wrong = 0
+    f = partsLib.openParts()
+    for number, group in enumerate(GROUPS):
+        for key, name in enumerate(groupKeys(parts, group)):
+            if name in parts[group]:
+                wrong += list(partsLib.readPart(f, number, key)) != parts[group][name]
+    f.close()
+    print("every part reads back the same: %s" % ("ok" if not wrong else "FAILED: %d differ" % wrong))
+    failures = wrong > 0
+    if args.bench:
+        failures += bench(parts, display, args.repeat)
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
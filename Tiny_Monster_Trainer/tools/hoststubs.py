@@ -0,0 +1,31 @@
+# Tiny Monster Trainer host stand-ins
+#
+# The micropython, ujson and thumby modules the game imports, with the
+# display and link left for each tool to fill in.
+
+import builtins
+import json
+import os
+import sys
+import types
+
+TMT_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CURTAIN_PATH = os.path.join(TMT_PATH, 'Curtain')
+
+
+class MicroPython:
+    @staticmethod
+    def native(function):
+        return function
+
+def install(display=None, link=None):
+    # Returns the stand-in thumby module, for the tools to swap their own
+    # link or display into
+    builtins.micropython = MicroPython
+    sys.modules['micropython'] = MicroPython
+    sys.modules['ujson'] = json
+    thumby = types.SimpleNamespace(display=display, link=link)
+    sys.modules['thumby'] = thumby
+    if CURTAIN_PATH not in sys.path:
+        sys.path.insert(0, CURTAIN_PATH)
+    return thumby
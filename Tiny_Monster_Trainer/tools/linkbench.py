@@ -0,0 +1,347 @@
+# Tiny Monster Trainer link exchange benchmark
+#
+# Trades players between two copies of Curtain/linkLib.py over a stand-in for
+# thumby.link, the way multiplayer.py does before a link battle, and checks
+# that each side ends up with exactly the other's player, monsters and
+# attacks. The shipped ghosts are used as the players. Each pairing is run
+# over a clean cable and over cables that lose or damage packets, with several
+# seeds, and the time to the end of the exchange is compared with the
+# per-field ujson exchange it replaced. The heap peak of one side of the
+# exchange is compared too.
+#
+# usage: python3 tools/linkbench.py [--runs 20] [--packet-ms 3] [--seed 1]
+#
+# linkLib.py and classLib.py are loaded unchanged through hoststubs.py, with a
+# virtual clock, so both thumbies take turns on one clock. The stand-in link
+# moves packets at the cable's 115200 baud, loses both packets when the two
+# sides transmit at once, and can lose packets (noise the link's own checksum
+# caught) or flip a bit in them (noise it missed). Time spent handling a
+# packet on the Thumby is --packet-ms, a guess, so the times are a model; the
+# old exchange is timed the same way, counting one packet each way per field
+# and its fixed sleeps, which is the least it ever took. Heap figures are
+# CPython's (tracemalloc), so they only compare the two exchanges with each
+# other.
+
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+
+import hoststubs
+
+TMT_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+GHOSTS = ("Ancient", "Blake", "MateiL")
+BAUD = 115200
+LINK_HEADER = 4 # bytes thumby.link adds to every packet
+CABLES = ( # name, share of packets lost, share damaged
+    ("clean", 0., 0.),
+    ("10% lost", .1, 0.),
+    ("30% lost", .3, 0.),
+    ("10% lost 5% bad", .1, .05),
+)
+TIMEOUT_MS = 60000
+
+
+#### Stand-ins for the link and the clock
+
+class Clock:
+    now = 0.
+
+    @classmethod
+    def ticks_ms(cls):
+        return int(cls.now)
+
+def wireMs(size):
+    return (size + LINK_HEADER) * 10 * 1000 / BAUD
+
+class Wire:
+    def __init__(self, rng, loss, damage):
+        self.rng = rng
+        self.loss = loss
+        self.damage = damage
+        self.ends = (LinkEnd(self, 0), LinkEnd(self, 1))
+        self.collisions = 0
+
+class LinkEnd:
+    def __init__(self, wire, side):
+        self.wire = wire
+        self.side = side
+        self.inbox = [] # (arrival time, packet)
+        self.sending = (0., 0.) # when this end's last packet was on the wire
+        self.lastSent = None
+        self.sentBytes = 0
+        self.log = None # packets received, when recording
+
+    def send(self, data):
+        wire = self.wire
+        start = Clock.now
+        end = start + wireMs(len(data))
+        self.sending = (start, end)
+        self.lastSent = len(data)
+        self.sentBytes += len(data) + LINK_HEADER
+        other = wire.ends[1 - self.side]
+        if other.sending[0] < end and start < other.sending[1]:
+            # both on the wire at once, neither gets through
+            wire.collisions += 1
+            other.inbox = [p for p in other.inbox if p[0] < start]
+            self.inbox = [p for p in self.inbox if p[0] < other.sending[0]]
+            return True
+        if wire.rng.random() < wire.loss:
+            return True
+        packet = bytearray(data)
+        if wire.rng.random() < wire.damage:
+            i = wire.rng.randrange(len(packet))
+            packet[i] ^= 1 << wire.rng.randrange(8)
+        other.inbox.append((end, packet))
+        return True
+
+    def receive(self):
+        if self.inbox and self.inbox[0][0] <= Clock.now:
+            packet = self.inbox.pop(0)[1]
+            if self.log is not None:
+                self.log.append(bytes(packet))
+            return packet
+        return None
+
+class ReplayLink:
+    # Feeds one side the packets it got in a recorded run
+    def __init__(self, packets):
+        self.packets = list(packets)
+
+    def send(self, data):
+        return True
+
+    def receive(self):
+        return bytearray(self.packets.pop(0)) if self.packets else None
+
+def loadLinkLib():
+    hoststubs.install()
+    time.ticks_ms = Clock.ticks_ms
+    time.ticks_diff = lambda a, b: a - b
+    import linkLib
+    return linkLib
+
+
+#### Players, from the ghosts' ujson files the way multiplayer.py loads them
+
+def loadGhost(name):
+    from classLib import Player, Monster, AttackMove
+    with open(os.path.join(TMT_PATH, 'Ghosts', name + '.ujson')) as f:
+        ghost = json.load(f)[0]
+    player = Player()
+    player.playerBlock = ghost['player'].copy()
+    for x in range(len(ghost['monsterInfo'][0])):
+        mon = Monster()
+        mon.statBlock = ghost['monsterInfo'][0]['mon%dstat' % x].copy()
+        mon.bodyBlock = ghost['monsterInfo'][1]['mon%dbody' % x].copy()
+        attacks = ghost['monsterInfo'][2]['mon%datk' % x]
+        for y in range(len(attacks)):
+            a = attacks['attack%d' % y]
+            mon.attackList.append(AttackMove(a['name'], a['numUses'], a['baseDamage'],
+                a['magic'], a['moveElementType']))
+        player.friends.append(mon)
+    return player, ghost
+
+def summary(player):
+    block = player.playerBlock
+    return ((block['name'], block['trainerLevel'], block['experience'], block['friendMax'],
+        block['worldSeed']), [((mon.statBlock['name'], mon.statBlock['given_name'])
+        + tuple(mon.statBlock[key] for key in ('Type1', 'Type2', 'Type3', 'Health',
+            'Agility', 'Strength', 'Endurance', 'Mysticism', 'Tinfoil'))
+        + tuple(tuple(mon.bodyBlock[key]) for key in ('head', 'body', 'legs')),
+        [(a.name, a.numUses, a.baseDamage, a.magic, a.moveElementType) for a in mon.attackList])
+        for mon in player.friends])
+
+
+#### The exchange
+
+def runExchange(linkLib, thumby, payloads, rng, loss, damage, packetMs, record=False):
+    Clock.now = 0.
+    wire = Wire(rng, loss, damage)
+    exchanges = []
+    for side in range(2):
+        thumby.link = wire.ends[side]
+        if record:
+            wire.ends[side].log = []
+        exchanges.append(linkLib.LinkExchange(payloads[side]))
+    # the second thumby gets through the handshake a little later
+    busyUntil = [0., rng.uniform(0, 40)]
+    finished = [None, None]
+    while None in finished and Clock.now < TIMEOUT_MS:
+        for side in range(2):
+            if finished[side] is None and Clock.now >= busyUntil[side]:
+                end = thumby.link = wire.ends[side]
+                end.lastSent = None
+                waiting = len(end.inbox)
+                done = exchanges[side].poll()
+                busy = 0.1 # checking the link for a packet
+                if end.lastSent is not None:
+                    busy += packetMs + wireMs(end.lastSent)
+                elif len(end.inbox) != waiting:
+                    busy += packetMs
+                busyUntil[side] = Clock.now + busy
+                if done:
+                    finished[side] = Clock.now
+        if None in finished:
+            Clock.now = min(busyUntil[side] for side in range(2) if finished[side] is None)
+    return exchanges, wire, max(t if t is not None else TIMEOUT_MS for t in finished)
+
+def newHeap(linkLib, thumby, player, packets):
+    # One side: pack, trade (fed the packets it got in a recorded run), unpack
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    thumby.link = ReplayLink(packets)
+    exchange = linkLib.LinkExchange(linkLib.packPlayer(player))
+    while thumby.link.packets:
+        exchange.poll()
+    ghost = linkLib.unpackPlayer(exchange.received)
+    peak = tracemalloc.get_traced_memory()[1] - base
+    tracemalloc.stop()
+    return peak, ghost
+
+
+#### The per-field ujson exchange from before linkLib, for comparison
+
+MON_KEYS = ['name', 'given_name','Health','Type1','Type2','Type3','Agility','Strength','Endurance','Mysticism','Tinfoil','head', 'body','legs']
+MOVE_KEYS = ['monster', 'name', 'numUses', 'baseDamage', 'magic', 'moveElementType']
+# sleeps before the monsters and before the moves: 1s, 1s, at least 300ms
+# trading counts, 1s, .1s, and .5s after each direction
+LEGACY_SLEEP_MS = 500 + 2*(1000 + 1000 + 300 + 1000 + 100 + 2*500)
+
+def legacyData(ghost):
+    info = ghost['monsterInfo']
+    mons = []
+    moves = []
+    for x in range(len(info[0])):
+        mon = {}
+        for key in MON_KEYS[:11]:
+            mon[key] = info[0]['mon%dstat' % x][key]
+        for key in MON_KEYS[11:]:
+            mon[key] = info[1]['mon%dbody' % x][key]
+        mons.append(mon)
+        for y in range(len(info[2]['mon%datk' % x])):
+            atk = info[2]['mon%datk' % x]['attack%d' % y]
+            moves.append({'monster': x, 'name': atk['name'], 'numUses': atk['numUses'],
+                'baseDamage': atk['baseDamage'], 'magic': atk['magic'],
+                'moveElementType': atk['moveElementType']})
+    return ghost['player'], mons, moves
+
+def legacyPackets(ghost):
+    # What crossed the cable for one player's data: (sent by them, sent back)
+    player, mons, moves = legacyData(ghost)
+    packets = [(json.dumps(player), json.dumps({'key0': 1})), ('x', 'x')]
+    for items, keys in ((mons, MON_KEYS), (moves, MOVE_KEYS)):
+        n = 0
+        for item in items:
+            for y in range(len(keys)):
+                packets.append((json.dumps({'key': y, 'key2': n, keys[y]: item[keys[y]]}),
+                    json.dumps({'key': y, 'key2': n})))
+                n += 1
+        packets.append(('', json.dumps({'key': y, 'key2': n})))
+    return packets
+
+def legacyMs(ghosts, packetMs):
+    total = LEGACY_SLEEP_MS
+    for ghost in ghosts:
+        for sent, back in legacyPackets(ghost):
+            for packet in (sent, back):
+                if packet:
+                    total += wireMs(len(packet)) + packetMs
+    return total
+
+def legacyHeap(path, theirPackets):
+    # One side, as multiplayer.py did it: the save is loaded again for each step,
+    # every field sent is a ujson packet, and every field received is parsed into
+    # a dict (building the ghost from those isn't counted)
+    def loadGameString():
+        with open(path) as f:
+            return json.load(f)
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    json.dumps(loadGameString()[0]['player']).encode()
+    yourGuyJson = json.loads(theirPackets[0][0])
+    for keys in (MON_KEYS, MOVE_KEYS):
+        loadGameString() # counting the keys to send, and to receive
+        loadGameString()
+        player, mons, moves = legacyData(loadGameString()[0])
+        for item in (mons if keys is MON_KEYS else moves):
+            for key in keys:
+                json.dumps({'key': 0, 'key2': 0, key: item[key]}).encode()
+    received = [{}]
+    for sent, back in theirPackets[2:]:
+        if sent:
+            packet = json.loads(sent)
+            key = [k for k in packet if k not in ('key', 'key2')][0]
+            if key in received[-1]:
+                received.append({})
+            received[-1][key] = packet[key]
+    peak = tracemalloc.get_traced_memory()[1] - base
+    tracemalloc.stop()
+    return peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the link battle exchange")
+    parser.add_argument("--runs", type=int, default=20, help="seeds for each pairing and cable")
+    parser.add_argument("--packet-ms", type=float, default=3., help="Thumby time to handle a packet")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    linkLib = loadLinkLib()
+    thumby = sys.modules['thumby']
+    players = {}
+    for name in GHOSTS:
+        players[name] = loadGhost(name)
+    pairs = [(GHOSTS[i], GHOSTS[(i+1) % len(GHOSTS)]) for i in range(len(GHOSTS))]
+    failures = 0
+
+    print("%-16s %-18s %8s %8s %8s %8s %8s %8s  %s" % ("pairing", "cable", "old ms", "med ms",
+        "max ms", "packets", "resent", "bytes", "check"))
+    for a, b in pairs:
+        payloads = [linkLib.packPlayer(players[a][0]), linkLib.packPlayer(players[b][0])]
+        expected = [summary(players[b][0]), summary(players[a][0])]
+        old = legacyMs([players[a][1], players[b][1]], args.packet_ms)
+        for cable, loss, damage in CABLES:
+            times = []
+            packets = resent = sent = bad = 0
+            for run in range(args.runs):
+                rng = random.Random(args.seed*1000 + run)
+                random.seed(args.seed*1000 + run)
+                exchanges, wire, ms = runExchange(linkLib, thumby, payloads, rng, loss,
+                    damage, args.packet_ms)
+                times.append(ms)
+                for side in range(2):
+                    ex = exchanges[side]
+                    packets += ex.packets
+                    resent += ex.resent
+                    sent += wire.ends[side].sentBytes
+                    if ms >= TIMEOUT_MS or summary(linkLib.unpackPlayer(ex.received)) != expected[side]:
+                        bad += 1
+            failures += bad
+            print("%-16s %-18s %8.0f %8.0f %8.0f %8.1f %8.1f %8.0f  %s" % ("%s-%s" % (a, b), cable,
+                old, statistics.median(times), max(times), packets / args.runs,
+                resent / args.runs, sent / args.runs,
+                "ok" if not bad else "%d sides wrong" % bad))
+
+    print()
+    print("payloads: " + ", ".join("%s %d B" % (name, len(linkLib.packPlayer(players[name][0])))
+        for name in GHOSTS))
+    for a, b in pairs[:1]:
+        payloads = [linkLib.packPlayer(players[a][0]), linkLib.packPlayer(players[b][0])]
+        random.seed(args.seed)
+        exchanges, wire, ms = runExchange(linkLib, thumby, payloads, random.Random(args.seed),
+            0., 0., args.packet_ms, record=True)
+        peak, ghost = newHeap(linkLib, thumby, players[a][0], wire.ends[0].log)
+        if summary(ghost) != summary(players[b][0]):
+            failures += 1
+        oldPeak = legacyHeap(os.path.join(TMT_PATH, 'Ghosts', a + '.ujson'),
+            legacyPackets(players[b][1]))
+        print("heap peak for %s's side: old %d B, new %d B" % (a, oldPeak, peak))
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
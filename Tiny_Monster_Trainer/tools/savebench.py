@@ -0,0 +1,337 @@
+# Tiny Monster Trainer save benchmark
+#
+# Saves and loads players with Curtain/saveLib.py and with the ujson save and
+# load it replaced, and reports the time, the heap peak and the bytes written to
+# flash for each. The players are the shipped ghosts and a full save made up
+# from their monsters (five monsters with mutations, bonus stats and used up
+# attacks, and a full inventory). It also saves after the kinds of changes the
+# game saves after, to show how few records the in-place save rewrites, and
+# checks that everything survives a save and a load, and that old ujson saves
+# and ghosts are migrated to the binary format intact.
+#
+# usage: python3 tools/savebench.py [--repeat 200]
+#
+# saveLib.py and classLib.py are loaded unchanged through hoststubs.py, and
+# save into a temporary directory. The old save and load are copied from
+# funcLib.py and wilderness.py. Times and heap figures (tracemalloc) are
+# CPython's, so only the ratios say much about the Thumby; the bytes written
+# are the same there.
+
+import argparse
+import copy
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import hoststubs
+
+TMT_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+GHOSTS = ("Ancient", "Blake", "MateiL")
+
+
+#### Counting what saves write
+
+class CountedFile:
+    # Counts the bytes written through it
+    written = 0
+
+    def __init__(self, f):
+        self.f = f
+
+    def write(self, data):
+        CountedFile.written += len(data)
+        return self.f.write(data)
+
+    def __getattr__(self, name):
+        return getattr(self.f, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.f.close()
+
+def countedOpen(path, mode='r'):
+    return CountedFile(open(path, mode))
+
+def loadSaveLib():
+    hoststubs.install()
+    import saveLib
+    saveLib.open = countedOpen
+    return saveLib
+
+
+#### The ujson save and load from before saveLib, for comparison
+
+def obj_to_dict(obj):
+    return obj.__dict__
+
+def legacySave(playerInfo, path):
+    statDict = {}
+    bodyDict = {}
+    attackDict = {}
+    mutateDict = {}
+    itemDict = {}
+    bonusDict = {}
+    for x in range(0, len(playerInfo.friends)):
+        tempAttackDict = {}
+        for y in range (0, len(playerInfo.friends[x].attackList)):
+            tempAttackDict["attack" + str(y)] = obj_to_dict(playerInfo.friends[x].attackList[y])
+            attackDict["mon" + str(x) + "atk"] = tempAttackDict
+        statDict["mon" + str(x) + "stat"] = playerInfo.friends[x].statBlock
+        bodyDict["mon" + str(x) + "body"] = playerInfo.friends[x].bodyBlock
+        mutateDict["mon" + str(x) + "mutate"] = playerInfo.friends[x].mutateSeed
+        bonusDict["mon" + str(x) + "bonus"] = playerInfo.friends[x].bonusStats
+    for x in range(0, len(playerInfo.inventory)):
+        itemDict["item" + str(x)] = obj_to_dict(playerInfo.inventory[x])
+    playerDict = [{"player" : playerInfo.playerBlock, "items" : [itemDict], "monsterInfo": [statDict, bodyDict, attackDict, mutateDict, bonusDict]}]
+    with countedOpen(path + '.ujson', 'w') as f:
+        json.dump(playerDict, f)
+        f.close()
+    del playerDict
+
+def legacyLoad(path):
+    from classLib import Player, Monster, AttackMove, Item
+    tempPlayer = Player()
+    f = open(path + '.ujson')
+    bigJson = json.load(f)
+    tempPlayer.playerBlock = bigJson[0]['player'].copy()
+    if bigJson[0]['items'] != [{}]:
+        for x in range(0, len(bigJson[0]['items'][0])):
+            tempPlayer.inventory.append(Item(bigJson[0]['items'][0]['item' + str(x)]['name'],
+                                            bigJson[0]['items'][0]['item' + str(x)]['key'],
+                                            bigJson[0]['items'][0]['item' + str(x)]['bonus']))
+    for x in range(0, len(bigJson[0]['monsterInfo'][0])):
+        tempMon = Monster()
+        tempMon.statBlock = bigJson[0]['monsterInfo'][0]['mon' + str(x) + 'stat'].copy()
+        tempMon.bodyBlock = bigJson[0]['monsterInfo'][1]['mon' + str(x) + 'body'].copy()
+        tempMon.mutateSeed = bigJson[0]['monsterInfo'][3]['mon' + str(x) + 'mutate'].copy()
+        try:
+            tempMon.bonusStats = bigJson[0]['monsterInfo'][4]['mon' + str(x) + 'bonus'].copy()
+        except:
+            pass
+        for y in range(0, len(bigJson[0]['monsterInfo'][2]['mon' + str(x) + 'atk'])):
+            tempAttackMove = AttackMove(bigJson[0]['monsterInfo'][2]['mon' + str(x) + 'atk']['attack' + str(y)]['name'],
+                                        bigJson[0]['monsterInfo'][2]['mon' + str(x) + 'atk']['attack' + str(y)]['numUses'],
+                                        bigJson[0]['monsterInfo'][2]['mon' + str(x) + 'atk']['attack' + str(y)]['baseDamage'],
+                                        bigJson[0]['monsterInfo'][2]['mon' + str(x) + 'atk']['attack' + str(y)]['magic'],
+                                        bigJson[0]['monsterInfo'][2]['mon' + str(x) + 'atk']['attack' + str(y)]['moveElementType'])
+            tempAttackMove.currentUses = bigJson[0]['monsterInfo'][2]['mon' + str(x) + 'atk']['attack' + str(y)]['currentUses']
+            tempMon.attackList.append(tempAttackMove)
+        tempMon.attackList = tempMon.attackList.copy()
+        tempPlayer.friends.append(tempMon)
+        tempPlayer.friends = tempPlayer.friends.copy()
+    f.close()
+    del bigJson
+    return tempPlayer
+
+def legacyLoadGhost(path):
+    # ghostBattle.py's loadGhost: ghosts have no items, mutations or bonus stats
+    from classLib import Player, Monster, AttackMove
+    tempPlayer = Player()
+    with open(path + '.ujson') as f:
+        ghost = json.load(f)[0]
+    tempPlayer.playerBlock = ghost['player'].copy()
+    for x in range(0, len(ghost['monsterInfo'][0])):
+        tempMon = Monster()
+        tempMon.statBlock = ghost['monsterInfo'][0]['mon' + str(x) + 'stat'].copy()
+        tempMon.bodyBlock = ghost['monsterInfo'][1]['mon' + str(x) + 'body'].copy()
+        attacks = ghost['monsterInfo'][2]['mon' + str(x) + 'atk']
+        for y in range(0, len(attacks)):
+            a = attacks['attack' + str(y)]
+            tempAttackMove = AttackMove(a['name'], a['numUses'], a['baseDamage'], a['magic'], a['moveElementType'])
+            tempAttackMove.currentUses = a['currentUses']
+            tempMon.attackList.append(tempAttackMove)
+        tempPlayer.friends.append(tempMon)
+    return tempPlayer
+
+
+#### Players
+
+STAT_KEYS = ('name', 'given_name', 'trainingPoints', 'Type1', 'Type2', 'Type3', 'Health', 'currentHealth',
+             'maxHealth', 'Strength', 'maxStrength', 'Agility', 'maxAgility', 'Endurance', 'maxEndurance',
+             'Mysticism', 'maxMysticism', 'Tinfoil', 'maxTinfoil')
+
+def summary(player):
+    # everything a save keeps; inspire and money are missing from old saves and load as 0
+    block = player.playerBlock
+    return ((block['name'], block['trainerLevel'], block['experience'], block['friendMax'], block['worldSeed'],
+        block.get('inspire', 0), block.get('money', 0)),
+        [(tuple(mon.statBlock[key] for key in STAT_KEYS),
+          tuple(tuple(mon.bodyBlock[key]) for key in ('head', 'body', 'legs')),
+          tuple(mon.mutateSeed), getattr(mon, 'bonusStats', None),
+          [(a.name, a.numUses, a.currentUses, a.baseDamage, a.magic, a.moveElementType) for a in mon.attackList])
+         for mon in player.friends],
+        [(item.name, item.key, item.bonus) for item in player.inventory])
+
+def fullSave(ghosts):
+    # A late game save: five monsters from the ghosts, with everything a
+    # save can hold filled in, and a full inventory
+    from classLib import Item
+    player = copy.deepcopy(ghosts["Ancient"])
+    player.playerBlock = {'name': "Trainer12345", 'trainerLevel': 57, 'experience': 41234, 'friendMax': 5,
+                          'worldSeed': 1018274651, 'inspire': 3, 'money': 1250}
+    monsters = [mon for name in GHOSTS for mon in copy.deepcopy(ghosts[name]).friends]
+    player.friends = monsters[:5]
+    for i, mon in enumerate(player.friends):
+        mon.mutateSeed = [(37*i + 11) % 256, i + 1] if i % 2 == 0 else []
+        mon.bonusStats = {'item': i*3, 'trained': 20 - i}
+        mon.statBlock['currentHealth'] = max(0, mon.statBlock['Health'] - 7*i)
+        for a in mon.attackList:
+            a.currentUses = a.numUses - i - 1
+    names = (("Crystals", 3), ("Potion", 1), ("Tonic", 2))
+    player.inventory = [Item(names[i % 3][0], names[i % 3][1], i - 2) for i in range(10)]
+    return player
+
+def ghostSaves():
+    ghosts = {}
+    for name in GHOSTS:
+        ghosts[name] = legacyLoadGhost(os.path.join(TMT_PATH, 'Ghosts', name))
+    return ghosts
+
+
+#### Measuring
+
+def measure(function, repeat):
+    CountedFile.written = 0
+    start = time.perf_counter()
+    for i in range(repeat):
+        result = function()
+    ms = (time.perf_counter() - start) * 1000 / repeat
+    written = CountedFile.written // repeat
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    function()
+    peak = tracemalloc.get_traced_memory()[1] - base
+    tracemalloc.stop()
+    return ms, peak, written, result
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Tiny Monster Trainer saves")
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    saveLib = loadSaveLib()
+    directory = tempfile.mkdtemp()
+    failures = 0
+    try:
+        ghosts = ghostSaves()
+        players = dict(ghosts)
+        players["full save"] = fullSave(ghosts)
+        print("record sizes: header %d, player %d, monster %d, item %d bytes" % (saveLib.HEADER_SIZE,
+            saveLib.PLAYER_SIZE, saveLib.MONSTER_SIZE, saveLib.ITEM_SIZE))
+        print()
+        print("%-10s %-5s %9s %9s %9s %9s %9s %9s" % ("save", "", "old ms", "new ms", "old heap",
+            "new heap", "old bytes", "new bytes"))
+        for name, player in players.items():
+            old = os.path.join(directory, "old")
+            new = os.path.join(directory, "new")
+            for path in (old, new):
+                for ext in (".ujson", ".sav"):
+                    if os.path.exists(path + ext):
+                        os.remove(path + ext)
+            if name == "full save":
+                oldSave = lambda: legacySave(player, old)
+                oldLoad = lambda: legacyLoad(old)
+            else:
+                # ghosts have no mutations or bonus stats, the old ghost save left them out
+                ghostCopy = copy.deepcopy(player)
+                for mon in ghostCopy.friends:
+                    mon.bonusStats = None
+                oldSave = lambda: legacySave(ghostCopy, old)
+                oldLoad = lambda: legacyLoadGhost(old)
+            saveLib.savePlayer(player, new)
+            # the game saves over its last save, usually after a change to one monster
+            first = player.friends[0].statBlock
+            def newSave():
+                first['currentHealth'] ^= 1
+                return saveLib.savePlayer(player, new)
+            oldTimes = measure(oldSave, args.repeat)
+            newTimes = measure(newSave, args.repeat)
+            print("%-10s %-5s %9.2f %9.2f %9d %9d %9d %9d" % (name, "save", oldTimes[0], newTimes[0],
+                oldTimes[1], newTimes[1], oldTimes[2], newTimes[2]))
+            oldTimes = measure(oldLoad, args.repeat)
+            newTimes = measure(lambda: saveLib.loadPlayer(new), args.repeat)
+            print("%-10s %-5s %9.2f %9.2f %9d %9d %9s %9s" % ("", "load", oldTimes[0], newTimes[0],
+                oldTimes[1], newTimes[1], "", ""))
+            print("%-10s %-5s %9s %9s %9s %9s %9d %9d" % ("", "file", "", "", "", "",
+                os.path.getsize(old + ".ujson"), os.path.getsize(new + ".sav")))
+
+        print()
+        print("records rewritten by an in-place save of the full save:")
+        player = copy.deepcopy(players["full save"])
+        path = os.path.join(directory, "tmt")
+        from classLib import Item
+        changes = (
+            ("nothing changed", lambda: None),
+            ("a monster took damage", lambda: player.friends[2].statBlock.update(currentHealth=1)),
+            ("an attack was used", lambda: setattr(player.friends[4].attackList[0], 'currentUses', 0)),
+            ("experience gained", lambda: player.playerBlock.update(experience=41300)),
+            ("two monsters swapped", lambda: player.friends.insert(0, player.friends.pop(1))),
+            ("an item was used", lambda: player.inventory.pop()),
+            ("an item was found", lambda: player.inventory.append(Item("Potion", 1, 4))),
+        )
+        CountedFile.written = 0
+        total = saveLib.savePlayer(player, path)
+        print("  %-24s %2d records %5d bytes" % ("first save", total, CountedFile.written))
+        for label, change in changes:
+            change()
+            CountedFile.written = 0
+            records = saveLib.savePlayer(player, path)
+            check = "ok" if summary(saveLib.loadPlayer(path)) == summary(player) else "FAILED"
+            failures += check != "ok"
+            print("  %-24s %2d records %5d bytes  %s" % (label, records, CountedFile.written, check))
+
+        print()
+        print("checks:")
+        for name, player in players.items():
+            path = os.path.join(directory, "roundtrip")
+            if os.path.exists(path + ".sav"):
+                os.remove(path + ".sav")
+            saveLib.savePlayer(player, path)
+            ok = summary(saveLib.loadPlayer(path)) == summary(player)
+            failures += not ok
+            print("  %-10s save and load               %s" % (name, "ok" if ok else "FAILED"))
+
+        path = os.path.join(directory, "tmt")
+        os.remove(path + ".sav")
+        legacySave(players["full save"], path)
+        expected = summary(legacyLoad(path))
+        migrated = summary(saveLib.loadPlayer(path))
+        ok = migrated == expected and not os.path.exists(path + ".ujson") and os.path.exists(path + ".sav") \
+            and summary(saveLib.loadPlayer(path)) == expected
+        failures += not ok
+        print("  %-10s migrated from tmt.ujson     %s" % ("full save", "ok" if ok else "FAILED"))
+
+        ghostDirectory = os.path.join(directory, "Ghosts")
+        shutil.copytree(os.path.join(TMT_PATH, 'Ghosts'), ghostDirectory)
+        for name in GHOSTS:
+            path = os.path.join(ghostDirectory, name)
+            expected = summary(legacyLoadGhost(path))
+            ok = summary(saveLib.loadPlayer(path)) == expected and not os.path.exists(path + ".ujson") \
+                and summary(saveLib.loadPlayer(path)) == expected
+            failures += not ok
+            print("  %-10s migrated from Ghosts/       %s" % (name, "ok" if ok else "FAILED"))
+        listed = sorted(saveLib.listSaves(ghostDirectory + "/"))
+        ok = listed == sorted(GHOSTS)
+        failures += not ok
+        print("  %-10s ghosts listed once each     %s" % ("", "ok" if ok else "FAILED: %s" % listed))
+
+        ok = not saveLib.saveExists(os.path.join(directory, "nobody"))
+        try:
+            saveLib.loadPlayer(os.path.join(directory, "nobody"))
+            ok = False
+        except OSError:
+            pass
+        failures += not ok
+        print("  %-10s no save is an OSError       %s" % ("", "ok" if ok else "FAILED"))
+    finally:
+        shutil.rmtree(directory)
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
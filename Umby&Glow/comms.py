@@ -1,52 +1,194 @@
 from machine import Pin, UART
+from array import array
+from time import ticks_us
+
+## Link frames ##
+# Each exchange sends one frame:
+#   magic, seq, base, ack, flags, length, payload..., fletcher-16 (2 bytes)
+# A keyframe payload is the whole of outbuf. Otherwise the payload is a delta
+# against frame "base" (the last frame the other side acknowledged), as spans
+# of (offset, length, bytes...). ack is the last frame received and applied
+# to inbuf. Sequence numbers run from 1 to 255, with 0 meaning none.
+_MAGIC = const(0xA7)
+_HEAD = const(6) # Header bytes
+_SIZE = const(160) # State bytes in inbuf/outbuf
+_FRAME = const(168) # Largest frame (a keyframe)
+_KEYFRAME = const(1) # Flag: payload is the whole state
+_RESYNC = const(2) # Flag: couldn't apply a delta, send a keyframe
+_KEYINT = const(30) # Most exchanges between keyframes
+_SPAN_GAP = const(3) # Equal bytes to include in a span rather than split it
 
 _rxPin = Pin(1, Pin.IN)
 _uart = UART(0, baudrate=115200, rx=_rxPin, tx=Pin(0, Pin.OUT), timeout=0,
-    txbuf=164, rxbuf=328)
+    txbuf=_FRAME, rxbuf=_FRAME*2)
 Pin(2, Pin.OUT).value(1)
 
-# Read/write buffers (last byte is checksum)
-_echobuf = bytearray(0 for x in range(160))
-inbuf = bytearray(0 for x in range(160))
-outbuf = bytearray(0 for x in range(160))
-_echo = _wait = _uanyc = 0 # Listen counters
+# Read/write buffers
+_echobuf = bytearray(0 for x in range(_FRAME))
+_rxbuf = bytearray(0 for x in range(_FRAME))
+_txbuf = bytearray(0 for x in range(_FRAME))
+inbuf = bytearray(0 for x in range(_SIZE))
+outbuf = bytearray(0 for x in range(_SIZE))
+_sent = bytearray(0 for x in range(_SIZE)) # outbuf as in the last frame sent
+_acked = bytearray(0 for x in range(_SIZE)) # outbuf as last acknowledged
+_echo = _wait = _got = _uanyc = _backoff = 0 # Listen counters
+_seq = _acked_seq = _rx_seq = _resync = _since_key = 0 # Frame sequencing
+# Frames sent, bytes sent, keyframes sent, frames received, frames rejected
+stats = array('l', [0, 0, 0, 0, 0])
 
 @micropython.viper
-def _prep_checksum():
-    chs = 0
-    for i in range(159):
-        chs ^= int(outbuf[i])
-    outbuf[159] = chs
+def _fletcher(buf: ptr8, n: int) -> int:
+    a = b = 0
+    for i in range(n):
+        a = (a + buf[i]) % 255
+        b = (b + a) % 255
+    return b << 8 | a
+
 @micropython.viper
-def _check_checksum() -> int:
-    chs = 0
-    for i in range(159):
-        chs ^= int(inbuf[i])
-    return 1 if int(inbuf[159]) == chs else 0
+def _encode(out: ptr8, cur: ptr8, ref: ptr8) -> int:
+    # Write the spans of cur that differ from ref after the header of out,
+    # returning the payload length, or -1 if a keyframe would be smaller
+    pos = _HEAD
+    i = 0
+    while i < _SIZE:
+        if cur[i] == ref[i]:
+            i += 1
+            continue
+        # Found a changed byte, extend the span until enough are equal
+        start = i
+        end = i = i + 1
+        while i < _SIZE and i - end < _SPAN_GAP:
+            if cur[i] != ref[i]:
+                end = i + 1
+            i += 1
+        if pos + 2 + end - start > _HEAD + _SIZE:
+            return -1
+        out[pos] = start
+        out[pos+1] = end - start
+        for j in range(start, end):
+            out[pos+2+j-start] = cur[j]
+        pos += 2 + end - start
+    return pos - _HEAD
+
+@micropython.viper
+def _apply(frame: ptr8, n: int, dest: ptr8) -> int:
+    # Apply the delta payload of a frame to dest, if it is well formed
+    pos = _HEAD
+    end = _HEAD + n
+    while pos < end:
+        if pos + 2 > end or frame[pos] + frame[pos+1] > _SIZE or (
+                pos + 2 + frame[pos+1] > end):
+            return 0
+        pos += 2 + frame[pos+1]
+    pos = _HEAD
+    while pos < end:
+        start = frame[pos]
+        length = frame[pos+1]
+        for j in range(length):
+            dest[start+j] = frame[pos+2+j]
+        pos += 2 + length
+    return 1
+
+@micropython.native
+def _prep_frame() -> int:
+    global _seq, _since_key
+    _seq = _seq % 255 + 1
+    n = -1
+    if _acked_seq and _since_key < _KEYINT:
+        n = int(_encode(_txbuf, outbuf, _acked))
+    key = n < 0
+    if key:
+        _txbuf[_HEAD:_HEAD+_SIZE] = outbuf
+        n = _SIZE
+        _since_key = 0
+        stats[2] += 1
+    else:
+        _since_key += 1
+    _txbuf[0] = _MAGIC
+    _txbuf[1] = _seq
+    _txbuf[2] = _acked_seq
+    _txbuf[3] = _rx_seq
+    _txbuf[4] = (_KEYFRAME if key else 0) | (_RESYNC if _resync else 0)
+    _txbuf[5] = n
+    n += _HEAD
+    chs = int(_fletcher(_txbuf, n))
+    _txbuf[n] = chs & 255
+    _txbuf[n+1] = chs >> 8
+    _sent[:] = outbuf
+    stats[0] += 1
+    stats[1] += n + 2
+    return n + 2
+
+@micropython.native
+def _receive(n: int) -> int:
+    global _acked_seq, _rx_seq, _resync
+    if int(_fletcher(_rxbuf, n-2)) != _rxbuf[n-2] | _rxbuf[n-1] << 8:
+        stats[4] += 1
+        return 0
+    flags = _rxbuf[4]
+    # The other side has our last frame, so deltas can be against it
+    if _rxbuf[3] and _rxbuf[3] == _seq:
+        _acked[:] = _sent
+        _acked_seq = _seq
+    if flags & _RESYNC:
+        _acked_seq = 0
+    if flags & _KEYFRAME:
+        if n != _HEAD + _SIZE + 2:
+            stats[4] += 1
+            return 0
+        inbuf[:] = memoryview(_rxbuf)[_HEAD:_HEAD+_SIZE]
+    elif not _rx_seq or _rxbuf[2] != _rx_seq:
+        # Delta against a frame we don't have, ask for a keyframe
+        _resync = 1
+        stats[4] += 1
+        return 0
+    elif not _apply(_rxbuf, n-_HEAD-2, inbuf):
+        stats[4] += 1
+        return 0
+    _rx_seq = _rxbuf[1]
+    _resync = 0
+    stats[3] += 1
+    return 1
 
 @micropython.native
 def comms():
-    global _echo, _wait, _uanyc
+    global _echo, _wait, _got, _uanyc, _backoff
     res = 0
     # Discard echo rebounding back on the wire (from half duplex)
     _echo -= _uart.readinto(_echobuf, _echo) or 0
     if _echo == 0 and _wait > 0: # Read
-        _wait -= _uart.readinto(memoryview(inbuf)[160-_wait:], _wait) or 0
-        if not _wait and _check_checksum():
-            res = 1 # Message recieved
+        _got += _uart.readinto(memoryview(_rxbuf)[_got:], _wait-_got) or 0
+        if _got == _HEAD and _wait == _HEAD: # Header, find the frame length
+            if _rxbuf[0] == _MAGIC and _rxbuf[5] <= _SIZE:
+                _wait = _HEAD + _rxbuf[5] + 2
+                _got += _uart.readinto(memoryview(_rxbuf)[_got:], _wait-_got) or 0
+            else: # Junk, our turn again
+                stats[4] += 1
+                _wait = _got = 0
+        if _wait and _got == _wait:
+            res = _receive(_wait) # Message recieved (if valid)
+            _wait = _got = _uanyc = _backoff = 0
+    if _backoff: # Listening a little longer before sending again
+        _backoff -= 1
+        if not _backoff and not _got:
+            _wait = 0
     # Check if it is our turn to send
     if _echo == 0 and _wait == 0 and _rxPin.value:
         # Wipe junk or half messages
         while _uart.any():
             _uart.readinto(_echobuf)
-        _prep_checksum()
-        _uart.write(outbuf) # Send
-        # Ready for echo and then reply
-        _echo = _wait = 160
+        n = _prep_frame()
+        _uart.write(memoryview(_txbuf)[:n]) # Send
+        # Ready for echo and then reply (header first)
+        _echo = n
+        _wait = _HEAD
+        _got = 0
     elif _wait != 0 and not _uart.any():
         _uanyc += 1
-        # If noreply 60 times, abort and send again
+        # If noreply 60 times, abort and send again after a random pause,
+        # so both sides don't keep talking over each other
         if _uanyc > 60:
-            _echo = _wait = _uanyc = 0
+            _echo = _got = _uanyc = 0
+            _wait = _HEAD
+            _backoff = 1 + (ticks_us() & 15)
     return res
-
@@ -35,6 +35,7 @@ def _run_menu():
         mons.tick(t)
         mons.draw_and_check_death(t, None, None)
         tape.auto_camera(mons.x[0], mons.y[0]-64, 1, t)
+        tape.prefetch()
         tape.comp()
         display_update()
         if not EMULATED:
@@ -167,6 +168,8 @@ def run_game():
             mons.tick(t)
         # Make the camera follow the action
         tape.auto_camera(p1.x, p1.y, p1.dir, t)
+        # Generate upcoming tape columns ahead of the scroll
+        tape.prefetch()
 
         # Update coop networking
         if coop:
@@ -229,7 +232,8 @@ def run_game():
             ptot += pstat
             gc.collect() # Full garbage collect for good memory use reading.
             print(pstat, ptot*_FPS//t, gc.mem_alloc(), gc.mem_free(), pstat2,
-                pfps1*1000//fpst, pfps2*1000//fpst, tape.x[0])
+                pfps1*1000//fpst, pfps2*1000//fpst, tape.x[0],
+                tape.cache_stats[0], tape.cache_stats[1])
             pstat = pstat2 = pfps1 = pfps2 = 0
             pfpst = ticks_ms()
         pw = ticks_ms()
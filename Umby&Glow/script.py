@@ -5,13 +5,14 @@ import gc
 from utils import *
 from machine import Pin, freq
 from array import array
+from struct import unpack
 _buf = array('l', [0, 0, 0, 0, 0, 0, 0, 0])
 bA = Pin(27, Pin.IN, Pin.PULL_UP).value
 bR = Pin(5, Pin.IN, Pin.PULL_UP).value
 
 w = None # World
 _loaded = None
-_last_feed = "[_","_","_","_","_]"
+_last_feed = ["_","_","_","_","_"]
 def _load_world(tape, mons, world, feed):
     global _loaded, _last_feed
     if _loaded != world:
@@ -30,58 +31,92 @@ def _load_world(tape, mons, world, feed):
             pass
         gc.collect()
         _loaded = world
-    tape.feed = eval(feed)
-    split = feed.split(',')
-    # Reset any offscreen background changes
-    if split[0] != _last_feed[0]:
+    # Find the feed patterns by name (world patterns are prefixed with "w.")
+    g = globals()
+    names = [world+n if n[:2] == "w." else n for n in feed]
+    tape.set_feed([getattr(w, n[2:]) if n[:2] == "w." else g[n] for n in feed],
+        names)
+    # Reset any offscreen background changes, a few columns a frame
+    if names[0] != _last_feed[0]:
         start = tape.bx[0]
-        for i in range(start+72, start+144):
-            tape.redraw_tape(0, i, tape.feed[0], None)
-    if split[1] != _last_feed[1] or split[2] != _last_feed[2]:
+        tape.refeed(0, start+72, start+144)
+    if names[1] != _last_feed[1] or names[2] != _last_feed[2]:
         start = tape.midx[0]
-        for i in range(start+72, start+144):
-            tape.redraw_tape(1, i, tape.feed[1], tape.feed[2])
-    _last_feed = split
+        tape.refeed(1, start+72, start+144)
+    _last_feed = names
 
-def _script():
-    with open("/Games/Umby&Glow/script.txt") as fp:
-        for line in fp:
-            if line and line[0] != "#" and line[0] != "\n":
-                dist, _, ev_str = line.partition(",")
-                yield int(dist), ev_str.strip()
+## Compiled script (script.bin, built from script.txt by tools/scriptc.py) ##
+# Event kinds
+_DIALOG = const(0)
+_LEVEL = const(1)
+_SPAWN = const(2)
+_FREQ = const(3)
+_END = const(4)
+_BLOCK = const(16) # Events per index entry
+
+_fp = open("/Games/Umby&Glow/script.bin", "rb")
+_blocks, _chapters = unpack("<7xHB", _fp.read(10))
+# Index entry for each block of events: [furthest position of any event up to
+# the block's first, offset, level offset]
+_index = array('l', unpack(f"<{_blocks*3}i", _fp.read(_blocks*12)))
+_chapter_offs = unpack(f"<{_chapters}I", _fp.read(_chapters*4))
+
+def _read():
+    # Read the next event from the script file as (kind, position, payload)
+    kind, size, at = unpack("<BHi", _fp.read(7))
+    return kind, at, _fp.read(size)
+
+def _read_at(offset):
+    _fp.seek(offset)
+    return _read()
 
 def get_chapters():
-    pos = -145
-    for dist, ev in _script():
-        pos += dist
-        if ev.startswith('"CHAPTER~') or ev.startswith('"~'):
-            yield (eval(ev), pos)
+    resume = _fp.tell()
+    for off in _chapter_offs:
+        _, at, text = _read_at(off)
+        yield (text.decode(), at - 145)
+    _fp.seek(resume)
 
-_line = _script()
-_next_at, _next_event = next(_line)
+_next_kind, _next_at, _next_event = _read()
 state = [_next_at] # Last event for save state
 
 def _load_lvl(tape, mons, ev):
-    _load_world(tape, mons, ev[0], ev[1])
-    tape.spawner = ev[2]
+    # Level payload: world, flags, spawner count, types, rates, feed names
+    n = ev[2]
+    _load_world(tape, mons, str(ev[0]), ev[3+n*2:].decode().split(","))
+    tape.spawner = (bytearray(ev[3:3+n]), bytearray(ev[3+n:3+n*2]))
     for plyr in tape.players:
-        plyr.space = ev[3] & 1
-    tape.cam_shake = ev[3] >> 1
+        plyr.space = ev[1] & 1
+    tape.cam_shake = ev[1] >> 1
 
 def story_jump(tape, mons, start, lobby):
-    global _next_event, _next_at
-    # Scan script finding the starting position
+    global _next_kind, _next_event, _next_at
+    # Find the starting position in the script
     if _next_at <= start:
-        lvl = None
-        for dist, _next_event in _line:
-            state[0] = _next_at
-            _next_at += dist
-            if _next_event[0] == "(":
-                lvl = _next_event
+        # Binary search the index for the last block with no event up to its
+        # first past the start
+        lo, hi = 0, _blocks-1
+        while lo < hi:
+            mid = (lo+hi+1)//2
+            if _index[mid*3] <= start:
+                lo = mid
+            else:
+                hi = mid-1
+        # Then scan the block, remembering the level in force at the start
+        lvl = _index[lo*3+2]
+        _fp.seek(_index[lo*3+1])
+        while 1:
+            off = _fp.tell()
+            _next_kind, _next_at, _next_event = _read()
             if _next_at > start:
                 break
+            state[0] = _next_at
+            if _next_kind == _LEVEL:
+                lvl = off
         if lvl:
-            _load_lvl(tape, mons, eval(lvl))
+            resume = _fp.tell()
+            _load_lvl(tape, mons, _read_at(lvl)[2])
+            _fp.seek(resume)
 
     # Reset the tape data to match the new details
     tape.reset(start)
@@ -123,7 +158,7 @@ def add_dialog(tape, dialog):
 
 @micropython.native
 def story_events(tape, mons, coop_px, autotxt, outbuf, inbuf):
-    global _dialog_c, _next_event, _next_at, _active_battle, _pos, _speaking
+    global _dialog_c, _next_kind, _next_event, _next_at, _active_battle, _pos, _speaking
     outbuf[14] = ((1 if not _speaking or autotxt else 0) |
         (2 if _active_battle >= 0 else 0))
     if tape.player and tape.player.mode > 200:
@@ -164,19 +199,23 @@ def story_events(tape, mons, coop_px, autotxt, outbuf, inbuf):
     posx = tape.x[0]
     pos = posx if posx > coop_px else coop_px # Furthest of both players
     if pos >= _next_at:
+        if _next_kind == _END:
+            return
         state[0] = _next_at
-        event = eval(_next_event)
-        if isinstance(event, tuple):
+        event = _next_event
+        if _next_kind == _LEVEL:
             _load_lvl(tape, mons, event)
-        elif isinstance(event, str):
+        elif _next_kind == _DIALOG:
             if inbuf[14] & 2:
                 return
-            add_dialog(tape, event)
-        elif event: # Monsters
+            add_dialog(tape, event.decode())
+        elif _next_kind == _SPAWN: # Monsters
             if posx < _next_at:
                 return # Wait to reach spawn position
-            bat = mons.add(event, posx+144, 32)
-            if event in boss_types:
+            tid = event[0]
+            bat = mons.add(tid, posx+144, 32)
+            if tid in boss_types:
                 _active_battle = bat
-        dist, _next_event = next(_line)
-        _next_at += dist
\ No newline at end of file
+        elif _next_kind == _FREQ:
+            freq(unpack("<I", event)[0])
+        _next_kind, _next_at, _next_event = _read()
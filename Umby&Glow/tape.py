@@ -35,6 +35,11 @@ except ImportError:
 
 # Setup the display
 _display_buffer = display.buffer
+# Pattern column cache: generated columns per feed, direct mapped by x
+_CACHE = const(32) # Columns per feed (power of 2)
+_FEEDS = const(2) # Feeds kept cached per layer
+_NOCOL = const(-1073741824) # Tag for an empty cache slot
+_REFEED = const(4) # Background columns fed again per frame after a switch
 timer = ticks_ms()
 _fwait = 1000//(_FPS if EMULATED else _FPS*2)
 @micropython.native
@@ -85,6 +90,21 @@ class Tape:
         self.mons_add = _pass
         # How far along the tape spawning has completed
         self._x = array('l', [0])
+        # Cache of generated feed columns (pattern top/bottom and fill
+        # top/bottom words) for the last few feeds of each layer, so columns
+        # scrolled away and back, or prefetched, don't need the patterns
+        # evaluating again, even after switching feeds and back.
+        self._cache = array('l', (0 for i in range(_CACHE*_FEEDS*3*4)))
+        self._cache_x = array('l', (_NOCOL for i in range(_CACHE*_FEEDS*3)))
+        # Feed name and cache slot for each layer, most recently used first
+        self._cache_feeds = [[(None, i*_FEEDS+s) for s in range(_FEEDS)]
+            for i in range(3)]
+        self._cache_slot = array('l', [0, _FEEDS, _FEEDS*2]) # In use
+        self._cache_dir = array('l', [1, 1, 1]) # Last scroll direction
+        # Background columns still to be fed again, for layers 0 and 1:
+        # [next ahead, end ahead, next behind, end behind]
+        self._refeed = array('l', [0, 0, 0, 0, 0, 0, 0, 0])
+        self.cache_stats = array('l', [0, 0, 0]) # Hits, misses, prefetches
         self.player = None # Player at this device
         self.players = [] # Player register for interactions
         self.clear_overlay()
@@ -99,12 +119,21 @@ class Tape:
         scroll[1] = p//2
         scroll[3] = p
         # Reset the tape buffers for all layers and fill with the current feed.
+        # The backgrounds only need the view filling now, the rest of their
+        # tape follows a few columns a frame.
         scroll = ptr32(self._tape_scroll)
+        feed_column = self.feed_column
+        refeed = ptr32(self._refeed)
+        for i in range(8):
+            refeed[i] = 0
         for i in range(3):
             layer = 3 if i == 2 else i
             tapePos = scroll[layer]
-            for x in range(tapePos-72, tapePos+144):
-                self.redraw_tape(i, x, self.feed[layer], self.feed[layer+1])
+            if i == 2:
+                for x in range(tapePos-72, tapePos+144):
+                    feed_column(i, x, 1)
+            else:
+                self.refeed(i, tapePos-72, tapePos+144)
 
     @micropython.viper
     def check(self, x: int, y: int, b: int) -> bool:
@@ -219,9 +248,9 @@ class Tape:
     
     @micropython.viper
     def scroll_tape(self, back_move: int, mid_move: int, fore_move: int):
-        tape = ptr32(self._tape)
         scroll = ptr32(self._tape_scroll)
-        feed = self.feed
+        direction = ptr32(self._cache_dir)
+        feed_column = self.feed_column
         for i in range(3):
             layer = 3 if i == 2 else i
             move = fore_move if i == 2 else mid_move if i == 1 else back_move
@@ -230,18 +259,9 @@ class Tape:
             # Advance the tape_scroll position for the layer
             tapePos = scroll[layer] + move
             scroll[layer] = tapePos
-            # Find the tape position for the column that needs to be filled
-            x = tapePos + 143 if move == 1 else tapePos - 72
-            offX = layer*432 + x%216*2
-            # Update 2 words of vertical pattern for the tape
-            # (the top 32 bits, then the bottom 32 bits)
-            pattern = feed[layer]
-            tape[offX] = int(pattern(x, 0))
-            tape[offX+1] = int(pattern(x, 32))
-            if layer != 0:
-                fill_pattern = feed[layer + 1]
-                tape[offX+432] = int(fill_pattern(x, 0))
-                tape[offX+433] = int(fill_pattern(x, 32))
+            # Fill the column that scrolled into the tape
+            feed_column(i, tapePos + 143 if move == 1 else tapePos - 72, 1)
+            direction[i] = move
         # Spawn new monsters
         xp = ptr32(self._x)
         p = scroll[3]
@@ -259,9 +279,145 @@ class Tape:
             r = r >> 1
         xp[0] = p 
 
+    @micropython.viper
+    def feed_column(self, i: int, x: int, write: int):
+        l = 3 if i == 2 else i
+        feed = self.feed
+        pattern = feed[l]
+        if not pattern:
+            return
+        fill_pattern = feed[l+1] if l != 0 else None
+        cache = ptr32(self._cache)
+        cache_x = ptr32(self._cache_x)
+        stats = ptr32(self.cache_stats)
+        s = ptr32(self._cache_slot)[i]*_CACHE + (x & (_CACHE-1))
+        c = s*4
+        if cache_x[s] == x:
+            if write:
+                stats[0] += 1
+        else:
+            stats[1 if write else 2] += 1
+            # The fill pattern relies on _buf state from the pattern call
+            # for the same column, so generate them together
+            cache[c] = int(pattern(x, 0))
+            cache[c+1] = int(pattern(x, 32))
+            if fill_pattern:
+                cache[c+2] = int(fill_pattern(x, 0))
+                cache[c+3] = int(fill_pattern(x, 32))
+            cache_x[s] = x
+        if write:
+            tape = ptr32(self._tape)
+            offX = l*432 + x%216*2
+            tape[offX] = cache[c]
+            tape[offX+1] = cache[c+1]
+            if fill_pattern:
+                tape[offX+432] = cache[c+2]
+                tape[offX+433] = cache[c+3]
+
+    def set_feed(self, feed, names):
+        # Switch the patterns fed into each tape section. The names identify
+        # the patterns (bound methods aren't the same object twice), and
+        # pick the cached columns of a layer's feed if it had it recently.
+        self.feed = feed
+        for i in range(3):
+            l = 3 if i == 2 else i
+            name = names[l] + "," + names[l+1] if l else names[0]
+            feeds = self._cache_feeds[i]
+            for n in range(_FEEDS):
+                if feeds[n][0] == name:
+                    break
+            else: # Reuse the slot of the least recently used feed
+                n = _FEEDS-1
+                feeds[n] = (name, feeds[n][1])
+                self.clear_cache(feeds[n][1])
+            feeds.insert(0, feeds.pop(n))
+            self._cache_slot[i] = feeds[0][1]
+
+    @micropython.viper
+    def clear_cache(self, slot: int):
+        cache_x = ptr32(self._cache_x)
+        for s in range(slot*_CACHE, slot*_CACHE+_CACHE):
+            cache_x[s] = _NOCOL
+
+    @micropython.viper
+    def refeed(self, i: int, lo: int, hi: int):
+        # Feed the columns [lo, hi) of a background layer again from its
+        # current patterns: those in view now, the others a few a frame from
+        # prefetch, nearest the view first, so a feed switch doesn't stall.
+        if i == 2:
+            for x in range(lo, hi):
+                self.feed_column(2, x, 1)
+            return
+        refeed = ptr32(self._refeed)
+        tapePos = ptr32(self._tape_scroll)[i]
+        r = i*4
+        for x in range(lo if lo > tapePos else tapePos,
+                hi if hi < tapePos+72 else tapePos+72):
+            self.feed_column(i, x, 1)
+        # Queue the rest, merged with any columns still waiting from before
+        a = lo if lo > tapePos+72 else tapePos+72
+        b = (hi if hi < tapePos else tapePos) - 1
+        if a < hi:
+            if refeed[r] < refeed[r+1]:
+                a = a if a < refeed[r] else refeed[r]
+                hi = hi if hi > refeed[r+1] else refeed[r+1]
+            refeed[r] = a
+            refeed[r+1] = hi
+        if b >= lo:
+            if refeed[r+2] > refeed[r+3]:
+                b = b if b > refeed[r+2] else refeed[r+2]
+                lo = lo if lo < refeed[r+3]+1 else refeed[r+3]+1
+            refeed[r+2] = b
+            refeed[r+3] = lo - 1
+
+    @micropython.viper
+    def settle(self, i: int, lo: int, hi: int):
+        # Feed any waiting background columns in [lo, hi), along with those
+        # between them and the view. Call before drawing over a column.
+        if i == 2:
+            return
+        refeed = ptr32(self._refeed)
+        tapePos = ptr32(self._tape_scroll)[i]
+        feed_column = self.feed_column
+        r = i*4
+        # Columns that left the tape buffer get fed when they scroll back in
+        if refeed[r+1] > tapePos+144:
+            refeed[r+1] = tapePos+144
+        if refeed[r+3] < tapePos-73:
+            refeed[r+3] = tapePos-73
+        while refeed[r] < hi and refeed[r] < refeed[r+1]:
+            feed_column(i, refeed[r], 1)
+            refeed[r] += 1
+        while refeed[r+2] >= lo and refeed[r+2] > refeed[r+3]:
+            feed_column(i, refeed[r+2], 1)
+            refeed[r+2] -= 1
+
+    @micropython.viper
+    def prefetch(self):
+        # Generate the next column each layer needs in the direction it
+        # last scrolled, so the pattern cost is spread over frames rather
+        # than landing on a scroll. After a turn the direction follows.
+        scroll = ptr32(self._tape_scroll)
+        direction = ptr32(self._cache_dir)
+        refeed = ptr32(self._refeed)
+        feed_column = self.feed_column
+        for i in range(3):
+            tapePos = scroll[3 if i == 2 else i]
+            if i != 2:
+                # Feed background columns waiting since a feed switch, at
+                # least those now in view
+                r = i*4
+                lo = refeed[r+2] - _REFEED + 1
+                hi = refeed[r] + _REFEED
+                self.settle(i, lo if lo < tapePos else tapePos,
+                    hi if hi > tapePos+72 else tapePos+72)
+            feed_column(i, tapePos + 144 if direction[i] == 1 else tapePos - 73, 0)
+
     @micropython.viper
     def redraw_tape(self, layer: int, x: int, pattern, fill_pattern):
         tape = ptr32(self._tape)
+        if layer != 2:
+            self.settle(layer, x, x+1)
         l = 3 if layer == 2 else layer
         offX = l*432 + x%216*2
         tape[offX] = int(pattern(x, 0))
@@ -273,6 +429,8 @@ class Tape:
     @micropython.viper
     def scratch_tape(self, layer: int, x: int, pattern, fill_pattern):
         tape = ptr32(self._tape)
+        if layer != 2:
+            self.settle(layer, x, x+1)
         l = 3 if layer == 2 else layer
         p = ptr32(self._tape_scroll)[l]
         if -72 <= x - p < 144:
@@ -286,6 +444,8 @@ class Tape:
     @micropython.viper
     def draw_tape(self, layer: int, x: int, pattern, fill_pattern):
         tape = ptr32(self._tape)
+        if layer != 2:
+            self.settle(layer, x, x+1)
         l = 3 if layer == 2 else layer
         offX = l*432 + x%216*2
         tape[offX] |= int(pattern(x, 0))
@@ -317,6 +477,8 @@ class Tape:
     def write(self, layer: int, text, x: int, y: int):
         text = text.upper()
         tape = ptr32(self._tape)
+        if layer == 1:
+            self.settle(1, x-1, x+int(len(text))*4)
         abc_b = ptr8(self._abc)
         abc_i = self._abc_i
         h = y - 8 # y position is from bottom of text
@@ -0,0 +1,146 @@
+## Host Stand-ins ##
+# The micropython, machine and ssd1306 modules and the ptr8, ptr32, const and
+# uint builtins, with viper's 32-bit arithmetic, plus viper_exec for the world
+# code and game_open for the game's device paths.
+
+import ast
+import builtins
+import os
+import sys
+import time
+import types
+
+GAME_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+class MicroPython:
+    native = viper = staticmethod(lambda f: f)
+    const = staticmethod(lambda v: v)
+
+_buffers = {} # Pretend address (high bits) -> buffer, for int(ptr) and back
+
+class _Ptr:
+    # A viper pointer: a buffer and a byte offset into it. int() of one
+    # gives a pretend address that ptr8/ptr32 of it (plus an offset) follow
+    def __init__(self, buf, offset=0):
+        if isinstance(buf, int):
+            buf, offset = _buffers[buf >> 32], buf & 0xFFFFFFFF
+        self.buf = buf
+        self.offset = offset
+    def __int__(self):
+        key = id(self.buf)
+        _buffers[key] = self.buf
+        return (key << 32) + self.offset
+
+class Ptr8(_Ptr):
+    def __getitem__(self, i):
+        return self.buf[self.offset+i]
+    def __setitem__(self, i, v):
+        self.buf[self.offset+i] = v & 0xFF
+
+class Ptr32(_Ptr):
+    # Viper stores 32 bit words, wrapping anything wider. Word arrays are
+    # indexed directly (CPython's array('l') has 64 bit items), anything
+    # else as little endian bytes
+    def __getitem__(self, i):
+        if getattr(self.buf, "typecode", "B") != "B":
+            return self.buf[self.offset//4+i]
+        p = self.offset + i*4
+        return int.from_bytes(self.buf[p:p+4], "little", signed=True)
+    def __setitem__(self, i, v):
+        v &= 0xFFFFFFFF
+        v = v - 0x100000000 if v & 0x80000000 else v
+        if getattr(self.buf, "typecode", "B") != "B":
+            self.buf[self.offset//4+i] = v
+        else:
+            p = self.offset + i*4
+            self.buf[p:p+4] = v.to_bytes(4, "little", signed=True)
+
+def viper_args(f):
+    # Viper functions take buffers as ptr8 arguments
+    if Ptr8 not in getattr(f, "__annotations__", {}).values():
+        return f
+    def call(*args):
+        return f(*(Ptr8(a) if isinstance(a, (bytearray, memoryview)) else a
+            for a in args))
+    return call
+
+class Pin:
+    IN = OUT = PULL_UP = 0
+    def __init__(self, *args, **kwargs):
+        pass
+    def value(self, *args):
+        return 1
+
+class _Device:
+    # Any other peripheral: accepts whatever it's given
+    def __init__(self, *args, **kwargs):
+        pass
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: 0
+
+class SSD1306_SPI:
+    def __init__(self, width, height, *args, **kwargs):
+        self.buffer = bytearray(width*height//8)
+    def show(self):
+        pass
+
+def machine(**overrides):
+    module = types.ModuleType("machine")
+    module.Pin = Pin
+    module.SPI = module.PWM = module.UART = _Device
+    module.freq = module.reset = lambda *args: None
+    for name, value in overrides.items():
+        setattr(module, name, value)
+    return module
+
+def install(**machine_overrides):
+    builtins.micropython = MicroPython
+    builtins.const = MicroPython.const
+    builtins.ptr8 = Ptr8
+    builtins.ptr32 = Ptr32
+    builtins.uint = lambda v: v & 0xFFFFFFFF
+    sys.modules["micropython"] = MicroPython
+    sys.modules["machine"] = machine(**machine_overrides)
+    ssd1306 = types.ModuleType("ssd1306")
+    ssd1306.SSD1306_SPI = SSD1306_SPI
+    sys.modules["ssd1306"] = ssd1306
+    time.ticks_ms = lambda: int(time.perf_counter() * 1000)
+    time.ticks_us = lambda: int(time.perf_counter() * 1000000)
+    time.sleep_ms = lambda ms: None
+
+class _ViperDivision(ast.NodeTransformer):
+    def visit_BinOp(self, node):
+        self.generic_visit(node)
+        name = {ast.Mod: "_viper_mod", ast.FloorDiv: "_viper_div",
+            ast.LShift: "_viper_lshift", ast.RShift: "_viper_rshift"}.get(
+            type(node.op))
+        if not name:
+            return node
+        return ast.Call(ast.Name(name, ast.Load()), [node.left, node.right], [])
+
+def viper_exec(source, scope):
+    # exec for game code run from source, where viper's integer division
+    # and modulo by zero give 0, and shifts use the low byte of the count
+    # like the Thumby's, rather than raising like CPython's
+    scope["_viper_mod"] = lambda a, b: a % b if b else 0
+    scope["_viper_div"] = lambda a, b: a // b if b else 0
+    scope["_viper_lshift"] = lambda a, b: a << (b & 0xFF) if b & 0xE0 == 0 else 0
+    scope["_viper_rshift"] = lambda a, b: (a >> (b & 0xFF) if b & 0xE0 == 0
+        else -1 if a < 0 else 0)
+    tree = ast.fix_missing_locations(_ViperDivision().visit(ast.parse(source)))
+    exec(compile(tree, "<game>", "exec"), scope)
+
+def game_open(missing=()):
+    # Open the game's files from this folder instead of the Thumby's
+    # /Games/Umby&Glow, raising OSError for names starting with any of
+    # missing, as if they weren't there
+    real_open = builtins.open
+    prefix = "/Games/Umby&Glow/"
+    def _open(path, *args, **kwargs):
+        if isinstance(path, str) and path.startswith(prefix):
+            name = path[len(prefix):]
+            if name.startswith(tuple(missing)):
+                raise OSError("no such file: " + path)
+            path = os.path.join(GAME_PATH, name)
+        return real_open(path, *args, **kwargs)
+    builtins.open = _open
@@ -0,0 +1,281 @@
+## Link Soak Test ##
+# Runs two copies of comms.py against each other over a simulated half-duplex
+# link cable, with both sides changing their outbuf every frame like co-op
+# play does, and checks that every frame accepted by one side matches what the
+# other side sent. Reports exchanges per frame, bytes on the wire and frames
+# rejected, so protocol changes can be soak-tested without two Thumbys.
+#
+# The same play is then run over the protocol comms.py replaced (copied below,
+# sending the whole 160 byte outbuf with an XOR checksum every exchange), on
+# the same cable, as the baseline. It has no sequence numbers, so an accepted
+# frame is counted as corrupt when it matches nothing the other side sent.
+# Both of its sides transmit whenever they aren't waiting for a reply, so how
+# often it gets through depends a lot on --offset, how far apart the two
+# sides start.
+#
+# usage: python3 tools/linksoak.py [--frames 36000] [--monsters 24]
+#            [--noise 0.0005] [--drop 0.0002] [--seed 1] [--offset 30]
+#
+# comms.py is loaded through the stand-ins in hoststubs.py. The stand-in for
+# machine.UART shares one wire between both sides. Bytes move at the link's
+# 115200 baud (192 bytes per 60Hz frame) and reach both ends, including the
+# sender (the half-duplex echo). If both sides transmit at once the bytes
+# collide (wired-AND, like the real open drain line). --noise flips a bit in
+# that share of bytes and --drop loses them.
+
+import argparse
+import importlib.util
+import os
+import random
+import sys
+import types
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import hoststubs
+
+_BYTES_PER_FRAME = 115200 // 10 // 60
+
+## Stand-in link cable ##
+
+class Wire:
+    def __init__(self, noise, drop, rng):
+        self.pending = bytearray()
+        self.ends = []
+        self.noise = noise
+        self.drop = drop
+        self.rng = rng
+        self.collisions = 0
+
+    def send(self, data):
+        # Overlapping transmissions collide bit by bit
+        if self.pending:
+            self.collisions += 1
+        for i, b in enumerate(data):
+            if i < len(self.pending):
+                self.pending[i] &= b
+            else:
+                self.pending.append(b)
+
+    def tick(self):
+        chunk = self.pending[:_BYTES_PER_FRAME]
+        del self.pending[:_BYTES_PER_FRAME]
+        out = bytearray()
+        for b in chunk:
+            if self.rng.random() < self.drop:
+                continue
+            if self.rng.random() < self.noise:
+                b ^= 1 << self.rng.randrange(8)
+            out.append(b)
+        for end in self.ends:
+            end.receive(out)
+
+class UART:
+    def __init__(self, wire, uid, baudrate, rx, tx, timeout, txbuf, rxbuf):
+        self.wire = wire
+        self.fifo = bytearray()
+        self.size = rxbuf
+        self.overflows = 0
+        self.writes = self.written = 0
+        wire.ends.append(self)
+
+    def receive(self, data):
+        room = self.size - len(self.fifo)
+        if len(data) > room:
+            self.overflows += 1
+        self.fifo += data[:room]
+
+    def any(self):
+        return len(self.fifo)
+
+    def readinto(self, buf, nbytes=None):
+        n = min(len(self.fifo), len(buf) if nbytes is None else nbytes)
+        if not n:
+            return None
+        buf[:n] = self.fifo[:n]
+        del self.fifo[:n]
+        return n
+
+    def write(self, data):
+        self.writes += 1
+        self.written += len(data)
+        self.wire.send(bytes(data))
+
+## The link protocol before delta frames ##
+
+_LEGACY_COMMS = '''
+from machine import Pin, UART
+
+_rxPin = Pin(1, Pin.IN)
+_uart = UART(0, baudrate=115200, rx=_rxPin, tx=Pin(0, Pin.OUT), timeout=0,
+    txbuf=164, rxbuf=328)
+Pin(2, Pin.OUT).value(1)
+
+# Read/write buffers (last byte is checksum)
+_echobuf = bytearray(0 for x in range(160))
+inbuf = bytearray(0 for x in range(160))
+outbuf = bytearray(0 for x in range(160))
+_echo = _wait = _uanyc = 0 # Listen counters
+
+@micropython.viper
+def _prep_checksum():
+    chs = 0
+    for i in range(159):
+        chs ^= int(outbuf[i])
+    outbuf[159] = chs
+@micropython.viper
+def _check_checksum() -> int:
+    chs = 0
+    for i in range(159):
+        chs ^= int(inbuf[i])
+    return 1 if int(inbuf[159]) == chs else 0
+
+@micropython.native
+def comms():
+    global _echo, _wait, _uanyc
+    res = 0
+    # Discard echo rebounding back on the wire (from half duplex)
+    _echo -= _uart.readinto(_echobuf, _echo) or 0
+    if _echo == 0 and _wait > 0: # Read
+        _wait -= _uart.readinto(memoryview(inbuf)[160-_wait:], _wait) or 0
+        if not _wait and _check_checksum():
+            res = 1 # Message recieved
+    # Check if it is our turn to send
+    if _echo == 0 and _wait == 0 and _rxPin.value:
+        # Wipe junk or half messages
+        while _uart.any():
+            _uart.readinto(_echobuf)
+        _prep_checksum()
+        _uart.write(outbuf) # Send
+        # Ready for echo and then reply
+        _echo = _wait = 160
+    elif _wait != 0 and not _uart.any():
+        _uanyc += 1
+        # If noreply 60 times, abort and send again
+        if _uanyc > 60:
+            _echo = _wait = _uanyc = 0
+    return res
+'''
+
+def load_comms(name, wire, rng, legacy=False):
+    sys.modules["machine"] = hoststubs.machine(
+        UART=lambda *a, **k: UART(wire, *a, **k))
+    if legacy:
+        module = types.ModuleType(name)
+        exec(compile(_LEGACY_COMMS, "comms.py (before delta frames)", "exec"),
+            vars(module))
+        return module
+    spec = importlib.util.spec_from_file_location(name,
+        os.path.join(hoststubs.GAME_PATH, "comms.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    module.ticks_us = lambda: rng.getrandbits(16)
+    for key, value in list(vars(module).items()):
+        if key.startswith("_") and callable(value) and key != "_uart":
+            setattr(module, key, hoststubs.viper_args(value))
+    return module
+
+## Simulated play ##
+
+class Side:
+    def __init__(self, name, wire, monsters, rng, legacy=False):
+        self.comms = load_comms(name, wire, rng, legacy)
+        self.rng = rng
+        self.monsters = monsters
+        self.sent = {} # seq -> outbuf as sent
+        self.received = 0
+        self.x = 0
+
+    def play(self):
+        # Player position and state change most frames, and a few monsters
+        # move, spawn or die
+        out = self.comms.outbuf
+        self.x += self.rng.choice((0, 1, 1, 2))
+        out[0:4] = self.x.to_bytes(4, "big")
+        for i in range(4, 15):
+            if self.rng.random() < 0.3:
+                out[i] = self.rng.randrange(256)
+        for i in range(self.monsters):
+            if self.rng.random() < 0.5:
+                out[16+i*3] = 1 + i % 20
+                out[17+i*3] = (out[17+i*3] + self.rng.choice((-1, 1))) & 255
+                out[18+i*3] = (out[18+i*3] + self.rng.choice((-1, 0, 1))) & 255
+
+    def step(self, peer):
+        seq = self.comms._seq
+        res = self.comms.comms()
+        if self.comms._seq != seq:
+            self.sent[self.comms._seq] = bytes(self.comms._sent)
+        if res:
+            self.received += 1
+            expected = peer.sent.get(self.comms._rx_seq)
+            if bytes(self.comms.inbuf) != expected:
+                return 1
+        return 0
+
+class LegacySide(Side):
+    def __init__(self, name, wire, monsters, rng):
+        super().__init__(name, wire, monsters, rng, True)
+        self.sent = set() # every outbuf sent, checksum included
+
+    def step(self, peer):
+        uart = self.comms._uart
+        writes = uart.writes
+        res = self.comms.comms()
+        if uart.writes != writes:
+            self.sent.add(bytes(self.comms.outbuf))
+        if res:
+            self.received += 1
+            if bytes(self.comms.inbuf) not in peer.sent:
+                return 1
+        return 0
+
+def run(args, side):
+    rng = random.Random(args.seed)
+    wire = Wire(args.noise, args.drop, rng)
+    a = side("comms_a", wire, args.monsters, rng)
+    b = side("comms_b", wire, args.monsters, rng)
+    mismatches = 0
+    for frame in range(args.frames):
+        a.play()
+        b.play()
+        mismatches += a.step(b)
+        if frame >= args.offset:
+            mismatches += b.step(a)
+        wire.tick()
+    return a, b, wire, mismatches
+
+def main():
+    parser = argparse.ArgumentParser(description="Soak test the co-op link")
+    parser.add_argument("--frames", type=int, default=36000)
+    parser.add_argument("--monsters", type=int, default=24)
+    parser.add_argument("--noise", type=float, default=0.0005)
+    parser.add_argument("--drop", type=float, default=0.0002)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--offset", type=int, default=30,
+        help="frames B starts after A, as two Thumbys never start together")
+    args = parser.parse_args()
+
+    hoststubs.install()
+    a, b, wire, mismatches = run(args, Side)
+    print("delta frames:")
+    for name, side in (("A", a), ("B", b)):
+        s = side.comms.stats
+        print(f"  {name}: {s[0]} frames sent ({s[2]} keyframes), "
+            f"{s[1]/max(s[0], 1):.1f} bytes per frame, {s[3]} received, "
+            f"{s[4]} rejected, {side.comms._uart.overflows} rx overflows, "
+            f"{side.received*60/args.frames:.1f} updates/s")
+    print(f"  {wire.collisions} collisions, {mismatches} mismatched frames")
+
+    a, b, wire, corrupt = run(args, LegacySide)
+    print("old protocol:")
+    for name, side in (("A", a), ("B", b)):
+        uart = side.comms._uart
+        print(f"  {name}: {uart.writes} frames sent, "
+            f"{uart.written/max(uart.writes, 1):.1f} bytes per frame, "
+            f"{side.received} received, {uart.overflows} rx overflows, "
+            f"{side.received*60/args.frames:.1f} updates/s")
+    print(f"  {wire.collisions} collisions, {corrupt} corrupt frames accepted")
+    return 1 if mismatches else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,155 @@
+## Script Compiler ##
+# Compiles the level script (script.txt) into the binary event stream
+# (script.bin) that script.py reads, so the game never needs to parse or
+# eval the script at runtime, and can jump straight to any position.
+#
+# usage: python3 tools/scriptc.py [script.txt] [script.bin] [--dump]
+#
+# script.txt has one event per line: "distance, event", where distance is
+# how far past the previous event this one triggers, and event is one of:
+#   "text"                                 Dialog, narration or chapter title
+#   ("world", "[feed,...]", (bytearray([types]), bytearray([rates])), flags)
+#                                          Level change
+#   MonsterName                            Monster spawn
+#   freq(hz)                               CPU frequency change
+#   StopIteration()                        End of the script
+#
+# script.bin (little endian):
+#   header   "UGSC", version:u8, events:u16, blocks:u16, chapters:u8
+#   index    per block of _BLOCK events: furthest position of any event up
+#            to the block's first (positions can go backwards, e.g. after a
+#            boss battle, so this keeps the index sorted):i32, offset:u32,
+#            offset of the last level event before the block (0 if none):u32
+#   chapters offset:u32 of each chapter title event
+#   events   kind:u8, size:u16, position:i32, then size bytes of payload:
+#     _DIALOG  utf-8 text
+#     _LEVEL   world:u8, flags:u8, count:u8, types[count], rates[count],
+#              then the 5 feed pattern names joined by ","
+#     _SPAWN   monster type:u8
+#     _FREQ    hz:u32
+#     _END     (nothing)
+
+import os
+import re
+import struct
+import sys
+
+_DIALOG = 0
+_LEVEL = 1
+_SPAWN = 2
+_FREQ = 3
+_END = 4
+
+_VERSION = 1
+_BLOCK = 16 # Events per index entry
+_HEADER = "<4sBHHB"
+_INDEX = "<iII"
+_EVENT = "<BHi"
+
+_here = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def monster_types(path):
+    # Read the public monster names and their type ids from monsters.py
+    with open(path) as fp:
+        src = fp.read()
+    ids = {m[0]: int(m[1]) for m in
+        re.findall(r"^(_\w+) = const\((\d+)\)", src, re.M)}
+    return {m[0]: ids[m[1]] for m in
+        re.findall(r"^(\w+) = (_\w+)$", src, re.M) if m[1] in ids}
+
+def parse(path, types):
+    # Yields (line number, absolute position, kind, payload) for each event
+    names = dict(types)
+    names["bytearray"] = bytearray
+    names["freq"] = lambda hz: (_FREQ, hz)
+    names["StopIteration"] = lambda: (_END,)
+    pos = 0
+    with open(path) as fp:
+        for num, line in enumerate(fp, 1):
+            if not line or line[0] == "#" or line[0] == "\n":
+                continue
+            dist, _, ev_str = line.partition(",")
+            pos += int(dist)
+            try:
+                ev = eval(ev_str.strip(), {"__builtins__": {}}, names)
+            except Exception as e:
+                raise ValueError(f"line {num}: {e}") from None
+            if isinstance(ev, str):
+                yield num, pos, _DIALOG, ev.encode()
+            elif isinstance(ev, int):
+                yield num, pos, _SPAWN, bytes([ev])
+            elif ev and ev[0] == _FREQ:
+                yield num, pos, _FREQ, struct.pack("<I", ev[1])
+            elif ev and ev[0] == _END:
+                yield num, pos, _END, b""
+            else:
+                world, feed, (tids, rates), flags = ev
+                feed = feed.replace(" ", "")
+                if feed[0] != "[" or feed[-1] != "]" or len(feed.split(",")) != 5:
+                    raise ValueError(f"line {num}: feed needs 5 patterns")
+                if len(tids) != len(rates):
+                    raise ValueError(f"line {num}: spawner sizes differ")
+                yield num, pos, _LEVEL, (bytes([int(world), flags, len(tids)])
+                    + tids + rates + feed[1:-1].encode())
+
+def compile_script(src, dst):
+    events = list(parse(src, monster_types(os.path.join(_here, "monsters.py"))))
+    blocks = (len(events) + _BLOCK - 1) // _BLOCK
+    chapters = [i for i, ev in enumerate(events) if ev[2] == _DIALOG
+        and (ev[3].startswith(b"CHAPTER~") or ev[3].startswith(b"~"))]
+    offset = (struct.calcsize(_HEADER) + blocks*struct.calcsize(_INDEX)
+        + len(chapters)*4)
+    body = bytearray()
+    offsets = []
+    for num, pos, kind, payload in events:
+        offsets.append(offset + len(body))
+        body += struct.pack(_EVENT, kind, len(payload), pos) + payload
+    out = bytearray(struct.pack(_HEADER, b"UGSC", _VERSION, len(events),
+        blocks, len(chapters)))
+    lvl = 0
+    reach = events[0][1]
+    for i, (num, pos, kind, payload) in enumerate(events):
+        reach = max(reach, pos)
+        if i % _BLOCK == 0:
+            out += struct.pack(_INDEX, reach, offsets[i], lvl)
+        if kind == _LEVEL:
+            lvl = offsets[i]
+    for i in chapters:
+        out += struct.pack("<I", offsets[i])
+    out += body
+    with open(dst, "wb") as fp:
+        fp.write(out)
+    print(f"{dst}: {len(events)} events, {blocks} index blocks, "
+        f"{len(chapters)} chapters, {len(out)} bytes")
+
+def dump(path):
+    with open(path, "rb") as fp:
+        data = fp.read()
+    magic, version, count, blocks, chapters = struct.unpack_from(_HEADER, data)
+    print(magic, version, count, "events", blocks, "blocks", chapters, "chapters")
+    o = struct.calcsize(_HEADER) + blocks*struct.calcsize(_INDEX) + chapters*4
+    for i in range(count):
+        kind, size, pos = struct.unpack_from(_EVENT, data, o)
+        o += struct.calcsize(_EVENT)
+        payload = data[o:o+size]
+        o += size
+        if kind == _DIALOG:
+            print(pos, repr(payload.decode()))
+        elif kind == _LEVEL:
+            n = payload[2]
+            print(pos, "LEVEL", payload[0], list(payload[3:3+n]),
+                list(payload[3+n:3+2*n]), payload[1], payload[3+2*n:].decode())
+        elif kind == _SPAWN:
+            print(pos, "SPAWN", payload[0])
+        elif kind == _FREQ:
+            print(pos, "FREQ", struct.unpack("<I", payload)[0])
+        else:
+            print(pos, "END")
+
+if __name__ == "__main__":
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    src = args[0] if args else os.path.join(_here, "script.txt")
+    dst = args[1] if len(args) > 1 else os.path.join(_here, "script.bin")
+    compile_script(src, dst)
+    if "--dump" in sys.argv:
+        dump(dst)
@@ -0,0 +1,146 @@
+## Tape Bench ##
+# Measures how many tape columns the feed patterns generate at once, where
+# the game would hitch: on a story jump (starting or loading a chapter), and
+# in each frame while scrolling through the script, level switches included.
+# Each frame is set against the old tape, with no column cache: it fed one
+# column per layer per pixel scrolled, and on a level switch redrew the 72
+# columns offscreen of each background whose patterns changed. Every frame
+# it also checks that the backgrounds in view are the same as when every
+# column of a feed switch is fed straight away.
+#
+# usage: python3 tools/tapebench.py [--frames 50000] [--speed 1]
+#
+# tape.py and script.py are loaded unchanged through the stand-ins in
+# hoststubs.py. Columns are counted from tape.cache_stats, which counts
+# every column a pattern generates, so they hold on the Thumby too; the
+# CPython times are only good for comparing with each other.
+
+import argparse
+import importlib
+import os
+import sys
+import time
+import types
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import hoststubs
+
+## Simulated play ##
+
+def load():
+    hoststubs.install()
+    # Monsters aren't needed (and monsters.py isn't valid CPython)
+    hoststubs.game_open(missing=("mons",))
+    monsters = types.ModuleType("monsters")
+    monsters.boss_types = []
+    sys.modules["monsters"] = monsters
+    sys.path.insert(0, hoststubs.GAME_PATH)
+    import tape
+    import script
+    script = importlib.reload(script) # Back to the start of script.bin
+    # MicroPython runs the worlds _load_world execs in the module's globals
+    script.exec = lambda code: hoststubs.viper_exec(code, vars(script))
+    return tape, script
+
+def generated(tp):
+    return tp.cache_stats[1] + tp.cache_stats[2]
+
+def view(tp):
+    # The words of the backgrounds' pattern and fill comp draws from
+    words = tp._tape
+    out = []
+    for l, planes in ((0, (0,)), (1, (0, 432))):
+        pos = tp._tape_scroll[l]
+        for x in range(pos, pos+72):
+            for plane in planes:
+                p = l*432 + plane + x%216*2
+                out += (words[p], words[p+1])
+    return hash(tuple(out))
+
+def events(tp, mons, script):
+    # The level and narration events of story_events, without the players
+    # and monsters
+    switched = 0
+    while (tp.x[0] >= script._next_at and
+            script._next_kind != script._END):
+        if script._next_kind == script._LEVEL:
+            script._load_lvl(tp, mons, script._next_event)
+            switched = 1
+        elif script._next_kind == script._DIALOG:
+            script.add_dialog(tp, script._next_event.decode())
+            script._dialog_queue.clear()
+        script._next_kind, script._next_at, script._next_event = script._read()
+    return switched
+
+def jumps(tape_module, script):
+    results = []
+    for title, start in list(script.get_chapters()):
+        tape_module, script = load()
+        tp = tape_module.Tape()
+        mons = types.SimpleNamespace(ticks=None)
+        t = time.perf_counter()
+        script.story_jump(tp, mons, start, True)
+        results.append((title, start, generated(tp),
+            (time.perf_counter()-t)*1000))
+    return results
+
+def scroll(frames, speed, refeed_all):
+    tape_module, script = load()
+    if refeed_all:
+        tape_module._REFEED = 1 << 30
+    tp = tape_module.Tape()
+    mons = types.SimpleNamespace(ticks=None)
+    start = list(script.get_chapters())[0][1]
+    script.story_jump(tp, mons, start, True)
+    counts = []
+    views = []
+    for t in range(frames):
+        before = generated(tp)
+        positions = [tp._tape_scroll[l] for l in (0, 1, 3)]
+        feed = script._last_feed
+        switched = events(tp, mons, script)
+        for i in range(speed):
+            tp.auto_camera(tp.x[0]+63, 20, 1, t)
+        tp.prefetch()
+        # What the old tape would have generated for the same frame
+        old = sum(abs(tp._tape_scroll[l] - p)
+            for l, p in zip((0, 1, 3), positions))
+        if switched:
+            old += 72*(script._last_feed[0] != feed[0])
+            old += 72*(script._last_feed[1:3] != feed[1:3])
+        counts.append((generated(tp) - before, old, switched))
+        views.append(view(tp))
+        if script._next_kind == script._END:
+            break
+    return counts, views
+
+def main():
+    parser = argparse.ArgumentParser(description="Count tape columns generated")
+    parser.add_argument("--frames", type=int, default=50000)
+    parser.add_argument("--speed", type=int, default=1,
+        help="pixels the camera moves each frame")
+    args = parser.parse_args()
+
+    tape_module, script = load()
+    print("story jumps (columns generated, CPython ms):")
+    for title, start, columns, ms in jumps(tape_module, script):
+        title = " ".join(title.split())
+        print(f"  {title[:24]:24} {start:6} {columns:5} {ms:8.1f}")
+
+    counts, views = scroll(args.frames, args.speed, False)
+    _, reference = scroll(args.frames, args.speed, True)
+    frames = len(counts)
+    print(f"scrolling {frames} frames at {args.speed} px/frame "
+        "(columns generated: new, old):")
+    for n, name in ((0, "new"), (1, "old")):
+        switches = [c[n] for c in counts if c[2]]
+        print(f"  {name}: {sum(c[n] for c in counts)/frames:.2f} per frame, "
+            f"worst {max(c[n] for c in counts)}, worst frame with one of "
+            f"{len(switches)} level switches {max(switches) if switches else 0}")
+    wrong = sum(a != b for a, b in zip(views, reference))
+    print(f"  {wrong} frames where the backgrounds in view differ from "
+        "feeding every column at once")
+    return 1 if wrong else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -21,7 +21,10 @@ def addDirFilesToList(path, childDir, file_paths):
     items = os.listdir(path)
     for item in items:
         abs_path = path + "/" + item
-        
+
+        # Host-side scripts (encoders, benchmarks) run on a PC, not the Thumby
+        if os.path.isdir(abs_path) and item == "tools":
+            continue
         if os.path.isdir(abs_path):
             addDirFilesToList(abs_path, True, file_paths)
         else: